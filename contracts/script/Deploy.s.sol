@@ -5,6 +5,7 @@ import "forge-std/Script.sol";
 import "../src/ERC8004Identity.sol";
 import "../src/ERC8004Reputation.sol";
 import "../src/MockJPYC.sol";
+import "../src/JPYCPaymentChannel.sol";
 
 /**
  * @title Deploy
@@ -32,6 +33,10 @@ contract Deploy is Script {
         MockJPYC jpyc = new MockJPYC();
         console.log("MockJPYC deployed at:", address(jpyc));
 
+        // 3b. ペイメントチャネル デプロイ（オフチェーンのバウチャーで決済し、閉じるときだけオンチェーン）
+        JPYCPaymentChannel paymentChannel = new JPYCPaymentChannel(address(jpyc));
+        console.log("JPYCPaymentChannel deployed at:", address(paymentChannel));
+
         // 4. テスト用アカウントにJPYCをエアドロップ
         address[] memory testAccounts = new address[](5);
         testAccounts[0] = 0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266; // account 0
@@ -82,6 +87,11 @@ contract Deploy is Script {
         );
 
         vm.writeFile("../deployments.txt", deployments);
+        // ペイメントチャネルのアドレスを追記
+        vm.writeLine(
+            "../deployments.txt",
+            string.concat("\n", "JPYCPaymentChannel=", vm.toString(address(paymentChannel)))
+        );
         console.log("\nDeployment info saved to deployments.txt");
     }
 }
@@ -5,6 +5,7 @@ import "forge-std/Script.sol";
 import "../src/ERC8004Identity.sol";
 import "../src/ERC8004Reputation.sol";
 import "../src/MockJPYC.sol";
+import "../src/JPYCPaymentChannel.sol";
 
 /**
  * @title DeployAmoy
@@ -34,6 +35,10 @@ contract DeployAmoy is Script {
         MockJPYC jpyc = new MockJPYC();
         console.log("MockJPYC deployed at:", address(jpyc));
 
+        // 3b. ペイメントチャネル デプロイ（オフチェーンのバウチャーで決済し、閉じるときだけオンチェーン）
+        JPYCPaymentChannel paymentChannel = new JPYCPaymentChannel(address(jpyc));
+        console.log("JPYCPaymentChannel deployed at:", address(paymentChannel));
+
         // 4. デプロイヤーにJPYCをmint
         address[] memory testAccounts = new address[](1);
         testAccounts[0] = deployer;
@@ -94,6 +99,11 @@ contract DeployAmoy is Script {
         );
 
         vm.writeFile("../deployments-amoy.txt", deployments);
+        // ペイメントチャネルのアドレスを追記
+        vm.writeLine(
+            "../deployments-amoy.txt",
+            string.concat("PAYMENT_CHANNEL=", vm.toString(address(paymentChannel)))
+        );
         console.log("\nDeployment info saved to deployments-amoy.txt");
         console.log("\n=== Deployment Complete ===");
         console.log("Next steps:");
@@ -0,0 +1,178 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.20;
+
+import "@openzeppelin/contracts/token/ERC20/IERC20.sol";
+import "@openzeppelin/contracts/token/ERC20/utils/SafeERC20.sol";
+import "@openzeppelin/contracts/utils/cryptography/ECDSA.sol";
+import "@openzeppelin/contracts/utils/cryptography/EIP712.sol";
+
+/**
+ * @title JPYCPaymentChannel
+ * @notice クライアント→サービスエージェントの一方向ペイメントチャネル（JPYC）
+ * @dev クライアントがデポジットしてチャネルを開き、呼び出しごとに累積額の
+ *      バウチャー（EIP-712署名）をオフチェーンで渡す。サービス側は最大額の
+ *      バウチャーで1回だけチャネルを閉じ、残額はクライアントに返る。
+ *      期限までに閉じられなければクライアントがデポジットを回収できる。
+ *      閉じた・回収したチャネルIDは finalized に残り、同じIDでは開き直せない
+ *      （開き直せると、前のチャネルのバウチャーで再び引き出せてしまう）。
+ */
+contract JPYCPaymentChannel is EIP712 {
+    using SafeERC20 for IERC20;
+
+    /// @notice チャネル構造体
+    struct Channel {
+        address sender;      // 支払い側（クライアント）
+        address recipient;   // 受け取り側（サービスエージェント）
+        uint256 deposit;     // デポジット額
+        uint256 expiresAt;   // 期限（Unix timestamp）
+    }
+
+    /// @notice バウチャーの型ハッシュ（amount はチャネル開設からの累積額）
+    bytes32 public constant VOUCHER_TYPEHASH =
+        keccak256("Voucher(bytes32 channelId,uint256 amount)");
+
+    /// @notice 決済トークン（JPYC）
+    IERC20 public immutable token;
+
+    /// @notice チャネルID → チャネル
+    mapping(bytes32 => Channel) public channels;
+
+    /// @notice 閉じた・期限切れで回収したチャネルID
+    mapping(bytes32 => bool) public finalized;
+
+    /// @notice イベント: チャネル開設
+    event ChannelOpened(
+        bytes32 indexed channelId,
+        address indexed sender,
+        address indexed recipient,
+        uint256 deposit,
+        uint256 expiresAt
+    );
+
+    /// @notice イベント: デポジット追加
+    event ChannelToppedUp(bytes32 indexed channelId, uint256 deposit);
+
+    /// @notice イベント: チャネル精算（受け取り側が閉じた）
+    event ChannelClosed(bytes32 indexed channelId, uint256 paid, uint256 refunded);
+
+    /// @notice イベント: 期限切れによる返金
+    event ChannelExpired(bytes32 indexed channelId, uint256 refunded);
+
+    constructor(address tokenAddress) EIP712("JPYCPaymentChannel", "1") {
+        token = IERC20(tokenAddress);
+    }
+
+    /**
+     * @notice チャネルIDを計算（送信前にクライアント側でも同じ値を計算できる）
+     * @param sender 支払い側アドレス
+     * @param recipient 受け取り側アドレス
+     * @param salt 任意の値（同じ相手と複数のチャネルを開くため）
+     */
+    function channelId(address sender, address recipient, bytes32 salt)
+        public
+        pure
+        returns (bytes32)
+    {
+        return keccak256(abi.encode(sender, recipient, salt));
+    }
+
+    /**
+     * @notice チャネルを開設してデポジット（事前に token.approve が必要）
+     * @param recipient 受け取り側アドレス
+     * @param deposit デポジット額
+     * @param duration 有効期間（秒）
+     * @param salt チャネルID計算用の値
+     * @return id チャネルID
+     */
+    function open(address recipient, uint256 deposit, uint256 duration, bytes32 salt)
+        external
+        returns (bytes32 id)
+    {
+        require(recipient != address(0), "Invalid recipient");
+        require(deposit > 0, "Deposit must be > 0");
+
+        id = channelId(msg.sender, recipient, salt);
+        require(channels[id].sender == address(0), "Channel exists");
+        require(!finalized[id], "Channel already finalized");
+
+        channels[id] = Channel({
+            sender: msg.sender,
+            recipient: recipient,
+            deposit: deposit,
+            expiresAt: block.timestamp + duration
+        });
+
+        token.safeTransferFrom(msg.sender, address(this), deposit);
+
+        emit ChannelOpened(id, msg.sender, recipient, deposit, block.timestamp + duration);
+    }
+
+    /**
+     * @notice デポジットを追加（支払い側のみ）
+     * @param id チャネルID
+     * @param amount 追加額
+     */
+    function topUp(bytes32 id, uint256 amount) external {
+        Channel storage channel = channels[id];
+        require(channel.sender == msg.sender, "Not channel sender");
+
+        channel.deposit += amount;
+        token.safeTransferFrom(msg.sender, address(this), amount);
+
+        emit ChannelToppedUp(id, channel.deposit);
+    }
+
+    /**
+     * @notice バウチャーのEIP-712ダイジェスト（オフチェーンの署名対象）
+     * @param id チャネルID
+     * @param amount 累積額
+     */
+    function voucherDigest(bytes32 id, uint256 amount) public view returns (bytes32) {
+        return _hashTypedDataV4(keccak256(abi.encode(VOUCHER_TYPEHASH, id, amount)));
+    }
+
+    /**
+     * @notice 最大額のバウチャーでチャネルを閉じる（受け取り側のみ、1回だけ）
+     * @param id チャネルID
+     * @param amount バウチャーの累積額
+     * @param signature 支払い側のバウチャー署名
+     */
+    function close(bytes32 id, uint256 amount, bytes calldata signature) external {
+        Channel memory channel = channels[id];
+        require(channel.recipient == msg.sender, "Not channel recipient");
+        require(amount <= channel.deposit, "Amount exceeds deposit");
+        require(
+            ECDSA.recover(voucherDigest(id, amount), signature) == channel.sender,
+            "Invalid voucher"
+        );
+
+        delete channels[id];
+        finalized[id] = true;
+
+        uint256 refund = channel.deposit - amount;
+        if (amount > 0) {
+            token.safeTransfer(channel.recipient, amount);
+        }
+        if (refund > 0) {
+            token.safeTransfer(channel.sender, refund);
+        }
+
+        emit ChannelClosed(id, amount, refund);
+    }
+
+    /**
+     * @notice 期限切れのチャネルのデポジットを回収（支払い側のみ）
+     * @param id チャネルID
+     */
+    function expire(bytes32 id) external {
+        Channel memory channel = channels[id];
+        require(channel.sender == msg.sender, "Not channel sender");
+        require(block.timestamp >= channel.expiresAt, "Channel not expired");
+
+        delete channels[id];
+        finalized[id] = true;
+        token.safeTransfer(channel.sender, channel.deposit);
+
+        emit ChannelExpired(id, channel.deposit);
+    }
+}
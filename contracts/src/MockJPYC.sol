@@ -108,6 +108,24 @@ contract MockJPYC is ERC20, Ownable {
         emit AuthorizationUsed(from, nonce);
     }
 
+    /**
+     * @notice 複数アドレスへの一括送金（エージェントへの支払いを1トランザクションで精算）
+     * @param recipients 受信者アドレス配列
+     * @param amounts 各受信者への送金額（recipientsと同じ順序）
+     * @return 成功した場合true
+     */
+    function batchTransfer(address[] calldata recipients, uint256[] calldata amounts)
+        external
+        returns (bool)
+    {
+        require(recipients.length == amounts.length, "Length mismatch");
+
+        for (uint256 i = 0; i < recipients.length; i++) {
+            _transfer(msg.sender, recipients[i], amounts[i]);
+        }
+        return true;
+    }
+
     /**
      * @notice テスト用に複数アドレスにエアドロップ
      * @param recipients 受信者アドレス配列
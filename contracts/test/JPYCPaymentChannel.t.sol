@@ -0,0 +1,118 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.20;
+
+import {Test} from "forge-std/Test.sol";
+import {MockJPYC} from "../src/MockJPYC.sol";
+import {JPYCPaymentChannel} from "../src/JPYCPaymentChannel.sol";
+
+contract JPYCPaymentChannelTest is Test {
+    MockJPYC public jpyc;
+    JPYCPaymentChannel public channel;
+
+    uint256 senderKey = 0xA11CE;
+    address sender;
+    address recipient = address(0xB0B);
+
+    bytes32 id;
+
+    function setUp() public {
+        sender = vm.addr(senderKey);
+        jpyc = new MockJPYC();
+        channel = new JPYCPaymentChannel(address(jpyc));
+        jpyc.mint(sender, 100 * 10**18);
+
+        vm.startPrank(sender);
+        jpyc.approve(address(channel), 100 * 10**18);
+        id = channel.open(recipient, 100 * 10**18, 1 days, bytes32(uint256(1)));
+        vm.stopPrank();
+    }
+
+    function _sign(uint256 key, uint256 amount) internal view returns (bytes memory) {
+        (uint8 v, bytes32 r, bytes32 s) = vm.sign(key, channel.voucherDigest(id, amount));
+        return abi.encodePacked(r, s, v);
+    }
+
+    function test_OpenLocksDeposit() public view {
+        assertEq(id, channel.channelId(sender, recipient, bytes32(uint256(1))));
+        assertEq(jpyc.balanceOf(address(channel)), 100 * 10**18);
+        assertEq(jpyc.balanceOf(sender), 0);
+    }
+
+    function test_CloseWithLatestVoucher() public {
+        bytes memory signature = _sign(senderKey, 23 * 10**18);
+
+        vm.prank(recipient);
+        channel.close(id, 23 * 10**18, signature);
+
+        assertEq(jpyc.balanceOf(recipient), 23 * 10**18);
+        assertEq(jpyc.balanceOf(sender), 77 * 10**18);
+        (address channelSender,,,) = channel.channels(id);
+        assertEq(channelSender, address(0));
+    }
+
+    function test_CloseRejectsForgedVoucher() public {
+        bytes memory signature = _sign(0xBAD, 23 * 10**18);
+
+        vm.prank(recipient);
+        vm.expectRevert("Invalid voucher");
+        channel.close(id, 23 * 10**18, signature);
+    }
+
+    function test_CloseRejectsAmountAboveDeposit() public {
+        bytes memory signature = _sign(senderKey, 101 * 10**18);
+
+        vm.prank(recipient);
+        vm.expectRevert("Amount exceeds deposit");
+        channel.close(id, 101 * 10**18, signature);
+    }
+
+    function test_OnlyRecipientCanClose() public {
+        bytes memory signature = _sign(senderKey, 1);
+
+        vm.prank(sender);
+        vm.expectRevert("Not channel recipient");
+        channel.close(id, 1, signature);
+    }
+
+    function test_SenderReclaimsAfterExpiry() public {
+        vm.prank(sender);
+        vm.expectRevert("Channel not expired");
+        channel.expire(id);
+
+        vm.warp(block.timestamp + 1 days);
+        vm.prank(sender);
+        channel.expire(id);
+
+        assertEq(jpyc.balanceOf(sender), 100 * 10**18);
+    }
+
+    function test_ClosedChannelCannotBeReopened() public {
+        bytes memory signature = _sign(senderKey, 23 * 10**18);
+        vm.prank(recipient);
+        channel.close(id, 23 * 10**18, signature);
+        assertTrue(channel.finalized(id));
+
+        vm.startPrank(sender);
+        jpyc.approve(address(channel), 77 * 10**18);
+        vm.expectRevert("Channel already finalized");
+        channel.open(recipient, 77 * 10**18, 1 days, bytes32(uint256(1)));
+        vm.stopPrank();
+
+        // 前のチャネルのバウチャーでは引き出せない
+        vm.prank(recipient);
+        vm.expectRevert("Not channel recipient");
+        channel.close(id, 23 * 10**18, signature);
+        assertEq(jpyc.balanceOf(recipient), 23 * 10**18);
+    }
+
+    function test_ExpiredChannelCannotBeReopened() public {
+        vm.warp(block.timestamp + 1 days);
+        vm.startPrank(sender);
+        channel.expire(id);
+
+        jpyc.approve(address(channel), 100 * 10**18);
+        vm.expectRevert("Channel already finalized");
+        channel.open(recipient, 100 * 10**18, 1 days, bytes32(uint256(1)));
+        vm.stopPrank();
+    }
+}
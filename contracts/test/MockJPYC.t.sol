@@ -0,0 +1,54 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.20;
+
+import {Test} from "forge-std/Test.sol";
+import {MockJPYC} from "../src/MockJPYC.sol";
+
+contract MockJPYCTest is Test {
+    MockJPYC public jpyc;
+
+    address alice = address(0xA11CE);
+    address bob = address(0xB0B);
+
+    function setUp() public {
+        jpyc = new MockJPYC();
+    }
+
+    function test_BatchTransfer() public {
+        address[] memory recipients = new address[](2);
+        recipients[0] = alice;
+        recipients[1] = bob;
+        uint256[] memory amounts = new uint256[](2);
+        amounts[0] = 3 * 10**18;
+        amounts[1] = 15 * 10**18;
+
+        uint256 before = jpyc.balanceOf(address(this));
+        assertTrue(jpyc.batchTransfer(recipients, amounts));
+
+        assertEq(jpyc.balanceOf(alice), 3 * 10**18);
+        assertEq(jpyc.balanceOf(bob), 15 * 10**18);
+        assertEq(jpyc.balanceOf(address(this)), before - 18 * 10**18);
+    }
+
+    function test_BatchTransferRevertsOnLengthMismatch() public {
+        address[] memory recipients = new address[](2);
+        recipients[0] = alice;
+        recipients[1] = bob;
+        uint256[] memory amounts = new uint256[](1);
+        amounts[0] = 1;
+
+        vm.expectRevert("Length mismatch");
+        jpyc.batchTransfer(recipients, amounts);
+    }
+
+    function test_BatchTransferRevertsOnInsufficientBalance() public {
+        address[] memory recipients = new address[](1);
+        recipients[0] = bob;
+        uint256[] memory amounts = new uint256[](1);
+        amounts[0] = 1;
+
+        vm.prank(alice);
+        vm.expectRevert();
+        jpyc.batchTransfer(recipients, amounts);
+    }
+}
@@ -29,9 +29,12 @@ CREATE TABLE IF NOT EXISTS suppliers (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- POS販売データ
+-- 日次集計の変更番号（変更ログの行と集計の版に採番）
+CREATE SEQUENCE IF NOT EXISTS pos_sales_change_seq;
+
+-- POS販売データ（date の月単位レンジパーティション）
 CREATE TABLE IF NOT EXISTS pos_sales (
-    id BIGSERIAL PRIMARY KEY,
+    id BIGSERIAL,
     date DATE NOT NULL,
     store_id VARCHAR(50) NOT NULL REFERENCES stores(store_id),
     product_sku VARCHAR(100) NOT NULL REFERENCES products(product_sku),
@@ -39,16 +42,314 @@ CREATE TABLE IF NOT EXISTS pos_sales (
     price DECIMAL(10, 2) NOT NULL,
     day_of_week INTEGER NOT NULL,
     is_holiday BOOLEAN NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    transaction_id VARCHAR(100),  -- POSエクスポートの取引ID（取り込み時の重複判定用）
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, date)
+) PARTITION BY RANGE (date);
+
+-- 在庫スナップショット（商品×店舗ごとの最新の手持ち在庫）
+CREATE TABLE IF NOT EXISTS inventory_snapshots (
+    product_sku VARCHAR(100) NOT NULL REFERENCES products(product_sku),
+    store_id VARCHAR(50) NOT NULL REFERENCES stores(store_id),
+    on_hand_quantity INTEGER NOT NULL CHECK (on_hand_quantity >= 0),
+    snapshot_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (product_sku, store_id)
 );
 
 -- インデックス
-CREATE INDEX IF NOT EXISTS idx_pos_sales_product_store_date
-    ON pos_sales(product_sku, store_id, date DESC);
+-- 予測クエリの列を INCLUDE したカバリングインデックス（ヒープを読まずに index-only scan で返す）
+DROP INDEX IF EXISTS idx_pos_sales_product_store_date;
+CREATE INDEX IF NOT EXISTS idx_pos_sales_product_store_date_covering
+    ON pos_sales(product_sku, store_id, date DESC)
+    INCLUDE (sales_quantity, price, day_of_week, is_holiday);
 
 CREATE INDEX IF NOT EXISTS idx_pos_sales_date
     ON pos_sales(date DESC);
 
+CREATE UNIQUE INDEX IF NOT EXISTS idx_pos_sales_transaction
+    ON pos_sales(date, store_id, transaction_id);
+
+-- 日次販売集計（需要予測用、(product_sku, store_id, date) ごとに1行）
+CREATE TABLE IF NOT EXISTS pos_sales_daily (
+    product_sku VARCHAR(100) NOT NULL,
+    store_id VARCHAR(50) NOT NULL,
+    date DATE NOT NULL,
+    sales_quantity INTEGER NOT NULL,
+    price DECIMAL(10, 2) NOT NULL,
+    day_of_week INTEGER NOT NULL,
+    is_holiday BOOLEAN NOT NULL,
+    transaction_count INTEGER NOT NULL,
+    refreshed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (product_sku, store_id, date)
+) PARTITION BY RANGE (date);
+
+-- 月次パーティションの管理
+-- パーティション名は <親テーブル>_YYYYMM、範囲は [月初, 翌月初)。
+-- 範囲外の行は <親テーブル>_default に入るため、取り込みより先に月次パーティションを作成しておく。
+CREATE OR REPLACE FUNCTION create_monthly_partition(p_parent TEXT, p_month DATE) RETURNS TEXT AS $$
+DECLARE
+    v_start DATE := date_trunc('month', p_month)::DATE;
+    v_end DATE := (date_trunc('month', p_month) + INTERVAL '1 month')::DATE;
+    v_name TEXT := p_parent || '_' || to_char(p_month, 'YYYYMM');
+BEGIN
+    IF to_regclass(v_name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+            v_name, p_parent, v_start, v_end
+        );
+    END IF;
+    RETURN v_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- p_from から p_to までの各月のパーティションを作成（作成済みの月は何もしない）
+-- 戻り値: 対象の月数
+CREATE OR REPLACE FUNCTION ensure_monthly_partitions(p_parent TEXT, p_from DATE, p_to DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    v_month DATE := date_trunc('month', p_from)::DATE;
+    v_count INTEGER := 0;
+BEGIN
+    WHILE v_month <= p_to LOOP
+        PERFORM create_monthly_partition(p_parent, v_month);
+        v_month := (v_month + INTERVAL '1 month')::DATE;
+        v_count := v_count + 1;
+    END LOOP;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- p_cutoff より前に終わる月次パーティションを切り離す（テーブル自体は残すのでアーカイブ後に DROP する）
+-- 戻り値: 切り離したパーティション名
+CREATE OR REPLACE FUNCTION detach_monthly_partitions_before(p_parent TEXT, p_cutoff DATE)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    v_name TEXT;
+BEGIN
+    FOR v_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = p_parent::regclass
+          AND c.relname ~ ('^' || p_parent || '_[0-9]{6}$')
+          AND to_date(right(c.relname, 6), 'YYYYMM') + INTERVAL '1 month' <= p_cutoff
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', p_parent, v_name);
+        RETURN NEXT v_name;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TABLE IF NOT EXISTS pos_sales_default PARTITION OF pos_sales DEFAULT;
+CREATE TABLE IF NOT EXISTS pos_sales_daily_default PARTITION OF pos_sales_daily DEFAULT;
+
+-- 直近1年分と3ヶ月先までのパーティション
+SELECT ensure_monthly_partitions(
+    'pos_sales', (CURRENT_DATE - INTERVAL '12 months')::DATE, (CURRENT_DATE + INTERVAL '3 months')::DATE
+);
+SELECT ensure_monthly_partitions(
+    'pos_sales_daily', (CURRENT_DATE - INTERVAL '12 months')::DATE, (CURRENT_DATE + INTERVAL '3 months')::DATE
+);
+
+-- DemandForecastAgent._fetch_pos_data 用のカバリングインデックス
+CREATE INDEX IF NOT EXISTS idx_pos_sales_daily_forecast
+    ON pos_sales_daily(product_sku, store_id, date)
+    INCLUDE (sales_quantity, price, day_of_week, is_holiday);
+
+-- 日次販売集計の差分更新状態（last_change_id は集計の版で、集計を更新するたびに増える）
+CREATE TABLE IF NOT EXISTS pos_sales_daily_refresh_state (
+    singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+    last_change_id BIGINT NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP
+);
+
+INSERT INTO pos_sales_daily_refresh_state (singleton) VALUES (TRUE)
+ON CONFLICT (singleton) DO NOTHING;
+
+-- 日次集計の再計算待ちの (商品, 店舗, 日)
+-- pos_sales のトリガーが書き込みと同じトランザクションで記録し、refresh_pos_sales_daily が
+-- DELETE ... RETURNING で取り出す。コミット順と採番順が前後しても取りこぼさない。
+CREATE TABLE IF NOT EXISTS pos_sales_daily_changelog (
+    change_id BIGINT PRIMARY KEY DEFAULT nextval('pos_sales_change_seq'),
+    product_sku VARCHAR(100) NOT NULL,
+    store_id VARCHAR(50) NOT NULL,
+    date DATE NOT NULL
+);
+
+-- 挿入・削除された行の (商品, 店舗, 日) を記録（文単位トリガー、遷移テーブル changed_rows）
+CREATE OR REPLACE FUNCTION log_pos_sales_changes() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO pos_sales_daily_changelog (product_sku, store_id, date)
+    SELECT DISTINCT product_sku, store_id, date FROM changed_rows;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 更新された行は更新前と更新後の両方を記録（商品・日付の変更で元の集計行が残らないように）
+CREATE OR REPLACE FUNCTION log_pos_sales_updates() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO pos_sales_daily_changelog (product_sku, store_id, date)
+    SELECT product_sku, store_id, date FROM old_rows
+    UNION
+    SELECT product_sku, store_id, date FROM new_rows;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS pos_sales_log_inserts ON pos_sales;
+CREATE TRIGGER pos_sales_log_inserts
+    AFTER INSERT ON pos_sales
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION log_pos_sales_changes();
+
+DROP TRIGGER IF EXISTS pos_sales_log_updates ON pos_sales;
+CREATE TRIGGER pos_sales_log_updates
+    AFTER UPDATE ON pos_sales
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION log_pos_sales_updates();
+
+DROP TRIGGER IF EXISTS pos_sales_log_deletes ON pos_sales;
+CREATE TRIGGER pos_sales_log_deletes
+    AFTER DELETE ON pos_sales
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION log_pos_sales_changes();
+
+-- 日次販売集計の差分更新
+-- 変更ログを取り出して、記録された (商品, 店舗, 日) だけを再集計して upsert する
+-- （元の行がすべて無くなった日は集計行を削除）。
+-- 戻り値: 再集計した (店舗, 月) ごとの最初の日と (商品, 日) の数
+--         （コミット後に呼び出し側が POS履歴キャッシュの該当月を破棄する）
+DROP FUNCTION IF EXISTS refresh_pos_sales_daily();
+CREATE FUNCTION refresh_pos_sales_daily()
+RETURNS TABLE (store_id VARCHAR(50), month DATE, first_date DATE, days_refreshed INTEGER) AS $$
+#variable_conflict use_column
+DECLARE
+    v_skus VARCHAR(100)[];
+    v_stores VARCHAR(50)[];
+    v_dates DATE[];
+    v_min_date DATE;
+    v_max_date DATE;
+BEGIN
+    -- 同時に呼ばれた更新を直列化
+    PERFORM 1 FROM pos_sales_daily_refresh_state FOR UPDATE;
+
+    -- コミット済みの変更ログを取り出す（未コミットの書き込みの分は次回に残る）
+    WITH drained AS (
+        DELETE FROM pos_sales_daily_changelog
+        RETURNING product_sku, store_id, date
+    ),
+    touched AS (
+        SELECT DISTINCT product_sku, store_id, date FROM drained
+    )
+    SELECT array_agg(product_sku), array_agg(store_id), array_agg(date), MIN(date), MAX(date)
+    INTO v_skus, v_stores, v_dates, v_min_date, v_max_date
+    FROM touched;
+
+    IF v_skus IS NULL THEN
+        RETURN;
+    END IF;
+
+    WITH touched AS (
+        SELECT * FROM unnest(v_skus, v_stores, v_dates) AS t(product_sku, store_id, date)
+    )
+    INSERT INTO pos_sales_daily (
+        product_sku,
+        store_id,
+        date,
+        sales_quantity,
+        price,
+        day_of_week,
+        is_holiday,
+        transaction_count,
+        refreshed_at
+    )
+    SELECT
+        p.product_sku,
+        p.store_id,
+        p.date,
+        SUM(p.sales_quantity),
+        -- 数量加重平均単価（販売数0の日は最大単価）
+        COALESCE(
+            ROUND(SUM(p.price * p.sales_quantity) / NULLIF(SUM(p.sales_quantity), 0), 2),
+            MAX(p.price)
+        ),
+        MAX(p.day_of_week),
+        BOOL_OR(p.is_holiday),
+        COUNT(*),
+        CURRENT_TIMESTAMP
+    FROM pos_sales p
+    JOIN touched t
+      ON p.product_sku = t.product_sku
+     AND p.store_id = t.store_id
+     AND p.date = t.date
+    -- 再集計する日付範囲のパーティションだけを読む
+    WHERE p.date BETWEEN v_min_date AND v_max_date
+    GROUP BY p.product_sku, p.store_id, p.date
+    ON CONFLICT (product_sku, store_id, date) DO UPDATE SET
+        sales_quantity = EXCLUDED.sales_quantity,
+        price = EXCLUDED.price,
+        day_of_week = EXCLUDED.day_of_week,
+        is_holiday = EXCLUDED.is_holiday,
+        transaction_count = EXCLUDED.transaction_count,
+        refreshed_at = EXCLUDED.refreshed_at;
+
+    DELETE FROM pos_sales_daily d
+    USING unnest(v_skus, v_stores, v_dates) AS t(product_sku, store_id, date)
+    WHERE d.product_sku = t.product_sku
+      AND d.store_id = t.store_id
+      AND d.date = t.date
+      AND d.date BETWEEN v_min_date AND v_max_date
+      AND NOT EXISTS (
+          SELECT 1
+          FROM pos_sales p
+          WHERE p.product_sku = d.product_sku
+            AND p.store_id = d.store_id
+            AND p.date = d.date
+      );
+
+    UPDATE pos_sales_daily_refresh_state
+    SET last_change_id = nextval('pos_sales_change_seq'),
+        refreshed_at = CURRENT_TIMESTAMP;
+
+    RETURN QUERY
+    SELECT t.store_id, date_trunc('month', t.date)::DATE, MIN(t.date), COUNT(*)::INTEGER
+    FROM unnest(v_skus, v_stores, v_dates) AS t(product_sku, store_id, date)
+    GROUP BY 1, 2;
+END;
+$$ LANGUAGE plpgsql;
+
+-- x402 精算台帳（DEFERRED / UPTO の課金を支払先ごとに合算してまとめて送金）
+-- status: accrued（未精算）→ submitting（batch_id で確保、送信後は tx_hash を記録）
+--         → settled（レシートの status = 1 を確認済み）。リバートした分は accrued に戻す
+CREATE TABLE IF NOT EXISTS x402_settlement_ledger (
+    transaction_id VARCHAR(100) PRIMARY KEY,
+    client_agent_id INTEGER NOT NULL,
+    service_agent_id INTEGER NOT NULL,
+    payment_address VARCHAR(42) NOT NULL,  -- 小文字に正規化
+    payment_scheme VARCHAR(20) NOT NULL,
+    amount NUMERIC(78, 0) NOT NULL CHECK (amount >= 0),  -- wei
+    status VARCHAR(20) NOT NULL DEFAULT 'accrued',
+    batch_id VARCHAR(100),
+    tx_hash VARCHAR(66),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    settled_at TIMESTAMP
+);
+
+-- 支払先ごとの未精算額（amount を INCLUDE して index-only scan で集計）
+CREATE INDEX IF NOT EXISTS idx_x402_settlement_ledger_accrued
+    ON x402_settlement_ledger(payment_address, created_at)
+    INCLUDE (amount)
+    WHERE status = 'accrued';
+
+CREATE INDEX IF NOT EXISTS idx_x402_settlement_ledger_batch
+    ON x402_settlement_ledger(batch_id);
+
+-- レシート未確認のバッチ（SettlementLedger.reconcile）
+CREATE INDEX IF NOT EXISTS idx_x402_settlement_ledger_submitting
+    ON x402_settlement_ledger(batch_id)
+    WHERE status = 'submitting';
+
 -- Phase 2以降で追加予定
 -- CREATE TABLE agent_executions (...);
 -- CREATE TABLE optimization_tasks (...);
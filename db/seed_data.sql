@@ -18,6 +18,11 @@ INSERT INTO suppliers (supplier_id, supplier_name, unit_price, lead_time_hours,
 ('SUP003', '北海道ファーム', 130.00, 24, 0.92)
 ON CONFLICT (supplier_id) DO NOTHING;
 
+-- 在庫スナップショット
+INSERT INTO inventory_snapshots (product_sku, store_id, on_hand_quantity) VALUES
+('tomato-medium-domestic', 'S001', 80)
+ON CONFLICT (product_sku, store_id) DO NOTHING;
+
 -- POS販売データ（過去30日分のサンプル）
 -- 曜日パターン: 0=月, 1=火, 2=水, 3=木, 4=金, 5=土, 6=日
 -- 平日: 300-400個、週末: 450-550個
@@ -67,3 +72,6 @@ BEGIN
         ON CONFLICT DO NOTHING;
     END LOOP;
 END $$;
+
+-- 日次販売集計を更新
+SELECT * FROM refresh_pos_sales_daily();
@@ -12,6 +12,7 @@ export default function DashboardPage() {
   });
   const [transactions, setTransactions] = useState<Transaction[]>([]);
   const [agents, setAgents] = useState<AgentInfo[]>([]);
+  const [jobId, setJobId] = useState<string | null>(null);
   const [isRunning, setIsRunning] = useState(false);
   const logsEndRef = useRef<HTMLDivElement>(null);
 
@@ -22,9 +23,9 @@ export default function DashboardPage() {
 
   // SSEでログをストリーミング
   useEffect(() => {
-    if (!isRunning) return;
+    if (!isRunning || !jobId) return;
 
-    const eventSource = new EventSource('http://localhost:8000/api/logs/stream');
+    const eventSource = new EventSource(`http://localhost:8000/api/jobs/${jobId}/stream`);
 
     eventSource.onmessage = (event) => {
       const data = JSON.parse(event.data);
@@ -49,15 +50,15 @@ export default function DashboardPage() {
     return () => {
       eventSource.close();
     };
-  }, [isRunning]);
+  }, [isRunning, jobId]);
 
   // トランザクション履歴を定期的に取得
   useEffect(() => {
-    if (!isRunning) return;
+    if (!isRunning || !jobId) return;
 
     const interval = setInterval(async () => {
       try {
-        const response = await fetch('http://localhost:8000/api/transactions');
+        const response = await fetch(`http://localhost:8000/api/jobs/${jobId}?log_limit=0`);
         const data = await response.json();
         setTransactions(data.transactions);
       } catch (error) {
@@ -66,7 +67,7 @@ export default function DashboardPage() {
     }, 2000);
 
     return () => clearInterval(interval);
-  }, [isRunning]);
+  }, [isRunning, jobId]);
 
   // エージェント情報とウォレット残高を取得
   useEffect(() => {
@@ -93,10 +94,11 @@ export default function DashboardPage() {
   const startOptimization = async () => {
     setLogs([]);
     setTransactions([]);
+    setJobId(null);
     setIsRunning(true);
 
     try {
-      await fetch('http://localhost:8000/api/optimize', {
+      const response = await fetch('http://localhost:8000/api/optimize', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -107,6 +109,11 @@ export default function DashboardPage() {
           unit_price: 200.0,
         }),
       });
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+      const data = await response.json();
+      setJobId(data.job_id);
     } catch (error) {
       console.error('Failed to start optimization:', error);
       setIsRunning(false);
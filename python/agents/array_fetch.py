@@ -0,0 +1,167 @@
+"""
+クエリ結果の配列デコード
+
+固定長の列だけを返すクエリを COPY (...) TO STDOUT (FORMAT binary) で実行し、
+受け取ったバッファを構造化dtypeで np.frombuffer して列ごとの NumPy 配列にする。
+行ごとのPythonオブジェクト（タプル・int・date）を作らない。
+
+psycopg2（Session）と asyncpg（AsyncSession）の両方に対応し、それ以外の
+接続（テスト用のセッションなど）では execute の結果から配列を作る。
+"""
+import io
+import logging
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .base import execute_query
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL の型名 → バイナリ表現（ビッグエンディアン）
+PG_BINARY_DTYPES = {
+    "bool": np.dtype("?"),
+    "int2": np.dtype(">i2"),
+    "int4": np.dtype(">i4"),
+    "int8": np.dtype(">i8"),
+    "float4": np.dtype(">f4"),
+    "float8": np.dtype(">f8"),
+    "date": np.dtype(">i4"),  # 2000-01-01 からの日数
+}
+
+ColumnSpec = Sequence[Tuple[str, str]]  # [(列名, PostgreSQLの型名)]
+
+_COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+_PG_EPOCH_DAYS = 10957  # 1970-01-01 → 2000-01-01
+_BIND_PARAM = re.compile(r"(?<![:\w]):(\w+)")
+
+
+def decode_binary_copy(buffer: bytes, columns: ColumnSpec) -> Dict[str, np.ndarray]:
+    """
+    COPY バイナリ形式のバッファを列ごとの配列にデコード
+
+    全列が固定長かつ NULL を含まない前提で、1行を構造化dtypeの1要素として読む。
+
+    Args:
+        buffer: COPY TO STDOUT (FORMAT binary) の出力
+        columns: 列名と型名（クエリの列順）
+
+    Returns:
+        Dict[str, np.ndarray]: 列名 → ネイティブエンディアンの配列（date は datetime64[D]）
+    """
+    view = memoryview(buffer)
+    if bytes(view[: len(_COPY_SIGNATURE)]) != _COPY_SIGNATURE:
+        raise ValueError("Invalid binary COPY signature")
+
+    # ヘッダ: シグネチャ(11) + フラグ(4) + 拡張領域長(4) + 拡張領域
+    extension_length = int.from_bytes(view[15:19], "big")
+    body = view[19 + extension_length : len(view) - 2]  # 末尾の -1 (int16) を除く
+
+    fields = [("n_fields", ">i2")]
+    for i, (_, pg_type) in enumerate(columns):
+        fields.append((f"length_{i}", ">i4"))
+        fields.append((f"value_{i}", PG_BINARY_DTYPES[pg_type]))
+    row_dtype = np.dtype(fields)
+
+    if len(body) % row_dtype.itemsize:
+        raise ValueError("Binary COPY row size does not match the column types")
+    rows = np.frombuffer(body, dtype=row_dtype)
+
+    if len(rows) and (rows["n_fields"] != len(columns)).any():
+        raise ValueError("Binary COPY field count does not match the column types")
+
+    arrays: Dict[str, np.ndarray] = {}
+    for i, (name, pg_type) in enumerate(columns):
+        expected = PG_BINARY_DTYPES[pg_type].itemsize
+        if len(rows) and (rows[f"length_{i}"] != expected).any():
+            raise ValueError(f"Column {name} contains NULL or variable-length values")
+
+        values = rows[f"value_{i}"]
+        if pg_type == "date":
+            arrays[name] = (values.astype(np.int64) + _PG_EPOCH_DAYS).astype("datetime64[D]")
+        else:
+            arrays[name] = values.astype(values.dtype.newbyteorder("="))
+    return arrays
+
+
+def _driver_name(db_session) -> Optional[str]:
+    get_bind = getattr(db_session, "get_bind", None)
+    if get_bind is None:
+        return None
+    return get_bind().dialect.driver
+
+
+async def _copy_psycopg2(db_session, sql: str, params: dict) -> bytes:
+    """psycopg2 の copy_expert で COPY を実行（パラメータは mogrify で埋め込む）"""
+    dbapi_connection = db_session.connection().connection
+    cursor = dbapi_connection.cursor()
+    try:
+        query = cursor.mogrify(_BIND_PARAM.sub(r"%(\1)s", sql), params).decode()
+        buffer = io.BytesIO()
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT binary)", buffer)
+        return buffer.getvalue()
+    finally:
+        cursor.close()
+
+
+async def _copy_asyncpg(db_session, sql: str, params: dict) -> bytes:
+    """asyncpg の copy_from_query で COPY を実行（パラメータは $n で渡す）"""
+    names: List[str] = []
+
+    def positional(match):
+        if match.group(1) not in names:
+            names.append(match.group(1))
+        return f"${names.index(match.group(1)) + 1}"
+
+    query = _BIND_PARAM.sub(positional, sql)
+
+    connection = await db_session.connection()
+    raw_connection = await connection.get_raw_connection()
+    chunks: List[bytes] = []
+
+    async def sink(chunk):
+        chunks.append(chunk)
+
+    await raw_connection.driver_connection.copy_from_query(
+        query, *(params[name] for name in names), output=sink, format="binary"
+    )
+    return b"".join(chunks)
+
+
+async def fetch_arrays(
+    db_session, query, params: Optional[dict], columns: ColumnSpec
+) -> Dict[str, np.ndarray]:
+    """
+    固定長の列だけを返すクエリを列ごとの NumPy 配列として取得
+
+    Args:
+        db_session: データベースセッション（Session / AsyncSession）
+        query: SQLAlchemy text クエリ（:name 形式のバインドパラメータ）
+        params: バインドパラメータ
+        columns: 列名と型名（クエリの列順）
+
+    Returns:
+        Dict[str, np.ndarray]: 列名 → 配列
+    """
+    params = params or {}
+    driver = _driver_name(db_session)
+
+    if driver == "psycopg2":
+        buffer = await _copy_psycopg2(db_session, query.text, params)
+        return decode_binary_copy(buffer, columns)
+    if driver == "asyncpg":
+        buffer = await _copy_asyncpg(db_session, query.text, params)
+        return decode_binary_copy(buffer, columns)
+
+    # COPY に対応しない接続では通常の実行結果から作る
+    result = await execute_query(db_session, query, params)
+    rows = result.fetchall()
+    arrays: Dict[str, np.ndarray] = {}
+    for i, (name, pg_type) in enumerate(columns):
+        values = [row[i] for row in rows]
+        if pg_type == "date":
+            arrays[name] = np.array(values, dtype="datetime64[D]")
+        else:
+            arrays[name] = np.array(values, dtype=PG_BINARY_DTYPES[pg_type].newbyteorder("="))
+    return arrays
@@ -7,6 +7,7 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from enum import Enum
 from typing import Dict, Optional, Any
+import inspect
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,9 +30,9 @@ class PaymentConfig:
     variable_rate: Optional[float] = None  # upto方式用（JPYC/1000レコード）
 
 
-@dataclass
+@dataclass(slots=True)
 class AgentResult:
-    """エージェント実行結果"""
+    """エージェント実行結果（__slots__ で属性辞書を持たない）"""
 
     success: bool
     data: Dict[str, Any]
@@ -42,6 +43,27 @@ class AgentResult:
     tx_hash: Optional[str] = None  # Phase 2で使用
 
 
+async def execute_query(db_session, query, params: Optional[Dict[str, Any]] = None):
+    """
+    クエリ実行
+
+    同期Session・AsyncSessionのどちらでも実行できるようにする。
+    AsyncSessionの場合はawaitするため、イベントループをブロックしない。
+
+    Args:
+        db_session: データベースセッション（Session / AsyncSession）
+        query: SQLAlchemyクエリ
+        params: バインドパラメータ
+
+    Returns:
+        Result: クエリ結果（バッファ済み）
+    """
+    result = db_session.execute(query, params or {})
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
 class Agent(ABC):
     """エージェント基底クラス"""
 
@@ -78,6 +100,19 @@ class Agent(ABC):
         """
         pass
 
+    async def _execute_query(self, query, params: Optional[Dict[str, Any]] = None):
+        """
+        クエリ実行（execute_query を自身のセッションで呼び出す）
+
+        Args:
+            query: SQLAlchemyクエリ
+            params: バインドパラメータ
+
+        Returns:
+            Result: クエリ結果（バッファ済み）
+        """
+        return await execute_query(self.db_session, query, params)
+
     def calculate_cost(self, usage_metrics: Dict[str, Any]) -> int:
         """
         実行コストの計算
@@ -4,24 +4,114 @@
 過去POSデータから翌日の販売数量を予測する。
 MVP版: 7日移動平均ベースの簡易予測
 """
+import copy
 import time
 import logging
-from typing import Dict, Any
+from datetime import date, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
 import pandas as pd
 from sqlalchemy import text
 
+from .array_fetch import fetch_arrays
 from .base import Agent, AgentResult, PaymentScheme, PaymentConfig
+from .forecast_cache import ForecastCache, ForecastKey
+from .forecast_kernel import (
+    HISTORY_DAYS,
+    MovingAverageForecast,
+    build_sales_matrix,
+    forecast_from_window_sums,
+    moving_average_forecast,
+)
+from .pos_history_cache import PosHistoryCache, fill_pos_history_cache
+from .rolling_stats import RollingStatsStore, RollingWindowStats
+from .tracing import span
 
 logger = logging.getLogger(__name__)
 
+# 1系列の予測用POSデータ（idx_pos_sales_daily_forecast で index-only scan になる）
+# 配列デコードのため全列を固定長の型で返す
+FORECAST_QUERY = text(
+    """
+    SELECT
+        date,
+        sales_quantity,
+        CAST(price AS FLOAT8) AS price,
+        day_of_week,
+        is_holiday
+    FROM pos_sales_daily
+    WHERE product_sku = :product_sku
+      AND store_id = :store_id
+      AND date >= :start_date
+      AND date <= :end_date
+    ORDER BY date
+"""
+)
+
+# 複数系列の予測用POSデータ（series は入力ペアの位置、0始まり）
+FORECAST_BATCH_QUERY = text(
+    """
+    SELECT
+        k.series - 1 AS series,
+        p.date,
+        p.sales_quantity,
+        CAST(p.price AS FLOAT8) AS price,
+        p.day_of_week,
+        p.is_holiday
+    FROM pos_sales_daily p
+    JOIN unnest(CAST(:product_skus AS VARCHAR[]), CAST(:store_ids AS VARCHAR[]))
+        WITH ORDINALITY AS k(product_sku, store_id, series)
+      ON p.product_sku = k.product_sku
+     AND p.store_id = k.store_id
+    WHERE p.date >= :start_date
+      AND p.date <= :end_date
+    ORDER BY k.series, p.date
+"""
+)
+
+# FORECAST_QUERY の列の型
+FORECAST_COLUMNS = [
+    ("date", "date"),
+    ("sales_quantity", "int4"),
+    ("price", "float8"),
+    ("day_of_week", "int4"),
+    ("is_holiday", "bool"),
+]
+
+# FORECAST_BATCH_QUERY の列の型
+FORECAST_BATCH_COLUMNS = [("series", "int8")] + FORECAST_COLUMNS
+
+
+def _date_range(days: int) -> Tuple[date, date]:
+    """
+    過去 days 日の取得範囲（今日を含む）
+
+    Args:
+        days: 取得日数
+
+    Returns:
+        Tuple[date, date]: (開始日, 終了日)
+    """
+    today = date.today()
+    return today - timedelta(days=days), today
+
 
 class DemandForecastAgent(Agent):
     """需要予測エージェント（簡易版）"""
 
-    def __init__(self, db_session):
+    def __init__(
+        self,
+        db_session,
+        rolling_stats: Optional[RollingStatsStore] = None,
+        history_cache: Optional[PosHistoryCache] = None,
+        forecast_cache: Optional[ForecastCache] = None,
+    ):
         """
         Args:
             db_session: データベースセッション
+            rolling_stats: ローリング統計ストア（指定時は状態から予測できる系列でDBを読まない）
+            history_cache: POS履歴キャッシュ（指定時は締まった日をキャッシュから読み、当日分だけDBを読む）
+            forecast_cache: 予測結果キャッシュ（指定時はデータが変わっていない系列を再計算・再課金しない）
         """
         super().__init__(
             name="demand_forecast",
@@ -32,6 +122,9 @@ class DemandForecastAgent(Agent):
             ),
         )
         self.db_session = db_session
+        self.rolling_stats = rolling_stats
+        self.history_cache = history_cache
+        self.forecast_cache = forecast_cache
 
     async def execute(self, input_data: Dict[str, Any]) -> AgentResult:
         """
@@ -55,48 +148,37 @@ class DemandForecastAgent(Agent):
                 f"[{self.name}] Starting prediction for {product_sku} at {store_id}"
             )
 
-            # 1. 過去POSデータ取得（過去30日分）
-            pos_data = self._fetch_pos_data(product_sku, store_id, days=30)
-
-            if len(pos_data) == 0:
-                return AgentResult(
-                    success=False,
-                    data={},
-                    confidence=0.0,
-                    execution_time=time.time() - start_time,
-                    cost=0,
-                    error_message="No historical data found",
-                )
-
-            # 2. 7日移動平均で予測
-            recent_sales = pos_data.tail(7)["sales_quantity"].values
-            predicted_demand = int(recent_sales.mean())
-
-            # 3. 信頼区間算出（±9%）
-            lower_bound = int(predicted_demand * 0.91)
-            upper_bound = int(predicted_demand * 1.09)
-
-            execution_time = time.time() - start_time
+            # ローリング統計から予測できる場合はDBを読まない
+            pair = (product_sku, store_id)
+            served, rolling_forecast = self._forecast_rolling([pair])
+            cache_keys, cached = ({}, {}) if served else await self._lookup_cache([pair])
+            if served:
+                result = self._build_result(rolling_forecast, 0, start_time)
+            elif pair in cached:
+                # データが変わっていなければ前回の予測を返す（課金しない）
+                result = self._cached_result(cached[pair], start_time)
+            elif self.history_cache is not None:
+                # 締まった日はキャッシュ、当日分だけDBから読む
+                quantities, codes = await self._fetch_sales_cached([pair], days=HISTORY_DAYS)
+                with span("compute", kernel="moving_average", series=1):
+                    forecast = moving_average_forecast(build_sales_matrix(quantities, codes, 1))
+                result = self._build_result(forecast, 0, start_time)
+            else:
+                # 1. 過去POSデータ取得（過去30日分）
+                pos_data = await self._fetch_pos_data(product_sku, store_id, days=HISTORY_DAYS)
 
-            # コスト計算
-            cost = self.calculate_cost({"data_rows": len(pos_data)})
+                # 2. 予測
+                result = self._forecast_from_pos_data(pos_data, start_time)
 
-            logger.info(
-                f"[{self.name}] Prediction: {predicted_demand} (range: {lower_bound}-{upper_bound})"
-            )
-
-            return AgentResult(
-                success=True,
-                data={
-                    "predicted_demand": predicted_demand,
-                    "confidence_interval": {"lower": lower_bound, "upper": upper_bound},
-                    "historical_data_points": len(pos_data),
-                    "method": "7-day moving average",
-                },
-                confidence=0.85,  # 簡易版なので85%
-                execution_time=execution_time,
-                cost=cost,
-            )
+            if cache_keys and pair not in cached:
+                await self._store_cache(cache_keys, {pair: result})
+            if result.success:
+                logger.info(
+                    f"[{self.name}] Prediction: {result.data['predicted_demand']} "
+                    f"(range: {result.data['confidence_interval']['lower']}"
+                    f"-{result.data['confidence_interval']['upper']})"
+                )
+            return result
 
         except KeyError as e:
             logger.error(f"[{self.name}] Missing required input: {e}")
@@ -119,12 +201,292 @@ class DemandForecastAgent(Agent):
                 error_message=str(e),
             )
 
-    def _fetch_pos_data(
+    async def execute_batch(
+        self, pairs: List[Tuple[str, str]], batch_size: int = 5000
+    ) -> List[AgentResult]:
+        """
+        需要予測の一括実行
+
+        複数の (product_sku, store_id) についてPOSデータを集合クエリでまとめて取得し、
+        ペアごとに予測する。
+
+        Args:
+            pairs: (product_sku, store_id) のリスト
+            batch_size: 1クエリで取得するペア数の上限
+
+        Returns:
+            List[AgentResult]: pairs と同じ順序の予測結果
+        """
+        results: List[AgentResult] = []
+
+        for offset in range(0, len(pairs), batch_size):
+            chunk = pairs[offset : offset + batch_size]
+            start_time = time.time()
+
+            unique_pairs = list(dict.fromkeys(chunk))
+            series: Dict[Tuple[str, str], Tuple[MovingAverageForecast, int]] = {}
+
+            # ローリング統計から予測できるペアはDBを読まない
+            served, rolling_forecast = self._forecast_rolling(unique_pairs)
+            series.update((pair, (rolling_forecast, i)) for i, pair in enumerate(served))
+
+            # データが変わっていないペアは前回の予測を返す
+            remaining = [pair for pair in unique_pairs if pair not in series]
+            cache_keys, cached = await self._lookup_cache(remaining)
+
+            # 残りは (系列 × 日) 行列にまとめて一括予測
+            to_fetch = [pair for pair in remaining if pair not in cached]
+            fetched_rows = 0
+            fetch_error: Optional[str] = None
+            if to_fetch:
+                try:
+                    if self.history_cache is not None:
+                        quantities, codes = await self._fetch_sales_cached(to_fetch, days=HISTORY_DAYS)
+                        fetched_rows = len(quantities)
+                        with span("compute", kernel="moving_average", series=len(to_fetch)):
+                            forecast = moving_average_forecast(
+                                build_sales_matrix(quantities, codes, len(to_fetch))
+                            )
+                    else:
+                        pos_data = await self._fetch_pos_data_batch(to_fetch, days=HISTORY_DAYS)
+                        fetched_rows = len(pos_data)
+                        forecast = self._forecast_matrix(pos_data, to_fetch)
+                    series.update((pair, (forecast, i)) for i, pair in enumerate(to_fetch))
+                except Exception as e:
+                    logger.error(f"[{self.name}] Batch fetch failed: {e}")
+                    fetch_error = str(e)
+
+            # 取得・計算時間はペア数で按分する
+            time_share = (time.time() - start_time) / len(chunk)
+            fresh: Dict[Tuple[str, str], AgentResult] = {}
+            for pair in chunk:
+                if pair in cached:
+                    results.append(self._cached_result(cached[pair], time.time() - time_share))
+                    continue
+                if pair not in series:
+                    results.append(
+                        AgentResult(
+                            success=False,
+                            data={},
+                            confidence=0.0,
+                            execution_time=time_share,
+                            cost=0,
+                            error_message=fetch_error,
+                        )
+                    )
+                    continue
+                forecast, i = series[pair]
+                results.append(self._build_result(forecast, i, time.time() - time_share))
+                fresh.setdefault(pair, results[-1])
+
+            await self._store_cache(cache_keys, fresh)
+
+            logger.info(
+                f"[{self.name}] Batch forecast: {len(chunk)} pairs "
+                f"({len(served)} from rolling stats, {len(cached)} cached), "
+                f"{fetched_rows} records in {time.time() - start_time:.3f}s"
+            )
+
+        return results
+
+    async def _lookup_cache(
+        self, pairs: List[Tuple[str, str]]
+    ) -> Tuple[Dict[Tuple[str, str], ForecastKey], Dict[Tuple[str, str], Dict[str, Any]]]:
+        """
+        予測結果キャッシュを引く
+
+        Args:
+            pairs: 重複のない (product_sku, store_id) のリスト
+
+        Returns:
+            Tuple: (ペア → キャッシュキー, ヒットしたペア → {"data", "confidence"})
+        """
+        if self.forecast_cache is None or not pairs:
+            return {}, {}
+
+        with span("cache_lookup", pairs=len(pairs)) as current:
+            try:
+                watermark = await self.forecast_cache.get_watermark(self.db_session)
+            except Exception as e:
+                logger.warning(f"[{self.name}] Forecast cache unavailable: {e}")
+                return {}, {}
+
+            today = date.today()
+            keys = {pair: (pair[0], pair[1], watermark, today) for pair in pairs}
+            entries = await self.forecast_cache.get_many(keys.values())
+            cached = {pair: entry for pair, entry in zip(pairs, entries) if entry is not None}
+            if current is not None:
+                current.attributes["hits"] = len(cached)
+        return keys, cached
+
+    async def _store_cache(
+        self,
+        cache_keys: Dict[Tuple[str, str], ForecastKey],
+        results: Dict[Tuple[str, str], AgentResult],
+    ) -> None:
+        """成功した予測結果をキャッシュに登録"""
+        items = {
+            cache_keys[pair]: {"data": result.data, "confidence": result.confidence}
+            for pair, result in results.items()
+            if result.success and pair in cache_keys
+        }
+        if items:
+            await self.forecast_cache.set_many(items)
+
+    def _cached_result(self, entry: Dict[str, Any], start_time: float) -> AgentResult:
+        """
+        キャッシュした予測から AgentResult を生成（再計算していないので課金しない）
+
+        Args:
+            entry: {"data", "confidence"}
+            start_time: 実行開始時刻
+
+        Returns:
+            AgentResult: 予測結果
+        """
+        return AgentResult(
+            success=True,
+            data=copy.deepcopy(entry["data"]),
+            confidence=entry["confidence"],
+            execution_time=time.time() - start_time,
+            cost=0,
+        )
+
+    def _forecast_from_pos_data(
+        self, pos_data: pd.DataFrame, start_time: float
+    ) -> AgentResult:
+        """
+        POSデータから予測結果を生成（1系列）
+
+        Args:
+            pos_data: POSデータ（日付昇順）
+            start_time: 実行開始時刻
+
+        Returns:
+            AgentResult: 予測結果
+        """
+        with span("compute", kernel="moving_average", series=1):
+            sales = pos_data["sales_quantity"].to_numpy(dtype=np.float64)
+            forecast = moving_average_forecast(sales.reshape(1, -1))
+        return self._build_result(forecast, 0, start_time)
+
+    def _forecast_rolling(
+        self, pairs: List[Tuple[str, str]]
+    ) -> Tuple[List[Tuple[str, str]], Optional[MovingAverageForecast]]:
+        """
+        ローリング統計から予測
+
+        DBから読む場合と同じ期間（今日までの HISTORY_DAYS 日）で集計し、期間内に
+        データがある系列だけを対象にする（データが無い系列はDBで確認する）。
+
+        Args:
+            pairs: 重複のない (product_sku, store_id) のリスト
+
+        Returns:
+            Tuple: (予測できたペアのリスト, そのペアと同じ並びの予測結果)
+        """
+        if self.rolling_stats is None:
+            return [], None
+
+        today = date.today()
+        served: List[Tuple[str, str]] = []
+        window_stats: List[RollingWindowStats] = []
+        for product_sku, store_id in pairs:
+            stats = self.rolling_stats.get(product_sku, store_id, as_of=today)
+            if stats is not None and stats.history_days > 0:
+                served.append((product_sku, store_id))
+                window_stats.append(stats)
+
+        if not served:
+            return [], None
+
+        with span("compute", kernel="window_sums", series=len(served)):
+            forecast = forecast_from_window_sums(
+                [stats.window_sum for stats in window_stats],
+                [stats.window_days for stats in window_stats],
+                [stats.history_days for stats in window_stats],
+            )
+        return served, forecast
+
+    def _forecast_matrix(
+        self, pos_data: pd.DataFrame, pairs: List[Tuple[str, str]]
+    ) -> MovingAverageForecast:
+        """
+        複数ペアのPOSデータを (系列 × 日) 行列に変換して一括予測
+
+        Args:
+            pos_data: POSデータ（series, date 順）
+            pairs: 重複のない (product_sku, store_id) のリスト（系列の並び）
+
+        Returns:
+            MovingAverageForecast: pairs と同じ並びの予測結果
+        """
+        with span("compute", kernel="moving_average", series=len(pairs)):
+            matrix = build_sales_matrix(
+                pos_data["sales_quantity"].to_numpy(dtype=np.float64),
+                pos_data["series"].to_numpy(),
+                len(pairs),
+            )
+            return moving_average_forecast(matrix)
+
+    def _build_result(
+        self, forecast: MovingAverageForecast, i: int, start_time: float
+    ) -> AgentResult:
+        """
+        予測カーネルの i 番目の系列から AgentResult を生成
+
+        Args:
+            forecast: 予測カーネルの出力
+            i: 系列番号
+            start_time: 実行開始時刻
+
+        Returns:
+            AgentResult: 予測結果
+        """
+        data_points = int(forecast.counts[i])
+
+        if data_points == 0:
+            return AgentResult(
+                success=False,
+                data={},
+                confidence=0.0,
+                execution_time=time.time() - start_time,
+                cost=0,
+                error_message="No historical data found",
+            )
+
+        predicted_demand = int(forecast.predicted[i])
+        lower_bound = int(forecast.lower[i])
+        upper_bound = int(forecast.upper[i])
+
+        execution_time = time.time() - start_time
+
+        # コスト計算
+        cost = self.calculate_cost({"data_rows": data_points})
+
+        return AgentResult(
+            success=True,
+            data={
+                "predicted_demand": predicted_demand,
+                "confidence_interval": {"lower": lower_bound, "upper": upper_bound},
+                "historical_data_points": data_points,
+                "method": "7-day moving average",
+            },
+            confidence=0.85,  # 簡易版なので85%
+            execution_time=execution_time,
+            cost=cost,
+        )
+
+    async def _fetch_pos_data(
         self, product_sku: str, store_id: str, days: int = 30
     ) -> pd.DataFrame:
         """
         POSデータ取得
 
+        日次集計テーブル（pos_sales_daily）から取得するため、pos_sales の
+        行数が増えても読み込む行数は日数分で一定。日付範囲は確定した日付で
+        渡すので、プランナが月次パーティションを1〜2個に絞り込める。
+
         Args:
             product_sku: 商品SKU
             store_id: 店舗ID
@@ -133,26 +495,111 @@ class DemandForecastAgent(Agent):
         Returns:
             pd.DataFrame: POSデータ
         """
-        query = text(
-            """
-            SELECT
-                date,
-                sales_quantity,
-                price,
-                day_of_week,
-                is_holiday
-            FROM pos_sales
-            WHERE product_sku = :product_sku
-              AND store_id = :store_id
-              AND date >= CURRENT_DATE - INTERVAL '30 days'
-            ORDER BY date
+        start_date, end_date = _date_range(days)
+        with span("db_fetch", query="forecast", pairs=1) as current:
+            columns = await fetch_arrays(
+                self.db_session,
+                FORECAST_QUERY,
+                {
+                    "product_sku": product_sku,
+                    "store_id": store_id,
+                    "start_date": start_date,
+                    "end_date": end_date,
+                },
+                FORECAST_COLUMNS,
+            )
+            if current is not None:
+                current.attributes["rows"] = len(columns["sales_quantity"])
+
+        df = pd.DataFrame(columns, copy=False)
+        logger.debug(f"Fetched {len(df)} records from POS data")
+        return df
+
+    async def _fetch_pos_data_batch(
+        self, pairs: List[Tuple[str, str]], days: int = 30
+    ) -> pd.DataFrame:
         """
-        )
+        複数ペアのPOSデータを1クエリで取得
 
-        result = self.db_session.execute(
-            query, {"product_sku": product_sku, "store_id": store_id}
-        )
+        Args:
+            pairs: (product_sku, store_id) のリスト
+            days: 取得日数
 
-        df = pd.DataFrame(result.fetchall(), columns=result.keys())
-        logger.debug(f"Fetched {len(df)} records from POS data")
+        Returns:
+            pd.DataFrame: POSデータ（series, date 順、series は pairs 上の位置）
+        """
+        start_date, end_date = _date_range(days)
+        with span("db_fetch", query="forecast_batch", pairs=len(pairs)) as current:
+            columns = await fetch_arrays(
+                self.db_session,
+                FORECAST_BATCH_QUERY,
+                {
+                    "product_skus": [sku for sku, _ in pairs],
+                    "store_ids": [store for _, store in pairs],
+                    "start_date": start_date,
+                    "end_date": end_date,
+                },
+                FORECAST_BATCH_COLUMNS,
+            )
+            if current is not None:
+                current.attributes["rows"] = len(columns["sales_quantity"])
+
+        df = pd.DataFrame(columns, copy=False)
+        logger.debug(f"Fetched {len(df)} records for {len(pairs)} pairs from POS data")
         return df
+
+    async def _fetch_sales_cached(
+        self, pairs: List[Tuple[str, str]], days: int = 30
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        POS履歴キャッシュと当日分のDBクエリから販売数量を取得
+
+        不足している (店舗, 月) のファイルを作成したうえで、締まった日は
+        メモリマップしたファイルから、当日分は FORECAST_BATCH_QUERY で読む。
+
+        Args:
+            pairs: 重複のない (product_sku, store_id) のリスト
+            days: 取得日数
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (販売数量, pairs 上の系列番号)（系列内は日付昇順）
+        """
+        cache = self.history_cache
+        start_date, end_date = _date_range(days)
+
+        with span("db_fetch", query="pos_history_fill") as current:
+            written = await fill_pos_history_cache(
+                cache, self.db_session, [store for _, store in pairs], start_date, end_date
+            )
+            if current is not None:
+                current.attributes["store_months"] = written
+
+        open_start = max(start_date, cache.closed_through() + timedelta(days=1))
+        with span("db_fetch", query="forecast_open_day", pairs=len(pairs)) as current:
+            open_day = await fetch_arrays(
+                self.db_session,
+                FORECAST_BATCH_QUERY,
+                {
+                    "product_skus": [sku for sku, _ in pairs],
+                    "store_ids": [store for _, store in pairs],
+                    "start_date": open_start,
+                    "end_date": end_date,
+                },
+                FORECAST_BATCH_COLUMNS,
+            )
+            if current is not None:
+                current.attributes["rows"] = len(open_day["series"])
+
+        with span("cache_read", pairs=len(pairs)):
+            parts = [cache.read(sku, store, start_date, end_date) for sku, store in pairs]
+        codes = [np.full(len(part), i, dtype=np.int64) for i, part in enumerate(parts)]
+
+        # 当日分は各系列の末尾に来るよう後ろに連結（build_sales_matrix は安定ソート）
+        parts.append(open_day["sales_quantity"].astype(np.int64))
+        codes.append(open_day["series"])
+
+        logger.debug(
+            f"Read {sum(len(p) for p in parts)} records for {len(pairs)} pairs "
+            f"({len(open_day['series'])} from the open day)"
+        )
+        return np.concatenate(parts), np.concatenate(codes)
@@ -0,0 +1,242 @@
+"""
+需要予測結果キャッシュ
+
+予測結果を (product_sku, store_id, データウォーターマーク, 基準日) をキーに保持する。
+ウォーターマークは日次集計の版（pos_sales_daily_refresh_state.last_change_id）で、
+日次集計が更新されるとキーが変わるため、古い予測が返ることはない。
+
+バックエンドはプロセス内のLRU（既定）と、複数プロセスで共有する Redis（任意）。
+"""
+import json
+import time
+import threading
+import logging
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from .base import execute_query
+
+logger = logging.getLogger(__name__)
+
+ForecastKey = Tuple[str, str, int, date]  # (product_sku, store_id, ウォーターマーク, 基準日)
+
+WATERMARK_QUERY = text(
+    """
+    SELECT last_change_id
+    FROM pos_sales_daily_refresh_state
+"""
+)
+
+
+class LRUForecastBackend:
+    """プロセス内LRUバックエンド（スレッドセーフ）"""
+
+    def __init__(self, max_entries: int = 10000):
+        """
+        Args:
+            max_entries: 保持する予測の上限件数
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        values = []
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                values.append(value)
+        return values
+
+    async def set_many(self, items: Dict[str, Dict[str, Any]]) -> None:
+        with self._lock:
+            for key, value in items.items():
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisForecastBackend:
+    """Redisバックエンド（エントリはTTLで失効、上限は Redis の maxmemory-policy に任せる）"""
+
+    KEY_PREFIX = "a2a:forecast:"
+
+    def __init__(self, redis_url: str, ttl_seconds: int = 86400, client=None):
+        """
+        Args:
+            redis_url: Redis接続URL
+            ttl_seconds: エントリの有効期間（秒）
+            client: redis.asyncio クライアント（Noneの場合は redis_url から作成）
+        """
+        if client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError as e:
+                raise ImportError("Redis forecast cache requires the redis package") from e
+            client = redis.from_url(redis_url)
+
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        if not keys:
+            return []
+        raw = await self.client.mget([self.KEY_PREFIX + key for key in keys])
+        return [json.loads(value) if value is not None else None for value in raw]
+
+    async def set_many(self, items: Dict[str, Dict[str, Any]]) -> None:
+        if not items:
+            return
+        pipeline = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipeline.set(self.KEY_PREFIX + key, json.dumps(value), ex=self.ttl_seconds)
+        await pipeline.execute()
+
+    async def clear(self) -> None:
+        async for key in self.client.scan_iter(match=self.KEY_PREFIX + "*"):
+            await self.client.delete(key)
+
+
+class ForecastCache:
+    """需要予測結果キャッシュ"""
+
+    def __init__(
+        self,
+        backend=None,
+        watermark_ttl_seconds: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            backend: LRUForecastBackend / RedisForecastBackend（Noneの場合はLRU）
+            watermark_ttl_seconds: 読み込んだウォーターマークを再利用する秒数
+            clock: 経過時間の計測に使う時計（テスト用に差し替え可能）
+        """
+        self.backend = backend if backend is not None else LRUForecastBackend()
+        self.watermark_ttl_seconds = watermark_ttl_seconds
+        self.clock = clock
+        self._watermark: Optional[int] = None
+        self._watermark_loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(key: ForecastKey) -> str:
+        product_sku, store_id, watermark, as_of = key
+        return f"{product_sku}|{store_id}|{watermark}|{as_of.isoformat()}"
+
+    async def get_watermark(self, db_session) -> int:
+        """
+        データウォーターマークを取得
+
+        短いTTLの間は読み込んだ値を再利用するため、キャッシュヒット時はDBを読まない。
+
+        Args:
+            db_session: データベースセッション（Session / AsyncSession）
+
+        Returns:
+            int: 日次集計の版
+        """
+        with self._lock:
+            if (
+                self._watermark is not None
+                and self.clock() - self._watermark_loaded_at < self.watermark_ttl_seconds
+            ):
+                return self._watermark
+
+        result = await execute_query(db_session, WATERMARK_QUERY)
+        watermark = int(result.scalar() or 0)
+
+        with self._lock:
+            self._watermark = watermark
+            self._watermark_loaded_at = self.clock()
+        return watermark
+
+    def invalidate_watermark(self) -> None:
+        """次回の取得でウォーターマークを読み直す（日次集計の更新直後など）"""
+        with self._lock:
+            self._watermark = None
+
+    async def get_many(self, keys: Iterable[ForecastKey]) -> List[Optional[Dict[str, Any]]]:
+        """
+        予測結果をまとめて取得
+
+        Args:
+            keys: キャッシュキー
+
+        Returns:
+            List: keys と同じ並びの {"data", "confidence"}（未登録は None）
+        """
+        try:
+            return await self.backend.get_many([self.make_key(key) for key in keys])
+        except Exception as e:
+            # キャッシュ障害時は予測を計算し直す
+            logger.warning(f"Forecast cache read failed: {e}")
+            return [None for _ in keys]
+
+    async def set_many(self, items: Dict[ForecastKey, Dict[str, Any]]) -> None:
+        """
+        予測結果をまとめて登録
+
+        Args:
+            items: キャッシュキー → {"data", "confidence"}
+        """
+        try:
+            await self.backend.set_many(
+                {self.make_key(key): value for key, value in items.items()}
+            )
+        except Exception as e:
+            logger.warning(f"Forecast cache write failed: {e}")
+
+    async def clear(self) -> None:
+        """全エントリを破棄"""
+        await self.backend.clear()
+        self.invalidate_watermark()
+
+
+# グローバルインスタンス（シングルトン）
+_forecast_cache_instance: Optional[ForecastCache] = None
+
+
+def get_forecast_cache() -> ForecastCache:
+    """
+    ForecastCacheのシングルトンインスタンスを取得
+
+    REDIS_URL が設定されていれば Redis、なければプロセス内LRUを使う。
+
+    Returns:
+        ForecastCache
+    """
+    global _forecast_cache_instance
+
+    if _forecast_cache_instance is None:
+        from config import settings
+
+        backend = None
+        if settings.REDIS_URL:
+            try:
+                backend = RedisForecastBackend(
+                    settings.REDIS_URL, ttl_seconds=settings.FORECAST_CACHE_TTL_SECONDS
+                )
+            except ImportError as e:
+                logger.warning(f"{e}; falling back to in-process forecast cache")
+        if backend is None:
+            backend = LRUForecastBackend(max_entries=settings.FORECAST_CACHE_MAX_ENTRIES)
+
+        _forecast_cache_instance = ForecastCache(
+            backend, watermark_ttl_seconds=settings.FORECAST_WATERMARK_TTL_SECONDS
+        )
+
+    return _forecast_cache_instance
@@ -0,0 +1,130 @@
+"""
+需要予測カーネル
+
+(系列 × 日) の販売数量行列に対して移動平均予測をまとめて計算する。
+DemandForecastAgent の単一予測・バッチ予測はどちらもこのカーネルを使用する。
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+# 予測に使う過去日数（今日を含めて HISTORY_DAYS + 1 日分を読む）
+HISTORY_DAYS = 30
+
+# 移動平均の窓幅（期間内の直近のデータ日数。販売の無い日は日次集計に行が無いので数えない）
+DEFAULT_WINDOW = 7
+
+# 信頼区間の幅（±9%）
+DEFAULT_INTERVAL = 0.09
+
+
+@dataclass
+class MovingAverageForecast:
+    """移動平均予測結果（系列ごとの配列）"""
+
+    predicted: np.ndarray  # 予測販売数量（int64）
+    lower: np.ndarray  # 信頼区間下限（int64）
+    upper: np.ndarray  # 信頼区間上限（int64）
+    counts: np.ndarray  # 系列ごとのデータ行数（int64）
+
+
+def build_sales_matrix(
+    quantities: np.ndarray, series_codes: np.ndarray, n_series: int
+) -> np.ndarray:
+    """
+    縦持ちの販売数量を (系列 × 日) の密行列に変換
+
+    各系列の値は右詰め（最新日が最終列）で配置し、欠けている先頭部分はNaNで埋める。
+
+    Args:
+        quantities: 販売数量（系列内では日付昇順）
+        series_codes: 各行の系列番号（0 ~ n_series-1）
+        n_series: 系列数
+
+    Returns:
+        np.ndarray: float64の (n_series × 最大行数) 行列
+    """
+    quantities = np.asarray(quantities, dtype=np.float64)
+    series_codes = np.asarray(series_codes, dtype=np.int64)
+
+    counts = np.bincount(series_codes, minlength=n_series)
+    width = int(counts.max()) if n_series > 0 and len(series_codes) > 0 else 0
+    matrix = np.full((n_series, width), np.nan)
+
+    if width == 0:
+        return matrix
+
+    # 系列内の位置（cumcount）
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    order = np.argsort(series_codes, kind="stable")
+    sorted_codes = series_codes[order]
+    positions = np.arange(len(sorted_codes)) - starts[sorted_codes]
+
+    columns = width - counts[sorted_codes] + positions
+    matrix[sorted_codes, columns] = quantities[order]
+    return matrix
+
+
+def moving_average_forecast(
+    sales_matrix: np.ndarray,
+    window: int = DEFAULT_WINDOW,
+    interval: float = DEFAULT_INTERVAL,
+) -> MovingAverageForecast:
+    """
+    全系列の移動平均予測を一括計算
+
+    Args:
+        sales_matrix: (系列 × 日) の販売数量行列（右詰め、欠損はNaN）
+        window: 移動平均の窓幅（各系列の末尾 window 行）
+        interval: 信頼区間の幅（比率）
+
+    Returns:
+        MovingAverageForecast: 系列ごとの予測値・信頼区間・データ行数
+    """
+    sales_matrix = np.atleast_2d(np.asarray(sales_matrix, dtype=np.float64))
+    valid = ~np.isnan(sales_matrix)
+    counts = valid.sum(axis=1)
+
+    recent = sales_matrix[:, -window:] if window > 0 else sales_matrix[:, :0]
+    recent_counts = (~np.isnan(recent)).sum(axis=1)
+    recent_sums = np.nansum(recent, axis=1)
+
+    return forecast_from_window_sums(recent_sums, recent_counts, counts, interval)
+
+
+def forecast_from_window_sums(
+    window_sums,
+    window_counts,
+    counts,
+    interval: float = DEFAULT_INTERVAL,
+) -> MovingAverageForecast:
+    """
+    窓内の合計・データ数から予測値と信頼区間を計算
+
+    行列を持たない呼び出し元（ローリング集計など）も同じ丸め規則で予測できるようにする。
+
+    Args:
+        window_sums: 系列ごとの窓内販売数量合計
+        window_counts: 系列ごとの窓内データ数
+        counts: 系列ごとの全データ数
+        interval: 信頼区間の幅（比率）
+
+    Returns:
+        MovingAverageForecast: 系列ごとの予測値・信頼区間・データ行数
+    """
+    window_sums = np.atleast_1d(np.asarray(window_sums, dtype=np.float64))
+    window_counts = np.atleast_1d(np.asarray(window_counts, dtype=np.int64))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(window_counts > 0, window_sums / window_counts, 0.0)
+
+    predicted = np.trunc(means)
+    lower = np.trunc(predicted * (1.0 - interval))
+    upper = np.trunc(predicted * (1.0 + interval))
+
+    return MovingAverageForecast(
+        predicted=predicted.astype(np.int64),
+        lower=lower.astype(np.int64),
+        upper=upper.astype(np.int64),
+        counts=np.atleast_1d(np.asarray(counts, dtype=np.int64)),
+    )
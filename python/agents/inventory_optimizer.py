@@ -5,22 +5,40 @@
 """
 import time
 import logging
-from typing import Dict, Any
-from scipy.stats import norm
+from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy import text
 
 from .base import Agent, AgentResult, PaymentScheme, PaymentConfig
+from .newsvendor_kernel import NewsvendorSolution, solve_newsvendor
+from .inventory_snapshot import InventorySnapshot, load_inventory_snapshot
+from .supplier_cache import SupplierCache, get_supplier_cache
+from .tracing import span
 
 logger = logging.getLogger(__name__)
 
+# 販売単価（円）
+SELLING_PRICE = 198.0
+
+# 廃棄コスト（円）
+DISPOSAL_COST = 120.0
+
 
 class InventoryOptimizerAgent(Agent):
     """在庫最適化エージェント"""
 
-    def __init__(self, db_session):
+    def __init__(
+        self,
+        db_session,
+        supplier_cache: Optional[SupplierCache] = None,
+        inventory_snapshot: Optional[InventorySnapshot] = None,
+    ):
         """
         Args:
             db_session: データベースセッション
+            supplier_cache: サプライヤーキャッシュ（Noneの場合は共有インスタンス）
+            inventory_snapshot: 事前に読み込んだ在庫スナップショット
+                （含まれない・期限切れの商品は実行時にまとめて読み込む。
+                Noneの場合は INVENTORY_SNAPSHOT_TTL_SECONDS で読み直す空のスナップショット）
         """
         super().__init__(
             name="inventory_optimizer",
@@ -30,6 +48,14 @@ class InventoryOptimizerAgent(Agent):
             ),
         )
         self.db_session = db_session
+        self.supplier_cache = supplier_cache or get_supplier_cache()
+        if inventory_snapshot is None:
+            from config import settings
+
+            inventory_snapshot = InventorySnapshot(
+                ttl_seconds=settings.INVENTORY_SNAPSHOT_TTL_SECONDS
+            )
+        self.inventory_snapshot = inventory_snapshot
 
     async def execute(self, input_data: Dict[str, Any]) -> AgentResult:
         """
@@ -37,7 +63,7 @@ class InventoryOptimizerAgent(Agent):
 
         Args:
             input_data:
-                - demand_forecast: 需要予測結果
+                - demand_forecast: 需要予測結果（AgentResult をコピーせずに渡す）
                 - product_sku: 商品SKU
                 - store_id: 店舗ID
 
@@ -49,74 +75,30 @@ class InventoryOptimizerAgent(Agent):
         try:
             demand_forecast = input_data["demand_forecast"]
             product_sku = input_data.get("product_sku", "tomato-medium-domestic")
+            store_id = input_data.get("store_id", "S001")
 
             logger.info(f"[{self.name}] Starting inventory optimization")
 
             # 需要予測値
-            demand_mean = float(demand_forecast["data"]["predicted_demand"])
-            demand_lower = float(demand_forecast["data"]["confidence_interval"]["lower"])
-            demand_upper = float(demand_forecast["data"]["confidence_interval"]["upper"])
-
-            # 標準偏差を推定（95%信頼区間から）
-            demand_std = float((demand_upper - demand_lower) / (2 * 1.96))
+            demand_mean, demand_std = self._parse_demand(demand_forecast)
 
             # サプライヤー情報取得
-            supplier = self._get_best_supplier()
+            supplier = await self._get_best_supplier()
 
-            # パラメータ
-            selling_price = 198.0  # 円
-            unit_cost = float(supplier["unit_price"])
-            disposal_cost = 120.0  # 円（廃棄コスト）
-            shortage_cost = selling_price - unit_cost  # 機会損失
+            # 現在在庫
+            await self._ensure_inventory([(product_sku, store_id)])
+            current_inventory = self.inventory_snapshot.get(product_sku, store_id)
 
             # ニュースベンダーモデル
-            # Critical Ratio = (p - c) / (p - c + h)
-            critical_ratio = float(shortage_cost / (shortage_cost + disposal_cost))
-
-            # 最適発注量（正規分布を仮定）
-            optimal_order = norm.ppf(critical_ratio, loc=demand_mean, scale=demand_std)
-
-            # 現在在庫（仮）
-            current_inventory = 80  # TODO: 実データ取得
+            solution = self._solve(supplier, [demand_mean], [demand_std], [current_inventory])
+            result = self._build_result(solution, 0, supplier, current_inventory, start_time)
 
-            # 発注量
-            order_quantity = max(0, int(optimal_order - current_inventory))
-
-            # 安全在庫
-            safety_stock = int(demand_mean * 0.15)
-
-            # 期待廃棄量・欠品量
-            expected_waste = max(0, int(optimal_order - demand_mean))
-            expected_shortage = max(0, int(demand_mean - optimal_order))
-
-            execution_time = time.time() - start_time
-            cost = self.calculate_cost({})
-
-            logger.info(
-                f"[{self.name}] Order quantity: {order_quantity} (supplier: {supplier['name']})"
-            )
-
-            return AgentResult(
-                success=True,
-                data={
-                    "order_quantity": order_quantity,
-                    "supplier": {
-                        "id": supplier["id"],
-                        "name": supplier["name"],
-                        "unit_price": float(unit_cost),
-                        "lead_time_hours": supplier["lead_time_hours"],
-                    },
-                    "current_inventory": current_inventory,
-                    "optimal_order_level": int(optimal_order),
-                    "safety_stock": safety_stock,
-                    "expected_waste": expected_waste,
-                    "expected_shortage": expected_shortage,
-                    "critical_ratio": round(critical_ratio, 3),
-                },
-                confidence=0.89,
-                execution_time=execution_time,
-                cost=cost,
-            )
+            if result.success:
+                logger.info(
+                    f"[{self.name}] Order quantity: {result.data['order_quantity']} "
+                    f"(supplier: {supplier['name']})"
+                )
+            return result
 
         except KeyError as e:
             logger.error(f"[{self.name}] Missing required input: {e}")
@@ -139,15 +121,262 @@ class InventoryOptimizerAgent(Agent):
                 error_message=str(e),
             )
 
-    def _get_best_supplier(self) -> Dict[str, Any]:
+    async def execute_batch(self, items: List[Dict[str, Any]]) -> List[AgentResult]:
+        """
+        在庫最適化の一括実行
+
+        サプライヤーを1回だけ取得し、全商品のニュースベンダー解を1回のカーネル呼び出しで求める。
+
+        Args:
+            items: execute と同じ形式の入力データのリスト
+
+        Returns:
+            List[AgentResult]: items と同じ順序の最適化結果
+        """
+        start_time = time.time()
+
+        if not items:
+            return []
+
+        try:
+            supplier = await self._get_best_supplier()
+        except Exception as e:
+            logger.error(f"[{self.name}] Batch execution failed: {e}")
+            return [
+                AgentResult(
+                    success=False,
+                    data={},
+                    confidence=0.0,
+                    execution_time=time.time() - start_time,
+                    cost=0,
+                    error_message=str(e),
+                )
+                for _ in items
+            ]
+
+        results: List[Optional[AgentResult]] = [None] * len(items)
+        indices: List[int] = []
+        keys: List[Tuple[str, str]] = []
+        demand_means: List[float] = []
+        demand_stds: List[float] = []
+
+        for i, item in enumerate(items):
+            try:
+                demand_mean, demand_std = self._parse_demand(item["demand_forecast"])
+            except (KeyError, TypeError) as e:
+                results[i] = AgentResult(
+                    success=False,
+                    data={},
+                    confidence=0.0,
+                    execution_time=0.0,
+                    cost=0,
+                    error_message=f"Missing required input: {e}",
+                )
+                continue
+            indices.append(i)
+            keys.append(
+                (
+                    item.get("product_sku", "tomato-medium-domestic"),
+                    item.get("store_id", "S001"),
+                )
+            )
+            demand_means.append(demand_mean)
+            demand_stds.append(demand_std)
+
+        # 現在在庫（未ロード分を1クエリで読み込み、配列で参照）
+        try:
+            await self._ensure_inventory(keys)
+        except Exception as e:
+            logger.error(f"[{self.name}] Inventory snapshot load failed: {e}")
+            return [
+                result
+                or AgentResult(
+                    success=False,
+                    data={},
+                    confidence=0.0,
+                    execution_time=time.time() - start_time,
+                    cost=0,
+                    error_message=str(e),
+                )
+                for result in results
+            ]
+        current_inventory = self.inventory_snapshot.lookup(keys)
+
+        solution = self._solve(supplier, demand_means, demand_stds, current_inventory)
+
+        # 実行時間は商品数で按分する
+        time_share = (time.time() - start_time) / len(items)
+        for k, i in enumerate(indices):
+            results[i] = self._build_result(
+                solution, k, supplier, int(current_inventory[k]), time.time() - time_share
+            )
+
+        logger.info(
+            f"[{self.name}] Batch optimization: {len(items)} items "
+            f"in {time.time() - start_time:.3f}s (supplier: {supplier['name']})"
+        )
+        return results
+
+    async def _ensure_inventory(self, keys: List[Tuple[str, str]]) -> None:
+        """
+        スナップショットにない・期限切れの商品の在庫をまとめて読み込む
+
+        inventory_snapshots に行がない商品は在庫0として扱う（他の商品と同じく
+        期限が切れたら読み直すので、後から行が追加されれば反映される）。
+
+        Args:
+            keys: (product_sku, store_id) のリスト
+        """
+        missing = self.inventory_snapshot.missing(keys)
+        if not missing:
+            return
+
+        with span("db_fetch", query="inventory_snapshot", items=len(missing)):
+            loaded = await load_inventory_snapshot(self.db_session, missing)
+        absent = loaded.missing(missing)
+        if absent:
+            logger.warning(
+                f"[{self.name}] No inventory snapshot for {len(absent)} items, assuming 0"
+            )
+            loaded.update(InventorySnapshot(absent, [0] * len(absent)))
+        self.inventory_snapshot.update(loaded)
+
+    def _parse_demand(self, demand_forecast) -> Tuple[float, float]:
+        """
+        需要予測結果から需要の平均と標準偏差を取り出す
+
+        Args:
+            demand_forecast: 需要予測結果（AgentResult、または "data" を持つ辞書）
+
+        Returns:
+            Tuple[float, float]: (需要平均, 標準偏差)
+        """
+        if isinstance(demand_forecast, AgentResult):
+            data = demand_forecast.data
+        else:
+            data = demand_forecast["data"]
+        demand_mean = float(data["predicted_demand"])
+        demand_lower = float(data["confidence_interval"]["lower"])
+        demand_upper = float(data["confidence_interval"]["upper"])
+
+        # 標準偏差を推定（95%信頼区間から）
+        demand_std = (demand_upper - demand_lower) / (2 * 1.96)
+        return demand_mean, demand_std
+
+    def _solve(
+        self,
+        supplier: Dict[str, Any],
+        demand_means: List[float],
+        demand_stds: List[float],
+        current_inventory,
+    ) -> NewsvendorSolution:
+        """
+        ニュースベンダーカーネルの呼び出し
+
+        Args:
+            supplier: サプライヤー情報
+            demand_means: 需要平均
+            demand_stds: 需要の標準偏差
+            current_inventory: 現在在庫
+
+        Returns:
+            NewsvendorSolution: 商品ごとの解
+        """
+        with span("compute", kernel="newsvendor", items=len(demand_means)):
+            return solve_newsvendor(
+                demand_mean=demand_means,
+                demand_std=demand_stds,
+                unit_cost=float(supplier["unit_price"]),
+                selling_price=SELLING_PRICE,
+                disposal_cost=DISPOSAL_COST,
+                current_inventory=current_inventory,
+            )
+
+    def _build_result(
+        self,
+        solution: NewsvendorSolution,
+        i: int,
+        supplier: Dict[str, Any],
+        current_inventory: int,
+        start_time: float,
+    ) -> AgentResult:
+        """
+        ニュースベンダー解の i 番目の要素から AgentResult を生成
+
+        Args:
+            solution: ニュースベンダーカーネルの出力
+            i: 要素番号
+            supplier: サプライヤー情報
+            current_inventory: 現在在庫
+            start_time: 実行開始時刻
+
+        Returns:
+            AgentResult: 最適化結果
+        """
+        if not solution.valid[i]:
+            return AgentResult(
+                success=False,
+                data={},
+                confidence=0.0,
+                execution_time=time.time() - start_time,
+                cost=0,
+                error_message="Invalid newsvendor parameters",
+            )
+
+        return AgentResult(
+            success=True,
+            data={
+                "order_quantity": int(solution.order_quantity[i]),
+                "supplier": {
+                    "id": supplier["id"],
+                    "name": supplier["name"],
+                    "unit_price": float(supplier["unit_price"]),
+                    "lead_time_hours": supplier["lead_time_hours"],
+                },
+                "current_inventory": current_inventory,
+                "optimal_order_level": int(solution.optimal_order_level[i]),
+                "safety_stock": int(solution.safety_stock[i]),
+                "expected_waste": int(solution.expected_waste[i]),
+                "expected_shortage": int(solution.expected_shortage[i]),
+                "critical_ratio": round(float(solution.critical_ratio[i]), 3),
+            },
+            confidence=0.89,
+            execution_time=time.time() - start_time,
+            cost=self.calculate_cost({}),
+        )
+
+    async def _get_best_supplier(self) -> Dict[str, Any]:
         """
         最適サプライヤー取得
 
         品質スコアが最も高いサプライヤーを選択。
+        ランキングはエージェント間で共有するキャッシュから取得する。
 
         Returns:
             Dict: サプライヤー情報
         """
+        with span("supplier_lookup"):
+            ranking = await self.supplier_cache.get_ranking(self._load_suppliers)
+
+        if not ranking:
+            # デフォルト値
+            return {
+                "id": "SUP001",
+                "name": "静岡農協",
+                "unit_price": 120.0,
+                "lead_time_hours": 8,
+                "quality_score": 0.95,
+            }
+
+        return dict(ranking[0])
+
+    async def _load_suppliers(self) -> List[Dict[str, Any]]:
+        """
+        サプライヤーマスタ取得
+
+        Returns:
+            List[Dict]: 品質スコア降順のサプライヤー一覧
+        """
         query = text(
             """
             SELECT
@@ -158,21 +387,9 @@ class InventoryOptimizerAgent(Agent):
                 quality_score
             FROM suppliers
             ORDER BY quality_score DESC
-            LIMIT 1
         """
         )
 
-        result = self.db_session.execute(query)
-        row = result.fetchone()
-
-        if row is None:
-            # デフォルト値
-            return {
-                "id": "SUP001",
-                "name": "静岡農協",
-                "unit_price": 120.0,
-                "lead_time_hours": 8,
-                "quality_score": 0.95,
-            }
-
-        return dict(row._mapping)
+        with span("db_fetch", query="suppliers"):
+            result = await self._execute_query(query)
+            return [dict(row._mapping) for row in result.fetchall()]
@@ -0,0 +1,194 @@
+"""
+在庫スナップショット
+
+inventory_snapshots テーブルから多数の (product_sku, store_id) の手持ち在庫を
+1クエリでまとめて読み込み、配列ベースの構造としてメモリ上に保持する。
+在庫は販売・入荷で変わるため、読み込んでから ttl_seconds 経ったキーは
+未ロードと同じ扱いにして読み直す。
+"""
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from .base import execute_query
+
+logger = logging.getLogger(__name__)
+
+InventoryKey = Tuple[str, str]  # (product_sku, store_id)
+
+
+class InventorySnapshot:
+    """手持ち在庫のスナップショット（キー索引 + int64配列）"""
+
+    def __init__(
+        self,
+        keys: Optional[List[InventoryKey]] = None,
+        quantities: Optional[Iterable[int]] = None,
+        ttl_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            keys: (product_sku, store_id) のリスト
+            quantities: keys と同じ並びの手持ち在庫
+            ttl_seconds: 読み込んでから読み直すまでの秒数（Noneの場合は invalidate するまで保持）
+            clock: 時刻関数（テスト用に差し替え可能）
+        """
+        keys = keys or []
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._index: Dict[InventoryKey, int] = {key: i for i, key in enumerate(keys)}
+        self.quantities = np.fromiter(quantities or [], dtype=np.int64, count=len(keys))
+        self.loaded_at = np.full(len(keys), clock(), dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: InventoryKey) -> bool:
+        return key in self._index
+
+    def get(self, product_sku: str, store_id: str, default: int = 0) -> int:
+        """
+        1件の手持ち在庫を取得
+
+        Args:
+            product_sku: 商品SKU
+            store_id: 店舗ID
+            default: スナップショットにない場合の値
+
+        Returns:
+            int: 手持ち在庫
+        """
+        i = self._index.get((product_sku, store_id))
+        return default if i is None else int(self.quantities[i])
+
+    def lookup(self, keys: Iterable[InventoryKey], default: int = 0) -> np.ndarray:
+        """
+        複数の手持ち在庫をまとめて取得
+
+        Args:
+            keys: (product_sku, store_id) のリスト
+            default: スナップショットにない場合の値
+
+        Returns:
+            np.ndarray: keys と同じ並びの手持ち在庫（int64）
+        """
+        positions = np.fromiter(
+            (self._index.get(key, -1) for key in keys), dtype=np.int64
+        )
+        found = positions >= 0
+        values = np.full(len(positions), default, dtype=np.int64)
+        values[found] = self.quantities[positions[found]]
+        return values
+
+    def missing(self, keys: Iterable[InventoryKey]) -> List[InventoryKey]:
+        """
+        読み込みが必要なキーを取得
+
+        Args:
+            keys: (product_sku, store_id) のリスト
+
+        Returns:
+            List[InventoryKey]: 重複を除いた、未ロード・期限切れ・破棄済みのキー
+        """
+        expires_before = (
+            -np.inf if self.ttl_seconds is None else self._clock() - self.ttl_seconds
+        )
+        missing = []
+        for key in dict.fromkeys(keys):
+            i = self._index.get(key)
+            if i is None or self.loaded_at[i] <= expires_before:
+                missing.append(key)
+        return missing
+
+    def update(self, other: "InventorySnapshot") -> None:
+        """
+        別のスナップショットの内容を取り込む（同じキーは上書きし、読み込み時刻を今にする）
+
+        Args:
+            other: 取り込むスナップショット
+        """
+        now = self._clock()
+        appended: List[int] = []
+        for key, j in other._index.items():
+            i = self._index.get(key)
+            if i is None:
+                self._index[key] = len(self.quantities) + len(appended)
+                appended.append(int(other.quantities[j]))
+            else:
+                self.quantities[i] = other.quantities[j]
+                self.loaded_at[i] = now
+
+        if appended:
+            self.quantities = np.concatenate(
+                [self.quantities, np.asarray(appended, dtype=np.int64)]
+            )
+            self.loaded_at = np.concatenate([self.loaded_at, np.full(len(appended), now)])
+
+    def invalidate(self, keys: Optional[Iterable[InventoryKey]] = None) -> None:
+        """
+        キーを破棄し、次に参照されたときに読み直す（入荷・棚卸しの反映時に呼び出す）
+
+        Args:
+            keys: 破棄する (product_sku, store_id) のリスト（Noneの場合は全件）
+        """
+        if keys is None:
+            self.loaded_at[:] = -np.inf
+            return
+        for key in keys:
+            i = self._index.get(key)
+            if i is not None:
+                self.loaded_at[i] = -np.inf
+
+
+async def load_inventory_snapshot(
+    db_session, keys: Optional[List[InventoryKey]] = None
+) -> InventorySnapshot:
+    """
+    手持ち在庫を1クエリで読み込む
+
+    Args:
+        db_session: データベースセッション（Session / AsyncSession）
+        keys: 読み込む (product_sku, store_id) のリスト（Noneの場合は全件）
+
+    Returns:
+        InventorySnapshot: 読み込んだスナップショット
+    """
+    if keys is None:
+        query = text(
+            """
+            SELECT product_sku, store_id, on_hand_quantity
+            FROM inventory_snapshots
+        """
+        )
+        params = {}
+    else:
+        if not keys:
+            return InventorySnapshot()
+        query = text(
+            """
+            SELECT s.product_sku, s.store_id, s.on_hand_quantity
+            FROM inventory_snapshots s
+            JOIN unnest(CAST(:product_skus AS VARCHAR[]), CAST(:store_ids AS VARCHAR[]))
+                AS k(product_sku, store_id)
+              ON s.product_sku = k.product_sku
+             AND s.store_id = k.store_id
+        """
+        )
+        params = {
+            "product_skus": [sku for sku, _ in keys],
+            "store_ids": [store for _, store in keys],
+        }
+
+    result = await execute_query(db_session, query, params)
+    rows = result.fetchall()
+
+    snapshot = InventorySnapshot(
+        keys=[(row[0], row[1]) for row in rows],
+        quantities=(row[2] for row in rows),
+    )
+    logger.debug(f"Loaded inventory snapshot: {len(snapshot)} items")
+    return snapshot
@@ -0,0 +1,97 @@
+"""
+ニュースベンダーカーネル
+
+正規分布需要を仮定したニュースベンダーモデルを、商品ごとの配列に対してまとめて解く。
+InventoryOptimizerAgent の単一最適化・バッチ最適化はどちらもこのカーネルを使用する。
+"""
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.special import ndtri
+
+# 安全在庫の係数（需要平均に対する比率）
+SAFETY_STOCK_RATIO = 0.15
+
+
+@dataclass
+class NewsvendorSolution:
+    """ニュースベンダー解（商品ごとの配列）"""
+
+    order_quantity: np.ndarray  # 発注量（int64）
+    optimal_order_level: np.ndarray  # 最適在庫水準（int64）
+    safety_stock: np.ndarray  # 安全在庫（int64）
+    expected_waste: np.ndarray  # 期待廃棄量（int64）
+    expected_shortage: np.ndarray  # 期待欠品量（int64）
+    critical_ratio: np.ndarray  # クリティカルレシオ（float64）
+    valid: np.ndarray  # 解が有限値かどうか（bool、Falseの要素の数量は0）
+
+
+def solve_newsvendor(
+    demand_mean,
+    demand_std,
+    unit_cost,
+    selling_price,
+    disposal_cost,
+    current_inventory,
+) -> NewsvendorSolution:
+    """
+    ニュースベンダーモデルを一括で解く
+
+    Critical Ratio = (p - c) / (p - c + h) とし、最適在庫水準を
+    需要分布 N(mean, std^2) の CR 分位点とする。引数はスカラーまたは
+    同じ長さの配列で、ブロードキャストされる。
+
+    Args:
+        demand_mean: 需要の平均
+        demand_std: 需要の標準偏差
+        unit_cost: 仕入れ単価
+        selling_price: 販売単価
+        disposal_cost: 廃棄コスト
+        current_inventory: 現在在庫
+
+    Returns:
+        NewsvendorSolution: 商品ごとの発注量・安全在庫・期待廃棄量・期待欠品量
+    """
+    mean, std, cost, price, disposal, inventory = np.broadcast_arrays(
+        *(
+            np.atleast_1d(np.asarray(a, dtype=np.float64))
+            for a in (
+                demand_mean,
+                demand_std,
+                unit_cost,
+                selling_price,
+                disposal_cost,
+                current_inventory,
+            )
+        )
+    )
+
+    # 欠品コスト = 機会損失
+    shortage_cost = price - cost
+    with np.errstate(invalid="ignore", divide="ignore"):
+        critical_ratio = shortage_cost / (shortage_cost + disposal)
+
+    # 最適在庫水準（正規分布の分位点）
+    with np.errstate(invalid="ignore", divide="ignore"):
+        optimal_order = mean + std * ndtri(critical_ratio)
+
+    # 価格 < 原価などで解が求まらない要素は0に置き換える
+    valid = np.isfinite(optimal_order) & np.isfinite(mean)
+    optimal_order = np.where(valid, optimal_order, 0.0)
+    mean = np.where(valid, mean, 0.0)
+    inventory = np.where(valid, inventory, 0.0)
+
+    order_quantity = np.maximum(0.0, np.trunc(optimal_order - inventory))
+    safety_stock = np.trunc(mean * SAFETY_STOCK_RATIO)
+    expected_waste = np.maximum(0.0, np.trunc(optimal_order - mean))
+    expected_shortage = np.maximum(0.0, np.trunc(mean - optimal_order))
+
+    return NewsvendorSolution(
+        order_quantity=order_quantity.astype(np.int64),
+        optimal_order_level=np.trunc(optimal_order).astype(np.int64),
+        safety_stock=safety_stock.astype(np.int64),
+        expected_waste=expected_waste.astype(np.int64),
+        expected_shortage=expected_shortage.astype(np.int64),
+        critical_ratio=critical_ratio,
+        valid=valid,
+    )
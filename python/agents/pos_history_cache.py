@@ -0,0 +1,380 @@
+"""
+POS履歴の列指向キャッシュ
+
+締まった日（今日より前）の日次販売集計は変わらないため、店舗×月ごとの
+Arrow IPC ファイルとしてローカルに保存し、メモリマップで読み込む。
+DemandForecastAgent は締まった日をこのキャッシュからゼロコピーで読み、
+当日分だけをDBから読む。
+
+ファイル配置:
+    <root>/store_id=<店舗ID>/month=<YYYY-MM>.arrow
+
+各ファイルは product_sku, date 順に並び、スキーマのメタデータに
+SKUごとの行範囲と、どの日まで締まったデータかを保持する。
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from .base import execute_query
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - pyarrow は任意依存
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+StoreMonth = Tuple[str, date]  # (store_id, 月初)
+
+# 店舗×月の締まった日の日次販売集計
+HISTORY_QUERY = text(
+    """
+    SELECT
+        store_id,
+        product_sku,
+        date,
+        sales_quantity,
+        price,
+        day_of_week,
+        is_holiday
+    FROM pos_sales_daily
+    WHERE store_id = ANY(CAST(:store_ids AS VARCHAR[]))
+      AND date >= :start_date
+      AND date <= :end_date
+    ORDER BY store_id, product_sku, date
+"""
+)
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _month_end(month: date) -> date:
+    next_month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def _months(start: date, end: date) -> List[date]:
+    """start から end までの各月の月初"""
+    months = []
+    month = _month_start(start)
+    while month <= end:
+        months.append(month)
+        month = _month_end(month) + timedelta(days=1)
+    return months
+
+
+class PosHistoryCache:
+    """締まった日のPOS日次集計の列指向キャッシュ"""
+
+    def __init__(self, root: Path, clock: Callable[[], date] = date.today):
+        """
+        Args:
+            root: キャッシュディレクトリ
+            clock: 今日の日付を返す関数（今日より前を締まった日とする）
+        """
+        if pa is None:
+            raise ImportError("POS history cache requires pyarrow")
+
+        self.root = Path(root)
+        self.clock = clock
+        self._tables: Dict[StoreMonth, Tuple[float, "pa.Table", Dict[str, List[int]], date]] = {}
+        self._lock = threading.Lock()
+
+    def month_path(self, store_id: str, month: date) -> Path:
+        return self.root / f"store_id={store_id}" / f"month={month:%Y-%m}.arrow"
+
+    def closed_through(self) -> date:
+        """締まった最終日（昨日）"""
+        return self.clock() - timedelta(days=1)
+
+    def missing(self, store_ids: Iterable[str], start: date, end: date) -> List[StoreMonth]:
+        """
+        未作成、または締まった日が足りない (店舗, 月) を取得
+
+        Args:
+            store_ids: 店舗IDのリスト
+            start: 期間の開始日
+            end: 期間の終了日（締まった最終日より後は対象外）
+
+        Returns:
+            List[StoreMonth]: 作り直しが必要な (store_id, 月初)
+        """
+        end = min(end, self.closed_through())
+        missing = []
+        for store_id in dict.fromkeys(store_ids):
+            for month in _months(start, end):
+                required = min(_month_end(month), self.closed_through())
+                entry = self._open(store_id, month)
+                if entry is None or entry[3] < required:
+                    missing.append((store_id, month))
+        return missing
+
+    def write_month(
+        self,
+        store_id: str,
+        month: date,
+        columns: Dict[str, np.ndarray],
+        closed_through: date,
+    ) -> Path:
+        """
+        店舗×月のファイルを書き込む（一時ファイルから置き換え）
+
+        Args:
+            store_id: 店舗ID
+            month: 月初
+            columns: product_sku, date, sales_quantity, price, day_of_week, is_holiday
+                （product_sku, date 順）
+            closed_through: このファイルに含む締まった最終日
+
+        Returns:
+            Path: 書き込んだファイル
+        """
+        skus = np.asarray(columns["product_sku"], dtype=object)
+
+        # SKUごとの行範囲 [offset, length]
+        index: Dict[str, List[int]] = {}
+        if len(skus):
+            boundaries = np.flatnonzero(skus[1:] != skus[:-1]) + 1
+            starts = np.concatenate([[0], boundaries])
+            ends = np.concatenate([boundaries, [len(skus)]])
+            index = {str(skus[s]): [int(s), int(e - s)] for s, e in zip(starts, ends)}
+
+        table = pa.table(
+            {
+                "product_sku": pa.array(skus, type=pa.string()),
+                "date": pa.array(list(columns["date"]), type=pa.date32()),
+                "sales_quantity": np.asarray(columns["sales_quantity"], dtype=np.int64),
+                "price": np.asarray(columns["price"], dtype=np.float64),
+                "day_of_week": np.asarray(columns["day_of_week"], dtype=np.int8),
+                "is_holiday": np.asarray(columns["is_holiday"], dtype=bool),
+            }
+        ).replace_schema_metadata(
+            {
+                "sku_index": json.dumps(index),
+                "closed_through": closed_through.isoformat(),
+            }
+        )
+
+        path = self.month_path(store_id, month)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".tmp{os.getpid()}")
+        with pa.OSFile(str(tmp_path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._tables.pop((store_id, month), None)
+        return path
+
+    def read(self, product_sku: str, store_id: str, start: date, end: date) -> np.ndarray:
+        """
+        1系列の締まった日の販売数量を日付順に取得
+
+        各月のファイルはメモリマップされ、月内の行範囲はスライスで取り出すので
+        月が1つの場合はファイルのバッファをそのまま参照する。
+
+        Args:
+            product_sku: 商品SKU
+            store_id: 店舗ID
+            start: 開始日
+            end: 終了日（締まった最終日より後は含まない）
+
+        Returns:
+            np.ndarray: 販売数量（int64、読み取り専用）
+        """
+        end = min(end, self.closed_through())
+        start_day = start.toordinal() - _EPOCH_ORDINAL
+        end_day = end.toordinal() - _EPOCH_ORDINAL
+
+        parts = []
+        for month in _months(start, end):
+            entry = self._open(store_id, month)
+            if entry is None:
+                continue
+            _, table, index, _ = entry
+            span = index.get(product_sku)
+            if span is None:
+                continue
+
+            rows = table.slice(span[0], span[1])
+            days = rows.column("date").chunk(0).view(pa.int32()).to_numpy(zero_copy_only=True)
+            lo, hi = np.searchsorted(days, [start_day, end_day + 1])
+            quantities = rows.column("sales_quantity").chunk(0).to_numpy(zero_copy_only=True)
+            parts.append(quantities[lo:hi])
+
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts)
+
+    def invalidate(self, store_id: Optional[str] = None, month: Optional[date] = None) -> None:
+        """
+        キャッシュを破棄（締まった日のデータが後から訂正された場合）
+
+        Args:
+            store_id: 店舗ID（Noneの場合は全店舗）
+            month: 月内の日付（Noneの場合は全月）
+        """
+        with self._lock:
+            if store_id is None:
+                self._tables.clear()
+                shutil.rmtree(self.root, ignore_errors=True)
+                return
+
+            months = [_month_start(month)] if month else None
+            for key in list(self._tables):
+                if key[0] == store_id and (months is None or key[1] in months):
+                    del self._tables[key]
+
+        if months is None:
+            shutil.rmtree(self.root / f"store_id={store_id}", ignore_errors=True)
+        else:
+            self.month_path(store_id, months[0]).unlink(missing_ok=True)
+
+    def invalidate_refreshed(self, refreshed: Iterable[Tuple[str, date, date]]) -> int:
+        """
+        日次集計の更新で締まった日が変わった (店舗, 月) を破棄
+
+        日次集計のコミット後に呼ぶ（コミット前に破棄すると、その間の予測が
+        古い集計からファイルを作り直してしまう）。
+
+        Args:
+            refreshed: (store_id, 月初, 再集計した最初の日)（refresh_pos_sales_daily の戻り値）
+
+        Returns:
+            int: 破棄した (店舗, 月) の数
+        """
+        closed_through = self.closed_through()
+        invalidated = 0
+        for store_id, month, first_date in refreshed:
+            if first_date <= closed_through:
+                self.invalidate(store_id, month)
+                invalidated += 1
+        return invalidated
+
+    def _open(self, store_id: str, month: date):
+        """店舗×月のファイルをメモリマップで開く（更新されていなければ開いたものを再利用）"""
+        path = self.month_path(store_id, month)
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+        key = (store_id, month)
+        with self._lock:
+            entry = self._tables.get(key)
+            if entry is not None and entry[0] == mtime:
+                return entry
+
+        source = pa.memory_map(str(path), "r")
+        table = pa.ipc.open_file(source).read_all().combine_chunks()
+        metadata = table.schema.metadata
+        entry = (
+            mtime,
+            table,
+            json.loads(metadata[b"sku_index"]),
+            date.fromisoformat(metadata[b"closed_through"].decode()),
+        )
+        with self._lock:
+            self._tables[key] = entry
+        return entry
+
+
+async def fill_pos_history_cache(
+    cache: PosHistoryCache, db_session, store_ids: Iterable[str], start: date, end: date
+) -> int:
+    """
+    期間内の不足している (店舗, 月) をDBから読み込んでキャッシュに書き込む
+
+    Args:
+        cache: POS履歴キャッシュ
+        db_session: データベースセッション（Session / AsyncSession）
+        store_ids: 店舗IDのリスト
+        start: 期間の開始日
+        end: 期間の終了日
+
+    Returns:
+        int: 書き込んだファイル数
+    """
+    missing = cache.missing(store_ids, start, end)
+    if not missing:
+        return 0
+
+    closed_through = cache.closed_through()
+    result = await execute_query(
+        db_session,
+        HISTORY_QUERY,
+        {
+            "store_ids": sorted({store_id for store_id, _ in missing}),
+            "start_date": min(month for _, month in missing),
+            "end_date": min(
+                max(_month_end(month) for _, month in missing), closed_through
+            ),
+        },
+    )
+    rows = result.fetchall()
+    names = list(result.keys())
+    columns = {
+        name: np.array([row[i] for row in rows], dtype=object)
+        for i, name in enumerate(names)
+    }
+
+    written = 0
+    months = (
+        np.array([_month_start(d) for d in columns["date"]], dtype=object)
+        if rows
+        else np.empty(0, dtype=object)
+    )
+    for store_id, month in missing:
+        mask = (columns["store_id"] == store_id) & (months == month) if rows else slice(0, 0)
+        cache.write_month(
+            store_id,
+            month,
+            {name: values[mask] for name, values in columns.items() if name != "store_id"},
+            min(_month_end(month), closed_through),
+        )
+        written += 1
+
+    logger.info(f"Filled POS history cache: {written} store-months, {len(rows)} rows")
+    return written
+
+
+# グローバルインスタンス（シングルトン）
+_pos_history_cache_instance: Optional[PosHistoryCache] = None
+
+
+def get_pos_history_cache() -> Optional[PosHistoryCache]:
+    """
+    PosHistoryCacheのシングルトンインスタンスを取得
+
+    Returns:
+        PosHistoryCache or None（POS_HISTORY_CACHE_DIR 未設定、または pyarrow がない場合）
+    """
+    global _pos_history_cache_instance
+
+    if _pos_history_cache_instance is None:
+        from config import settings
+
+        if not settings.POS_HISTORY_CACHE_DIR:
+            return None
+        if pa is None:
+            logger.warning("POS_HISTORY_CACHE_DIR is set but pyarrow is not installed")
+            return None
+        _pos_history_cache_instance = PosHistoryCache(Path(settings.POS_HISTORY_CACHE_DIR))
+
+    return _pos_history_cache_instance
@@ -0,0 +1,314 @@
+"""
+ローリング販売統計
+
+POSデータの到着ごとに (product_sku, store_id) の日次販売数量を直近 HISTORY_DAYS 日の
+リングバッファに保持し、期間内の合計・二乗和・データ日数をO(1)で更新する。
+窓の定義は予測カーネル（forecast_kernel）と同じで、期間内の直近 DEFAULT_WINDOW
+データ日（販売のあった日）を移動平均の窓とする。DemandForecastAgent はこの状態から
+DBにアクセスせずに、DBから読んだ場合と同じ予測を返せる。
+"""
+import math
+import threading
+import logging
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, Optional, Tuple
+
+from .forecast_kernel import DEFAULT_WINDOW, HISTORY_DAYS
+
+logger = logging.getLogger(__name__)
+
+# リングバッファの日数（_date_range と同じく終端日を含めて HISTORY_DAYS + 1 日）
+SPAN_DAYS = HISTORY_DAYS + 1
+
+SalesKey = Tuple[str, str]  # (product_sku, store_id)
+
+
+@dataclass
+class RollingWindowStats:
+    """期間・窓ごとの集計値（期間の終端は latest）"""
+
+    latest: date
+    window_sum: float  # 直近 DEFAULT_WINDOW データ日の合計
+    window_sum_sq: float
+    window_days: int
+    history_sum: float  # 直近 HISTORY_DAYS 日（終端日を含む）の合計
+    history_sum_sq: float
+    history_days: int
+
+    @staticmethod
+    def _std(total: float, total_sq: float, days: int) -> float:
+        if days < 2:
+            return 0.0
+        mean = total / days
+        return math.sqrt(max(0.0, total_sq / days - mean * mean))
+
+    @property
+    def window_mean(self) -> float:
+        return self.window_sum / self.window_days if self.window_days else 0.0
+
+    @property
+    def window_std(self) -> float:
+        return self._std(self.window_sum, self.window_sum_sq, self.window_days)
+
+    @property
+    def history_mean(self) -> float:
+        return self.history_sum / self.history_days if self.history_days else 0.0
+
+    @property
+    def history_std(self) -> float:
+        return self._std(self.history_sum, self.history_sum_sq, self.history_days)
+
+
+class RollingSalesStats:
+    """
+    1系列（商品×店舗）のローリング統計
+
+    直近 SPAN_DAYS 日分の日次販売数量をリングバッファに保持し、期間から外れた日を
+    差し引くことで期間の合計・二乗和・データ日数を維持する。移動平均の窓
+    （直近 DEFAULT_WINDOW データ日）は snapshot でバッファを最新日から遡って求める。
+    """
+
+    __slots__ = (
+        "_totals",
+        "_present",
+        "_latest",
+        "history_sum",
+        "history_sum_sq",
+        "history_days",
+    )
+
+    def __init__(self):
+        self._totals = [0.0] * SPAN_DAYS
+        self._present = [False] * SPAN_DAYS
+        self._latest: Optional[int] = None  # 最新日（date.toordinal）
+        self.history_sum = 0.0
+        self.history_sum_sq = 0.0
+        self.history_days = 0
+
+    def _evict(self, day: int) -> None:
+        """期間（リングバッファ）から day を外す"""
+        slot = day % SPAN_DAYS
+        if self._present[slot]:
+            total = self._totals[slot]
+            self.history_sum -= total
+            self.history_sum_sq -= total * total
+            self.history_days -= 1
+        self._totals[slot] = 0.0
+        self._present[slot] = False
+
+    def advance_to(self, day: int) -> None:
+        """
+        最新日を day まで進め、期間から外れた日を差し引く
+
+        日の前進は最大 SPAN_DAYS ステップなので、償却O(1)。
+
+        Args:
+            day: 新しい最新日（date.toordinal）
+        """
+        if self._latest is None:
+            self._latest = day
+            return
+        if day <= self._latest:
+            return
+
+        if day - self._latest >= SPAN_DAYS:
+            self.__init__()
+            self._latest = day
+            return
+
+        for new_day in range(self._latest + 1, day + 1):
+            self._evict(new_day - SPAN_DAYS)
+        self._latest = day
+
+    def set_total(self, day: int, quantity: Optional[float]) -> bool:
+        """
+        日の販売数量の合計を置き換える（日次集計の値をそのまま反映する）
+
+        Args:
+            day: 販売日（date.toordinal）
+            quantity: その日の販売数量の合計（Noneの場合は販売なし）
+
+        Returns:
+            bool: 期間内で反映された場合True（期間より古い日は無視）
+        """
+        if quantity is None and (self._latest is None or day > self._latest):
+            return False
+        self.advance_to(day)
+        if self._latest - day >= SPAN_DAYS:
+            return False
+
+        slot = day % SPAN_DAYS
+        old = self._totals[slot]
+        new = 0.0 if quantity is None else quantity
+        present = quantity is not None
+
+        self.history_sum += new - old
+        self.history_sum_sq += new * new - old * old
+        self.history_days += present - self._present[slot]
+        self._totals[slot] = new
+        self._present[slot] = present
+        return True
+
+    def add(self, day: int, quantity: float) -> bool:
+        """
+        販売行を1件加算
+
+        Args:
+            day: 販売日（date.toordinal）
+            quantity: 販売数量
+
+        Returns:
+            bool: 期間内で加算された場合True（期間より古い行は無視）
+        """
+        self.advance_to(day)
+        if self._latest - day >= SPAN_DAYS:
+            return False
+        return self.set_total(day, self._totals[day % SPAN_DAYS] + quantity)
+
+    def snapshot(self) -> RollingWindowStats:
+        window_sum = window_sum_sq = 0.0
+        window_days = 0
+        for day in range(self._latest, self._latest - SPAN_DAYS, -1):
+            if window_days == DEFAULT_WINDOW:
+                break
+            slot = day % SPAN_DAYS
+            if self._present[slot]:
+                total = self._totals[slot]
+                window_sum += total
+                window_sum_sq += total * total
+                window_days += 1
+
+        return RollingWindowStats(
+            latest=date.fromordinal(self._latest),
+            window_sum=window_sum,
+            window_sum_sq=window_sum_sq,
+            window_days=window_days,
+            history_sum=self.history_sum,
+            history_sum_sq=self.history_sum_sq,
+            history_days=self.history_days,
+        )
+
+
+class RollingStatsStore:
+    """系列ごとのローリング統計のストア（スレッドセーフ）"""
+
+    def __init__(self):
+        # store_id → product_sku → 統計（店舗単位で入れ替えられるよう店舗で分ける）
+        self._stores: Dict[str, Dict[str, RollingSalesStats]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(series) for series in self._stores.values())
+
+    def add_sale(
+        self, product_sku: str, store_id: str, sale_date: date, quantity: float
+    ) -> bool:
+        """
+        販売行を1件取り込む
+
+        Args:
+            product_sku: 商品SKU
+            store_id: 店舗ID
+            sale_date: 販売日
+            quantity: 販売数量
+
+        Returns:
+            bool: 期間内で加算された場合True
+        """
+        with self._lock:
+            store = self._stores.setdefault(store_id, {})
+            series = store.get(product_sku)
+            if series is None:
+                series = store[product_sku] = RollingSalesStats()
+            return series.add(sale_date.toordinal(), float(quantity))
+
+    def add_sales(self, rows: Iterable[Tuple[str, str, date, float]]) -> int:
+        """
+        販売行をまとめて取り込む
+
+        Args:
+            rows: (product_sku, store_id, date, sales_quantity) の列
+
+        Returns:
+            int: 期間内で加算された行数
+        """
+        added = 0
+        for product_sku, store_id, sale_date, quantity in rows:
+            added += self.add_sale(product_sku, store_id, sale_date, quantity)
+        return added
+
+    def replace_store(
+        self, store_id: str, daily_totals: Iterable[Tuple[str, date, float]]
+    ) -> int:
+        """
+        店舗の全系列を日次集計の値で置き換える
+
+        取り込み済みの行の更新（数量・商品の変更）は加算では反映できないため、
+        日次集計の更新後に再集計された店舗の直近の期間を読み直して入れ替える。
+
+        Args:
+            store_id: 店舗ID
+            daily_totals: (product_sku, date, 日次販売数量) の列
+
+        Returns:
+            int: 置き換え後の系列数
+        """
+        series: Dict[str, RollingSalesStats] = {}
+        for product_sku, sale_date, quantity in daily_totals:
+            stats = series.get(product_sku)
+            if stats is None:
+                stats = series[product_sku] = RollingSalesStats()
+            stats.set_total(sale_date.toordinal(), float(quantity))
+
+        with self._lock:
+            if series:
+                self._stores[store_id] = series
+            else:
+                self._stores.pop(store_id, None)
+        return len(series)
+
+    def get(
+        self, product_sku: str, store_id: str, as_of: Optional[date] = None
+    ) -> Optional[RollingWindowStats]:
+        """
+        系列の集計値を取得
+
+        Args:
+            product_sku: 商品SKU
+            store_id: 店舗ID
+            as_of: 期間の終端日（Noneの場合は最後に取り込んだ販売日）
+
+        Returns:
+            RollingWindowStats or None（未取り込みの系列）
+        """
+        with self._lock:
+            series = self._stores.get(store_id, {}).get(product_sku)
+            if series is None:
+                return None
+            if as_of is not None:
+                series.advance_to(as_of.toordinal())
+            return series.snapshot()
+
+
+# グローバルインスタンス（シングルトン）
+_rolling_stats_store_instance: Optional[RollingStatsStore] = None
+
+
+def get_rolling_stats_store() -> RollingStatsStore:
+    """
+    RollingStatsStoreのシングルトンインスタンスを取得
+
+    ストアはプロセス内のメモリにしかない。同じプロセスで PosIngestor が取り込んだ
+    店舗だけが温まり、別プロセス（pos_ingestion.py のCLIなど）の取り込みは
+    このプロセスのストアには反映されない（その店舗の系列はDBから読む）。
+
+    Returns:
+        RollingStatsStore
+    """
+    global _rolling_stats_store_instance
+
+    if _rolling_stats_store_instance is None:
+        _rolling_stats_store_instance = RollingStatsStore()
+
+    return _rolling_stats_store_instance
@@ -0,0 +1,100 @@
+"""
+サプライヤーマスタキャッシュ
+
+サプライヤーマスタは1日に1回程度しか変わらないため、品質スコア順のランキングを
+プロセス内にTTL付きで保持し、エージェントインスタンス間で共有する。
+"""
+import threading
+import time
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SupplierRanking = List[Dict[str, Any]]
+
+
+class SupplierCache:
+    """サプライヤーランキングのTTLキャッシュ"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = 600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            ttl_seconds: キャッシュ有効期間（秒）
+            clock: 時刻関数（テスト用に差し替え可能）
+        """
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._ranking: Optional[SupplierRanking] = None
+        self._loaded_at = 0.0
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._ranking is not None
+            and self._clock() - self._loaded_at < self.ttl_seconds
+        )
+
+    async def get_ranking(
+        self, loader: Callable[[], Awaitable[SupplierRanking]]
+    ) -> SupplierRanking:
+        """
+        品質スコア降順のサプライヤーランキングを取得
+
+        キャッシュが期限切れまたは未ロードの場合のみ loader を呼び出す。
+
+        Args:
+            loader: サプライヤー一覧を取得する非同期関数
+
+        Returns:
+            SupplierRanking: 品質スコア降順のサプライヤー一覧
+        """
+        with self._lock:
+            if self._is_fresh():
+                return self._ranking
+
+        suppliers = await loader()
+        ranking = sorted(
+            suppliers, key=lambda s: float(s.get("quality_score") or 0), reverse=True
+        )
+
+        with self._lock:
+            self._ranking = ranking
+            self._loaded_at = self._clock()
+
+        logger.debug(f"Supplier cache refreshed: {len(ranking)} suppliers")
+        return ranking
+
+    def invalidate(self) -> None:
+        """キャッシュを破棄（サプライヤーマスタ更新時に呼び出す）"""
+        with self._lock:
+            self._ranking = None
+            self._loaded_at = 0.0
+        logger.info("Supplier cache invalidated")
+
+
+# グローバルインスタンス（シングルトン）
+_supplier_cache_instance: Optional[SupplierCache] = None
+
+
+def get_supplier_cache() -> SupplierCache:
+    """
+    SupplierCacheのシングルトンインスタンスを取得
+
+    Returns:
+        SupplierCache
+    """
+    global _supplier_cache_instance
+
+    if _supplier_cache_instance is None:
+        from config import settings
+
+        _supplier_cache_instance = SupplierCache(
+            ttl_seconds=settings.SUPPLIER_CACHE_TTL_SECONDS
+        )
+
+    return _supplier_cache_instance
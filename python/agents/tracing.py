@@ -0,0 +1,387 @@
+"""
+処理時間の計測（スパン）
+
+タスクごとの処理を perf_counter_ns で計測したスパンの木として記録する。
+スパン名は処理の種類（db_fetch / compute / supplier_lookup / summary など）で、
+どこで時間を使っているかをステージ単位で集計できる。
+
+トレースは contextvars で引き継ぐため、トレース外で呼ばれた span() は何もしない。
+任意でタスクごとの cProfile（関数別の累積時間）と tracemalloc（行別の確保量）も取得し、
+JSON Lines、または OpenTelemetry の OTLP/JSON 形式で書き出せる。
+"""
+import cProfile
+import json
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("json", "otlp")
+
+_current_trace: ContextVar[Optional["TaskTrace"]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+# cProfile / tracemalloc はプロセス全体で1つなので、同時に取得するのは1タスクだけ
+_capture_lock = threading.Lock()
+
+
+@dataclass(slots=True)
+class Span:
+    """計測区間"""
+
+    name: str
+    span_id: int
+    parent_id: Optional[int]
+    start_ns: int  # perf_counter_ns
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+@dataclass(slots=True)
+class TaskTrace:
+    """1タスク分のスパンとプロファイル"""
+
+    name: str
+    attributes: Dict[str, Any]
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    # perf_counter_ns → UNIX時刻(ns) の変換量（トレース開始時に決める）
+    epoch_offset_ns: int = field(default_factory=lambda: time.time_ns() - time.perf_counter_ns())
+    spans: List[Span] = field(default_factory=list)
+    profile: Optional[List[Dict[str, Any]]] = None  # cProfile の上位関数
+    memory: Optional[Dict[str, Any]] = None  # tracemalloc のピークと上位の確保箇所
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+    def start_span(self, name: str, parent: Optional[Span], attributes: Dict[str, Any]) -> Span:
+        span = Span(
+            name=name,
+            span_id=len(self.spans) + 1,
+            parent_id=parent.span_id if parent is not None else None,
+            start_ns=time.perf_counter_ns(),
+            attributes=attributes,
+        )
+        self.spans.append(span)
+        return span
+
+    def breakdown(self) -> Dict[str, float]:
+        """
+        スパン名ごとの合計時間
+
+        Returns:
+            Dict[str, float]: スパン名 → ミリ秒（ルートスパンを除く）
+        """
+        totals: Dict[str, float] = {}
+        for span in self.spans[1:]:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON出力用の辞書に変換"""
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "attributes": self.attributes,
+            "start_time_unix_ns": self.root.start_ns + self.epoch_offset_ns,
+            "duration_ms": self.root.duration_ms,
+            "breakdown_ms": self.breakdown(),
+            "spans": [
+                {
+                    "name": span.name,
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "start_offset_ms": (span.start_ns - self.root.start_ns) / 1e6,
+                    "duration_ms": span.duration_ms,
+                    "attributes": span.attributes,
+                }
+                for span in self.spans
+            ],
+            "profile": self.profile,
+            "memory": self.memory,
+        }
+
+    def to_otlp(self, service_name: str = "a2a-supply-chain") -> Dict[str, Any]:
+        """
+        OTLP/JSON（ExportTraceServiceRequest）形式に変換
+
+        cProfile・tracemalloc の結果はルートスパンのイベントとして付ける。
+
+        Args:
+            service_name: resource の service.name
+
+        Returns:
+            Dict: OpenTelemetry Collector の otlp/json 受信・file エクスポートと同じ形式
+        """
+        spans = []
+        for span in self.spans:
+            spans.append(
+                {
+                    "traceId": self.trace_id,
+                    "spanId": f"{span.span_id:016x}",
+                    "parentSpanId": f"{span.parent_id:016x}" if span.parent_id else "",
+                    "name": span.name,
+                    "kind": 1,  # SPAN_KIND_INTERNAL
+                    "startTimeUnixNano": str(span.start_ns + self.epoch_offset_ns),
+                    "endTimeUnixNano": str(span.end_ns + self.epoch_offset_ns),
+                    "attributes": _otlp_attributes(span.attributes),
+                    "events": [],
+                }
+            )
+
+        root = spans[0]
+        root["attributes"].extend(_otlp_attributes(self.attributes))
+        event_time = root["endTimeUnixNano"]
+        for entry in self.profile or []:
+            root["events"].append(
+                {"name": "cprofile.function", "timeUnixNano": event_time,
+                 "attributes": _otlp_attributes(entry)}
+            )
+        if self.memory is not None:
+            root["attributes"].extend(
+                _otlp_attributes({"memory.peak_bytes": self.memory["peak_bytes"]})
+            )
+            for entry in self.memory["top"]:
+                root["events"].append(
+                    {"name": "tracemalloc.allocation", "timeUnixNano": event_time,
+                     "attributes": _otlp_attributes(entry)}
+                )
+
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": _otlp_attributes({"service.name": service_name})
+                    },
+                    "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+                }
+            ]
+        }
+
+
+def _otlp_attributes(values: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """属性の辞書を OTLP の KeyValue リストに変換"""
+    attributes = []
+    for key, value in values.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        attributes.append({"key": key, "value": typed})
+    return attributes
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    処理区間を計測
+
+    トレース中でなければ何もしない。asyncio のタスクは作成時のコンテキストを
+    引き継ぐため、パイプラインのステージワーカー内のスパンも同じトレースに入る。
+
+    Args:
+        name: スパン名（db_fetch / compute / supplier_lookup / summary など）
+        **attributes: スパンの属性（行数・件数など）
+
+    Yields:
+        Span or None: 計測中のスパン（属性を後から追加できる）
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    current = trace.start_span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        current.end_ns = time.perf_counter_ns()
+        _current_span.reset(token)
+
+
+class Tracer:
+    """タスク単位のトレースの取得と書き出し"""
+
+    def __init__(
+        self,
+        profile: bool = False,
+        trace_memory: bool = False,
+        export_path: Optional[str] = None,
+        export_format: str = "json",
+        top_n: int = 20,
+        max_traces: int = 100,
+    ):
+        """
+        Args:
+            profile: タスクごとに cProfile を取得する
+            trace_memory: タスクごとに tracemalloc を取得する
+            export_path: 完了したトレースを追記するファイル（Noneの場合は書き出さない）
+            export_format: "json"（TaskTrace.to_dict）または "otlp"（TaskTrace.to_otlp）、1行1トレース
+            top_n: プロファイル・メモリの上位何件を残すか
+            max_traces: メモリ上に保持する直近のトレース数
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown trace export format: {export_format}")
+
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.export_path = Path(export_path) if export_path else None
+        self.export_format = export_format
+        self.top_n = top_n
+        self.traces: Deque[TaskTrace] = deque(maxlen=max_traces)
+        self._export_lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, name: str, **attributes: Any) -> Iterator[TaskTrace]:
+        """
+        タスクのトレースを開始
+
+        cProfile・tracemalloc はプロセス全体で1つのため、並行タスクのうち
+        先に始めた1つだけが取得する（他のタスクはスパンのみ）。
+
+        Args:
+            name: ルートスパン名
+            **attributes: トレースの属性（product_sku, store_id など）
+
+        Yields:
+            TaskTrace: 記録中のトレース
+        """
+        trace = TaskTrace(name=name, attributes=attributes)
+        capture = (self.profile or self.trace_memory) and _capture_lock.acquire(blocking=False)
+        if (self.profile or self.trace_memory) and not capture:
+            logger.debug(f"Profile capture skipped for {name}: another task is capturing")
+
+        profiler = None
+        memory_started = False
+        memory_before = None
+        if capture and self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                memory_started = True
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.take_snapshot()
+        if capture and self.profile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        trace_token = _current_trace.set(trace)
+        root = trace.start_span(name, None, {})
+        span_token = _current_span.set(root)
+        try:
+            yield trace
+        finally:
+            root.end_ns = time.perf_counter_ns()
+            try:
+                _current_span.reset(span_token)
+                _current_trace.reset(trace_token)
+            except ValueError:
+                # 非同期ジェネレータが別のコンテキストで閉じられた場合
+                pass
+
+            if profiler is not None:
+                profiler.disable()
+                trace.profile = self._profile_top(profiler)
+            if memory_before is not None:
+                trace.memory = self._memory_top(memory_before)
+                if memory_started:
+                    tracemalloc.stop()
+            if capture:
+                _capture_lock.release()
+
+            self._finish(trace)
+
+    def _profile_top(self, profiler: cProfile.Profile) -> List[Dict[str, Any]]:
+        """累積時間の上位関数"""
+        stats = pstats.Stats(profiler).stats
+        ranked = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+        return [
+            {
+                "function": f"{filename}:{line}({function})",
+                "ncalls": ncalls,
+                "tottime_ms": tottime * 1000,
+                "cumtime_ms": cumtime * 1000,
+            }
+            for (filename, line, function), (_, ncalls, tottime, cumtime, _) in ranked[
+                : self.top_n
+            ]
+        ]
+
+    def _memory_top(self, before: tracemalloc.Snapshot) -> Dict[str, Any]:
+        """タスク中のメモリのピークと、確保量が増えた上位の行"""
+        _, peak = tracemalloc.get_traced_memory()
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+        diff = after.compare_to(before.filter_traces(ignore), "lineno")
+        return {
+            "peak_bytes": peak,
+            "top": [
+                {
+                    "location": str(stat.traceback),
+                    "size_bytes": stat.size_diff,
+                    "count": stat.count_diff,
+                }
+                for stat in diff[: self.top_n]
+            ],
+        }
+
+    def _finish(self, trace: TaskTrace) -> None:
+        """完了したトレースを保持し、設定されていればファイルに追記"""
+        self.traces.append(trace)
+        logger.debug(
+            f"Trace {trace.name} {trace.root.duration_ms:.1f}ms: "
+            + ", ".join(f"{name}={ms:.1f}ms" for name, ms in trace.breakdown().items())
+        )
+
+        if self.export_path is None:
+            return
+        record = trace.to_otlp() if self.export_format == "otlp" else trace.to_dict()
+        try:
+            with self._export_lock, self.export_path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            logger.warning(f"Trace export failed: {e}")
+
+
+# グローバルインスタンス（シングルトン）
+_tracer_instance: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    """
+    Tracerのシングルトンインスタンスを取得
+
+    Returns:
+        Tracer
+    """
+    global _tracer_instance
+
+    if _tracer_instance is None:
+        from config import settings
+
+        _tracer_instance = Tracer(
+            profile=settings.TRACE_PROFILE,
+            trace_memory=settings.TRACE_MEMORY,
+            export_path=settings.TRACE_EXPORT_PATH,
+            export_format=settings.TRACE_EXPORT_FORMAT,
+        )
+
+    return _tracer_instance
@@ -0,0 +1,249 @@
+"""
+最適化ジョブ管理
+
+/api/optimize の実行をジョブとして管理する。ジョブごとにID・ログ（上限付き）・
+エージェントステータス・トランザクション履歴・SSE配信ハブを持つため、
+同時に複数の店舗から実行しても互いのログや状態を書き換えない。
+
+同時に実行するジョブ数はセマフォで制限し、上限を超えた分は待機させる。
+待機数も上限を超える場合は受け付けない。
+"""
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from api.sse_hub import SSEHub
+
+logger = logging.getLogger(__name__)
+
+AGENTS = ("demand_forecast", "inventory_optimizer", "report_generator")
+
+# ジョブの状態
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class JobLimitError(Exception):
+    """実行中・待機中のジョブ数が上限に達している"""
+
+
+class Job:
+    """最適化ジョブ（1回の /api/optimize の実行）"""
+
+    def __init__(
+        self,
+        params: Dict[str, Any],
+        log_limit: int = 1000,
+        sse_queue_size: int = 256,
+        heartbeat_seconds: float = 15.0,
+    ):
+        """
+        Args:
+            params: リクエストパラメータ
+            log_limit: 保持するログの上限件数（SSEの再送用履歴も同じ件数）
+            sse_queue_size: SSE購読者ごとのキューの上限
+            heartbeat_seconds: SSEのハートビート間隔（秒）
+        """
+        self.job_id = uuid.uuid4().hex
+        self.params = params
+        self.state = QUEUED
+        self.error_message: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.logs: Deque[Dict[str, Any]] = deque(maxlen=log_limit)
+        self.agents: Dict[str, Dict[str, Any]] = {
+            agent: {"status": "idle", "progress": 0} for agent in AGENTS
+        }
+        self.transactions: List[Dict[str, Any]] = []
+        self.hub = SSEHub(
+            stream="jobs",
+            queue_size=sse_queue_size,
+            history_size=log_limit,
+            heartbeat_seconds=heartbeat_seconds,
+        )
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (COMPLETED, FAILED)
+
+    def fail(self, message: str):
+        """ジョブを失敗として記録（ランナーが処理を打ち切るときに呼ぶ）"""
+        self.state = FAILED
+        self.error_message = message
+
+    def add_log(self, level: str, message: str, agent: str = None, details: Dict = None):
+        """ログを追加"""
+        log_entry = {
+            "timestamp": datetime.now().strftime("%H:%M:%S.%f")[:-3],
+            "level": level,
+            "agent": agent,
+            "message": message,
+            "details": details or {},
+        }
+        self.publish_log(log_entry)
+        logger.info(f"[job {self.job_id[:8]}] {level.upper()}: {message}")
+
+    def publish_log(self, entry: Dict[str, Any]):
+        """ログ（タスク完了通知を含む）を保持し、SSE購読者に配信"""
+        self.logs.append(entry)
+        self.hub.publish(entry)
+
+    def status_event(self) -> Dict[str, Any]:
+        """ステータスのSSEイベント"""
+        return {"type": "status", "data": self.agents}
+
+    def update_agent_status(self, agent: str, status: str, progress: int = 0):
+        """エージェントステータスを更新（変化があった場合だけ配信）"""
+        if agent in self.agents:
+            if self.agents[agent] == {"status": status, "progress": progress}:
+                return
+            self.agents[agent]["status"] = status
+            self.agents[agent]["progress"] = progress
+            # 最新値だけが意味を持つので再送用の履歴には残さない（接続時に現在値を送る）
+            self.hub.publish(self.status_event(), retain=False)
+
+    def add_transaction(self, agent: str, amount: float, address: str, tx_hash: str):
+        """トランザクション履歴を追加"""
+        self.transactions.append({
+            "timestamp": datetime.now().isoformat(),
+            "agent": agent,
+            "amount": amount,
+            "address": address,
+            "tx_hash": tx_hash,
+            "status": "completed",
+        })
+
+    def to_dict(self, log_limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        API レスポンス用の辞書に変換
+
+        Args:
+            log_limit: 返すログの件数（Noneの場合は保持している全件）
+
+        Returns:
+            Dict: ジョブの状態
+        """
+        logs = list(self.logs)
+        if log_limit is not None:
+            logs = logs[-log_limit:] if log_limit > 0 else []
+        return {
+            "job_id": self.job_id,
+            "state": self.state,
+            "params": self.params,
+            "error_message": self.error_message,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "agents": self.agents,
+            "transactions": self.transactions,
+            "logs": logs,
+        }
+
+
+class JobManager:
+    """最適化ジョブの受付・同時実行制御・保持"""
+
+    def __init__(
+        self,
+        max_concurrent_jobs: int = 4,
+        max_queued_jobs: int = 100,
+        max_retained_jobs: int = 200,
+        log_limit: int = 1000,
+        sse_queue_size: int = 256,
+        heartbeat_seconds: float = 15.0,
+    ):
+        """
+        Args:
+            max_concurrent_jobs: 同時に実行するジョブ数の上限
+            max_queued_jobs: 実行待ちにできるジョブ数の上限（超えたら JobLimitError）
+            max_retained_jobs: 保持する完了済みジョブ数（古いものから破棄）
+            log_limit: ジョブごとのログの上限件数
+            sse_queue_size: SSE購読者ごとのキューの上限
+            heartbeat_seconds: SSEのハートビート間隔（秒）
+        """
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.max_queued_jobs = max_queued_jobs
+        self.max_retained_jobs = max_retained_jobs
+        self.log_limit = log_limit
+        self.sse_queue_size = sse_queue_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def count(self, state: str) -> int:
+        return sum(1 for job in self._jobs.values() if job.state == state)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def latest(self) -> Optional[Job]:
+        """最後に受け付けたジョブ"""
+        return next(reversed(self._jobs.values()), None)
+
+    def list(self) -> List[Job]:
+        """保持しているジョブ（新しい順）"""
+        return list(reversed(self._jobs.values()))
+
+    def submit(self, params: Dict[str, Any], runner: Callable[[Job], Awaitable[None]]) -> Job:
+        """
+        ジョブを受け付けて実行を開始（同時実行数の上限に達していれば待機）
+
+        Args:
+            params: リクエストパラメータ
+            runner: ジョブを実行するコルーチン関数（Job を受け取る）
+
+        Returns:
+            Job: 受け付けたジョブ
+
+        Raises:
+            JobLimitError: 待機中のジョブ数が上限に達している場合
+        """
+        if self.count(QUEUED) >= self.max_queued_jobs:
+            raise JobLimitError(
+                f"Too many queued jobs (max_queued_jobs={self.max_queued_jobs})"
+            )
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_jobs)
+
+        job = Job(
+            params,
+            log_limit=self.log_limit,
+            sse_queue_size=self.sse_queue_size,
+            heartbeat_seconds=self.heartbeat_seconds,
+        )
+        self._jobs[job.job_id] = job
+        self._evict()
+        job.task = asyncio.create_task(self._run(job, runner))
+        return job
+
+    async def _run(self, job: Job, runner: Callable[[Job], Awaitable[None]]) -> None:
+        async with self._semaphore:
+            job.state = RUNNING
+            job.started_at = datetime.now()
+            try:
+                await runner(job)
+                if job.state == RUNNING:
+                    job.state = COMPLETED
+            except Exception as e:
+                logger.error(f"Job {job.job_id} failed: {e}")
+                job.fail(str(e))
+            finally:
+                job.finished_at = datetime.now()
+                job.task = None
+
+    def _evict(self) -> None:
+        """上限を超えた完了済みジョブを古い順に破棄"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[: max(0, len(finished) - self.max_retained_jobs)]:
+            del self._jobs[job_id]
+
+    def collect_metrics(self) -> List[Tuple[Tuple[str], int]]:
+        """状態ごとのジョブ数（メトリクス a2a_jobs の収集用）"""
+        return [((state,), self.count(state)) for state in (QUEUED, RUNNING, COMPLETED, FAILED)]
@@ -4,14 +4,14 @@ FastAPI バックエンド - Phase 5
 """
 import os
 import asyncio
-import json
+import time
 from datetime import datetime
-from typing import AsyncGenerator, Dict, List
+from typing import Dict, Optional
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from web3 import Web3
@@ -24,9 +24,13 @@ load_dotenv(env_path)
 # プロジェクトルートをPythonパスに追加（protocols importのため）
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+import metrics
+from api.jobs import AGENTS, Job, JobLimitError, JobManager
+from api.sse_hub import parse_last_event_id
+
 # ブロックチェーン関連のインポート
 try:
-    from protocols.blockchain_service import get_blockchain_service
+    from protocols.blockchain_service import get_async_blockchain_service
     BLOCKCHAIN_AVAILABLE = True
 except ImportError as e:
     print(f"Warning: Blockchain service not available: {e}")
@@ -63,14 +67,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# グローバル状態（簡易実装、本番ではRedis等を使用）
-current_logs: List[Dict] = []
-current_status: Dict = {
-    "demand_forecast": {"status": "idle", "progress": 0},
-    "inventory_optimizer": {"status": "idle", "progress": 0},
-    "report_generator": {"status": "idle", "progress": 0},
-}
-transactions: List[Dict] = []
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """エンドポイント（ルートのパステンプレート）ごとのレイテンシを記録"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.labels(
+            method=request.method,
+            endpoint=getattr(route, "path", "unmatched"),
+            status=str(status),
+        ).observe(time.perf_counter() - start)
+
+# 最適化ジョブ（ジョブごとにログ・ステータス・トランザクション・SSE配信を持つ）
+job_manager = JobManager(
+    max_concurrent_jobs=int(os.getenv("MAX_CONCURRENT_JOBS", "4")),
+    max_queued_jobs=int(os.getenv("MAX_QUEUED_JOBS", "100")),
+    max_retained_jobs=int(os.getenv("MAX_RETAINED_JOBS", "200")),
+    log_limit=int(os.getenv("JOB_LOG_LIMIT", "1000")),
+    sse_queue_size=int(os.getenv("SSE_QUEUE_SIZE", "256")),
+    heartbeat_seconds=float(os.getenv("SSE_HEARTBEAT_SECONDS", "15")),
+)
+metrics.JOBS.bind(job_manager.collect_metrics)
+
+IDLE_STATUS: Dict = {agent: {"status": "idle", "progress": 0} for agent in AGENTS}
 
 
 # ==========================================
@@ -94,39 +120,36 @@ class LogEntry(BaseModel):
 
 
 # ==========================================
-# ログ管理
+# ジョブ参照
 # ==========================================
 
-def add_log(level: str, message: str, agent: str = None, details: Dict = None):
-    """ログを追加"""
-    log_entry = {
-        "timestamp": datetime.now().strftime("%H:%M:%S.%f")[:-3],
-        "level": level,
-        "agent": agent,
-        "message": message,
-        "details": details or {}
-    }
-    current_logs.append(log_entry)
-    print(f"[{log_entry['timestamp']}] {level.upper()}: {message}")  # サーバーログ
+def get_job_or_404(job_id: str) -> Job:
+    """ジョブを取得（存在しなければ404）"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
 
 
-def update_agent_status(agent: str, status: str, progress: int = 0):
-    """エージェントステータスを更新"""
-    if agent in current_status:
-        current_status[agent]["status"] = status
-        current_status[agent]["progress"] = progress
+def stream_job(job: Job, request: Request, last_event_id: Optional[str]) -> StreamingResponse:
+    """
+    ジョブのログ・ステータスを SSE で配信
 
+    接続時に保持しているログ（Last-Event-ID があればそれ以降）と現在のステータスを送り、
+    以降は変更があったときだけ配信する。変更がない間はハートビートのみ。
+    """
+    resume_from = parse_last_event_id(
+        request.headers.get("last-event-id", last_event_id)
+    )
 
-def add_transaction(agent: str, amount: float, address: str, tx_hash: str):
-    """トランザクション履歴を追加"""
-    transactions.append({
-        "timestamp": datetime.now().isoformat(),
-        "agent": agent,
-        "amount": amount,
-        "address": address,
-        "tx_hash": tx_hash,
-        "status": "completed"
-    })
+    return StreamingResponse(
+        job.hub.stream_events(resume_from, snapshot=job.status_event),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        }
+    )
 
 
 def get_jpyc_balance(address: str) -> int:
@@ -158,34 +181,68 @@ def root():
     }
 
 
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus 形式のメトリクス"""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/api/status")
 def get_status():
-    """現在のエージェントステータスを取得"""
+    """最新ジョブのエージェントステータスを取得"""
+    job = job_manager.latest()
     return {
-        "agents": current_status,
-        "total_transactions": len(transactions)
+        "job_id": job.job_id if job else None,
+        "agents": job.agents if job else IDLE_STATUS,
+        "total_transactions": len(job.transactions) if job else 0,
+        "running_jobs": job_manager.count("running"),
+        "queued_jobs": job_manager.count("queued"),
     }
 
 
 @app.get("/api/transactions")
 def get_transactions():
-    """トランザクション履歴を取得"""
+    """最新ジョブのトランザクション履歴を取得"""
+    job = job_manager.latest()
     return {
-        "transactions": transactions
+        "transactions": job.transactions if job else []
     }
 
 
 @app.get("/api/logs")
 def get_logs(limit: int = 100):
-    """ログを取得"""
+    """最新ジョブのログを取得"""
+    job = job_manager.latest()
     return {
-        "logs": current_logs[-limit:]
+        "logs": job.to_dict(log_limit=limit)["logs"] if job else []
     }
 
 
+@app.get("/api/jobs")
+def list_jobs():
+    """ジョブ一覧を取得（新しい順、ログは含まない）"""
+    return {
+        "jobs": [job.to_dict(log_limit=0) for job in job_manager.list()]
+    }
+
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str, log_limit: int = 100):
+    """ジョブの状態・ステータス・トランザクション・ログを取得"""
+    return get_job_or_404(job_id).to_dict(log_limit=log_limit)
+
+
+@app.get("/api/jobs/{job_id}/stream")
+async def stream_job_logs(job_id: str, request: Request, last_event_id: Optional[str] = None):
+    """ジョブのログ・ステータスを Server-Sent Events (SSE) でストリーミング"""
+    return stream_job(get_job_or_404(job_id), request, last_event_id)
+
+
 @app.get("/api/agents")
 def get_agents():
-    """エージェント情報とウォレット残高を取得"""
+    """エージェント情報とウォレット残高を取得（ステータスは最新ジョブ）"""
+    job = job_manager.latest()
+    current_status = job.agents if job else IDLE_STATUS
     agent_wallets = {
         "demand_forecast": os.getenv("AGENT_DEMAND_FORECAST_ADDRESS"),
         "inventory_optimizer": os.getenv("AGENT_INVENTORY_OPTIMIZER_ADDRESS"),
@@ -218,69 +275,53 @@ def get_agents():
 async def optimize(request: OptimizationRequest):
     """
     最適化タスクを実行
-    非同期でエージェントを実行し、タスクIDを返す
+    ジョブとして受け付けてバックグラウンドで実行し、ジョブIDを返す
+    （同時実行数の上限を超えた分は待機、待機数も上限なら429）
     """
-    # ログとステータスをリセット
-    current_logs.clear()
-    for agent in current_status:
-        update_agent_status(agent, "idle", 0)
-    transactions.clear()
-
-    add_log("info", f"🚀 最適化タスク開始")
-    add_log("info", f"   商品: {request.product_sku}")
-    add_log("info", f"   店舗: {request.store_id}")
-    add_log("info", f"   天気: {request.weather}, タイプ: {request.day_type}")
+    try:
+        job = job_manager.submit(
+            request.model_dump(), lambda job: run_optimization_task(job, request)
+        )
+    except JobLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
 
-    # バックグラウンドでタスクを実行
-    asyncio.create_task(run_optimization_task(request))
+    job.add_log("info", f"🚀 最適化タスク開始")
+    job.add_log("info", f"   商品: {request.product_sku}")
+    job.add_log("info", f"   店舗: {request.store_id}")
+    job.add_log("info", f"   天気: {request.weather}, タイプ: {request.day_type}")
 
     return {
         "status": "started",
-        "message": "最適化タスクを開始しました。/api/logs/stream でリアルタイムログを確認できます。"
+        "job_id": job.job_id,
+        "state": job.state,
+        "message": f"最適化タスクを開始しました。/api/jobs/{job.job_id}/stream でリアルタイムログを確認できます。"
     }
 
 
 @app.get("/api/logs/stream")
-async def stream_logs():
+async def stream_logs(request: Request, last_event_id: Optional[str] = None):
     """
-    Server-Sent Events (SSE) でリアルタイムログをストリーミング
+    最新ジョブのログを Server-Sent Events (SSE) でストリーミング
+    （ジョブを指定する場合は /api/jobs/{job_id}/stream）
     """
-    async def log_generator() -> AsyncGenerator[str, None]:
-        """ログを生成"""
-        last_log_count = 0
-
-        while True:
-            # 新しいログがあるか確認
-            if len(current_logs) > last_log_count:
-                new_logs = current_logs[last_log_count:]
-                for log in new_logs:
-                    # SSE形式で送信
-                    yield f"data: {json.dumps(log)}\n\n"
-                last_log_count = len(current_logs)
-
-            # ステータス更新も送信
-            yield f"data: {json.dumps({'type': 'status', 'data': current_status})}\n\n"
-
-            await asyncio.sleep(0.5)  # 0.5秒ごとにポーリング
-
-    return StreamingResponse(
-        log_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-        }
-    )
+    job = job_manager.latest()
+    if job is None:
+        raise HTTPException(status_code=404, detail="No optimization job has been started")
+    return stream_job(job, request, last_event_id)
 
 
 # ==========================================
 # エージェント協調制御（モック実装）
 # ==========================================
 
-async def run_optimization_task(request: OptimizationRequest):
+async def run_optimization_task(job: Job, request: OptimizationRequest):
     """
     最適化タスクを実行
     実際のブロックチェーン決済を実行（LLM推論はモック）
+
+    Args:
+        job: ログ・ステータス・トランザクションを記録するジョブ
+        request: 最適化リクエスト
     """
     try:
         # エージェントウォレット
@@ -292,67 +333,73 @@ async def run_optimization_task(request: OptimizationRequest):
 
         # BlockchainService初期化
         if not BLOCKCHAIN_AVAILABLE:
-            add_log("error", "❌ Blockchain service not available")
+            job.add_log("error", "❌ Blockchain service not available")
+            job.fail("Blockchain service not available")
             return
 
-        blockchain_service = get_blockchain_service()
-        add_log("info", f"✅ Blockchain接続成功 (Chain ID: {blockchain_service.w3.eth.chain_id})")
+        # RPC 呼び出しはスレッドプールで実行（SSE 配信や他のリクエストを止めない）
+        blockchain_service = await get_async_blockchain_service()
+        chain_id = await blockchain_service.get_chain_id()
+        job.add_log("info", f"✅ Blockchain接続成功 (Chain ID: {chain_id})")
 
         # 残高確認
-        balance = blockchain_service.get_balance()
-        add_log("info", f"   Deployer残高: {balance['jpyc_balance']:,} JPYC")
+        balance = await blockchain_service.get_balance()
+        job.add_log("info", f"   Deployer残高: {balance['jpyc_balance']:,} JPYC")
 
         # ==========================================
         # Phase 1: 需要予測エージェント
         # ==========================================
-        add_log("info", "📊 Phase 1: 需要予測エージェント", agent="demand_forecast")
-        update_agent_status("demand_forecast", "running", 10)
+        job.add_log("info", "📊 Phase 1: 需要予測エージェント", agent="demand_forecast")
+        phase_start = time.perf_counter()
+        job.update_agent_status("demand_forecast", "running", 10)
 
         await asyncio.sleep(1)
 
-        add_log("info", "   LLMモデル準備中...", agent="demand_forecast")
-        update_agent_status("demand_forecast", "running", 30)
+        job.add_log("info", "   LLMモデル準備中...", agent="demand_forecast")
+        job.update_agent_status("demand_forecast", "running", 30)
 
         # 実際のLLMエージェント実行（モック）
         await asyncio.sleep(2)
-        add_log("success", "   ✅ LLM推論完了", agent="demand_forecast")
-        update_agent_status("demand_forecast", "running", 60)
+        job.add_log("success", "   ✅ LLM推論完了", agent="demand_forecast")
+        job.update_agent_status("demand_forecast", "running", 60)
 
         # 決済処理（実ブロックチェーン）
-        add_log("payment", f"💰 決済処理開始: 3 JPYC", agent="demand_forecast")
-        add_log("info", f"   送信先: {agent_wallets['demand_forecast']}", agent="demand_forecast")
+        job.add_log("payment", f"💰 決済処理開始: 3 JPYC", agent="demand_forecast")
+        job.add_log("info", f"   送信先: {agent_wallets['demand_forecast']}", agent="demand_forecast")
 
         # 実際のJPYC送金
         try:
-            tx_hash = blockchain_service.transfer_jpyc(
+            tx_hash = await blockchain_service.transfer_jpyc(
                 to_address=agent_wallets['demand_forecast'],
                 amount=3  # 3 JPYC (Wei単位で送信される)
             )
-            add_log("info", f"   トランザクション送信中...", agent="demand_forecast")
-            add_log("info", f"   TX: {tx_hash}", agent="demand_forecast")
+            job.add_log("info", f"   トランザクション送信中...", agent="demand_forecast")
+            job.add_log("info", f"   TX: {tx_hash}", agent="demand_forecast")
 
             # トランザクション確認待ち（非同期）
             await asyncio.sleep(3)  # Polygon Amoyは約2-3秒
 
-            add_log("transaction", f"✅ トランザクション成功", agent="demand_forecast", details={
+            job.add_log("transaction", f"✅ トランザクション成功", agent="demand_forecast", details={
                 "tx_hash": tx_hash,
                 "amount": 3,
                 "address": agent_wallets['demand_forecast'],
                 "explorer": f"https://amoy.polygonscan.com/tx/{tx_hash}"
             })
 
-            add_transaction(
+            job.add_transaction(
                 agent="需要予測エージェント",
                 amount=3,
                 address=agent_wallets['demand_forecast'],
                 tx_hash=tx_hash
             )
         except Exception as e:
-            add_log("error", f"❌ 決済エラー: {str(e)}", agent="demand_forecast")
-            update_agent_status("demand_forecast", "error", 0)
+            job.add_log("error", f"❌ 決済エラー: {str(e)}", agent="demand_forecast")
+            job.update_agent_status("demand_forecast", "error", 0)
+            job.fail(f"Payment failed: {e}")
+            metrics.observe_agent("demand_forecast", time.perf_counter() - phase_start, 0, False)
             return
 
-        update_agent_status("demand_forecast", "running", 80)
+        job.update_agent_status("demand_forecast", "running", 80)
 
         # 結果
         forecast_result = {
@@ -361,65 +408,69 @@ async def run_optimization_task(request: OptimizationRequest):
             "model": "moving_average_7d"
         }
 
-        add_log("success", f"📈 需要予測結果: {forecast_result['predicted_demand']} 個",
+        job.add_log("success", f"📈 需要予測結果: {forecast_result['predicted_demand']} 個",
                 agent="demand_forecast", details=forecast_result)
-        update_agent_status("demand_forecast", "completed", 100)
+        job.update_agent_status("demand_forecast", "completed", 100)
+        metrics.observe_agent("demand_forecast", time.perf_counter() - phase_start, 3, True)
 
         await asyncio.sleep(1)
 
         # ==========================================
         # Phase 2: 在庫最適化エージェント
         # ==========================================
-        add_log("info", "📦 Phase 2: 在庫最適化エージェント", agent="inventory_optimizer")
-        update_agent_status("inventory_optimizer", "running", 10)
+        job.add_log("info", "📦 Phase 2: 在庫最適化エージェント", agent="inventory_optimizer")
+        phase_start = time.perf_counter()
+        job.update_agent_status("inventory_optimizer", "running", 10)
 
         await asyncio.sleep(1)
 
-        add_log("info", "   需要予測データを受信", agent="inventory_optimizer")
-        add_log("info", f"   予測需要: {forecast_result['predicted_demand']} 個",
+        job.add_log("info", "   需要予測データを受信", agent="inventory_optimizer")
+        job.add_log("info", f"   予測需要: {forecast_result['predicted_demand']} 個",
                 agent="inventory_optimizer")
-        update_agent_status("inventory_optimizer", "running", 30)
+        job.update_agent_status("inventory_optimizer", "running", 30)
 
         # LLM推論
         await asyncio.sleep(2)
-        add_log("success", "   ✅ 最適化計算完了", agent="inventory_optimizer")
-        update_agent_status("inventory_optimizer", "running", 60)
+        job.add_log("success", "   ✅ 最適化計算完了", agent="inventory_optimizer")
+        job.update_agent_status("inventory_optimizer", "running", 60)
 
         # 決済処理（実ブロックチェーン）
-        add_log("payment", f"💰 決済処理開始: 15 JPYC", agent="inventory_optimizer")
-        add_log("info", f"   送信先: {agent_wallets['inventory_optimizer']}",
+        job.add_log("payment", f"💰 決済処理開始: 15 JPYC", agent="inventory_optimizer")
+        job.add_log("info", f"   送信先: {agent_wallets['inventory_optimizer']}",
                 agent="inventory_optimizer")
 
         # 実際のJPYC送金
         try:
-            tx_hash2 = blockchain_service.transfer_jpyc(
+            tx_hash2 = await blockchain_service.transfer_jpyc(
                 to_address=agent_wallets['inventory_optimizer'],
                 amount=15  # 15 JPYC
             )
-            add_log("info", f"   トランザクション送信中...", agent="inventory_optimizer")
-            add_log("info", f"   TX: {tx_hash2}", agent="inventory_optimizer")
+            job.add_log("info", f"   トランザクション送信中...", agent="inventory_optimizer")
+            job.add_log("info", f"   TX: {tx_hash2}", agent="inventory_optimizer")
 
             await asyncio.sleep(3)
 
-            add_log("transaction", f"✅ トランザクション成功", agent="inventory_optimizer", details={
+            job.add_log("transaction", f"✅ トランザクション成功", agent="inventory_optimizer", details={
                 "tx_hash": tx_hash2,
                 "amount": 15,
                 "address": agent_wallets['inventory_optimizer'],
                 "explorer": f"https://amoy.polygonscan.com/tx/{tx_hash2}"
             })
 
-            add_transaction(
+            job.add_transaction(
                 agent="在庫最適化エージェント",
                 amount=15,
                 address=agent_wallets['inventory_optimizer'],
                 tx_hash=tx_hash2
             )
         except Exception as e:
-            add_log("error", f"❌ 決済エラー: {str(e)}", agent="inventory_optimizer")
-            update_agent_status("inventory_optimizer", "error", 0)
+            job.add_log("error", f"❌ 決済エラー: {str(e)}", agent="inventory_optimizer")
+            job.update_agent_status("inventory_optimizer", "error", 0)
+            job.fail(f"Payment failed: {e}")
+            metrics.observe_agent("inventory_optimizer", time.perf_counter() - phase_start, 0, False)
             return
 
-        update_agent_status("inventory_optimizer", "running", 80)
+        job.update_agent_status("inventory_optimizer", "running", 80)
 
         # 結果
         optimization_result = {
@@ -429,59 +480,63 @@ async def run_optimization_task(request: OptimizationRequest):
             "total_cost": 33600
         }
 
-        add_log("success", f"📦 推奨発注量: {optimization_result['recommended_order']} 個",
+        job.add_log("success", f"📦 推奨発注量: {optimization_result['recommended_order']} 個",
                 agent="inventory_optimizer", details=optimization_result)
-        update_agent_status("inventory_optimizer", "completed", 100)
+        job.update_agent_status("inventory_optimizer", "completed", 100)
+        metrics.observe_agent("inventory_optimizer", time.perf_counter() - phase_start, 15, True)
 
         await asyncio.sleep(1)
 
         # ==========================================
         # Phase 3: レポート生成エージェント
         # ==========================================
-        add_log("info", "📄 Phase 3: レポート生成エージェント", agent="report_generator")
-        update_agent_status("report_generator", "running", 10)
+        job.add_log("info", "📄 Phase 3: レポート生成エージェント", agent="report_generator")
+        phase_start = time.perf_counter()
+        job.update_agent_status("report_generator", "running", 10)
 
         await asyncio.sleep(1)
 
-        add_log("info", "   最適化結果を集計中...", agent="report_generator")
-        update_agent_status("report_generator", "running", 40)
+        job.add_log("info", "   最適化結果を集計中...", agent="report_generator")
+        job.update_agent_status("report_generator", "running", 40)
 
         await asyncio.sleep(2)
-        add_log("success", "   ✅ レポート生成完了", agent="report_generator")
-        update_agent_status("report_generator", "running", 70)
+        job.add_log("success", "   ✅ レポート生成完了", agent="report_generator")
+        job.update_agent_status("report_generator", "running", 70)
 
         # 決済処理（実ブロックチェーン）
-        add_log("payment", f"💰 決済処理開始: 5 JPYC", agent="report_generator")
-        add_log("info", f"   送信先: {agent_wallets['report_generator']}",
+        job.add_log("payment", f"💰 決済処理開始: 5 JPYC", agent="report_generator")
+        job.add_log("info", f"   送信先: {agent_wallets['report_generator']}",
                 agent="report_generator")
 
         # 実際のJPYC送金
         try:
-            tx_hash3 = blockchain_service.transfer_jpyc(
+            tx_hash3 = await blockchain_service.transfer_jpyc(
                 to_address=agent_wallets['report_generator'],
                 amount=5  # 5 JPYC
             )
-            add_log("info", f"   トランザクション送信中...", agent="report_generator")
-            add_log("info", f"   TX: {tx_hash3}", agent="report_generator")
+            job.add_log("info", f"   トランザクション送信中...", agent="report_generator")
+            job.add_log("info", f"   TX: {tx_hash3}", agent="report_generator")
 
             await asyncio.sleep(3)
 
-            add_log("transaction", f"✅ トランザクション成功", agent="report_generator", details={
+            job.add_log("transaction", f"✅ トランザクション成功", agent="report_generator", details={
                 "tx_hash": tx_hash3,
                 "amount": 5,
                 "address": agent_wallets['report_generator'],
                 "explorer": f"https://amoy.polygonscan.com/tx/{tx_hash3}"
             })
 
-            add_transaction(
+            job.add_transaction(
                 agent="レポート生成エージェント",
                 amount=5,
                 address=agent_wallets['report_generator'],
                 tx_hash=tx_hash3
             )
         except Exception as e:
-            add_log("error", f"❌ 決済エラー: {str(e)}", agent="report_generator")
-            update_agent_status("report_generator", "error", 0)
+            job.add_log("error", f"❌ 決済エラー: {str(e)}", agent="report_generator")
+            job.update_agent_status("report_generator", "error", 0)
+            job.fail(f"Payment failed: {e}")
+            metrics.observe_agent("report_generator", time.perf_counter() - phase_start, 0, False)
             return
 
         # レポート結果
@@ -498,42 +553,44 @@ async def run_optimization_task(request: OptimizationRequest):
             "total_cost": f"{total_cost} JPYC"
         }
 
-        add_log("success", f"📊 レポート生成完了", agent="report_generator", details=report_result)
-        add_log("info", f"   需要予測精度: {report_result['forecast_accuracy']}", agent="report_generator")
-        add_log("info", f"   推奨発注量: {report_result['recommended_order']}個", agent="report_generator")
-        add_log("info", f"   予想粗利: ¥{report_result['expected_gross_profit']:,}", agent="report_generator")
-        add_log("info", f"   予想ロス率: {report_result['expected_loss_rate']} (従来12% → 目標達成)", agent="report_generator")
-        add_log("info", f"   コスト削減効果: ¥{report_result['cost_reduction']:,}/日", agent="report_generator")
+        job.add_log("success", f"📊 レポート生成完了", agent="report_generator", details=report_result)
+        job.add_log("info", f"   需要予測精度: {report_result['forecast_accuracy']}", agent="report_generator")
+        job.add_log("info", f"   推奨発注量: {report_result['recommended_order']}個", agent="report_generator")
+        job.add_log("info", f"   予想粗利: ¥{report_result['expected_gross_profit']:,}", agent="report_generator")
+        job.add_log("info", f"   予想ロス率: {report_result['expected_loss_rate']} (従来12% → 目標達成)", agent="report_generator")
+        job.add_log("info", f"   コスト削減効果: ¥{report_result['cost_reduction']:,}/日", agent="report_generator")
 
-        update_agent_status("report_generator", "completed", 100)
+        job.update_agent_status("report_generator", "completed", 100)
+        metrics.observe_agent("report_generator", time.perf_counter() - phase_start, 5, True)
 
         # ==========================================
         # 完了
         # ==========================================
         await asyncio.sleep(1)
-        add_log("success", f"🎉 すべてのエージェント実行完了！")
-        add_log("info", f"   総決済額: {total_cost} JPYC")
-        add_log("info", f"   トランザクション数: {len(transactions)}")
-        add_log("info", f"   実行時間: 約45秒")
+        job.add_log("success", f"🎉 すべてのエージェント実行完了！")
+        job.add_log("info", f"   総決済額: {total_cost} JPYC")
+        job.add_log("info", f"   トランザクション数: {len(job.transactions)}")
+        job.add_log("info", f"   実行時間: 約45秒")
 
         # 最終残高確認
-        final_balance = blockchain_service.get_balance()
-        add_log("info", f"   Deployer残高（決済後）: {final_balance['jpyc_balance']:,} JPYC")
+        final_balance = await blockchain_service.get_balance()
+        job.add_log("info", f"   Deployer残高（決済後）: {final_balance['jpyc_balance']:,} JPYC")
 
         # タスク完了通知（フロントエンド用）
-        current_logs.append({
+        job.publish_log({
             "type": "task_complete",
             "timestamp": datetime.now().strftime("%H:%M:%S.%f")[:-3],
             "message": "Task completed successfully"
         })
 
     except Exception as e:
-        add_log("error", f"❌ エラー: {str(e)}")
-        for agent in current_status:
-            update_agent_status(agent, "error", 0)
+        job.add_log("error", f"❌ エラー: {str(e)}")
+        job.fail(str(e))
+        for agent in job.agents:
+            job.update_agent_status(agent, "error", 0)
 
         # エラー時も完了通知
-        current_logs.append({
+        job.publish_log({
             "type": "task_complete",
             "timestamp": datetime.now().strftime("%H:%M:%S.%f")[:-3],
             "message": "Task failed"
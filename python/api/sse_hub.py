@@ -0,0 +1,203 @@
+"""
+SSE ブロードキャストハブ
+
+ログ・ステータスのイベントを発生時に1回だけ SSE フレームに変換し、
+購読者ごとの asyncio.Queue に配る。購読者はキューを待つだけなので、
+イベントがない間は一定間隔のハートビート（SSE コメント行）だけを送る。
+
+各イベントには連番の id を付け、直近のイベントを保持する。再接続時に
+Last-Event-ID を受け取ると、それより後のイベントだけを再送する。
+キューがあふれた購読者（読み出しが遅いクライアント）は切断し、
+再接続時に Last-Event-ID から再開させる。
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Set, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_FRAME = ": heartbeat\n\n"
+
+
+@dataclass(eq=False)
+class Subscriber:
+    """購読者（1つのSSE接続）"""
+
+    queue: asyncio.Queue
+    dropped: bool = False
+
+
+def format_event(data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    """
+    SSE フレームに変換
+
+    Args:
+        data: イベント本文（JSON で送る）
+        event_id: イベントID（Noneの場合は id 行を付けない）
+
+    Returns:
+        str: SSE フレーム
+    """
+    payload = json.dumps(data, ensure_ascii=False)
+    if event_id is None:
+        return f"data: {payload}\n\n"
+    return f"id: {event_id}\ndata: {payload}\n\n"
+
+
+class SSEHub:
+    """SSE ブロードキャストハブ"""
+
+    def __init__(
+        self,
+        stream: str = "logs",
+        queue_size: int = 256,
+        history_size: int = 1000,
+        heartbeat_seconds: float = 15.0,
+    ):
+        """
+        Args:
+            stream: メトリクスのラベルに使うストリーム名
+            queue_size: 購読者ごとに溜められるフレーム数（超えたら切断）
+            history_size: Last-Event-ID での再送用に保持するイベント数
+            heartbeat_seconds: イベントがないときにハートビートを送る間隔（秒）
+        """
+        self.stream = stream
+        self.queue_size = queue_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self._history: Deque[Tuple[int, str]] = deque(maxlen=history_size)
+        self._subscribers: Set[Subscriber] = set()
+        self._last_id = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def last_event_id(self) -> int:
+        return self._last_id
+
+    def publish(self, data: Dict[str, Any], retain: bool = True) -> int:
+        """
+        イベントを全購読者に配信
+
+        イベントループ外のスレッドから呼ばれた場合は、ループのスレッドで配信する。
+
+        Args:
+            data: イベント本文
+            retain: 再送用の履歴に残すか（最新値だけが意味を持つステータスは残さない）
+
+        Returns:
+            int: 割り当てたイベントID
+        """
+        with self._lock:
+            self._last_id += 1
+            event_id = self._last_id
+            frame = format_event(data, event_id)
+            if retain:
+                self._history.append((event_id, frame))
+
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return event_id
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(frame)
+        else:
+            loop.call_soon_threadsafe(self._deliver, frame)
+        return event_id
+
+    def reset(self) -> None:
+        """再送用の履歴を破棄（イベントIDは続き番号のまま）"""
+        with self._lock:
+            self._history.clear()
+
+    def _deliver(self, frame: str) -> None:
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+
+    def _drop(self, subscriber: Subscriber) -> None:
+        """読み出しが追いつかない購読者を切断（溜まったフレームを捨てて終了を通知）"""
+        self._subscribers.discard(subscriber)
+        subscriber.dropped = True
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+        metrics.SSE_DROPPED_SUBSCRIBERS_TOTAL.labels(stream=self.stream).inc()
+        logger.warning(f"Dropped slow SSE subscriber on {self.stream}")
+
+    async def stream_events(
+        self,
+        last_event_id: Optional[int] = None,
+        snapshot: Optional[Callable[[], Dict[str, Any]]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        1つの接続に送る SSE フレームを生成
+
+        履歴のうち last_event_id より後のイベント（未指定なら保持している全件）、
+        snapshot の現在値の順に送り、その後は配信されたイベントを送る。
+
+        Args:
+            last_event_id: クライアントが最後に受け取ったイベントID（Last-Event-ID）
+            snapshot: 接続時に1回送る現在値（ステータスなど）を返す関数
+
+        Yields:
+            str: SSE フレーム
+        """
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(asyncio.Queue(maxsize=self.queue_size))
+
+        # 登録と履歴の取得の間に await を挟まないので、イベントの取りこぼし・重複はない
+        self._subscribers.add(subscriber)
+        with self._lock:
+            replay = [
+                frame
+                for event_id, frame in self._history
+                if last_event_id is None or event_id > last_event_id
+            ]
+        metrics.SSE_SUBSCRIBERS.labels(stream=self.stream).inc()
+
+        try:
+            for frame in replay:
+                yield frame
+            if snapshot is not None:
+                yield format_event(snapshot())
+
+            while True:
+                try:
+                    frame = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=self.heartbeat_seconds
+                    )
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT_FRAME
+                    continue
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            # 切断時（ジェネレータのクローズ・キャンセル）
+            self._subscribers.discard(subscriber)
+            metrics.SSE_SUBSCRIBERS.labels(stream=self.stream).dec()
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    """Last-Event-ID ヘッダ・クエリの値を整数に変換（不正な値は None）"""
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
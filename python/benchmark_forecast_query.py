@@ -0,0 +1,409 @@
+"""
+予測クエリのベンチマーク
+
+ローカルの PostgreSQL に合成POSデータを投入し、DemandForecastAgent._fetch_pos_data の
+クエリ（1系列・複数系列）と pos_sales の生データ読み出しを繰り返し実行して、
+レイテンシ（p50/p99）と EXPLAIN (ANALYZE, BUFFERS) のバッファヒット・ヒープフェッチを報告する。
+
+合成データの店舗・商品は BENCH- / bench- の接頭辞を持ち、--cleanup で削除できる。
+
+Usage:
+    python benchmark_forecast_query.py --rows 5 --iterations 2000
+    python benchmark_forecast_query.py --skip-seed --json results.json
+    python benchmark_forecast_query.py --cleanup
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from agents.demand_forecast import FORECAST_BATCH_QUERY, FORECAST_QUERY
+
+logger = logging.getLogger(__name__)
+
+STORE_PREFIX = "BENCH-S"
+SKU_PREFIX = "bench-sku-"
+
+# pos_sales の生データを読むクエリ（日次集計を使わない場合の読み出し）
+RAW_QUERY = text(
+    """
+    SELECT
+        date,
+        sales_quantity,
+        price,
+        day_of_week,
+        is_holiday
+    FROM pos_sales
+    WHERE product_sku = :product_sku
+      AND store_id = :store_id
+      AND date >= :start_date
+      AND date <= :end_date
+    ORDER BY date DESC
+"""
+)
+
+# 1回のINSERTで投入する行数
+SEED_BATCH_ROWS = 1_000_000
+
+
+def seed(engine, rows: int, stores: int, skus: int, days: int) -> None:
+    """
+    合成POSデータを投入し、日次集計の更新と VACUUM ANALYZE まで行う
+
+    行は (店舗 × 商品) の系列に順に割り当て（全系列に行がある）、各系列は今日から
+    遡って最大 days 日に分布する。rows が系列数 × days を超えた分は同じ日に重なる。
+
+    Args:
+        engine: SQLAlchemyエンジン
+        rows: 投入行数
+        stores: 店舗数
+        skus: 商品数
+        days: データの日数
+    """
+    from database import ensure_partitions
+
+    today = date.today()
+    with engine.connect() as conn:
+        conn.execute(
+            text(
+                """
+                INSERT INTO stores (store_id, store_name, latitude, longitude)
+                SELECT :prefix || lpad(i::text, 4, '0'), 'Benchmark store ' || i, 35.0, 139.0
+                FROM generate_series(1, :stores) AS i
+                ON CONFLICT (store_id) DO NOTHING
+                """
+            ),
+            {"prefix": STORE_PREFIX, "stores": stores},
+        )
+        conn.execute(
+            text(
+                """
+                INSERT INTO products (product_sku, product_name, category, shelf_life_days)
+                SELECT :prefix || lpad(i::text, 5, '0'), 'Benchmark product ' || i, 'benchmark', 3
+                FROM generate_series(1, :skus) AS i
+                ON CONFLICT (product_sku) DO NOTHING
+                """
+            ),
+            {"prefix": SKU_PREFIX, "skus": skus},
+        )
+        conn.commit()
+
+    from sqlalchemy.orm import Session
+
+    with Session(engine) as db:
+        ensure_partitions(db, today - timedelta(days=days), today)
+
+    insert = text(
+        """
+        INSERT INTO pos_sales (
+            date, store_id, product_sku, sales_quantity, price, day_of_week, is_holiday
+        )
+        SELECT
+            d,
+            :store_prefix || lpad((s % :stores + 1)::text, 4, '0'),
+            :sku_prefix || lpad((s / :stores + 1)::text, 5, '0'),
+            1 + (random() * 40)::INTEGER,
+            198.00,
+            EXTRACT(DOW FROM d)::INTEGER,
+            EXTRACT(DOW FROM d) IN (0, 6)
+        FROM (
+            SELECT
+                g % (:stores * :skus) AS s,
+                CAST(:today AS DATE) - ((g / (:stores * :skus)) % :days)::INTEGER AS d
+            FROM generate_series(CAST(:first AS BIGINT), CAST(:last AS BIGINT)) AS g
+        ) AS rows
+        """
+    )
+
+    start_time = time.perf_counter()
+    for first in range(0, rows, SEED_BATCH_ROWS):
+        last = min(first + SEED_BATCH_ROWS, rows) - 1
+        with engine.connect() as conn:
+            conn.execute(
+                insert,
+                {
+                    "store_prefix": STORE_PREFIX,
+                    "sku_prefix": SKU_PREFIX,
+                    "stores": stores,
+                    "skus": skus,
+                    "days": days,
+                    "today": today,
+                    "first": first,
+                    "last": last,
+                },
+            )
+            conn.commit()
+        logger.info(f"Seeded {last + 1:,}/{rows:,} rows")
+
+    with engine.connect() as conn:
+        refreshed = conn.execute(
+            text("SELECT COALESCE(SUM(days_refreshed), 0) FROM refresh_pos_sales_daily()")
+        ).scalar_one()
+        conn.commit()
+    logger.info(f"Refreshed {refreshed:,} daily aggregates")
+
+    # index-only scan には visibility map が必要
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM ANALYZE pos_sales"))
+        conn.execute(text("VACUUM ANALYZE pos_sales_daily"))
+
+    logger.info(f"Seeding completed in {time.perf_counter() - start_time:.1f}s")
+
+
+def cleanup(engine) -> None:
+    """合成データを削除"""
+    with engine.connect() as conn:
+        for table in ("pos_sales_daily", "pos_sales", "inventory_snapshots"):
+            conn.execute(
+                text(f"DELETE FROM {table} WHERE store_id LIKE :prefix"),
+                {"prefix": STORE_PREFIX + "%"},
+            )
+        conn.execute(
+            text("DELETE FROM stores WHERE store_id LIKE :prefix"),
+            {"prefix": STORE_PREFIX + "%"},
+        )
+        conn.execute(
+            text("DELETE FROM products WHERE product_sku LIKE :prefix"),
+            {"prefix": SKU_PREFIX + "%"},
+        )
+        conn.commit()
+    logger.info("Removed benchmark data")
+
+
+def _walk_plan(node: Dict[str, Any], stats: Dict[str, Any]) -> None:
+    """EXPLAIN (FORMAT JSON) のプランノードを再帰的に集計"""
+    node_type = node["Node Type"]
+    stats["node_types"][node_type] = stats["node_types"].get(node_type, 0) + 1
+    if "Index Name" in node:
+        stats["indexes"].add(node["Index Name"])
+    stats["heap_fetches"] += node.get("Heap Fetches", 0)
+    for child in node.get("Plans", []):
+        _walk_plan(child, stats)
+
+
+def explain(conn, query, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    EXPLAIN (ANALYZE, BUFFERS) でプランとバッファ使用量を取得
+
+    Args:
+        conn: SQLAlchemy接続
+        query: 対象クエリ
+        params: バインドパラメータ
+
+    Returns:
+        Dict: node_types, indexes, heap_fetches, shared_hit, shared_read
+    """
+    plan = conn.execute(
+        text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query.text), params
+    ).scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]["Plan"]
+
+    stats: Dict[str, Any] = {"node_types": {}, "indexes": set(), "heap_fetches": 0}
+    _walk_plan(root, stats)
+    stats["shared_hit"] = root.get("Shared Hit Blocks", 0)
+    stats["shared_read"] = root.get("Shared Read Blocks", 0)
+    return stats
+
+
+def _series(stores: int, skus: int) -> List[Tuple[str, str]]:
+    return [
+        (f"{SKU_PREFIX}{sku:05d}", f"{STORE_PREFIX}{store:04d}")
+        for sku in range(1, skus + 1)
+        for store in range(1, stores + 1)
+    ]
+
+
+def run_benchmark(
+    engine,
+    stores: int,
+    skus: int,
+    iterations: int,
+    batch_size: int,
+    window_days: int,
+    explain_samples: int,
+    seed_value: int = 0,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    クエリミックスを実行してレイテンシとバッファ使用量を集計
+
+    1系列クエリ（FORECAST_QUERY）、複数系列クエリ（FORECAST_BATCH_QUERY、
+    10回に1回）、生データクエリ（RAW_QUERY）を混ぜて実行する。
+
+    Args:
+        engine: SQLAlchemyエンジン
+        stores: 店舗数
+        skus: 商品数
+        iterations: 1系列クエリの実行回数
+        batch_size: 複数系列クエリの系列数
+        window_days: 予測ウィンドウの日数
+        explain_samples: クエリ種別ごとの EXPLAIN 回数
+        seed_value: 系列選択の乱数シード
+
+    Returns:
+        Dict: クエリ種別ごとの集計結果
+    """
+    rng = random.Random(seed_value)
+    series = _series(stores, skus)
+    today = date.today()
+    window = {"start_date": today - timedelta(days=window_days), "end_date": today}
+
+    def single_params():
+        sku, store = rng.choice(series)
+        return {"product_sku": sku, "store_id": store, **window}
+
+    def batch_params():
+        pairs = rng.sample(series, min(batch_size, len(series)))
+        return {
+            "product_skus": [sku for sku, _ in pairs],
+            "store_ids": [store for _, store in pairs],
+            **window,
+        }
+
+    mix = [
+        ("forecast_single", FORECAST_QUERY, single_params),
+        ("forecast_batch", FORECAST_BATCH_QUERY, batch_params),
+        ("raw_pos_sales", RAW_QUERY, single_params),
+    ]
+    latencies: Dict[str, List[float]] = {name: [] for name, _, _ in mix}
+    rows: Dict[str, int] = {name: 0 for name, _, _ in mix}
+
+    with engine.connect() as conn:
+        # ウォームアップ
+        for _, query, make_params in mix:
+            conn.execute(query, make_params()).fetchall()
+
+        for i in range(iterations):
+            for name, query, make_params in mix:
+                if name == "forecast_batch" and i % 10:
+                    continue
+                params = make_params()
+                start = time.perf_counter()
+                fetched = conn.execute(query, params).fetchall()
+                latencies[name].append((time.perf_counter() - start) * 1000)
+                rows[name] += len(fetched)
+
+        report: Dict[str, Dict[str, Any]] = {}
+        for name, query, make_params in mix:
+            samples = [explain(conn, query, make_params()) for _ in range(explain_samples)]
+            node_types: Dict[str, int] = {}
+            for sample in samples:
+                for node_type, count in sample["node_types"].items():
+                    node_types[node_type] = node_types.get(node_type, 0) + count
+
+            values = np.asarray(latencies[name])
+            report[name] = {
+                "runs": len(values),
+                "mean_rows": rows[name] / max(len(values), 1),
+                "p50_ms": float(np.percentile(values, 50)),
+                "p99_ms": float(np.percentile(values, 99)),
+                "mean_ms": float(values.mean()),
+                "node_types": node_types,
+                "indexes": sorted(set().union(*(s["indexes"] for s in samples))),
+                "heap_fetches": sum(s["heap_fetches"] for s in samples) / explain_samples,
+                "shared_hit": sum(s["shared_hit"] for s in samples) / explain_samples,
+                "shared_read": sum(s["shared_read"] for s in samples) / explain_samples,
+            }
+
+    return report
+
+
+def print_report(report: Dict[str, Dict[str, Any]]) -> None:
+    """集計結果を表示"""
+    print(
+        f"{'query':<16} {'runs':>6} {'rows':>8} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'hit':>8} {'read':>8} {'heap':>8}"
+    )
+    for name, r in report.items():
+        print(
+            f"{name:<16} {r['runs']:>6} {r['mean_rows']:>8.1f} {r['p50_ms']:>8.3f} "
+            f"{r['p99_ms']:>8.3f} {r['shared_hit']:>8.1f} {r['shared_read']:>8.1f} "
+            f"{r['heap_fetches']:>8.1f}"
+        )
+    print()
+    for name, r in report.items():
+        index_only = r["node_types"].get("Index Only Scan", 0)
+        verdict = "✅ index-only" if index_only and not r["heap_fetches"] else "⚠️  heap access"
+        print(f"{name:<16} {verdict}  nodes={r['node_types']}  indexes={r['indexes']}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    コマンドライン引数を解析
+
+    Args:
+        argv: 引数のリスト（Noneの場合は sys.argv）
+
+    Returns:
+        argparse.Namespace: 解析結果（rows は投入行数に換算済み）
+    """
+    parser = argparse.ArgumentParser(description="予測クエリのレイテンシとバッファ使用量を計測")
+    parser.add_argument("--database-url", help="接続先（省略時は settings.DATABASE_URL）")
+    parser.add_argument("--rows", type=float, default=1.0, help="投入行数（百万行）")
+    parser.add_argument("--stores", type=int, default=50, help="店舗数")
+    parser.add_argument("--skus", type=int, default=200, help="商品数")
+    parser.add_argument("--days", type=int, default=365, help="合成データの日数")
+    parser.add_argument("--window-days", type=int, default=30, help="予測ウィンドウの日数")
+    parser.add_argument("--iterations", type=int, default=1000, help="1系列クエリの実行回数")
+    parser.add_argument("--batch-size", type=int, default=100, help="複数系列クエリの系列数")
+    parser.add_argument("--explain-samples", type=int, default=20, help="EXPLAIN の回数")
+    parser.add_argument("--skip-seed", action="store_true", help="投入済みのデータで計測")
+    parser.add_argument("--cleanup", action="store_true", help="合成データを削除して終了")
+    parser.add_argument("--json", type=Path, help="結果をJSONで書き出すパス")
+    args = parser.parse_args(argv)
+    # 1.001 * 1_000_000 = 1000999.99... のような浮動小数の誤差で1行少なくならないよう丸める
+    args.rows = round(args.rows * 1_000_000)
+    return args
+
+
+def main(argv: Optional[List[str]] = None):
+    """コマンドライン実行"""
+    args = parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+
+    if args.database_url:
+        from sqlalchemy import create_engine
+
+        engine = create_engine(args.database_url)
+    else:
+        from database import engine
+
+    if args.cleanup:
+        cleanup(engine)
+        return
+
+    if not args.skip_seed:
+        seed(engine, args.rows, args.stores, args.skus, args.days)
+
+    report = run_benchmark(
+        engine,
+        stores=args.stores,
+        skus=args.skus,
+        iterations=args.iterations,
+        batch_size=args.batch_size,
+        window_days=args.window_days,
+        explain_samples=args.explain_samples,
+    )
+    print_report(report)
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"\n📄 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -23,12 +23,43 @@ class Settings:
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
 
-    # Redis (Phase 2)
+    # POS partitions
+    POS_PARTITION_MONTHS_AHEAD: int = int(os.getenv("POS_PARTITION_MONTHS_AHEAD", "3"))
+    POS_PARTITION_RETAIN_MONTHS: int = int(os.getenv("POS_PARTITION_RETAIN_MONTHS", "24"))
+
+    # Cache
+    SUPPLIER_CACHE_TTL_SECONDS: float = float(os.getenv("SUPPLIER_CACHE_TTL_SECONDS", "600"))
+    INVENTORY_SNAPSHOT_TTL_SECONDS: float = float(os.getenv("INVENTORY_SNAPSHOT_TTL_SECONDS", "60"))
+    POS_HISTORY_CACHE_DIR: Optional[str] = os.getenv("POS_HISTORY_CACHE_DIR")  # 未設定なら無効
+
+    FORECAST_CACHE_MAX_ENTRIES: int = int(os.getenv("FORECAST_CACHE_MAX_ENTRIES", "10000"))
+    FORECAST_CACHE_TTL_SECONDS: int = int(os.getenv("FORECAST_CACHE_TTL_SECONDS", "86400"))
+    FORECAST_WATERMARK_TTL_SECONDS: float = float(os.getenv("FORECAST_WATERMARK_TTL_SECONDS", "1.0"))
+
+    # Tracing (スパンは常に記録、cProfile / tracemalloc は任意)
+    TRACE_PROFILE: bool = os.getenv("TRACE_PROFILE", "false").lower() == "true"
+    TRACE_MEMORY: bool = os.getenv("TRACE_MEMORY", "false").lower() == "true"
+    TRACE_EXPORT_PATH: Optional[str] = os.getenv("TRACE_EXPORT_PATH")  # 未設定なら書き出さない
+    TRACE_EXPORT_FORMAT: str = os.getenv("TRACE_EXPORT_FORMAT", "json")  # json / otlp
+
+    # Redis (Phase 2, 設定時は予測結果キャッシュを共有)
     REDIS_URL: Optional[str] = os.getenv("REDIS_URL")
 
     # Blockchain (Phase 2)
     ANVIL_RPC_URL: Optional[str] = os.getenv("ANVIL_RPC_URL")
     PRIVATE_KEY: Optional[str] = os.getenv("PRIVATE_KEY")
+    # 送金・残高照会などの RPC 呼び出しを実行するスレッド数（イベントループを止めないため）
+    BLOCKCHAIN_EXECUTOR_WORKERS: int = int(os.getenv("BLOCKCHAIN_EXECUTOR_WORKERS", "4"))
+    GAS_PRICE_TTL_SECONDS: float = float(os.getenv("GAS_PRICE_TTL_SECONDS", "5"))
+    # nonce too low などで弾かれたときに nonce を取り直して再送する回数
+    TRANSFER_NONCE_RETRIES: int = int(os.getenv("TRANSFER_NONCE_RETRIES", "2"))
+
+    # x402 精算台帳（後払い・従量課金は支払先ごとに合算して一括送金）
+    SETTLEMENT_THRESHOLD_JPYC: float = float(os.getenv("SETTLEMENT_THRESHOLD_JPYC", "100"))
+    SETTLEMENT_MAX_AGE_SECONDS: float = float(os.getenv("SETTLEMENT_MAX_AGE_SECONDS", "3600"))
+    SETTLEMENT_MAX_BATCH_SIZE: int = int(os.getenv("SETTLEMENT_MAX_BATCH_SIZE", "200"))
+    # 定期精算の間隔（秒、0 の場合は定期精算しない）
+    SETTLEMENT_INTERVAL_SECONDS: float = float(os.getenv("SETTLEMENT_INTERVAL_SECONDS", "60"))
 
 
 settings = Settings()
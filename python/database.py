@@ -4,11 +4,15 @@
 PostgreSQLへの接続とセッション管理。
 """
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from datetime import date
+from typing import AsyncGenerator, Generator, List, Optional
 import logging
 
 from config import settings
+from partitions import PARTITIONED_TABLES, add_months
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +28,20 @@ engine = create_engine(
 # セッションファクトリ
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 非同期エンジン（asyncpg）
+async_engine = create_async_engine(
+    make_url(settings.DATABASE_URL).set(drivername="postgresql+asyncpg"),
+    pool_size=10,
+    max_overflow=20,
+    pool_pre_ping=True,
+    echo=(settings.LOG_LEVEL == "DEBUG"),
+)
+
+# 非同期セッションファクトリ
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
 
 def get_db() -> Generator[Session, None, None]:
     """
@@ -43,6 +61,125 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    非同期データベースセッションを取得
+
+    Yields:
+        AsyncSession: SQLAlchemy非同期セッション
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception as e:
+            logger.error(f"Database error: {e}")
+            await db.rollback()
+            raise
+
+
+def refresh_daily_sales(db: Session, history_cache=None) -> int:
+    """
+    日次販売集計（pos_sales_daily）を差分更新
+
+    前回の更新以降に追加・更新された pos_sales 行が属する日だけを再集計し、
+    コミット後に締まった日を再集計した (店舗, 月) のPOS履歴キャッシュを破棄する。
+
+    Args:
+        db: SQLAlchemyセッション
+        history_cache: POS履歴キャッシュ（Noneの場合は設定のキャッシュ、未設定なら破棄しない）
+
+    Returns:
+        int: 再集計した (商品, 店舗, 日) の数
+    """
+    refreshed = db.execute(
+        text("SELECT store_id, month, first_date, days_refreshed FROM refresh_pos_sales_daily()")
+    ).all()
+    db.commit()
+
+    if history_cache is None:
+        from agents.pos_history_cache import get_pos_history_cache
+
+        history_cache = get_pos_history_cache()
+    if history_cache is not None:
+        history_cache.invalidate_refreshed(row[:3] for row in refreshed)
+
+    updated = sum(row[3] for row in refreshed)
+    logger.info(f"Refreshed pos_sales_daily: {updated} rows")
+    return updated
+
+
+def ensure_partitions(
+    db: Session, start: date, end: date, tables=PARTITIONED_TABLES
+) -> int:
+    """
+    start から end までの各月のパーティションを作成（作成済みの月は何もしない）
+
+    Args:
+        db: SQLAlchemyセッション
+        start: 最初の月に含まれる日
+        end: 最後の月に含まれる日
+        tables: 対象テーブル
+
+    Returns:
+        int: 対象の月数（テーブルごと）
+    """
+    months = 0
+    for table in tables:
+        months = db.execute(
+            text("SELECT ensure_monthly_partitions(:table, :start, :end)"),
+            {"table": table, "start": start, "end": end},
+        ).scalar_one()
+    db.commit()
+    return months
+
+
+def maintain_partitions(
+    db: Session,
+    months_ahead: Optional[int] = None,
+    retain_months: Optional[int] = None,
+    today: Optional[date] = None,
+) -> List[str]:
+    """
+    パーティションの定期メンテナンス
+
+    months_ahead ヶ月先までのパーティションを作成し、retain_months ヶ月より
+    古いパーティションを切り離す。切り離したテーブルは残るので、アーカイブ後に DROP する。
+
+    Args:
+        db: SQLAlchemyセッション
+        months_ahead: 先行して作成する月数（Noneの場合は設定値）
+        retain_months: 保持する月数（Noneの場合は設定値）
+        today: 基準日（Noneの場合は今日）
+
+    Returns:
+        List[str]: 切り離したパーティション名
+    """
+    if months_ahead is None:
+        months_ahead = settings.POS_PARTITION_MONTHS_AHEAD
+    if retain_months is None:
+        retain_months = settings.POS_PARTITION_RETAIN_MONTHS
+    today = today or date.today()
+
+    ensure_partitions(db, today, add_months(today, months_ahead))
+
+    cutoff = add_months(today, -retain_months)
+    detached: List[str] = []
+    for table in PARTITIONED_TABLES:
+        detached.extend(
+            db.execute(
+                text("SELECT detach_monthly_partitions_before(:table, :cutoff)"),
+                {"table": table, "cutoff": cutoff},
+            ).scalars()
+        )
+    db.commit()
+
+    logger.info(
+        f"Partition maintenance: created up to {months_ahead} months ahead, "
+        f"detached {len(detached)} partitions before {cutoff}"
+    )
+    return detached
+
+
 def test_connection() -> bool:
     """
     データベース接続をテスト
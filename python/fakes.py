@@ -0,0 +1,85 @@
+"""
+テスト用のフェイク
+
+DB接続なしのテストで共有するセッション・結果・時計の代替。
+"""
+
+# サプライヤーマスタ（品質スコア最上位は SUP001）
+SUPPLIERS = [
+    {"id": "SUP002", "name": "熊本直送便", "unit_price": 115.0, "lead_time_hours": 12, "quality_score": 0.88},
+    {"id": "SUP001", "name": "静岡農協", "unit_price": 120.0, "lead_time_hours": 8, "quality_score": 0.95},
+    {"id": "SUP003", "name": "北海道ファーム", "unit_price": 130.0, "lead_time_hours": 24, "quality_score": 0.92},
+]
+
+
+class FakeRow:
+    """SQLAlchemy Row の代替（_mapping だけを持つ）"""
+
+    def __init__(self, mapping):
+        self._mapping = mapping
+
+
+class FakeResult:
+    """SQLAlchemy Result の代替"""
+
+    def __init__(self, rows, columns=None):
+        self._rows = rows
+        self._columns = columns or []
+
+    def keys(self):
+        return self._columns
+
+    def fetchall(self):
+        return self._rows
+
+    def scalar(self):
+        return self._rows[0][0] if self._rows else None
+
+    def scalar_one(self):
+        return self._rows[0][0]
+
+    def scalars(self):
+        return iter(row[0] for row in self._rows)
+
+
+class FakeSession:
+    """サプライヤーマスタと在庫スナップショットを返すだけのセッション"""
+
+    def __init__(self, suppliers=SUPPLIERS, inventory=None):
+        # inventory: {(product_sku, store_id): 手持ち在庫}
+        self.suppliers = suppliers
+        self.inventory = inventory or {}
+        self.queries = 0
+        self.inventory_queries = 0
+
+    def execute(self, query, params=None):
+        if "inventory_snapshots" in str(query):
+            self.inventory_queries += 1
+            keys = zip(params["product_skus"], params["store_ids"])
+            return FakeResult(
+                [(sku, store, self.inventory[(sku, store)]) for sku, store in keys
+                 if (sku, store) in self.inventory]
+            )
+
+        self.queries += 1
+        return FakeResult([FakeRow(s) for s in self.suppliers])
+
+
+class FakeClock:
+    """now を書き換えて進める時計"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def demand_forecast_result(predicted=300, lower=273, upper=327):
+    """在庫最適化エージェントに渡す需要予測結果"""
+    return {
+        "data": {
+            "predicted_demand": predicted,
+            "confidence_interval": {"lower": lower, "upper": upper},
+        }
+    }
@@ -44,17 +44,19 @@ def print_result(result):
     print(f"実行時刻: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
     print("\n--- 需要予測 ---")
-    demand_data = result.demand_forecast.get("data", {})
+    demand = result.demand_forecast
+    demand_data = demand.data
     print(f"  予測販売数量: {demand_data.get('predicted_demand', 0)} 個")
     ci = demand_data.get("confidence_interval", {})
     print(f"  信頼区間: {ci.get('lower', 0)} ~ {ci.get('upper', 0)} 個")
     print(
-        f"  信頼度: {result.demand_forecast.get('confidence', 0) * 100:.1f}%"
+        f"  信頼度: {demand.confidence * 100:.1f}%"
     )
-    print(f"  コスト: {result.demand_forecast.get('cost', 0)} JPYC")
+    print(f"  コスト: {demand.cost} JPYC")
 
     print("\n--- 在庫最適化 ---")
-    inv_data = result.inventory_optimization.get("data", {})
+    inventory = result.inventory_optimization
+    inv_data = inventory.data
     print(f"  推奨発注量: {inv_data.get('order_quantity', 0)} 個")
     supplier = inv_data.get("supplier", {})
     print(f"  推奨サプライヤー: {supplier.get('name', 'N/A')}")
@@ -63,9 +65,9 @@ def print_result(result):
     print(f"  期待廃棄量: {inv_data.get('expected_waste', 0)} 個")
     print(f"  期待欠品量: {inv_data.get('expected_shortage', 0)} 個")
     print(
-        f"  信頼度: {result.inventory_optimization.get('confidence', 0) * 100:.1f}%"
+        f"  信頼度: {inventory.confidence * 100:.1f}%"
     )
-    print(f"  コスト: {result.inventory_optimization.get('cost', 0)} JPYC")
+    print(f"  コスト: {inventory.cost} JPYC")
 
     print("\n--- サマリー ---")
     summary = result.summary
@@ -76,6 +78,15 @@ def print_result(result):
     print("\n" + "=" * 70 + "\n")
 
 
+def print_trace(trace):
+    """処理時間の内訳表示"""
+    print("--- 処理時間内訳 ---")
+    print(f"  合計: {trace.root.duration_ms:.1f} ms")
+    for name, ms in sorted(trace.breakdown().items(), key=lambda item: -item[1]):
+        print(f"  {name}: {ms:.1f} ms")
+    print()
+
+
 async def main():
     """メイン処理"""
     print_banner()
@@ -101,6 +112,8 @@ async def main():
 
         # 結果表示
         print_result(result)
+        if coordinator.tracer.traces:
+            print_trace(coordinator.tracer.traces[-1])
 
         if result.success:
             logger.info("✅ Optimization completed successfully!")
@@ -0,0 +1,212 @@
+"""
+メトリクス
+
+アプリケーションのメトリクスを prometheus_client で定義する。FastAPI の /metrics が
+REGISTRY を Prometheus のテキスト形式で返す（render()）。
+
+スクレイプ時にしか値が決まらないもの（DBコネクションプールの使用数・状態ごとの
+ジョブ数）は GaugeCollector が収集時に関数を呼んで値を取得する。
+"""
+import logging
+from typing import Callable, Iterable, Iterator, Optional, Sequence, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    Gauge,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# ブロックチェーンの送信・確認待ち用（ブロック時間が2〜3秒）
+TRANSFER_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# (ラベル値, 値) の列
+GaugeSamples = Iterable[Tuple[Sequence[str], float]]
+
+
+class GaugeCollector(Collector):
+    """収集時に関数を呼んで値を決めるゲージ"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        read: Optional[Callable[[], GaugeSamples]] = None,
+    ):
+        """
+        Args:
+            name: メトリクス名
+            documentation: HELP に出す説明
+            labelnames: ラベル名
+            read: (ラベル値, 値) の列を返す関数（bind で後から指定できる）
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.read = read
+
+    def bind(self, read: Callable[[], GaugeSamples]) -> None:
+        """値を返す関数を指定（ジョブマネージャなど、定義時に存在しないもの用）"""
+        self.read = read
+
+    def describe(self) -> Iterator[GaugeMetricFamily]:
+        yield GaugeMetricFamily(self.name, self.documentation, labels=self.labelnames)
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        if self.read is None:
+            return
+        family = GaugeMetricFamily(self.name, self.documentation, labels=self.labelnames)
+        try:
+            for labels, value in self.read():
+                family.add_metric(list(labels), value)
+        except Exception as e:
+            # 収集に失敗しても他のメトリクスは返す
+            logger.warning(f"Metrics collector {self.name} failed: {e}")
+            return
+        yield family
+
+
+def render(registry: Optional[CollectorRegistry] = None) -> bytes:
+    """
+    全メトリクスを Prometheus のテキスト形式で出力
+
+    Args:
+        registry: 出力するレジストリ（Noneの場合は REGISTRY）
+
+    Returns:
+        bytes: /metrics のレスポンス本文
+    """
+    return generate_latest(registry or REGISTRY)
+
+
+def db_pool_usage() -> GaugeSamples:
+    """database の同期・非同期エンジンのコネクションプール使用状況"""
+    import database
+
+    samples = []
+    for engine_name, pool in (
+        ("sync", database.engine.pool),
+        ("async", database.async_engine.pool),
+    ):
+        if not hasattr(pool, "checkedout"):
+            # NullPool など使用数を持たないプール
+            continue
+        samples += [
+            ((engine_name, "size"), pool.size()),
+            ((engine_name, "checked_in"), pool.checkedin()),
+            ((engine_name, "checked_out"), pool.checkedout()),
+            ((engine_name, "overflow"), max(pool.overflow(), 0)),
+        ]
+    return samples
+
+
+# ==========================================
+# アプリケーションのメトリクス
+# ==========================================
+
+REGISTRY = CollectorRegistry()
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "a2a_http_request_duration_seconds",
+    "HTTP request latency until the response starts, by route template",
+    ["method", "endpoint", "status"],
+    registry=REGISTRY,
+)
+
+AGENT_EXECUTION_SECONDS = Histogram(
+    "a2a_agent_execution_seconds",
+    "Agent execution time",
+    ["agent"],
+    registry=REGISTRY,
+)
+AGENT_EXECUTIONS_TOTAL = Counter(
+    "a2a_agent_executions_total",
+    "Agent executions by outcome",
+    ["agent", "status"],
+    registry=REGISTRY,
+)
+AGENT_COST_JPYC_TOTAL = Counter(
+    "a2a_agent_cost_jpyc_total",
+    "JPYC charged by agents",
+    ["agent"],
+    registry=REGISTRY,
+)
+
+BLOCKCHAIN_TRANSFER_SECONDS = Histogram(
+    "a2a_blockchain_transfer_seconds",
+    "JPYC transfer latency (submit: build, sign and send; confirm: wait for receipt)",
+    ["stage"],
+    buckets=TRANSFER_BUCKETS,
+    registry=REGISTRY,
+)
+BLOCKCHAIN_TRANSFER_FAILURES_TOTAL = Counter(
+    "a2a_blockchain_transfer_failures_total",
+    "Failed JPYC transfers (submit errors, reverted or timed out confirmations)",
+    ["stage"],
+    registry=REGISTRY,
+)
+
+SSE_SUBSCRIBERS = Gauge(
+    "a2a_sse_subscribers",
+    "Connected server-sent event subscribers",
+    ["stream"],
+    registry=REGISTRY,
+)
+SSE_DROPPED_SUBSCRIBERS_TOTAL = Counter(
+    "a2a_sse_dropped_subscribers_total",
+    "Server-sent event subscribers disconnected because their queue overflowed",
+    ["stream"],
+    registry=REGISTRY,
+)
+
+# 値を返す関数は JobManager を作成したところで bind する
+JOBS = GaugeCollector(
+    "a2a_jobs",
+    "Optimization jobs by state (queued, running, completed, failed)",
+    ["state"],
+)
+REGISTRY.register(JOBS)
+
+DB_POOL_CONNECTIONS = GaugeCollector(
+    "a2a_db_pool_connections",
+    "Database connection pool usage (size, checked_in, checked_out, overflow)",
+    ["engine", "state"],
+    db_pool_usage,
+)
+REGISTRY.register(DB_POOL_CONNECTIONS)
+
+
+def observe_agent(agent: str, seconds: float, cost: int, success: bool) -> None:
+    """
+    エージェント1回分の実行時間・コスト・成否を記録
+
+    Args:
+        agent: エージェント名
+        seconds: 実行時間（秒）
+        cost: 課金額（JPYC）
+        success: 成功したか
+    """
+    AGENT_EXECUTION_SECONDS.labels(agent=agent).observe(seconds)
+    AGENT_EXECUTIONS_TOTAL.labels(agent=agent, status="success" if success else "failure").inc()
+    if cost:
+        AGENT_COST_JPYC_TOTAL.labels(agent=agent).inc(cost)
+
+
+def observe_agent_result(agent: str, result) -> None:
+    """
+    AgentResult から実行時間・コスト・成否を記録
+
+    Args:
+        agent: エージェント名
+        result: AgentResult
+    """
+    observe_agent(agent, result.execution_time, result.cost, result.success)
@@ -3,43 +3,82 @@ Orchestrator - エージェント協調制御
 
 複数のエージェントを協調させてタスクを実行する。
 """
+import asyncio
+import inspect
 import logging
 import time
-from typing import Dict, Any
-from dataclasses import dataclass
+from typing import Dict, Any, AsyncIterator, Callable, Iterable, Optional, Tuple
+from dataclasses import asdict, dataclass
 
+from agents.base import AgentResult
 from agents.demand_forecast import DemandForecastAgent
+from agents.forecast_cache import get_forecast_cache
 from agents.inventory_optimizer import InventoryOptimizerAgent
+from agents.pos_history_cache import get_pos_history_cache
+from agents.rolling_stats import get_rolling_stats_store
+from agents.tracing import Tracer, get_tracer, span
+from metrics import observe_agent_result
+from pipeline import (
+    DemandForecastStage,
+    InventoryOptimizationStage,
+    Pipeline,
+    PipelineItem,
+)
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(slots=True)
 class OptimizationResult:
-    """最適化タスク結果"""
+    """最適化タスク結果（各エージェントの AgentResult をそのまま保持）"""
 
     success: bool
     product_sku: str
     store_id: str
-    demand_forecast: Dict[str, Any]
-    inventory_optimization: Dict[str, Any]
+    demand_forecast: Optional[AgentResult]
+    inventory_optimization: Optional[AgentResult]
     total_cost: int  # JPYC
     total_execution_time: float  # 秒
     summary: Dict[str, Any]
     error_message: str = ""
 
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON出力用の辞書に変換"""
+        return asdict(self)
+
 
 class AgentCoordinator:
     """エージェント協調制御"""
 
-    def __init__(self, db_session):
+    def __init__(
+        self,
+        db_session,
+        session_factory: Optional[Callable[[], Any]] = None,
+        tracer: Optional[Tracer] = None,
+    ):
         """
         Args:
             db_session: データベースセッション
+            session_factory: execute_many / execute_pipeline でセッションを作るファクトリ
+                （Noneの場合は database.AsyncSessionLocal）
+            tracer: タスクごとの処理時間を記録するトレーサー（Noneの場合は共有インスタンス）
         """
         self.db_session = db_session
-        self.demand_forecast_agent = DemandForecastAgent(db_session)
+        self.session_factory = session_factory
+        self.tracer = tracer or get_tracer()
+        self.demand_forecast_agent = DemandForecastAgent(
+            db_session,
+            rolling_stats=get_rolling_stats_store(),
+            history_cache=get_pos_history_cache(),
+            forecast_cache=get_forecast_cache(),
+        )
         self.inventory_optimizer_agent = InventoryOptimizerAgent(db_session)
+        self.pipeline = Pipeline(
+            [
+                DemandForecastStage(self.demand_forecast_agent),
+                InventoryOptimizationStage(self.inventory_optimizer_agent),
+            ]
+        )
         logger.info("AgentCoordinator initialized")
 
     async def execute_optimization_task(
@@ -55,90 +94,193 @@ class AgentCoordinator:
         Returns:
             OptimizationResult: 最適化結果
         """
-        start_time = time.time()
         logger.info(f"=== Starting optimization task: {product_sku} @ {store_id} ===")
 
+        with self.tracer.trace(
+            "optimization_task", product_sku=product_sku, store_id=store_id
+        ):
+            item = PipelineItem(product_sku, store_id)
+            await self.pipeline.run_batch([item])
+            return self._to_result(item)
+
+    async def execute_pipeline(
+        self,
+        tasks: Iterable[Tuple[str, str]],
+        batch_size: int = 100,
+    ) -> AsyncIterator[OptimizationResult]:
+        """
+        複数の最適化タスクをバッチパイプラインで実行
+
+        需要予測・在庫最適化はそれぞれバッチ単位の一括処理で、上流のバッチが
+        終わった時点で下流が処理を始める。ステージは並行して動くため、
+        ステージごとに session_factory から専用のセッションを作る。
+        実行全体を1つのトレースとして記録する（スパンはバッチ単位）。
+
+        Args:
+            tasks: (product_sku, store_id) のリスト
+            batch_size: 1バッチのタスク数
+
+        Yields:
+            OptimizationResult: タスクの結果（バッチ順）
+        """
+        session_factory = self._session_factory()
+        demand_session = session_factory()
+        inventory_session = session_factory()
         try:
-            # Phase 1: 需要予測
-            logger.info("Phase 1: Demand Forecasting")
-            demand_result = await self.demand_forecast_agent.execute(
-                {"product_sku": product_sku, "store_id": store_id}
+            pipeline = Pipeline(
+                [
+                    DemandForecastStage(
+                        DemandForecastAgent(
+                            demand_session,
+                            rolling_stats=self.demand_forecast_agent.rolling_stats,
+                            history_cache=self.demand_forecast_agent.history_cache,
+                            forecast_cache=self.demand_forecast_agent.forecast_cache,
+                        )
+                    ),
+                    InventoryOptimizationStage(InventoryOptimizerAgent(inventory_session)),
+                ]
             )
+            with self.tracer.trace("optimization_pipeline", batch_size=batch_size):
+                async for item in pipeline.run(tasks, batch_size=batch_size):
+                    yield self._to_result(item)
+        finally:
+            for session in (demand_session, inventory_session):
+                closed = session.close()
+                if inspect.isawaitable(closed):
+                    await closed
 
-            if not demand_result.success:
-                logger.error(f"Demand forecast failed: {demand_result.error_message}")
-                return OptimizationResult(
-                    success=False,
-                    product_sku=product_sku,
-                    store_id=store_id,
-                    demand_forecast={},
-                    inventory_optimization={},
-                    total_cost=0,
-                    total_execution_time=time.time() - start_time,
-                    summary={},
-                    error_message=f"Demand forecast failed: {demand_result.error_message}",
-                )
-
-            # Phase 2: 在庫最適化
-            logger.info("Phase 2: Inventory Optimization")
-            inventory_result = await self.inventory_optimizer_agent.execute(
-                {
-                    "demand_forecast": demand_result.__dict__,
-                    "product_sku": product_sku,
-                    "store_id": store_id,
-                }
-            )
+    def _session_factory(self) -> Callable[[], Any]:
+        if self.session_factory is not None:
+            return self.session_factory
 
-            if not inventory_result.success:
-                logger.error(
-                    f"Inventory optimization failed: {inventory_result.error_message}"
-                )
-                return OptimizationResult(
-                    success=False,
-                    product_sku=product_sku,
-                    store_id=store_id,
-                    demand_forecast=demand_result.__dict__,
-                    inventory_optimization={},
-                    total_cost=demand_result.cost,
-                    total_execution_time=time.time() - start_time,
-                    summary={},
-                    error_message=f"Inventory optimization failed: {inventory_result.error_message}",
-                )
-
-            # 合計コスト・実行時間
-            total_cost = demand_result.cost + inventory_result.cost
-            total_execution_time = time.time() - start_time
+        from database import AsyncSessionLocal
 
-            # サマリー生成
-            summary = self._generate_summary(demand_result, inventory_result)
+        return AsyncSessionLocal
 
-            logger.info(f"=== Optimization completed: {total_cost} JPYC ===")
+    def _to_result(self, item: PipelineItem) -> OptimizationResult:
+        """
+        パイプラインを通過したアイテムから OptimizationResult を生成
 
-            return OptimizationResult(
-                success=True,
-                product_sku=product_sku,
-                store_id=store_id,
-                demand_forecast=demand_result.__dict__,
-                inventory_optimization=inventory_result.__dict__,
-                total_cost=total_cost,
-                total_execution_time=total_execution_time,
-                summary=summary,
-            )
+        Args:
+            item: パイプラインのアイテム
+
+        Returns:
+            OptimizationResult: 最適化結果
+        """
+        demand_result = item.demand
+        inventory_result = item.inventory
+        total_execution_time = time.time() - item.start_time
+
+        if demand_result is not None:
+            observe_agent_result(self.demand_forecast_agent.name, demand_result)
+        if inventory_result is not None:
+            observe_agent_result(self.inventory_optimizer_agent.name, inventory_result)
 
-        except Exception as e:
-            logger.error(f"Optimization task failed: {e}")
+        if item.failed:
+            # 需要予測まで成功していればその分は課金済み
+            demand_ok = demand_result is not None and demand_result.success
+            logger.error(item.error_message)
             return OptimizationResult(
                 success=False,
-                product_sku=product_sku,
-                store_id=store_id,
-                demand_forecast={},
-                inventory_optimization={},
-                total_cost=0,
-                total_execution_time=time.time() - start_time,
+                product_sku=item.product_sku,
+                store_id=item.store_id,
+                demand_forecast=demand_result if demand_ok else None,
+                inventory_optimization=None,
+                total_cost=demand_result.cost if demand_ok else 0,
+                total_execution_time=total_execution_time,
                 summary={},
-                error_message=str(e),
+                error_message=item.error_message,
             )
 
+        # 合計コスト・サマリー
+        with span("summary"):
+            total_cost = demand_result.cost + inventory_result.cost
+            summary = self._generate_summary(demand_result, inventory_result)
+
+        logger.info(f"=== Optimization completed: {total_cost} JPYC ===")
+
+        return OptimizationResult(
+            success=True,
+            product_sku=item.product_sku,
+            store_id=item.store_id,
+            demand_forecast=demand_result,
+            inventory_optimization=inventory_result,
+            total_cost=total_cost,
+            total_execution_time=total_execution_time,
+            summary=summary,
+        )
+
+    async def execute_many(
+        self,
+        tasks: Iterable[Tuple[str, str]],
+        max_concurrency: int = 10,
+        timeout: Optional[float] = 60.0,
+    ) -> AsyncIterator[OptimizationResult]:
+        """
+        複数の最適化タスクを並行実行
+
+        同時実行数をセマフォで制限し、タスクごとにコネクションプールから
+        専用のセッションを取得する。非同期セッションを使う場合は各タスクの
+        DBクエリが並行して進む。結果は完了順にストリーミングで返す。
+
+        Args:
+            tasks: (product_sku, store_id) のリスト
+            max_concurrency: 同時実行数の上限
+            timeout: タスクごとのタイムアウト（秒、Noneで無制限）
+
+        Yields:
+            OptimizationResult: 完了したタスクの結果（完了順）
+        """
+        session_factory = self._session_factory()
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run_task(product_sku: str, store_id: str) -> OptimizationResult:
+            async with semaphore:
+                start_time = time.time()
+                session = session_factory()
+                try:
+                    coordinator = type(self)(session, session_factory, self.tracer)
+                    return await asyncio.wait_for(
+                        coordinator.execute_optimization_task(product_sku, store_id),
+                        timeout,
+                    )
+                except asyncio.TimeoutError:
+                    logger.error(
+                        f"Optimization task timed out: {product_sku} @ {store_id}"
+                    )
+                    return OptimizationResult(
+                        success=False,
+                        product_sku=product_sku,
+                        store_id=store_id,
+                        demand_forecast=None,
+                        inventory_optimization=None,
+                        total_cost=0,
+                        total_execution_time=time.time() - start_time,
+                        summary={},
+                        error_message=f"Timed out after {timeout} seconds",
+                    )
+                finally:
+                    closed = session.close()
+                    if inspect.isawaitable(closed):
+                        await closed
+
+        pending = [
+            asyncio.create_task(run_task(product_sku, store_id))
+            for product_sku, store_id in tasks
+        ]
+        logger.info(
+            f"=== Starting {len(pending)} optimization tasks "
+            f"(max_concurrency={max_concurrency}) ==="
+        )
+
+        try:
+            for next_done in asyncio.as_completed(pending):
+                yield await next_done
+        finally:
+            # 呼び出し側が途中で打ち切った場合は残りをキャンセル
+            for task in pending:
+                task.cancel()
+
     def _generate_summary(
         self, demand_result, inventory_result
     ) -> Dict[str, Any]:
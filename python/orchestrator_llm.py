@@ -3,16 +3,21 @@ LLMエージェントオーケストレータ
 
 CrewAIエージェントとX402決済を統合したサプライチェーン最適化オーケストレータ
 """
+import asyncio
 import logging
+import threading
 from typing import Dict, Any, Optional
 from datetime import datetime
 
+from config import settings
 from protocols.x402 import (
     PaymentScheme,
+    SettlementLedger,
     X402Client,
     X402Request,
     X402Response,
     X402Transaction,
+    get_settlement_ledger,
 )
 from protocols.x402.models import jpyc_to_wei, wei_to_jpyc
 
@@ -65,15 +70,37 @@ class SupplyChainOrchestrator:
     需要予測 → 在庫最適化 → レポート生成の協調フローを管理
     """
 
-    def __init__(self, client_agent_id: int = 0):
+    def __init__(
+        self,
+        client_agent_id: int = 0,
+        ledger: Optional[SettlementLedger] = None,
+        settlement_interval_seconds: Optional[float] = None
+    ):
         """
         初期化
 
         Args:
             client_agent_id: クライアント（店舗）エージェントID
+            ledger: 精算台帳（Noneの場合は PostgreSQL の台帳）
+            settlement_interval_seconds: 定期精算の間隔（秒、Noneの場合は設定値、0 の場合は定期精算しない）
         """
         self.client_agent_id = client_agent_id
-        self.x402_client = X402Client(client_agent_id=client_agent_id)
+        # DEFERRED・UPTO の課金は台帳に積み、支払先ごとにまとめて精算する
+        self.x402_client = X402Client(
+            client_agent_id=client_agent_id,
+            ledger=ledger if ledger is not None else get_settlement_ledger()
+        )
+
+        if settlement_interval_seconds is None:
+            settlement_interval_seconds = settings.SETTLEMENT_INTERVAL_SECONDS
+        if settlement_interval_seconds > 0:
+            # 課金時は送信だけなので、レシートの確認と経過時間での精算は定期精算で行う
+            threading.Thread(
+                target=asyncio.run,
+                args=(self.x402_client.settle_periodically(settlement_interval_seconds),),
+                name="x402-settlement",
+                daemon=True,
+            ).start()
 
         # エージェント設定
         self.agent_configs = {
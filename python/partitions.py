@@ -0,0 +1,25 @@
+"""
+月次パーティション
+
+pos_sales / pos_sales_daily の月次レンジパーティション（schema.sql）の対象テーブルと
+月の計算。database（定期メンテナンス）と pos_ingestion（取り込み前の作成）で共有する。
+"""
+from datetime import date
+
+# 月次レンジパーティションのテーブル（schema.sql と同じ）
+PARTITIONED_TABLES = ("pos_sales", "pos_sales_daily")
+
+
+def add_months(day: date, months: int) -> date:
+    """
+    day の月初から months ヶ月ずらした月初
+
+    Args:
+        day: 基準日
+        months: ずらす月数（負なら過去）
+
+    Returns:
+        date: 月初の日付
+    """
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
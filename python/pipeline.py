@@ -0,0 +1,222 @@
+"""
+最適化パイプライン
+
+需要予測 → 在庫最適化をステージとして並べ、タスクをバッチ単位で流す。
+各ステージは独立したワーカーで動き、上流のバッチが終わった時点で下流が処理を始めるため、
+バッチ2の需要予測とバッチ1の在庫最適化が重なって進む。
+
+ステージ間は PipelineItem を参照で受け渡し、各ステージは自分の結果フィールドを
+埋めるだけで、結果の辞書化やコピーはしない。
+"""
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Iterable, List, Optional, Sequence, Tuple
+
+from agents.base import AgentResult
+from agents.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class PipelineItem:
+    """パイプラインを流れる1タスク"""
+
+    product_sku: str
+    store_id: str
+    demand: Optional[AgentResult] = None
+    inventory: Optional[AgentResult] = None
+    error_message: Optional[str] = None
+    start_time: float = field(default_factory=time.time)
+
+    @property
+    def failed(self) -> bool:
+        return self.error_message is not None
+
+
+class PipelineStage(ABC):
+    """
+    パイプラインのステージ
+
+    process はバッチ内の PipelineItem に自分の結果を書き込む。失敗したアイテムには
+    error_message を設定し、後続のステージはそのアイテムを処理しない。
+    """
+
+    name: str = "stage"
+
+    @abstractmethod
+    async def process(self, batch: List[PipelineItem]) -> None:
+        """
+        バッチを処理
+
+        Args:
+            batch: 処理するアイテム（失敗済みのアイテムを含む）
+        """
+        pass
+
+
+class DemandForecastStage(PipelineStage):
+    """需要予測ステージ"""
+
+    name = "demand_forecast"
+
+    def __init__(self, agent):
+        """
+        Args:
+            agent: DemandForecastAgent
+        """
+        self.agent = agent
+
+    async def process(self, batch: List[PipelineItem]) -> None:
+        items = [item for item in batch if not item.failed]
+        if not items:
+            return
+
+        results = await self.agent.execute_batch(
+            [(item.product_sku, item.store_id) for item in items]
+        )
+        for item, result in zip(items, results):
+            item.demand = result
+            if not result.success:
+                item.error_message = f"Demand forecast failed: {result.error_message}"
+
+
+class InventoryOptimizationStage(PipelineStage):
+    """在庫最適化ステージ（需要予測の AgentResult をそのまま入力にする）"""
+
+    name = "inventory_optimization"
+
+    def __init__(self, agent):
+        """
+        Args:
+            agent: InventoryOptimizerAgent
+        """
+        self.agent = agent
+
+    async def process(self, batch: List[PipelineItem]) -> None:
+        items = [item for item in batch if not item.failed]
+        if not items:
+            return
+
+        results = await self.agent.execute_batch(
+            [
+                {
+                    "demand_forecast": item.demand,
+                    "product_sku": item.product_sku,
+                    "store_id": item.store_id,
+                }
+                for item in items
+            ]
+        )
+        for item, result in zip(items, results):
+            item.inventory = result
+            if not result.success:
+                item.error_message = f"Inventory optimization failed: {result.error_message}"
+
+
+class Pipeline:
+    """ステージをキューでつないだバッチパイプライン"""
+
+    def __init__(self, stages: Sequence[PipelineStage], queue_size: int = 2):
+        """
+        Args:
+            stages: 実行順のステージ
+            queue_size: ステージ間で待機できるバッチ数（上流が先行しすぎないよう制限）
+        """
+        self.stages = list(stages)
+        self.queue_size = queue_size
+
+    async def run_batch(self, batch: List[PipelineItem]) -> List[PipelineItem]:
+        """
+        1バッチを全ステージに順に通す
+
+        Args:
+            batch: 処理するアイテム
+
+        Returns:
+            List[PipelineItem]: 同じアイテム（結果が書き込まれている）
+        """
+        for stage in self.stages:
+            await self._process(stage, batch)
+        return batch
+
+    async def run(
+        self, tasks: Iterable[Tuple[str, str]], batch_size: int = 100
+    ) -> AsyncIterator[PipelineItem]:
+        """
+        タスクをバッチに分けてパイプラインに流す
+
+        Args:
+            tasks: (product_sku, store_id) のリスト
+            batch_size: 1バッチのタスク数
+
+        Yields:
+            PipelineItem: 全ステージを通過したアイテム（バッチ順）
+        """
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+
+        async def feed():
+            batch: List[PipelineItem] = []
+            for product_sku, store_id in tasks:
+                batch.append(PipelineItem(product_sku, store_id))
+                if len(batch) >= batch_size:
+                    await queues[0].put(batch)
+                    batch = []
+            if batch:
+                await queues[0].put(batch)
+            await queues[0].put(None)
+
+        async def work(stage: PipelineStage, inbox: asyncio.Queue, outbox: asyncio.Queue):
+            while True:
+                batch = await inbox.get()
+                if batch is None:
+                    await outbox.put(None)
+                    return
+                await self._process(stage, batch)
+                await outbox.put(batch)
+
+        workers = [asyncio.create_task(feed())] + [
+            asyncio.create_task(work(stage, queues[i], queues[i + 1]))
+            for i, stage in enumerate(self.stages)
+        ]
+
+        # 出口のキューとワーカーを一緒に待ち、上流が例外で止まった場合は
+        # 終端（None）を待ち続けずにその例外を呼び出し元に伝える
+        getter: Optional[asyncio.Future] = None
+        try:
+            while True:
+                if getter is None:
+                    getter = asyncio.ensure_future(queues[-1].get())
+                running = [worker for worker in workers if not worker.done()]
+                await asyncio.wait([getter, *running], return_when=asyncio.FIRST_COMPLETED)
+                for worker in workers:
+                    if worker.done() and not worker.cancelled() and worker.exception():
+                        raise worker.exception()
+                if not getter.done():
+                    continue
+
+                batch, getter = getter.result(), None
+                if batch is None:
+                    break
+                for item in batch:
+                    yield item
+            await asyncio.gather(*workers)
+        finally:
+            if getter is not None:
+                getter.cancel()
+            for worker in workers:
+                worker.cancel()
+
+    async def _process(self, stage: PipelineStage, batch: List[PipelineItem]) -> None:
+        """ステージを実行し、例外はバッチ内の未失敗アイテムのエラーとして記録する"""
+        try:
+            with span(stage.name, batch_size=len(batch)):
+                await stage.process(batch)
+        except Exception as e:
+            logger.error(f"Pipeline stage {stage.name} failed: {e}")
+            for item in batch:
+                if not item.failed:
+                    item.error_message = str(e)
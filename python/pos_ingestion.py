@@ -0,0 +1,431 @@
+"""
+POSデータ一括取り込み
+
+CSV / Parquet 形式のPOSエクスポートをチャンクごとに PostgreSQL の COPY で
+一時テーブルへ流し込み、pos_sales へ upsert する。取り込み後に日次集計
+（pos_sales_daily）を差分更新し、POS履歴キャッシュ・ローリング統計に反映する。
+
+Usage:
+    python pos_ingestion.py exports/pos_20260116.csv --chunk-size 100000
+"""
+import argparse
+import io
+import logging
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+import pandas as pd
+
+from partitions import PARTITIONED_TABLES
+
+logger = logging.getLogger(__name__)
+
+# pos_sales に取り込む列（COPYの列順）
+POS_COLUMNS = [
+    "date",
+    "store_id",
+    "product_sku",
+    "sales_quantity",
+    "price",
+    "day_of_week",
+    "is_holiday",
+    "transaction_id",
+]
+
+# エクスポートに必須の列（transaction_id は再取り込み時の重複判定に使う）
+REQUIRED_COLUMNS = ["date", "store_id", "product_sku", "sales_quantity", "price", "transaction_id"]
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+# ローリング統計を読み直す日次集計（店舗単位、直近の期間）
+ROLLING_STATS_QUERY = """
+    SELECT store_id, product_sku, date, sales_quantity
+    FROM pos_sales_daily
+    WHERE store_id = ANY(%s)
+      AND date >= %s
+"""
+
+
+@dataclass
+class IngestionStats:
+    """取り込み進捗"""
+
+    rows_read: int = 0
+    rows_inserted: int = 0
+    rows_updated: int = 0
+    rows_rejected: int = 0
+    chunks: int = 0
+    elapsed_seconds: float = 0.0
+    daily_rows_refreshed: int = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        if self.elapsed_seconds <= 0:
+            return 0.0
+        return self.rows_read / self.elapsed_seconds
+
+
+def iter_export_chunks(path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    POSエクスポートをチャンクごとに読み込む
+
+    Args:
+        path: CSV / Parquet ファイルのパス
+        chunk_size: 1チャンクの行数
+
+    Yields:
+        pd.DataFrame: チャンク
+    """
+    suffix = path.suffix.lower()
+
+    if suffix == ".parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet ingestion requires pyarrow") from e
+
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+
+    elif ".csv" in [s.lower() for s in path.suffixes]:
+        yield from pd.read_csv(
+            path,
+            chunksize=chunk_size,
+            dtype={"store_id": str, "product_sku": str, "transaction_id": str},
+        )
+
+    else:
+        raise ValueError(f"Unsupported export format: {path}")
+
+
+def normalize_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    エクスポートのチャンクを pos_sales の列構成に揃える
+
+    day_of_week（0=日曜）と is_holiday が無い場合は日付から補完し、
+    同じ取引IDの重複行は最後の行を残す。取引IDが空の行は再取り込みで
+    重複を判定できないため取り込まない（件数は count_rejected で数える）。
+
+    Args:
+        df: エクスポートのチャンク
+
+    Returns:
+        pd.DataFrame: POS_COLUMNS の列を持つデータ
+    """
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}")
+
+    out = pd.DataFrame(
+        {
+            "date": pd.to_datetime(df["date"]).dt.date,
+            "store_id": df["store_id"].astype(str),
+            "product_sku": df["product_sku"].astype(str),
+            "sales_quantity": df["sales_quantity"].astype("int64"),
+            "price": df["price"].astype("float64"),
+        }
+    )
+
+    if "day_of_week" in df.columns:
+        out["day_of_week"] = df["day_of_week"].astype("int64")
+    else:
+        # PostgreSQL の EXTRACT(DOW) に合わせる（0=日曜）
+        out["day_of_week"] = (pd.to_datetime(df["date"]).dt.dayofweek + 1) % 7
+
+    if "is_holiday" in df.columns:
+        out["is_holiday"] = df["is_holiday"].astype(bool)
+    else:
+        out["is_holiday"] = out["day_of_week"].isin([0, 6])
+
+    out["transaction_id"] = df["transaction_id"]
+    out = out[_keyed(df)].drop_duplicates(
+        subset=["date", "store_id", "transaction_id"], keep="last"
+    )
+
+    return out[POS_COLUMNS]
+
+
+def count_rejected(df: pd.DataFrame) -> int:
+    """取引IDが空で normalize_chunk が取り込まない行数"""
+    return int((~_keyed(df)).sum())
+
+
+def _keyed(df: pd.DataFrame) -> pd.Series:
+    ids = df["transaction_id"]
+    return ids.notna() & (ids.astype(str).str.strip() != "")
+
+
+class PosIngestor:
+    """COPYによるPOSデータ取り込み"""
+
+    STAGING_TABLE = "pos_sales_staging"
+
+    def __init__(
+        self,
+        engine=None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        history_cache=None,
+        rolling_stats=None,
+    ):
+        """
+        Args:
+            engine: SQLAlchemyエンジン（Noneの場合は database.engine）
+            chunk_size: 1回のCOPYで流し込む行数
+            history_cache: POS履歴キャッシュ（日次集計の更新後に、締まった日を再集計した (店舗, 月) を破棄する）
+            rolling_stats: ローリング統計ストア（日次集計の更新後に、直近の期間を再集計した店舗を読み直す）
+        """
+        if engine is None:
+            from database import engine
+
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.history_cache = history_cache
+        self.rolling_stats = rolling_stats
+
+    def ingest_file(
+        self,
+        path: Path,
+        progress_callback: Optional[Callable[[IngestionStats], None]] = None,
+    ) -> IngestionStats:
+        """
+        POSエクスポートファイルを取り込む
+
+        Args:
+            path: CSV / Parquet ファイルのパス
+            progress_callback: チャンクごとに進捗を受け取る関数
+
+        Returns:
+            IngestionStats: 取り込み結果
+        """
+        return self.ingest_chunks(
+            iter_export_chunks(Path(path), self.chunk_size), progress_callback
+        )
+
+    def ingest_chunks(
+        self,
+        chunks: Iterator[pd.DataFrame],
+        progress_callback: Optional[Callable[[IngestionStats], None]] = None,
+    ) -> IngestionStats:
+        """
+        チャンクの列を取り込む（チャンクごとにコミット）
+
+        Args:
+            chunks: エクスポートのチャンク
+            progress_callback: チャンクごとに進捗を受け取る関数
+
+        Returns:
+            IngestionStats: 取り込み結果
+        """
+        stats = IngestionStats()
+        start_time = time.time()
+
+        raw_conn = self.engine.raw_connection()
+        try:
+            cursor = raw_conn.cursor()
+            cursor.execute(
+                f"""
+                CREATE TEMP TABLE IF NOT EXISTS {self.STAGING_TABLE} (
+                    date DATE,
+                    store_id VARCHAR(50),
+                    product_sku VARCHAR(100),
+                    sales_quantity INTEGER,
+                    price DECIMAL(10, 2),
+                    day_of_week INTEGER,
+                    is_holiday BOOLEAN,
+                    transaction_id VARCHAR(100)
+                )
+                """
+            )
+
+            for chunk in chunks:
+                rows = normalize_chunk(chunk)
+                rejected = count_rejected(chunk)
+                if rejected:
+                    logger.warning(f"Skipped {rejected:,} rows without transaction_id")
+                inserted, updated = self._copy_and_upsert(cursor, rows)
+                raw_conn.commit()
+
+                stats.rows_read += len(chunk)
+                stats.rows_inserted += inserted
+                stats.rows_updated += updated
+                stats.rows_rejected += rejected
+                stats.chunks += 1
+                stats.elapsed_seconds = time.time() - start_time
+
+                logger.info(
+                    f"POS ingestion chunk {stats.chunks}: {stats.rows_read:,} rows "
+                    f"({stats.rows_inserted:,} inserted, {stats.rows_updated:,} updated, "
+                    f"{stats.rows_per_second:,.0f} rows/s)"
+                )
+                if progress_callback:
+                    progress_callback(stats)
+
+            # 日次集計を差分更新
+            cursor.execute(
+                "SELECT store_id, month, first_date, days_refreshed FROM refresh_pos_sales_daily()"
+            )
+            refreshed = cursor.fetchall()
+            stats.daily_rows_refreshed = sum(row[3] for row in refreshed)
+            raw_conn.commit()
+
+            # 日次集計のコミット後に、締まった日を再集計した (店舗, 月) のキャッシュを破棄
+            if self.history_cache is not None:
+                self.history_cache.invalidate_refreshed(row[:3] for row in refreshed)
+            if self.rolling_stats is not None:
+                self._reload_rolling_stats(cursor, refreshed)
+                raw_conn.commit()
+
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+
+        stats.elapsed_seconds = time.time() - start_time
+        logger.info(
+            f"POS ingestion completed: {stats.rows_read:,} rows in "
+            f"{stats.elapsed_seconds:.1f}s ({stats.rows_per_second:,.0f} rows/s), "
+            f"{stats.daily_rows_refreshed:,} daily aggregates refreshed"
+        )
+        return stats
+
+    def _reload_rolling_stats(self, cursor, refreshed) -> int:
+        """
+        直近の期間を再集計した店舗のローリング統計を日次集計から読み直す
+
+        取り込みは同じ取引IDの行を更新するため、チャンクの行を加算すると二重に
+        数えてしまう。コミット済みの日次集計で店舗ごと置き換える。
+
+        Args:
+            cursor: psycopg2カーソル
+            refreshed: refresh_pos_sales_daily() の (store_id, month, first_date, days_refreshed)
+
+        Returns:
+            int: 読み直した店舗数
+        """
+        from agents.forecast_kernel import HISTORY_DAYS
+
+        since = date.today() - timedelta(days=HISTORY_DAYS)
+        store_ids = sorted(
+            {store_id for store_id, month, *_ in refreshed if month >= since.replace(day=1)}
+        )
+        if not store_ids:
+            return 0
+
+        cursor.execute(ROLLING_STATS_QUERY, (store_ids, since))
+        daily_totals = {store_id: [] for store_id in store_ids}
+        for store_id, product_sku, day, quantity in cursor.fetchall():
+            daily_totals[store_id].append((product_sku, day, quantity))
+
+        for store_id, totals in daily_totals.items():
+            self.rolling_stats.replace_store(store_id, totals)
+        logger.info(f"Reloaded rolling stats for {len(store_ids):,} stores")
+        return len(store_ids)
+
+    def _copy_and_upsert(self, cursor, rows: pd.DataFrame):
+        """
+        1チャンクをCOPYで一時テーブルに流し込み、pos_sales へ upsert
+
+        Args:
+            cursor: psycopg2カーソル
+            rows: normalize_chunk 済みのデータ
+
+        Returns:
+            Tuple[int, int]: (挿入行数, 更新行数)
+        """
+        buffer = io.StringIO()
+        rows.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+
+        if rows.empty:
+            return 0, 0
+
+        # 既定パーティションに入らないよう、チャンクの月のパーティションを先に作成
+        start, end = rows["date"].min(), rows["date"].max()
+        for table in PARTITIONED_TABLES:
+            cursor.execute(
+                "SELECT ensure_monthly_partitions(%s, %s, %s)", (table, start, end)
+            )
+
+        columns = ", ".join(POS_COLUMNS)
+        cursor.execute(f"TRUNCATE {self.STAGING_TABLE}")
+        cursor.copy_expert(
+            f"COPY {self.STAGING_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+
+        # パーティションテーブルでは RETURNING で xmax を読めないため、
+        # 既存の取引IDの件数を先に数えて更新行数とする
+        cursor.execute(
+            f"""
+            SELECT COUNT(*)
+            FROM {self.STAGING_TABLE} s
+            JOIN pos_sales p
+              ON p.date = s.date
+             AND p.store_id = s.store_id
+             AND p.transaction_id = s.transaction_id
+            WHERE p.date BETWEEN %s AND %s
+            """,
+            (start, end),
+        )
+        updated = cursor.fetchone()[0]
+
+        # 同じ取引IDの行は更新する。pos_sales のトリガーが更新前と更新後の
+        # (商品, 店舗, 日) を変更ログに記録するので、商品が変わっても元の集計行が残らない
+        cursor.execute(
+            f"""
+            INSERT INTO pos_sales ({columns})
+            SELECT {columns} FROM {self.STAGING_TABLE}
+            ON CONFLICT (date, store_id, transaction_id) DO UPDATE SET
+                product_sku = EXCLUDED.product_sku,
+                sales_quantity = EXCLUDED.sales_quantity,
+                price = EXCLUDED.price,
+                day_of_week = EXCLUDED.day_of_week,
+                is_holiday = EXCLUDED.is_holiday
+            """
+        )
+        inserted = cursor.rowcount - updated
+        return inserted, updated
+
+
+def main():
+    """コマンドライン実行"""
+    parser = argparse.ArgumentParser(description="POSエクスポートを pos_sales に取り込む")
+    parser.add_argument("paths", nargs="+", type=Path, help="CSV / Parquet ファイル")
+    parser.add_argument(
+        "--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="1回のCOPYの行数"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+
+    from agents.pos_history_cache import get_pos_history_cache
+    from agents.rolling_stats import get_rolling_stats_store
+
+    # ローリング統計はこのプロセス内のストアにしか反映されない（APIプロセスのストアは温まらない）
+    ingestor = PosIngestor(
+        chunk_size=args.chunk_size,
+        history_cache=get_pos_history_cache(),
+        rolling_stats=get_rolling_stats_store(),
+    )
+    for path in args.paths:
+        stats = ingestor.ingest_file(path)
+        print(
+            f"✅ {path}: {stats.rows_read:,} rows "
+            f"({stats.rows_inserted:,} inserted, {stats.rows_updated:,} updated, "
+            f"{stats.rows_rejected:,} rejected) "
+            f"in {stats.elapsed_seconds:.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
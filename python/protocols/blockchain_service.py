@@ -3,8 +3,12 @@ Blockchain Service
 
 Polygon Amoyテストネットとの接続・トランザクション実行
 """
+import asyncio
 import os
-from typing import Optional, Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
 from decimal import Decimal
 import logging
 from web3 import Web3
@@ -12,6 +16,9 @@ from web3.middleware import geth_poa_middleware
 from eth_account import Account
 from eth_typing import Address
 
+from metrics import BLOCKCHAIN_TRANSFER_FAILURES_TOTAL, BLOCKCHAIN_TRANSFER_SECONDS
+from protocols.nonce_manager import GasPriceOracle, NonceManager, is_nonce_error
+
 logger = logging.getLogger(__name__)
 
 
@@ -32,13 +39,78 @@ class BlockchainService:
         "name": "transfer",
         "outputs": [{"name": "", "type": "bool"}],
         "type": "function"
+    }, {
+        # MockJPYC の一括送金
+        "constant": False,
+        "inputs": [
+            {"name": "recipients", "type": "address[]"},
+            {"name": "amounts", "type": "uint256[]"}
+        ],
+        "name": "batchTransfer",
+        "outputs": [{"name": "", "type": "bool"}],
+        "type": "function"
+    }, {
+        "constant": False,
+        "inputs": [
+            {"name": "_spender", "type": "address"},
+            {"name": "_value", "type": "uint256"}
+        ],
+        "name": "approve",
+        "outputs": [{"name": "", "type": "bool"}],
+        "type": "function"
     }]
 
+    # JPYCPaymentChannel（開設・精算・期限切れ回収）
+    PAYMENT_CHANNEL_ABI = [{
+        "inputs": [
+            {"name": "recipient", "type": "address"},
+            {"name": "deposit", "type": "uint256"},
+            {"name": "duration", "type": "uint256"},
+            {"name": "salt", "type": "bytes32"}
+        ],
+        "name": "open",
+        "outputs": [{"name": "id", "type": "bytes32"}],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    }, {
+        "inputs": [
+            {"name": "id", "type": "bytes32"},
+            {"name": "amount", "type": "uint256"},
+            {"name": "signature", "type": "bytes"}
+        ],
+        "name": "close",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    }, {
+        "inputs": [{"name": "id", "type": "bytes32"}],
+        "name": "expire",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    }, {
+        "inputs": [{"name": "", "type": "bytes32"}],
+        "name": "channels",
+        "outputs": [
+            {"name": "sender", "type": "address"},
+            {"name": "recipient", "type": "address"},
+            {"name": "deposit", "type": "uint256"},
+            {"name": "expiresAt", "type": "uint256"}
+        ],
+        "stateMutability": "view",
+        "type": "function"
+    }]
+
+    # 一括送金のガスリミット（未指定時）: 基本分 + 受信者ごと（新規アドレスへの送金を含む上限）
+    BATCH_GAS_BASE = 40000
+    BATCH_GAS_PER_TRANSFER = 60000
+
     def __init__(
         self,
         rpc_url: Optional[str] = None,
         private_key: Optional[str] = None,
-        jpyc_address: Optional[str] = None
+        jpyc_address: Optional[str] = None,
+        payment_channel_address: Optional[str] = None
     ):
         """
         初期化
@@ -47,6 +119,7 @@ class BlockchainService:
             rpc_url: Polygon Amoy RPC URL（Noneの場合は環境変数から取得）
             private_key: 秘密鍵（Noneの場合は環境変数から取得）
             jpyc_address: JPYCコントラクトアドレス（Noneの場合は環境変数から取得）
+            payment_channel_address: JPYCPaymentChannelのアドレス（Noneの場合は環境変数から取得、未設定ならチャネルは使えない）
         """
         # 環境変数から設定を読み込み
         self.rpc_url = rpc_url or os.getenv("POLYGON_AMOY_RPC_URL")
@@ -54,6 +127,7 @@ class BlockchainService:
         self.jpyc_address = jpyc_address or os.getenv("MOCK_JPYC",
             "0xafac6B9175D5c51C5F73ab1aAb6d2c35bDC3A302"  # デフォルト値
         )
+        self.payment_channel_address = payment_channel_address or os.getenv("PAYMENT_CHANNEL")
 
         if not self.rpc_url:
             raise ValueError("POLYGON_AMOY_RPC_URL not set")
@@ -76,13 +150,34 @@ class BlockchainService:
             abi=self.ERC20_TRANSFER_ABI
         )
 
+        # ペイメントチャネル（デプロイ済みの場合）
+        self.payment_channel_contract = None
+        if self.payment_channel_address:
+            self.payment_channel_contract = self.w3.eth.contract(
+                address=Web3.to_checksum_address(self.payment_channel_address),
+                abi=self.PAYMENT_CHANNEL_ABI
+            )
+
         # 接続確認
         if not self.w3.is_connected():
             raise ConnectionError(f"Failed to connect to {self.rpc_url}")
 
+        # 送金ごとの RPC 呼び出し（チェーンID・ガス価格・nonce）を減らす
+        from config import settings
+
+        self.chain_id = self.w3.eth.chain_id
+        self.nonces = NonceManager(
+            lambda: self.w3.eth.get_transaction_count(self.address, "pending")
+        )
+        self.gas_price = GasPriceOracle(
+            lambda: self.w3.eth.gas_price,
+            ttl_seconds=settings.GAS_PRICE_TTL_SECONDS,
+        )
+        self.nonce_retries = settings.TRANSFER_NONCE_RETRIES
+
         logger.info(
             f"BlockchainService initialized\n"
-            f"  Network: Polygon Amoy (Chain ID: {self.w3.eth.chain_id})\n"
+            f"  Network: Polygon Amoy (Chain ID: {self.chain_id})\n"
             f"  Account: {self.address}\n"
             f"  JPYC: {self.jpyc_address}"
         )
@@ -151,31 +246,16 @@ class BlockchainService:
         Returns:
             トランザクションハッシュ
         """
+        start = time.perf_counter()
         try:
             # アドレスをチェックサム形式に変換
             to_checksum = Web3.to_checksum_address(to_address)
 
-            # トランザクションを構築
-            transaction = self.jpyc_contract.functions.transfer(
-                to_checksum,
-                amount
-            ).build_transaction({
-                'from': self.address,
-                'gas': gas_limit,
-                'gasPrice': self.w3.eth.gas_price,
-                'nonce': self.w3.eth.get_transaction_count(self.address),
-            })
-
-            # トランザクションに署名
-            signed_txn = self.w3.eth.account.sign_transaction(
-                transaction,
-                private_key=self.private_key
+            tx_hash_hex = self._send_transaction(
+                self.jpyc_contract.functions.transfer(to_checksum, amount),
+                gas_limit,
             )
 
-            # トランザクションを送信
-            tx_hash = self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-            tx_hash_hex = tx_hash.hex()
-
             logger.info(
                 f"JPYC transfer initiated\n"
                 f"  From: {self.address}\n"
@@ -188,12 +268,220 @@ class BlockchainService:
             # receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
             # logger.info(f"Transaction confirmed in block {receipt['blockNumber']}")
 
+            BLOCKCHAIN_TRANSFER_SECONDS.labels(stage="submit").observe(time.perf_counter() - start)
             return tx_hash_hex
 
         except Exception as e:
+            BLOCKCHAIN_TRANSFER_FAILURES_TOTAL.labels(stage="submit").inc()
             logger.error(f"JPYC transfer failed: {e}")
             raise
 
+    def transfer_jpyc_batch(
+        self,
+        transfers: List[Tuple[str, int]],
+        gas_limit: Optional[int] = None
+    ) -> str:
+        """
+        複数アドレスへのJPYC送金を1トランザクションで実行（batchTransfer）
+
+        Args:
+            transfers: (送信先アドレス, 送信額（wei単位）) のリスト
+            gas_limit: ガスリミット（Noneの場合は件数から見積もる）
+
+        Returns:
+            トランザクションハッシュ
+        """
+        if not transfers:
+            raise ValueError("No transfers to batch")
+
+        start = time.perf_counter()
+        try:
+            recipients = [Web3.to_checksum_address(to) for to, _ in transfers]
+            amounts = [amount for _, amount in transfers]
+            if gas_limit is None:
+                gas_limit = self.BATCH_GAS_BASE + self.BATCH_GAS_PER_TRANSFER * len(transfers)
+
+            tx_hash_hex = self._send_transaction(
+                self.jpyc_contract.functions.batchTransfer(recipients, amounts),
+                gas_limit,
+            )
+
+            logger.info(
+                f"JPYC batch transfer initiated\n"
+                f"  From: {self.address}\n"
+                f"  Recipients: {len(recipients)}\n"
+                f"  Total: {sum(amounts)} wei ({self.w3.from_wei(sum(amounts), 'ether')} JPYC)\n"
+                f"  TX Hash: {tx_hash_hex}"
+            )
+
+            BLOCKCHAIN_TRANSFER_SECONDS.labels(stage="submit").observe(time.perf_counter() - start)
+            return tx_hash_hex
+
+        except Exception as e:
+            BLOCKCHAIN_TRANSFER_FAILURES_TOTAL.labels(stage="submit").inc()
+            logger.error(f"JPYC batch transfer failed: {e}")
+            raise
+
+    def open_payment_channel(
+        self,
+        recipient: str,
+        deposit: int,
+        duration_seconds: int = 86400,
+        salt: Optional[bytes] = None,
+        gas_limit: int = 200000
+    ) -> Dict[str, Any]:
+        """
+        ペイメントチャネルを開設してデポジット（approve と open の2トランザクション）
+
+        nonce はローカルで連番に払い出すので、approve の確認を待たずに open を送れる。
+
+        Args:
+            recipient: 受け取り側（サービスエージェント）アドレス
+            deposit: デポジット額（wei単位）
+            duration_seconds: 有効期間（秒、過ぎると期限切れで回収できる）
+            salt: チャネルID計算用の32バイト（Noneの場合はランダム）
+            gas_limit: open のガスリミット
+
+        Returns:
+            チャネルID・salt・期限・トランザクションハッシュ
+            （期限は送信前の時刻から計算するので、オンチェーンの expiresAt 以前になる）
+        """
+        from protocols.x402.channel import compute_channel_id
+
+        if self.payment_channel_contract is None:
+            raise RuntimeError("PAYMENT_CHANNEL not set")
+
+        # expiresAt = open が取り込まれたブロックの時刻 + duration（送信前の時刻で下限を取る）
+        expires_at = int(time.time()) + duration_seconds
+        salt = salt or os.urandom(32)
+        recipient = Web3.to_checksum_address(recipient)
+        approve_tx = self._send_transaction(
+            self.jpyc_contract.functions.approve(self.payment_channel_contract.address, deposit),
+            100000,
+        )
+        open_tx = self._send_transaction(
+            self.payment_channel_contract.functions.open(recipient, deposit, duration_seconds, salt),
+            gas_limit,
+        )
+        channel_id = compute_channel_id(self.address, recipient, salt)
+
+        logger.info(
+            f"Payment channel opened\n"
+            f"  Channel: {channel_id}\n"
+            f"  To: {recipient}\n"
+            f"  Deposit: {deposit} wei ({self.w3.from_wei(deposit, 'ether')} JPYC)\n"
+            f"  TX Hash: {open_tx}"
+        )
+        return {
+            "channel_id": channel_id,
+            "salt": salt,
+            "expires_at": expires_at,
+            "approve_tx_hash": approve_tx,
+            "open_tx_hash": open_tx,
+        }
+
+    def get_payment_channel(self, channel_id: str) -> Dict[str, Any]:
+        """
+        オンチェーンのチャネル状態を取得（受け取り側がデポジットと期限を確認する）
+
+        Args:
+            channel_id: チャネルID
+
+        Returns:
+            sender・recipient・deposit（wei）・expires_at（閉じたチャネルは sender が 0 アドレス）
+        """
+        if self.payment_channel_contract is None:
+            raise RuntimeError("PAYMENT_CHANNEL not set")
+
+        sender, recipient, deposit, expires_at = self.payment_channel_contract.functions.channels(
+            bytes.fromhex(channel_id.removeprefix("0x"))
+        ).call()
+        return {
+            "sender": sender,
+            "recipient": recipient,
+            "deposit": deposit,
+            "expires_at": expires_at,
+        }
+
+    def close_payment_channel(
+        self,
+        channel_id: str,
+        amount: int,
+        signature: str,
+        gas_limit: int = 150000
+    ) -> str:
+        """
+        最新のバウチャーでペイメントチャネルを閉じる（受け取り側のアカウントで実行）
+
+        Args:
+            channel_id: チャネルID
+            amount: バウチャーの累積額（wei単位）
+            signature: 支払い側のバウチャー署名
+
+        Returns:
+            トランザクションハッシュ
+        """
+        if self.payment_channel_contract is None:
+            raise RuntimeError("PAYMENT_CHANNEL not set")
+
+        tx_hash = self._send_transaction(
+            self.payment_channel_contract.functions.close(
+                bytes.fromhex(channel_id.removeprefix("0x")),
+                amount,
+                bytes.fromhex(signature.removeprefix("0x")),
+            ),
+            gas_limit,
+        )
+        logger.info(f"Payment channel {channel_id} closed with {amount} wei: {tx_hash}")
+        return tx_hash
+
+    def _send_transaction(self, contract_function, gas_limit: int) -> str:
+        """
+        コントラクト呼び出しを構築・署名・送信
+
+        nonce はローカルで払い出し、ガス価格はキャッシュを使う。nonce の競合・ずれで
+        弾かれた場合は RPC から nonce を取り直して再送する。
+
+        Args:
+            contract_function: 送信するコントラクト関数（引数適用済み）
+            gas_limit: ガスリミット
+
+        Returns:
+            トランザクションハッシュ
+        """
+        for attempt in range(self.nonce_retries + 1):
+            nonce = self.nonces.allocate()
+            try:
+                # トランザクションを構築（chainId・gas・gasPrice・nonce を渡すので RPC は呼ばない）
+                transaction = contract_function.build_transaction({
+                    'from': self.address,
+                    'chainId': self.chain_id,
+                    'gas': gas_limit,
+                    'gasPrice': self.gas_price.get(),
+                    'nonce': nonce,
+                })
+
+                # トランザクションに署名
+                signed_txn = self.w3.eth.account.sign_transaction(
+                    transaction,
+                    private_key=self.private_key
+                )
+
+                # トランザクションを送信
+                tx_hash = self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
+                return tx_hash.hex()
+
+            except Exception as e:
+                if not is_nonce_error(e):
+                    self.nonces.release(nonce)
+                    raise
+                # 他のプロセス・手動送金で nonce がずれた、または置換で弾かれた
+                self.nonces.resync()
+                self.gas_price.invalidate()
+                if attempt == self.nonce_retries:
+                    raise
+                logger.warning(f"Nonce {nonce} rejected ({e}), resyncing and retrying")
+
     def get_transaction_receipt(self, tx_hash: str) -> Dict[str, Any]:
         """
         トランザクションレシートを取得
@@ -232,33 +520,188 @@ class BlockchainService:
         """
         logger.info(f"Waiting for transaction {tx_hash}...")
 
-        receipt = self.w3.eth.wait_for_transaction_receipt(
-            tx_hash,
-            timeout=timeout
-        )
+        start = time.perf_counter()
+        try:
+            receipt = self.w3.eth.wait_for_transaction_receipt(
+                tx_hash,
+                timeout=timeout
+            )
+        except Exception:
+            # タイムアウトなど
+            BLOCKCHAIN_TRANSFER_FAILURES_TOTAL.labels(stage="confirm").inc()
+            raise
+        BLOCKCHAIN_TRANSFER_SECONDS.labels(stage="confirm").observe(time.perf_counter() - start)
 
         if receipt['status'] == 1:
             logger.info(f"Transaction confirmed in block {receipt['blockNumber']}")
         else:
+            BLOCKCHAIN_TRANSFER_FAILURES_TOTAL.labels(stage="confirm").inc()
             logger.error(f"Transaction failed: {tx_hash}")
 
         return self.get_transaction_receipt(tx_hash)
 
 
+class AsyncBlockchainService:
+    """
+    BlockchainService の非同期ラッパー
+
+    RPC 呼び出し（ガス価格・nonce 取得、送信、残高照会）はブロッキングなので、
+    専用のスレッドプールで実行する。イベントループ（SSE 配信や他のリクエスト）を
+    止めず、FastAPI の既定スレッドプールも送金待ちで埋めない。
+    """
+
+    def __init__(self, service: BlockchainService, max_workers: int = 4):
+        """
+        初期化
+
+        Args:
+            service: 同期版の BlockchainService
+            max_workers: RPC 呼び出しに使うスレッド数
+        """
+        self.service = service
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="blockchain",
+        )
+
+    @property
+    def address(self) -> str:
+        return self.service.address
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+
+    async def get_chain_id(self) -> int:
+        """チェーンIDを取得"""
+        return await self._run(lambda: self.service.w3.eth.chain_id)
+
+    async def get_balance(self, address: Optional[str] = None) -> Dict[str, Any]:
+        """
+        残高を取得
+
+        Args:
+            address: アドレス（Noneの場合は自分のアドレス）
+
+        Returns:
+            残高情報
+        """
+        return await self._run(self.service.get_balance, address)
+
+    async def transfer_jpyc(
+        self,
+        to_address: str,
+        amount: int,
+        gas_limit: int = 100000
+    ) -> str:
+        """
+        JPYC転送を実行
+
+        Args:
+            to_address: 送信先アドレス
+            amount: 送信額（wei単位、18 decimals）
+            gas_limit: ガスリミット
+
+        Returns:
+            トランザクションハッシュ
+        """
+        return await self._run(self.service.transfer_jpyc, to_address, amount, gas_limit)
+
+    async def transfer_jpyc_batch(
+        self,
+        transfers: List[Tuple[str, int]],
+        gas_limit: Optional[int] = None
+    ) -> str:
+        """
+        複数アドレスへのJPYC送金を1トランザクションで実行
+
+        Args:
+            transfers: (送信先アドレス, 送信額（wei単位）) のリスト
+            gas_limit: ガスリミット（Noneの場合は件数から見積もる）
+
+        Returns:
+            トランザクションハッシュ
+        """
+        return await self._run(self.service.transfer_jpyc_batch, transfers, gas_limit)
+
+    async def get_transaction_receipt(self, tx_hash: str) -> Dict[str, Any]:
+        """
+        トランザクションレシートを取得
+
+        Args:
+            tx_hash: トランザクションハッシュ
+
+        Returns:
+            トランザクションレシート
+        """
+        return await self._run(self.service.get_transaction_receipt, tx_hash)
+
+    async def wait_for_transaction(self, tx_hash: str, timeout: int = 120) -> Dict[str, Any]:
+        """
+        トランザクションの完了を待つ（待機中もイベントループは止まらない）
+
+        Args:
+            tx_hash: トランザクションハッシュ
+            timeout: タイムアウト（秒）
+
+        Returns:
+            トランザクションレシート
+        """
+        return await self._run(self.service.wait_for_transaction, tx_hash, timeout)
+
+    def shutdown(self) -> None:
+        """スレッドプールを停止"""
+        self._executor.shutdown(wait=False)
+
+
 # グローバルインスタンス（シングルトン）
 _blockchain_service_instance: Optional[BlockchainService] = None
+_async_blockchain_service_instance: Optional[AsyncBlockchainService] = None
+_blockchain_service_lock = threading.Lock()
 
 
 def get_blockchain_service() -> BlockchainService:
     """
     BlockchainServiceのシングルトンインスタンスを取得
 
+    スレッドプールから同時に呼ばれても1つだけ生成する（インスタンスが
+    複数あるとノンスを別々に払い出してしまう）。
+
     Returns:
         BlockchainService
     """
     global _blockchain_service_instance
 
     if _blockchain_service_instance is None:
-        _blockchain_service_instance = BlockchainService()
+        with _blockchain_service_lock:
+            if _blockchain_service_instance is None:
+                _blockchain_service_instance = BlockchainService()
 
     return _blockchain_service_instance
+
+
+async def get_async_blockchain_service() -> AsyncBlockchainService:
+    """
+    AsyncBlockchainServiceのシングルトンインスタンスを取得
+
+    初回は接続確認などの RPC 呼び出しを含む BlockchainService の生成も
+    イベントループ外で行う。
+
+    Returns:
+        AsyncBlockchainService
+    """
+    from config import settings
+
+    global _async_blockchain_service_instance
+
+    if _async_blockchain_service_instance is None:
+        loop = asyncio.get_running_loop()
+        service = await loop.run_in_executor(None, get_blockchain_service)
+        # 生成を待つ間に別のタスクが先に作っていればそちらを使う
+        if _async_blockchain_service_instance is None:
+            _async_blockchain_service_instance = AsyncBlockchainService(
+                service,
+                max_workers=settings.BLOCKCHAIN_EXECUTOR_WORKERS,
+            )
+
+    return _async_blockchain_service_instance
@@ -0,0 +1,125 @@
+"""
+Nonce 管理・ガス価格オラクル
+
+同じアカウントから並行して送金すると、送金ごとに RPC で取得した nonce が
+重複する。NonceManager は最初に pending の nonce を取得した後はローカルで
+連番を払い出し、「nonce too low」などのエラーを受けたら RPC から取り直す。
+
+GasPriceOracle はガス価格を短い TTL でキャッシュし、送金ごとの RPC 呼び出しを省く。
+
+どちらもスレッドセーフ（AsyncBlockchainService はスレッドプールから呼ぶ）。
+"""
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# nonce の取り直しで解消するノードのエラーメッセージ
+NONCE_ERROR_MESSAGES = (
+    "nonce too low",
+    "nonce too high",
+    "replacement transaction underpriced",
+)
+
+
+def is_nonce_error(error: Exception) -> bool:
+    """nonce の競合・ずれによる送信エラーか"""
+    message = str(error).lower()
+    return any(text in message for text in NONCE_ERROR_MESSAGES)
+
+
+class NonceManager:
+    """アカウントの nonce をローカルで払い出す"""
+
+    def __init__(self, fetch_pending_nonce: Callable[[], int]):
+        """
+        初期化
+
+        Args:
+            fetch_pending_nonce: pending を含めた次の nonce を RPC で取得する関数
+        """
+        self._fetch = fetch_pending_nonce
+        self._next: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def allocate(self) -> int:
+        """
+        次の nonce を払い出す（初回・resync 後だけ RPC で取得）
+
+        Returns:
+            int: nonce
+        """
+        with self._lock:
+            if self._next is None:
+                self._next = self._fetch()
+                logger.info(f"Nonce synced from pending: {self._next}")
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def release(self, nonce: int) -> None:
+        """
+        送信に失敗した nonce を返却
+
+        最後に払い出した nonce なら次回に再利用する。それより前の nonce は
+        後続の送信が間を空けたままになるので、次回 RPC から取り直す。
+
+        Args:
+            nonce: 送信できなかった nonce
+        """
+        with self._lock:
+            if self._next is not None and nonce == self._next - 1:
+                self._next = nonce
+            else:
+                self._next = None
+
+    def resync(self) -> None:
+        """次回の allocate で RPC から取り直す（nonce too low などを受けたとき）"""
+        with self._lock:
+            self._next = None
+
+
+class GasPriceOracle:
+    """ガス価格を TTL 付きでキャッシュ"""
+
+    def __init__(
+        self,
+        fetch_gas_price: Callable[[], int],
+        ttl_seconds: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        初期化
+
+        Args:
+            fetch_gas_price: ガス価格（wei）を RPC で取得する関数
+            ttl_seconds: キャッシュの有効期間（秒、0 の場合は毎回取得）
+            clock: 現在時刻（秒）を返す関数
+        """
+        self._fetch = fetch_gas_price
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._value: Optional[int] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> int:
+        """
+        ガス価格を取得（期限切れの場合だけ RPC で取得）
+
+        Returns:
+            int: ガス価格（wei）
+        """
+        with self._lock:
+            now = self._clock()
+            if self._value is None or now >= self._expires_at:
+                self._value = self._fetch()
+                self._expires_at = now + self.ttl_seconds
+            return self._value
+
+    def invalidate(self) -> None:
+        """キャッシュを破棄（underpriced で弾かれたときなど）"""
+        with self._lock:
+            self._value = None
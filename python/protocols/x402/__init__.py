@@ -12,6 +12,8 @@ from .models import (
     X402Transaction,
 )
 from .client import X402Client
+from .ledger import SettlementLedger, get_settlement_ledger
+from .channel import ChannelError, PaymentChannelPayer, PaymentChannelReceiver, Voucher
 
 __all__ = [
     "PaymentScheme",
@@ -20,4 +22,10 @@ __all__ = [
     "PaymentStatus",
     "X402Transaction",
     "X402Client",
+    "SettlementLedger",
+    "get_settlement_ledger",
+    "ChannelError",
+    "PaymentChannelPayer",
+    "PaymentChannelReceiver",
+    "Voucher",
 ]
@@ -0,0 +1,270 @@
+"""
+X402 ペイメントチャネル
+
+クライアントとサービスエージェントの間の一方向ペイメントチャネル
+（contracts/src/JPYCPaymentChannel.sol）。クライアントはチャネルを開いて
+デポジットし、呼び出しごとに「チャネル開設からの累積額」に EIP-712 署名した
+バウチャーを渡す。サービス側は署名をローカルで検証するだけで支払いを確定でき、
+最後に最大額のバウチャーで1回だけチャネルを閉じる（オンチェーンは開設と精算の2回）。
+
+累積額のバウチャーなので、サービス側は最新の1枚だけを保持すればよく、
+古いバウチャーの再送は額が増えないため受け付けない。
+
+期限を過ぎると支払い側がデポジットを回収できるため、期限の expiry_margin_seconds 前からは
+バウチャーを発行・受理しない（サービス側が期限前に close を確定させる時間）。
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from eth_abi import encode
+from eth_account import Account
+from eth_account.messages import encode_typed_data
+from eth_utils import keccak, to_checksum_address
+
+logger = logging.getLogger(__name__)
+
+# JPYCPaymentChannel の EIP712("JPYCPaymentChannel", "1") と VOUCHER_TYPEHASH に対応
+DOMAIN_NAME = "JPYCPaymentChannel"
+DOMAIN_VERSION = "1"
+VOUCHER_TYPES = {
+    "Voucher": [
+        {"name": "channelId", "type": "bytes32"},
+        {"name": "amount", "type": "uint256"},
+    ]
+}
+
+# 期限の何秒前からバウチャーを発行・受理しないか
+DEFAULT_EXPIRY_MARGIN_SECONDS = 600
+
+
+class ChannelError(ValueError):
+    """バウチャーを発行・受理できない（デポジット超過・署名不正など）"""
+
+
+def compute_channel_id(sender: str, recipient: str, salt: bytes) -> str:
+    """
+    チャネルIDを計算（JPYCPaymentChannel.channelId と同じ）
+
+    Args:
+        sender: 支払い側アドレス
+        recipient: 受け取り側アドレス
+        salt: 32バイトの任意値
+
+    Returns:
+        str: チャネルID（0x付き16進）
+    """
+    return "0x" + keccak(
+        encode(["address", "address", "bytes32"], [sender, recipient, salt])
+    ).hex()
+
+
+def _voucher_message(
+    channel_id: str, amount: int, chain_id: int, contract_address: str
+):
+    return encode_typed_data(
+        domain_data={
+            "name": DOMAIN_NAME,
+            "version": DOMAIN_VERSION,
+            "chainId": chain_id,
+            "verifyingContract": to_checksum_address(contract_address),
+        },
+        message_types=VOUCHER_TYPES,
+        message_data={"channelId": bytes.fromhex(channel_id[2:]), "amount": amount},
+    )
+
+
+def _check_expiry(
+    channel_id: str, expires_at: int, margin_seconds: float, clock: Callable[[], float]
+) -> None:
+    if clock() >= expires_at - margin_seconds:
+        raise ChannelError(
+            f"Channel {channel_id} expires at {expires_at}; "
+            f"no vouchers within {margin_seconds:.0f}s of expiry"
+        )
+
+
+@dataclass(slots=True)
+class Voucher:
+    """累積額のバウチャー"""
+
+    channel_id: str
+    amount: int  # チャネル開設からの累積額（wei）
+    signature: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"channel_id": self.channel_id, "amount": self.amount, "signature": self.signature}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Voucher":
+        return cls(data["channel_id"], int(data["amount"]), data["signature"])
+
+
+class PaymentChannelPayer:
+    """支払い側（クライアント）のチャネル: バウチャーを発行"""
+
+    def __init__(
+        self,
+        private_key: str,
+        recipient: str,
+        deposit: int,
+        chain_id: int,
+        contract_address: str,
+        expires_at: int,
+        salt: Optional[bytes] = None,
+        expiry_margin_seconds: float = DEFAULT_EXPIRY_MARGIN_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        初期化
+
+        Args:
+            private_key: 支払い側の秘密鍵（バウチャーの署名用）
+            recipient: 受け取り側アドレス
+            deposit: デポジット額（wei）
+            chain_id: チェーンID
+            contract_address: JPYCPaymentChannel のアドレス
+            expires_at: チャネルの期限（Unix timestamp、オンチェーンの値以前であること）
+            salt: チャネルID計算用の値（Noneの場合はランダム）
+            expiry_margin_seconds: 期限の何秒前からバウチャーを発行しないか
+            clock: 現在時刻（Unix timestamp）を返す関数
+        """
+        self._account = Account.from_key(private_key)
+        self.sender = self._account.address
+        self.recipient = to_checksum_address(recipient)
+        self.deposit = deposit
+        self.chain_id = chain_id
+        self.contract_address = to_checksum_address(contract_address)
+        self.expires_at = expires_at
+        self.expiry_margin_seconds = expiry_margin_seconds
+        self._clock = clock
+        self.salt = salt or os.urandom(32)
+        self.channel_id = compute_channel_id(self.sender, self.recipient, self.salt)
+        self.paid = 0
+        self._lock = threading.Lock()
+
+    @property
+    def remaining(self) -> int:
+        """未使用のデポジット（wei）"""
+        return self.deposit - self.paid
+
+    def pay(self, amount: int) -> Voucher:
+        """
+        amount を上乗せした累積額のバウチャーを発行
+
+        Args:
+            amount: 今回の支払額（wei）
+
+        Returns:
+            Voucher
+
+        Raises:
+            ChannelError: デポジットが足りない場合・期限が近い場合
+        """
+        _check_expiry(self.channel_id, self.expires_at, self.expiry_margin_seconds, self._clock)
+        with self._lock:
+            total = self.paid + amount
+            if total > self.deposit:
+                raise ChannelError(
+                    f"Channel {self.channel_id} deposit exhausted: "
+                    f"{total} > {self.deposit} wei"
+                )
+            signed = self._account.sign_message(
+                _voucher_message(self.channel_id, total, self.chain_id, self.contract_address)
+            )
+            self.paid = total
+        return Voucher(self.channel_id, total, "0x" + signed.signature.hex().removeprefix("0x"))
+
+
+class PaymentChannelReceiver:
+    """受け取り側（サービスエージェント）のチャネル: バウチャーをローカルで検証"""
+
+    def __init__(
+        self,
+        sender: str,
+        channel_id: str,
+        deposit: int,
+        chain_id: int,
+        contract_address: str,
+        expires_at: int,
+        expiry_margin_seconds: float = DEFAULT_EXPIRY_MARGIN_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        初期化
+
+        Args:
+            sender: 支払い側アドレス（バウチャーの署名者）
+            channel_id: チャネルID
+            deposit: デポジット額（wei、オンチェーンの値を確認済みであること）
+            chain_id: チェーンID
+            contract_address: JPYCPaymentChannel のアドレス
+            expires_at: チャネルの期限（Unix timestamp、オンチェーンの値を確認済みであること）
+            expiry_margin_seconds: 期限の何秒前からバウチャーを受理しないか（close を確定させる時間）
+            clock: 現在時刻（Unix timestamp）を返す関数
+        """
+        self.sender = to_checksum_address(sender)
+        self.channel_id = channel_id.lower()
+        self.deposit = deposit
+        self.chain_id = chain_id
+        self.contract_address = to_checksum_address(contract_address)
+        self.expires_at = expires_at
+        self.expiry_margin_seconds = expiry_margin_seconds
+        self._clock = clock
+        self.latest: Optional[Voucher] = None
+        self._lock = threading.Lock()
+
+    @property
+    def received(self) -> int:
+        """受け取り済みの累積額（wei）"""
+        return self.latest.amount if self.latest else 0
+
+    def accept(self, voucher: Voucher, price: int) -> int:
+        """
+        バウチャーを検証して受理（署名の検証だけでオンチェーンの呼び出しはしない）
+
+        Args:
+            voucher: 受け取ったバウチャー
+            price: 今回の請求額（wei、累積額の増分がこれ以上であること）
+
+        Returns:
+            int: 今回の支払額（累積額の増分）
+
+        Raises:
+            ChannelError: チャネル違い・期限切れ間近・額不足・デポジット超過・署名不正の場合
+        """
+        if voucher.channel_id.lower() != self.channel_id:
+            raise ChannelError(f"Voucher for another channel: {voucher.channel_id}")
+        _check_expiry(self.channel_id, self.expires_at, self.expiry_margin_seconds, self._clock)
+        if voucher.amount > self.deposit:
+            raise ChannelError(f"Voucher exceeds deposit: {voucher.amount} > {self.deposit}")
+
+        signer = Account.recover_message(
+            _voucher_message(self.channel_id, voucher.amount, self.chain_id, self.contract_address),
+            signature=voucher.signature,
+        )
+        if signer != self.sender:
+            raise ChannelError(f"Invalid voucher signature (signer {signer})")
+
+        with self._lock:
+            increment = voucher.amount - self.received
+            if increment < max(price, 1):
+                raise ChannelError(
+                    f"Voucher does not cover the charge: +{increment} < {price} wei"
+                )
+            self.latest = voucher
+        return increment
+
+    def close_args(self) -> Tuple[str, int, str]:
+        """
+        チャネルを閉じる引数（JPYCPaymentChannel.close に渡す最新のバウチャー）
+
+        Returns:
+            Tuple[str, int, str]: (チャネルID, 累積額, 署名)
+        """
+        if self.latest is None:
+            raise ChannelError(f"No voucher received on channel {self.channel_id}")
+        return self.latest.channel_id, self.latest.amount, self.latest.signature
@@ -3,8 +3,10 @@ X402 v2 クライアント
 
 Agent-to-Agent決済を実行するクライアント実装
 """
+import asyncio
 import uuid
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime
 import logging
 
@@ -17,9 +19,14 @@ from .models import (
     jpyc_to_wei,
     wei_to_jpyc,
 )
+from .channel import ChannelError, PaymentChannelPayer
+from .ledger import ACCRUED, SETTLED, SettlementBatch
 
 logger = logging.getLogger(__name__)
 
+# 台帳に記録してまとめて精算するスキーム（精算台帳を渡した場合）
+LEDGER_SCHEMES = (PaymentScheme.DEFERRED, PaymentScheme.UPTO)
+
 
 class X402Client:
     """
@@ -31,7 +38,9 @@ class X402Client:
     def __init__(
         self,
         blockchain_service=None,
-        client_agent_id: int = 0
+        client_agent_id: int = 0,
+        max_batch_size: int = 200,
+        ledger=None
     ):
         """
         初期化
@@ -39,10 +48,20 @@ class X402Client:
         Args:
             blockchain_service: ブロックチェーンサービス（Phase 3ではNone）
             client_agent_id: クライアントエージェントID
+            max_batch_size: 一括精算1トランザクションあたりの送金先数の上限
+            ledger: 精算台帳（SettlementLedger、指定した場合 DEFERRED・UPTO は台帳経由で精算）
         """
         self.blockchain_service = blockchain_service
         self.client_agent_id = client_agent_id
+        self.max_batch_size = max_batch_size
+        self.ledger = ledger
         self.transactions: Dict[str, X402Transaction] = {}
+        # 支払先アドレス（小文字）→ ペイメントチャネル
+        self.channels: Dict[str, PaymentChannelPayer] = {}
+        # 一括精算待ちの決済（トランザクション, 支払先アドレス）
+        self._pending_settlement: List[Tuple[X402Transaction, str]] = []
+        # 送信済みでレシート未確認の一括送金（トランザクションハッシュ → 決済）
+        self._awaiting_receipt: Dict[str, List[Tuple[X402Transaction, str]]] = {}
 
         logger.info(f"X402Client initialized for agent {client_agent_id}")
 
@@ -97,6 +116,12 @@ class X402Client:
         """
         X402レスポンスを処理し、決済を実行
 
+        支払先とのペイメントチャネルがある場合は、累積額のバウチャーを発行するだけで
+        オンチェーンの送金はしない（デポジットが尽きたら以下の方法にフォールバック）。
+        精算台帳がある場合、DEFERRED・UPTO は台帳に記録するだけで（AUTHORIZED）、
+        この支払先が精算時期に達したら精算時期の支払先の分をまとめて送金する
+        （精算の失敗は記録のみで、課金は台帳に残って次回の精算で送金される）。
+
         Args:
             request: 元のリクエスト
             response: エージェントからのレスポンス
@@ -104,6 +129,81 @@ class X402Client:
         Returns:
             X402Transaction
         """
+        transaction = self._create_transaction(request, response)
+
+        transaction_id = transaction.transaction_id
+        actual_amount_jpyc = wei_to_jpyc(response.actual_amount)
+
+        channel = self.channels.get(response.payment_address.lower())
+        if channel is not None:
+            try:
+                voucher = channel.pay(response.actual_amount)
+            except ChannelError as e:
+                logger.warning(f"{e}; falling back to on-chain payment")
+            else:
+                transaction.channel_id = voucher.channel_id
+                transaction.voucher = voucher.to_dict()
+                transaction.status = PaymentStatus.COMPLETED
+                transaction.completed_at = datetime.now()
+                self.transactions[transaction_id] = transaction
+                return transaction
+
+        if self.ledger is not None and request.payment_scheme in LEDGER_SCHEMES:
+            transaction.status = PaymentStatus.AUTHORIZED
+            self.transactions[transaction_id] = transaction
+            self.ledger.accrue(transaction, response.payment_address)
+            try:
+                if self.ledger.is_payee_due(response.payment_address):
+                    # 送信だけ行う（レシートの待ち受けで課金を止めない）
+                    self.settle_ledger(wait_for_receipts=False)
+            except Exception as e:
+                # 課金は台帳に記録済み（次回の精算・settle_periodically で送金される）
+                logger.error(f"Ledger settlement failed: {e}")
+            return transaction
+
+        # 決済実行（Phase 3ではモック、Phase 4でブロックチェーン統合）
+        if self.blockchain_service:
+            # 実際のブロックチェーン決済
+            tx_hash = self._execute_blockchain_payment(
+                to_address=response.payment_address,
+                amount=response.actual_amount
+            )
+            transaction.tx_hash = tx_hash
+            transaction.status = PaymentStatus.COMPLETED
+            transaction.completed_at = datetime.now()
+
+        else:
+            # Phase 3: モック決済
+            transaction.tx_hash = f"0xmock_{transaction_id[:8]}"
+            transaction.status = PaymentStatus.COMPLETED
+            transaction.completed_at = datetime.now()
+
+            logger.info(
+                f"[MOCK] Payment completed: {actual_amount_jpyc} JPYC "
+                f"from agent {request.client_agent_id} to agent {request.service_agent_id} "
+                f"(scheme: {request.payment_scheme.value})"
+            )
+
+        # トランザクションを記録
+        self.transactions[transaction_id] = transaction
+
+        return transaction
+
+    def _create_transaction(
+        self,
+        request: X402Request,
+        response: X402Response
+    ) -> X402Transaction:
+        """
+        レスポンスの請求額をスキームに沿って検証し、トランザクションを作成
+
+        Args:
+            request: 元のリクエスト
+            response: エージェントからのレスポンス
+
+        Returns:
+            X402Transaction（PENDING）
+        """
         # トランザクションIDを生成
         transaction_id = f"tx-{uuid.uuid4()}"
 
@@ -139,33 +239,295 @@ class X402Client:
             status=PaymentStatus.PENDING
         )
 
-        # 決済実行（Phase 3ではモック、Phase 4でブロックチェーン統合）
-        if self.blockchain_service:
-            # 実際のブロックチェーン決済
-            tx_hash = self._execute_blockchain_payment(
-                to_address=response.payment_address,
-                amount=response.actual_amount
-            )
-            transaction.tx_hash = tx_hash
+        return transaction
+
+    def add_channel(self, channel: PaymentChannelPayer) -> None:
+        """
+        開設済みのペイメントチャネルを登録（以降その支払先への決済はバウチャーで行う）
+
+        Args:
+            channel: 支払い側のチャネル
+        """
+        self.channels[channel.recipient.lower()] = channel
+
+    def open_channel(
+        self,
+        payment_address: str,
+        deposit_jpyc: float,
+        duration_seconds: int = 86400
+    ) -> PaymentChannelPayer:
+        """
+        支払先とのペイメントチャネルをオンチェーンで開設して登録
+
+        Args:
+            payment_address: 支払先（サービスエージェント）アドレス
+            deposit_jpyc: デポジット額（JPYC）
+            duration_seconds: 有効期間（秒）
+
+        Returns:
+            PaymentChannelPayer
+        """
+        if not self.blockchain_service:
+            raise RuntimeError("Blockchain service not initialized")
+
+        deposit = jpyc_to_wei(deposit_jpyc)
+        opened = self.blockchain_service.open_payment_channel(
+            recipient=payment_address,
+            deposit=deposit,
+            duration_seconds=duration_seconds,
+        )
+        channel = PaymentChannelPayer(
+            private_key=self.blockchain_service.private_key,
+            recipient=payment_address,
+            deposit=deposit,
+            chain_id=self.blockchain_service.chain_id,
+            contract_address=self.blockchain_service.payment_channel_address,
+            expires_at=opened["expires_at"],
+            salt=opened["salt"],
+        )
+        self.add_channel(channel)
+        return channel
+
+    def queue_payment(
+        self,
+        request: X402Request,
+        response: X402Response
+    ) -> X402Transaction:
+        """
+        X402レスポンスを処理し、決済を一括精算待ちに積む
+
+        送金は settle_pending() でまとめて実行する（送金ごとのガス代・待ち時間を省く）。
+
+        Args:
+            request: 元のリクエスト
+            response: エージェントからのレスポンス
+
+        Returns:
+            X402Transaction（AUTHORIZED、精算後に COMPLETED）
+        """
+        transaction = self._create_transaction(request, response)
+        transaction.status = PaymentStatus.AUTHORIZED
+
+        self.transactions[transaction.transaction_id] = transaction
+        self._pending_settlement.append((transaction, response.payment_address))
+
+        return transaction
+
+    @property
+    def pending_settlement_count(self) -> int:
+        """一括精算待ちの決済数"""
+        return len(self._pending_settlement)
+
+    def settle_pending(self) -> List[X402Transaction]:
+        """
+        一括精算待ちの決済をまとめて送金
+
+        同じ支払先への決済は合算し、max_batch_size 件ごとに1トランザクション
+        （batchTransfer）で送金する。全バッチを送信してからレシートを確認し、
+        成功した分だけ COMPLETED にする。送金に失敗した分とリバートした分は
+        精算待ちに残るので、再度呼び出せば再送できる。レシートを待てなかった分は
+        次回の呼び出しで確認する（再送はしない）。
+
+        Returns:
+            List[X402Transaction]: 精算した（レシートを確認した）決済
+
+        Raises:
+            Exception: 送金に失敗した場合（送信済みのバッチはレシートを確認する）
+        """
+        confirm = self._confirmer()
+        settled: List[X402Transaction] = []
+        for tx_hash in list(self._awaiting_receipt):
+            settled.extend(self._confirm_batch(tx_hash, confirm))
+
+        submitted: List[str] = []
+        try:
+            self._submit_pending(submitted)
+        finally:
+            for tx_hash in submitted:
+                settled.extend(self._confirm_batch(tx_hash, confirm))
+
+        return settled
+
+    def _submit_pending(self, submitted: List[str]) -> None:
+        """精算待ちの決済を max_batch_size 件の支払先ごとに送信（送信したハッシュを submitted に追加）"""
+        while self._pending_settlement:
+            # 支払先ごとに合算（max_batch_size 件の支払先まで）
+            totals: "OrderedDict[str, int]" = OrderedDict()
+            count = 0
+            for transaction, address in self._pending_settlement:
+                key = address.lower()
+                if key not in totals and len(totals) == self.max_batch_size:
+                    break
+                totals[key] = totals.get(key, 0) + transaction.amount
+                count += 1
+            batch = self._pending_settlement[:count]
+            addresses: Dict[str, str] = {}
+            for _, address in batch:
+                addresses.setdefault(address.lower(), address)
+
+            if self.blockchain_service:
+                tx_hash = self.blockchain_service.transfer_jpyc_batch(
+                    [(addresses[key], amount) for key, amount in totals.items()]
+                )
+            else:
+                # Phase 3: モック決済
+                tx_hash = f"0xmock_batch_{uuid.uuid4().hex[:8]}"
+                logger.info(
+                    f"[MOCK] Batch payment completed: {len(batch)} payments to "
+                    f"{len(totals)} addresses ({wei_to_jpyc(sum(totals.values()))} JPYC)"
+                )
+
+            for transaction, _ in batch:
+                transaction.tx_hash = tx_hash
+            self._awaiting_receipt[tx_hash] = batch
+            submitted.append(tx_hash)
+            del self._pending_settlement[:count]
+
+    def _confirm_batch(self, tx_hash: str, confirm) -> List[X402Transaction]:
+        """
+        一括送金のレシートを確認
+
+        成功なら COMPLETED にし、リバートなら精算待ちに戻す。
+        確認できなかった場合（タイムアウトなど）は次回まで保留する。
+
+        Args:
+            tx_hash: 一括送金のトランザクションハッシュ
+            confirm: レシートを確認する関数
+
+        Returns:
+            List[X402Transaction]: 精算した決済
+        """
+        try:
+            succeeded = confirm(tx_hash)
+        except Exception as e:
+            logger.warning(f"Batch payment {tx_hash} not confirmed yet: {e}")
+            return []
+
+        batch = self._awaiting_receipt.pop(tx_hash)
+        if not succeeded:
+            logger.error(f"Batch payment {tx_hash} reverted; {len(batch)} payments re-queued")
+            for transaction, _ in batch:
+                transaction.tx_hash = None
+            self._pending_settlement.extend(batch)
+            return []
+
+        completed_at = datetime.now()
+        for transaction, _ in batch:
             transaction.status = PaymentStatus.COMPLETED
-            transaction.completed_at = datetime.now()
+            transaction.completed_at = completed_at
+        return [transaction for transaction, _ in batch]
+
+    def settle_ledger(
+        self, force: bool = False, wait_for_receipts: bool = True
+    ) -> List[SettlementBatch]:
+        """
+        精算台帳の未精算分を支払先ごとに合算して送金
 
+        送金ごとにレシートを確認し、成功した分だけ COMPLETED にする
+        （リバートした分は台帳の未精算に戻り、次回の精算で再送される）。
+        wait_for_receipts=False の場合はレシートを待たない。送信済みのバッチは
+        マイニング済みのものだけ確認し、送信したバッチは submitting のまま残して
+        次回の精算（settle_periodically など）で確認する。
+
+        Args:
+            force: しきい値・経過時間に関係なく全支払先を精算する
+            wait_for_receipts: レシートを待つか（課金の処理中に精算する場合はFalse）
+
+        Returns:
+            List[SettlementBatch]: 確認・送信した一括送金（SettlementBatch.status に結果）
+        """
+        if self.ledger is None:
+            raise RuntimeError("Settlement ledger not configured")
+
+        if self.blockchain_service:
+            send_batch = self.blockchain_service.transfer_jpyc_batch
         else:
             # Phase 3: モック決済
-            transaction.tx_hash = f"0xmock_{transaction_id[:8]}"
-            transaction.status = PaymentStatus.COMPLETED
-            transaction.completed_at = datetime.now()
+            def send_batch(transfers):
+                return f"0xmock_batch_{uuid.uuid4().hex[:8]}"
+        confirm = self._confirmer(wait=wait_for_receipts)
+
+        # 前回レシートを確認できなかったバッチを先に確認
+        batches = self.ledger.reconcile(confirm)
+        batches += self.ledger.settle(
+            send_batch, confirm=confirm if wait_for_receipts else None, force=force
+        )
 
-            logger.info(
-                f"[MOCK] Payment completed: {actual_amount_jpyc} JPYC "
-                f"from agent {request.client_agent_id} to agent {request.service_agent_id} "
-                f"(scheme: {request.payment_scheme.value})"
-            )
+        # このクライアントが記録した決済のステータスを更新
+        for batch in batches:
+            for transaction_id in batch.transaction_ids:
+                transaction = self.transactions.get(transaction_id)
+                if transaction is None:
+                    continue
+                if batch.status == SETTLED:
+                    transaction.tx_hash = batch.tx_hash
+                    transaction.status = PaymentStatus.COMPLETED
+                    transaction.completed_at = datetime.now()
+                elif batch.status == ACCRUED:
+                    # リバート（台帳の未精算に戻ったので AUTHORIZED のまま）
+                    transaction.tx_hash = None
+                else:
+                    transaction.tx_hash = batch.tx_hash
+
+        return batches
+
+    async def settle_periodically(self, interval_seconds: float) -> None:
+        """
+        精算台帳を一定間隔で精算（経過時間の条件に達した支払先を送金し、
+        課金時に送信だけしたバッチのレシートを確認する）
 
-        # トランザクションを記録
-        self.transactions[transaction_id] = transaction
+        タスクとして起動し、停止するときはキャンセルする。
 
-        return transaction
+        Args:
+            interval_seconds: 精算を確認する間隔（秒）
+        """
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                # 台帳の読み書きと送金はブロッキングなのでスレッドで実行
+                await asyncio.to_thread(self.settle_ledger)
+            except Exception as e:
+                logger.error(f"Periodic settlement failed: {e}")
+
+    def _confirmer(self, wait: bool = True):
+        """
+        レシートを確認する関数（Phase 3のモック決済では常に成功）
+
+        Args:
+            wait: レシートを待つか（Falseの場合はマイニング済みかだけを確認）
+        """
+        if self.blockchain_service:
+            return self._confirm_transaction if wait else self._check_transaction
+        return lambda tx_hash: True
+
+    def _confirm_transaction(self, tx_hash: str) -> bool:
+        """
+        送金のレシートを待ち、成功したかを返す
+
+        Args:
+            tx_hash: トランザクションハッシュ
+
+        Returns:
+            bool: レシートの status が 1（成功）ならTrue
+        """
+        receipt = self.blockchain_service.wait_for_transaction(tx_hash)
+        return receipt["status"] == 1
+
+    def _check_transaction(self, tx_hash: str) -> bool:
+        """
+        送金のレシートを待たずに取得し、成功したかを返す
+
+        Args:
+            tx_hash: トランザクションハッシュ
+
+        Returns:
+            bool: レシートの status が 1（成功）ならTrue
+
+        Raises:
+            Exception: まだマイニングされていない場合（TransactionNotFound）
+        """
+        receipt = self.blockchain_service.get_transaction_receipt(tx_hash)
+        return receipt["status"] == 1
 
     def _execute_blockchain_payment(
         self,
@@ -0,0 +1,550 @@
+"""
+X402 精算台帳
+
+DEFERRED（後払い）・UPTO（従量課金）の課金を送金せずに台帳へ記録し、
+支払先ごとに合算してまとめて送金する。1万回呼ばれたエージェントへの支払いも
+数回の batchTransfer で済む。
+
+精算は支払先ごとの未精算額がしきい値に達したとき、または最も古い課金が
+一定時間を過ぎたときに行う（X402Client.settle_periodically で定期実行もできる）。
+
+精算は「確保（submitting）→ 送金（tx_hash を記録）→ レシート確認 → 精算済み（settled）」
+の順で台帳を更新する。レシートの status が 1 になるまでは submitting のままで、
+リバートした分と送金に失敗した分は未精算に戻す。レシートを待てなかった分は
+reconcile で後から確認する。確保後・送金前にプロセスが落ちた分は tx_hash がないまま
+submitting に残るので、その行を突き合わせれば二重払いにならない。
+
+バックエンドは PostgreSQL（既定、x402_settlement_ledger テーブル）と
+プロセス内のメモリ（テスト用）。
+"""
+import logging
+import threading
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+from .models import X402Transaction, jpyc_to_wei, wei_to_jpyc
+
+logger = logging.getLogger(__name__)
+
+# 台帳の状態
+ACCRUED = "accrued"
+SUBMITTING = "submitting"
+SETTLED = "settled"
+
+# (送信先アドレス, 送信額（wei）) のリストを送金してトランザクションハッシュを返す関数
+SendBatch = Callable[[List[Tuple[str, int]]], str]
+
+# トランザクションハッシュのレシートを待ち、成功（status == 1）したかを返す関数
+ConfirmBatch = Callable[[str], bool]
+
+
+@dataclass(slots=True)
+class LedgerEntry:
+    """台帳の1行（1回分の課金）"""
+
+    transaction_id: str
+    client_agent_id: int
+    service_agent_id: int
+    payment_address: str  # 小文字に正規化
+    payment_scheme: str
+    amount: int  # wei
+    created_at: datetime
+    status: str = ACCRUED
+    batch_id: Optional[str] = None
+    tx_hash: Optional[str] = None
+    settled_at: Optional[datetime] = None
+
+
+@dataclass(slots=True)
+class PayeeBalance:
+    """支払先ごとの未精算額"""
+
+    payment_address: str
+    amount: int  # wei
+    count: int
+    oldest_at: datetime
+
+
+@dataclass(slots=True)
+class SettlementBatch:
+    """1回の一括送金"""
+
+    batch_id: str
+    tx_hash: str
+    transfers: List[Tuple[str, int]]
+    transaction_ids: List[str] = field(default_factory=list)
+    status: str = SUBMITTING  # レシート確認後に SETTLED、リバートした場合は ACCRUED
+
+
+class InMemoryLedgerBackend:
+    """プロセス内の台帳（テスト・DBなしの実行用、再起動で消える）"""
+
+    def __init__(self):
+        self._entries: Dict[str, LedgerEntry] = {}
+        self._lock = threading.Lock()
+
+    def add(self, entry: LedgerEntry) -> None:
+        with self._lock:
+            self._entries.setdefault(entry.transaction_id, entry)
+
+    def balances(self) -> List[PayeeBalance]:
+        with self._lock:
+            totals: Dict[str, PayeeBalance] = {}
+            for entry in self._entries.values():
+                if entry.status != ACCRUED:
+                    continue
+                balance = totals.get(entry.payment_address)
+                if balance is None:
+                    totals[entry.payment_address] = PayeeBalance(
+                        entry.payment_address, entry.amount, 1, entry.created_at
+                    )
+                else:
+                    balance.amount += entry.amount
+                    balance.count += 1
+                    balance.oldest_at = min(balance.oldest_at, entry.created_at)
+            return list(totals.values())
+
+    def balance(self, address: str) -> Optional[PayeeBalance]:
+        with self._lock:
+            entries = [
+                entry for entry in self._entries.values()
+                if entry.status == ACCRUED and entry.payment_address == address
+            ]
+        if not entries:
+            return None
+        return PayeeBalance(
+            address,
+            sum(entry.amount for entry in entries),
+            len(entries),
+            min(entry.created_at for entry in entries),
+        )
+
+    def claim(self, addresses: Sequence[str], batch_id: str) -> List[LedgerEntry]:
+        targets = set(addresses)
+        with self._lock:
+            claimed = []
+            for entry in self._entries.values():
+                if entry.status == ACCRUED and entry.payment_address in targets:
+                    entry.status = SUBMITTING
+                    entry.batch_id = batch_id
+                    claimed.append(entry)
+            return claimed
+
+    def submitted(self, batch_id: str, tx_hash: str) -> None:
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.batch_id == batch_id and entry.status == SUBMITTING:
+                    entry.tx_hash = tx_hash
+
+    def in_flight(self) -> List[LedgerEntry]:
+        with self._lock:
+            return [
+                entry for entry in self._entries.values()
+                if entry.status == SUBMITTING and entry.tx_hash is not None
+            ]
+
+    def complete(self, batch_id: str) -> None:
+        with self._lock:
+            settled_at = datetime.now()
+            for entry in self._entries.values():
+                if entry.batch_id == batch_id and entry.status == SUBMITTING:
+                    entry.status = SETTLED
+                    entry.settled_at = settled_at
+
+    def release(self, batch_id: str) -> None:
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.batch_id == batch_id and entry.status == SUBMITTING:
+                    entry.status = ACCRUED
+                    entry.batch_id = None
+                    entry.tx_hash = None
+
+    def get(self, transaction_id: str) -> Optional[LedgerEntry]:
+        with self._lock:
+            return self._entries.get(transaction_id)
+
+
+class PostgresLedgerBackend:
+    """PostgreSQL の台帳（x402_settlement_ledger、複数プロセスで共有）"""
+
+    INSERT = text(
+        """
+        INSERT INTO x402_settlement_ledger (
+            transaction_id, client_agent_id, service_agent_id,
+            payment_address, payment_scheme, amount, created_at
+        )
+        VALUES (
+            :transaction_id, :client_agent_id, :service_agent_id,
+            :payment_address, :payment_scheme, :amount, :created_at
+        )
+        ON CONFLICT (transaction_id) DO NOTHING
+        """
+    )
+
+    BALANCES = text(
+        """
+        SELECT payment_address, SUM(amount), COUNT(*), MIN(created_at)
+        FROM x402_settlement_ledger
+        WHERE status = 'accrued'
+        GROUP BY payment_address
+        """
+    )
+
+    # idx_x402_settlement_ledger_accrued の index-only scan（課金ごとのしきい値判定用）
+    BALANCE = text(
+        """
+        SELECT SUM(amount), COUNT(*), MIN(created_at)
+        FROM x402_settlement_ledger
+        WHERE status = 'accrued' AND payment_address = :address
+        """
+    )
+
+    # 他のプロセスが確保中の行は飛ばす（同じ課金を二重に送金しない）
+    CLAIM = text(
+        """
+        UPDATE x402_settlement_ledger
+        SET status = 'submitting', batch_id = :batch_id
+        WHERE transaction_id IN (
+            SELECT transaction_id
+            FROM x402_settlement_ledger
+            WHERE status = 'accrued' AND payment_address = ANY(:addresses)
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING transaction_id, client_agent_id, service_agent_id,
+                  payment_address, payment_scheme, amount, created_at
+        """
+    )
+
+    SUBMITTED = text(
+        """
+        UPDATE x402_settlement_ledger
+        SET tx_hash = :tx_hash
+        WHERE batch_id = :batch_id AND status = 'submitting'
+        """
+    )
+
+    IN_FLIGHT = text(
+        """
+        SELECT transaction_id, client_agent_id, service_agent_id,
+               payment_address, payment_scheme, amount, created_at, batch_id, tx_hash
+        FROM x402_settlement_ledger
+        WHERE status = 'submitting' AND tx_hash IS NOT NULL
+        """
+    )
+
+    COMPLETE = text(
+        """
+        UPDATE x402_settlement_ledger
+        SET status = 'settled', settled_at = :settled_at
+        WHERE batch_id = :batch_id AND status = 'submitting'
+        """
+    )
+
+    RELEASE = text(
+        """
+        UPDATE x402_settlement_ledger
+        SET status = 'accrued', batch_id = NULL, tx_hash = NULL
+        WHERE batch_id = :batch_id AND status = 'submitting'
+        """
+    )
+
+    def __init__(self, session_factory: Callable):
+        """
+        Args:
+            session_factory: 同期セッションを返す関数（database.SessionLocal）
+        """
+        self.session_factory = session_factory
+
+    def _execute(self, statement, params: Dict) -> List:
+        with self.session_factory() as db:
+            result = db.execute(statement, params)
+            rows = result.fetchall() if result.returns_rows else []
+            db.commit()
+            return rows
+
+    def add(self, entry: LedgerEntry) -> None:
+        self._execute(self.INSERT, {
+            "transaction_id": entry.transaction_id,
+            "client_agent_id": entry.client_agent_id,
+            "service_agent_id": entry.service_agent_id,
+            "payment_address": entry.payment_address,
+            "payment_scheme": entry.payment_scheme,
+            "amount": entry.amount,
+            "created_at": entry.created_at,
+        })
+
+    def balances(self) -> List[PayeeBalance]:
+        return [
+            PayeeBalance(address, int(amount), count, oldest_at)
+            for address, amount, count, oldest_at in self._execute(self.BALANCES, {})
+        ]
+
+    def balance(self, address: str) -> Optional[PayeeBalance]:
+        amount, count, oldest_at = self._execute(self.BALANCE, {"address": address})[0]
+        if not count:
+            return None
+        return PayeeBalance(address, int(amount), count, oldest_at)
+
+    def claim(self, addresses: Sequence[str], batch_id: str) -> List[LedgerEntry]:
+        rows = self._execute(self.CLAIM, {"addresses": list(addresses), "batch_id": batch_id})
+        return [_submitting_entry(row, batch_id) for row in rows]
+
+    def submitted(self, batch_id: str, tx_hash: str) -> None:
+        self._execute(self.SUBMITTED, {"batch_id": batch_id, "tx_hash": tx_hash})
+
+    def in_flight(self) -> List[LedgerEntry]:
+        return [
+            _submitting_entry(row[:7], row[7], row[8])
+            for row in self._execute(self.IN_FLIGHT, {})
+        ]
+
+    def complete(self, batch_id: str) -> None:
+        self._execute(self.COMPLETE, {"batch_id": batch_id, "settled_at": datetime.now()})
+
+    def release(self, batch_id: str) -> None:
+        self._execute(self.RELEASE, {"batch_id": batch_id})
+
+
+def _submitting_entry(row, batch_id: str, tx_hash: Optional[str] = None) -> LedgerEntry:
+    return LedgerEntry(
+        transaction_id=row[0],
+        client_agent_id=row[1],
+        service_agent_id=row[2],
+        payment_address=row[3],
+        payment_scheme=row[4],
+        amount=int(row[5]),
+        created_at=row[6],
+        status=SUBMITTING,
+        batch_id=batch_id,
+        tx_hash=tx_hash,
+    )
+
+
+class SettlementLedger:
+    """後払い・従量課金の精算台帳"""
+
+    def __init__(
+        self,
+        backend=None,
+        threshold_jpyc: float = 100.0,
+        max_age_seconds: float = 3600.0,
+        max_batch_size: int = 200,
+    ):
+        """
+        初期化
+
+        Args:
+            backend: 台帳のバックエンド（Noneの場合はプロセス内のメモリ）
+            threshold_jpyc: 支払先ごとの未精算額がこの額に達したら精算する（JPYC）
+            max_age_seconds: 最も古い未精算の課金がこの秒数を過ぎたら精算する
+            max_batch_size: 一括送金1回あたりの送金先数の上限
+        """
+        self.backend = backend or InMemoryLedgerBackend()
+        self.threshold = jpyc_to_wei(threshold_jpyc)
+        self.max_age = timedelta(seconds=max_age_seconds)
+        self.max_batch_size = max_batch_size
+
+    def accrue(self, transaction: X402Transaction, payment_address: str) -> LedgerEntry:
+        """
+        課金を未精算として記録
+
+        Args:
+            transaction: 課金のトランザクション
+            payment_address: 支払先アドレス
+
+        Returns:
+            LedgerEntry
+        """
+        entry = LedgerEntry(
+            transaction_id=transaction.transaction_id,
+            client_agent_id=transaction.client_agent_id,
+            service_agent_id=transaction.service_agent_id,
+            payment_address=payment_address.lower(),
+            payment_scheme=transaction.payment_scheme.value,
+            amount=transaction.amount,
+            created_at=transaction.created_at,
+        )
+        self.backend.add(entry)
+        return entry
+
+    def balances(self) -> List[PayeeBalance]:
+        """支払先ごとの未精算額"""
+        return self.backend.balances()
+
+    def due_payees(self, now: Optional[datetime] = None) -> List[PayeeBalance]:
+        """
+        精算時期に達した支払先
+
+        Args:
+            now: 基準時刻（Noneの場合は現在時刻）
+
+        Returns:
+            List[PayeeBalance]: しきい値・経過時間のいずれかに達した支払先
+        """
+        now = now or datetime.now()
+        return [
+            balance
+            for balance in self.balances()
+            if balance.amount >= self.threshold or now - balance.oldest_at >= self.max_age
+        ]
+
+    def is_due(self, now: Optional[datetime] = None) -> bool:
+        """精算時期に達した支払先があるか（全支払先を集計する）"""
+        return bool(self.due_payees(now))
+
+    def is_payee_due(self, payment_address: str, now: Optional[datetime] = None) -> bool:
+        """
+        支払先1件の未精算額が精算時期に達したか（課金ごとの判定用、その支払先の行だけを読む）
+
+        Args:
+            payment_address: 支払先アドレス
+            now: 基準時刻（Noneの場合は現在時刻）
+
+        Returns:
+            bool: しきい値・経過時間のいずれかに達していればTrue
+        """
+        balance = self.backend.balance(payment_address.lower())
+        if balance is None:
+            return False
+        now = now or datetime.now()
+        return balance.amount >= self.threshold or now - balance.oldest_at >= self.max_age
+
+    def settle(
+        self,
+        send_batch: SendBatch,
+        confirm: Optional[ConfirmBatch] = None,
+        force: bool = False,
+        now: Optional[datetime] = None,
+    ) -> List[SettlementBatch]:
+        """
+        未精算の課金を支払先ごとに合算して送金
+
+        全バッチを送信してから、confirm でレシートを確認する。
+
+        Args:
+            send_batch: 一括送金を行う関数（BlockchainService.transfer_jpyc_batch など）
+            confirm: レシートを確認する関数（Noneの場合は submitting のまま残し、reconcile で確認）
+            force: しきい値・経過時間に関係なく全支払先を精算する
+            now: 基準時刻（Noneの場合は現在時刻）
+
+        Returns:
+            List[SettlementBatch]: 送信した一括送金
+
+        Raises:
+            Exception: 送金に失敗した場合（そのバッチは未精算に戻る。送信済みのバッチは確認する）
+        """
+        payees = self.balances() if force else self.due_payees(now)
+        addresses = [balance.payment_address for balance in payees]
+
+        batches: List[SettlementBatch] = []
+        try:
+            for i in range(0, len(addresses), self.max_batch_size):
+                batch_id = f"batch-{uuid.uuid4()}"
+                entries = self.backend.claim(addresses[i:i + self.max_batch_size], batch_id)
+                if not entries:
+                    # 他のプロセスが先に精算した
+                    continue
+
+                totals: Dict[str, int] = {}
+                for entry in entries:
+                    totals[entry.payment_address] = totals.get(entry.payment_address, 0) + entry.amount
+                transfers = list(totals.items())
+
+                try:
+                    tx_hash = send_batch(transfers)
+                except Exception:
+                    self.backend.release(batch_id)
+                    raise
+                self.backend.submitted(batch_id, tx_hash)
+
+                logger.info(
+                    f"Submitted settlement of {len(entries)} charges to {len(transfers)} payees "
+                    f"({wei_to_jpyc(sum(totals.values()))} JPYC) in {tx_hash}"
+                )
+                batches.append(SettlementBatch(
+                    batch_id=batch_id,
+                    tx_hash=tx_hash,
+                    transfers=transfers,
+                    transaction_ids=[entry.transaction_id for entry in entries],
+                ))
+        finally:
+            if confirm is not None:
+                for batch in batches:
+                    self._confirm(batch, confirm)
+
+        return batches
+
+    def reconcile(self, confirm: ConfirmBatch) -> List[SettlementBatch]:
+        """
+        送信済みでレシート未確認のバッチを確認（タイムアウト・再起動で残った分）
+
+        Args:
+            confirm: レシートを確認する関数
+
+        Returns:
+            List[SettlementBatch]: 確認したバッチ（まだ確認できないものは SUBMITTING のまま）
+        """
+        batches: Dict[str, SettlementBatch] = {}
+        for entry in self.backend.in_flight():
+            batch = batches.get(entry.batch_id)
+            if batch is None:
+                batch = batches[entry.batch_id] = SettlementBatch(
+                    batch_id=entry.batch_id, tx_hash=entry.tx_hash, transfers=[]
+                )
+            batch.transaction_ids.append(entry.transaction_id)
+
+        for batch in batches.values():
+            self._confirm(batch, confirm)
+        return list(batches.values())
+
+    def _confirm(self, batch: SettlementBatch, confirm: ConfirmBatch) -> None:
+        """レシートを確認し、成功なら精算済み、リバートなら未精算に戻す"""
+        try:
+            succeeded = confirm(batch.tx_hash)
+        except Exception as e:
+            # タイムアウトなど（submitting のまま残し、次の reconcile で確認）
+            logger.warning(f"Settlement {batch.tx_hash} not confirmed yet: {e}")
+            return
+
+        if succeeded:
+            self.backend.complete(batch.batch_id)
+            batch.status = SETTLED
+            logger.info(f"Settlement {batch.tx_hash} confirmed")
+        else:
+            self.backend.release(batch.batch_id)
+            batch.status = ACCRUED
+            logger.error(
+                f"Settlement {batch.tx_hash} reverted; "
+                f"{len(batch.transaction_ids)} charges returned to accrued"
+            )
+
+
+# グローバルインスタンス（シングルトン）
+_settlement_ledger_instance: Optional[SettlementLedger] = None
+
+
+def get_settlement_ledger() -> SettlementLedger:
+    """
+    PostgreSQL の台帳を使う SettlementLedger のシングルトンインスタンスを取得
+
+    Returns:
+        SettlementLedger
+    """
+    from config import settings
+    from database import SessionLocal
+
+    global _settlement_ledger_instance
+
+    if _settlement_ledger_instance is None:
+        _settlement_ledger_instance = SettlementLedger(
+            backend=PostgresLedgerBackend(SessionLocal),
+            threshold_jpyc=settings.SETTLEMENT_THRESHOLD_JPYC,
+            max_age_seconds=settings.SETTLEMENT_MAX_AGE_SECONDS,
+            max_batch_size=settings.SETTLEMENT_MAX_BATCH_SIZE,
+        )
+
+    return _settlement_ledger_instance
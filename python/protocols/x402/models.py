@@ -134,6 +134,10 @@ class X402Transaction(BaseModel):
     tx_hash: Optional[str] = Field(None, description="ブロックチェーントランザクションハッシュ")
     block_number: Optional[int] = Field(None, description="ブロック番号")
 
+    # ペイメントチャネル情報（チャネル経由の場合は tx_hash の代わりにバウチャー）
+    channel_id: Optional[str] = Field(None, description="ペイメントチャネルID")
+    voucher: Optional[Dict[str, Any]] = Field(None, description="累積額のバウチャー（channel_id, amount, signature）")
+
     # ステータス
     status: PaymentStatus = Field(default=PaymentStatus.PENDING, description="決済ステータス")
 
@@ -0,0 +1,95 @@
+"""
+エージェント基底クラス テスト
+
+execute_query が同期Session・AsyncSessionのどちらでも結果を返すことを検証（DB不要）
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from agents.base import Agent, AgentResult, PaymentConfig, PaymentScheme, execute_query
+from fakes import FakeResult
+
+
+class FakeAsyncSession:
+    """AsyncSession と同じく execute がコルーチンを返すセッション"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    async def execute(self, query, params=None):
+        self.calls.append((str(query), params))
+        await asyncio.sleep(0)  # I/O 待ちの間に他のタスクへ制御を渡す
+        return FakeResult(self.rows)
+
+
+class EchoAgent(Agent):
+    """_execute_query を呼ぶだけのエージェント"""
+
+    def __init__(self, db_session):
+        super().__init__("echo", PaymentConfig(scheme=PaymentScheme.EXACT, base_amount=1))
+        self.db_session = db_session
+
+    async def execute(self, input_data):
+        result = await self._execute_query(text("SELECT :value"), {"value": input_data["value"]})
+        return AgentResult(
+            success=True,
+            data={"rows": result.fetchall()},
+            confidence=1.0,
+            execution_time=0.0,
+            cost=0,
+        )
+
+
+def test_execute_query_with_sync_session():
+    """同期Sessionの結果（awaitable でない）はそのまま返す"""
+    engine = create_engine("sqlite://")
+    with Session(engine) as session:
+        result = asyncio.run(execute_query(session, text("SELECT :a + 1"), {"a": 41}))
+        assert result.fetchall() == [(42,)]
+
+
+def test_execute_query_awaits_async_session():
+    """AsyncSession の結果は await し、パラメータ省略時は空の辞書を渡す"""
+    session = FakeAsyncSession([("tomato", 80)])
+
+    result = asyncio.run(execute_query(session, text("SELECT 1")))
+
+    assert result.fetchall() == [("tomato", 80)]
+    assert session.calls == [("SELECT 1", {})]
+
+
+def test_execute_query_does_not_block_other_tasks():
+    """AsyncSession の待ち時間に他のクエリが進む"""
+    session = FakeAsyncSession([(1,)])
+    order = []
+
+    async def query(name):
+        order.append(f"{name}:start")
+        await execute_query(session, text("SELECT 1"))
+        order.append(f"{name}:end")
+
+    async def run():
+        await asyncio.gather(query("a"), query("b"))
+
+    asyncio.run(run())
+
+    assert order == ["a:start", "b:start", "a:end", "b:end"]
+
+
+def test_agent_execute_query_uses_own_session():
+    """Agent._execute_query はエージェントのセッションで実行する"""
+    session = FakeAsyncSession([(7,)])
+    agent = EchoAgent(session)
+
+    result = asyncio.run(agent.execute({"value": 7}))
+
+    assert result.data["rows"] == [(7,)]
+    assert session.calls == [("SELECT :value", {"value": 7})]
@@ -0,0 +1,112 @@
+"""
+非同期 Blockchain Service テスト
+
+ブロッキングな RPC 呼び出しがイベントループを止めないことを検証（ネットワーク不要）
+"""
+import asyncio
+import threading
+import time
+import sys
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+import protocols.blockchain_service as blockchain_service
+from protocols.blockchain_service import AsyncBlockchainService
+
+
+class SlowService:
+    """RPC の往復を time.sleep で模した同期版サービス"""
+
+    address = "0x0000000000000000000000000000000000000001"
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.threads = []
+
+    def transfer_jpyc(self, to_address, amount, gas_limit=100000):
+        self.threads.append(threading.current_thread().name)
+        time.sleep(self.delay)
+        return f"0x{amount:064x}"
+
+    def get_balance(self, address=None):
+        time.sleep(self.delay)
+        return {"address": address or self.address, "jpyc_balance": 100}
+
+
+def test_transfer_does_not_block_event_loop():
+    """送金中もイベントループ上の他のタスク（SSE配信など）が進む"""
+    service = SlowService(delay=0.2)
+    async_service = AsyncBlockchainService(service, max_workers=2)
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    async def run():
+        task = asyncio.create_task(ticker())
+        tx_hash = await async_service.transfer_jpyc("0xabc", 3)
+        task.cancel()
+        return tx_hash
+
+    try:
+        tx_hash = asyncio.run(run())
+    finally:
+        async_service.shutdown()
+
+    assert tx_hash == f"0x{3:064x}"
+    assert service.threads[0].startswith("blockchain")
+    # ブロックしていれば 0.2 秒の間 ticker は1回も進まない
+    assert len(ticks) >= 5
+
+
+def test_concurrent_calls_overlap():
+    """複数ジョブの送金・残高照会はスレッド数まで並行に実行される"""
+    service = SlowService(delay=0.2)
+    async_service = AsyncBlockchainService(service, max_workers=2)
+
+    async def run():
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            async_service.transfer_jpyc("0xabc", 5),
+            async_service.get_balance(),
+        )
+        return results, time.perf_counter() - start
+
+    try:
+        (tx_hash, balance), elapsed = asyncio.run(run())
+    finally:
+        async_service.shutdown()
+
+    assert tx_hash == f"0x{5:064x}"
+    assert balance["jpyc_balance"] == 100
+    assert elapsed < 0.35
+
+
+def test_singleton_created_once_across_threads(monkeypatch):
+    """複数スレッドから同時に取得してもサービスは1つだけ生成される"""
+    created = []
+
+    def slow_service():
+        created.append(SlowService(delay=0.0))
+        time.sleep(0.05)  # 接続確認の RPC 往復
+        return created[-1]
+
+    monkeypatch.setattr(blockchain_service, "BlockchainService", slow_service)
+    monkeypatch.setattr(blockchain_service, "_blockchain_service_instance", None)
+
+    instances = []
+    threads = [
+        threading.Thread(target=lambda: instances.append(blockchain_service.get_blockchain_service()))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(instance is created[0] for instance in instances)
@@ -0,0 +1,117 @@
+"""
+予測クエリのベンチマーク テスト
+
+コマンドライン引数が投入・計測・後片付けに渡ることを検証（DB不要）
+"""
+import json
+import sys
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+import benchmark_forecast_query as benchmark
+
+REPORT = {
+    "forecast_single": {
+        "runs": 2,
+        "mean_rows": 30.0,
+        "p50_ms": 0.1,
+        "p99_ms": 0.2,
+        "mean_ms": 0.15,
+        "node_types": {"Index Only Scan": 1},
+        "indexes": ["idx_pos_sales_daily_forecast"],
+        "heap_fetches": 0.0,
+        "shared_hit": 4.0,
+        "shared_read": 0.0,
+    }
+}
+
+
+class Recorder:
+    """呼び出された関数と引数を記録する"""
+
+    def __init__(self, monkeypatch):
+        self.calls = []
+        monkeypatch.setattr(benchmark, "seed", self._record("seed"))
+        monkeypatch.setattr(benchmark, "cleanup", self._record("cleanup"))
+        monkeypatch.setattr(benchmark, "run_benchmark", self._record("run_benchmark", REPORT))
+
+    def _record(self, name, result=None):
+        def record(engine, *args, **kwargs):
+            self.calls.append((name, str(engine.url), args, kwargs))
+            return result
+
+        return record
+
+    def names(self):
+        return [call[0] for call in self.calls]
+
+
+def test_parse_args_defaults():
+    """省略時は100万行・50店舗・200商品・30日ウィンドウ"""
+    args = benchmark.parse_args([])
+
+    assert args.rows == 1_000_000
+    assert (args.stores, args.skus, args.days, args.window_days) == (50, 200, 365, 30)
+    assert (args.iterations, args.batch_size, args.explain_samples) == (1000, 100, 20)
+    assert not args.skip_seed and not args.cleanup
+    assert args.database_url is None and args.json is None
+
+
+def test_parse_args_rows_in_millions():
+    """--rows は百万行単位で、浮動小数の誤差で切り捨てない"""
+    assert benchmark.parse_args(["--rows", "5"]).rows == 5_000_000
+    assert benchmark.parse_args(["--rows", "0.0015"]).rows == 1_500
+    assert benchmark.parse_args(["--rows", "1.001"]).rows == 1_001_000
+
+
+def test_main_seeds_and_runs_with_args(monkeypatch, tmp_path, capsys):
+    """投入と計測に引数を渡し、--json で結果を書き出す"""
+    recorder = Recorder(monkeypatch)
+    output = tmp_path / "results.json"
+
+    benchmark.main(
+        [
+            "--database-url", "sqlite://",
+            "--rows", "0.5",
+            "--stores", "3",
+            "--skus", "4",
+            "--days", "90",
+            "--window-days", "14",
+            "--iterations", "7",
+            "--batch-size", "8",
+            "--explain-samples", "2",
+            "--json", str(output),
+        ]
+    )
+
+    assert recorder.calls == [
+        ("seed", "sqlite://", (500_000, 3, 4, 90), {}),
+        (
+            "run_benchmark",
+            "sqlite://",
+            (),
+            {
+                "stores": 3,
+                "skus": 4,
+                "iterations": 7,
+                "batch_size": 8,
+                "window_days": 14,
+                "explain_samples": 2,
+            },
+        ),
+    ]
+    assert json.loads(output.read_text()) == REPORT
+    assert "index-only" in capsys.readouterr().out
+
+
+def test_main_skip_seed_and_cleanup(monkeypatch):
+    """--skip-seed は投入せずに計測し、--cleanup は削除だけして終了する"""
+    recorder = Recorder(monkeypatch)
+    benchmark.main(["--database-url", "sqlite://", "--skip-seed"])
+    assert recorder.names() == ["run_benchmark"]
+
+    recorder = Recorder(monkeypatch)
+    benchmark.main(["--database-url", "sqlite://", "--cleanup"])
+    assert recorder.names() == ["cleanup"]
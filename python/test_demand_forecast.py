@@ -0,0 +1,378 @@
+"""
+需要予測エージェント テスト
+
+DB接続なしで予測ロジックとバッチ実行を検証
+"""
+import asyncio
+import struct
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+
+from agents.array_fetch import decode_binary_copy
+from agents.demand_forecast import FORECAST_BATCH_COLUMNS, DemandForecastAgent
+from agents.forecast_cache import ForecastCache, LRUForecastBackend
+from agents.forecast_kernel import (
+    build_sales_matrix,
+    forecast_from_window_sums,
+    moving_average_forecast,
+)
+from agents.pos_history_cache import PosHistoryCache
+from agents.rolling_stats import RollingStatsStore
+from fakes import FakeClock, FakeResult
+
+
+class FakeSession:
+    """POSデータを返すだけのセッション"""
+
+    COLUMNS = [
+        "product_sku",
+        "store_id",
+        "date",
+        "sales_quantity",
+        "price",
+        "day_of_week",
+        "is_holiday",
+    ]
+
+    def __init__(self, sales, through=None):
+        # sales: {(product_sku, store_id): [quantity, ...]}（日付昇順、最終日は through）
+        self.sales = sales
+        self.through = through or date.today() - timedelta(days=1)
+        self.watermark = 1  # 日次集計の版
+        self.queries = 0
+
+    def _rows(self, pairs, start_date=None, end_date=None):
+        rows = []
+        for sku, store in pairs:
+            quantities = self.sales.get((sku, store), [])
+            start = self.through - timedelta(days=len(quantities) - 1)
+            for i, qty in enumerate(quantities):
+                d = start + timedelta(days=i)
+                if start_date and not start_date <= d <= end_date:
+                    continue
+                rows.append((sku, store, d, qty, 198.0, d.weekday(), False))
+        return rows
+
+    def execute(self, query, params=None):
+        self.queries += 1
+        params = params or {}
+        if "pos_sales_daily_refresh_state" in str(query):
+            return FakeResult([(self.watermark,)], ["last_change_id"])
+
+        dates = (params.get("start_date"), params.get("end_date"))
+        if "product_skus" in params:
+            # 系列番号（入力ペアの位置）付きの一括クエリ
+            pairs = list(zip(params["product_skus"], params["store_ids"]))
+            rows = [
+                (i, *row[2:])
+                for i, pair in enumerate(pairs)
+                for row in self._rows([pair], *dates)
+            ]
+            return FakeResult(rows, ["series"] + self.COLUMNS[2:])
+
+        if "store_ids" in params:
+            # 店舗単位の履歴クエリ（store_id, product_sku, date 順）
+            pairs = sorted(k for k in self.sales if k[1] in params["store_ids"])
+            pairs.sort(key=lambda k: (k[1], k[0]))
+            rows = [(r[1], r[0], *r[2:]) for r in self._rows(pairs, *dates)]
+            return FakeResult(rows, ["store_id", "product_sku"] + self.COLUMNS[2:])
+
+        pair = (params["product_sku"], params["store_id"])
+        rows = [row[2:] for row in self._rows([pair], *dates)]
+        return FakeResult(rows, self.COLUMNS[2:])
+
+
+def test_execute_single():
+    """単一ペアの予測"""
+    session = FakeSession({("tomato", "S001"): [100] * 23 + [300] * 7})
+    agent = DemandForecastAgent(session)
+
+    result = asyncio.run(agent.execute({"product_sku": "tomato", "store_id": "S001"}))
+
+    assert result.success
+    assert result.data["predicted_demand"] == 300
+    assert result.data["confidence_interval"] == {"lower": 273, "upper": 327}
+    assert result.data["historical_data_points"] == 30
+
+
+def test_execute_batch_matches_single():
+    """バッチ実行は1クエリで単一実行と同じ結果を返す"""
+    sales = {
+        ("tomato", "S001"): [300 + i for i in range(30)],
+        ("tomato", "S002"): [500] * 10,
+        ("cucumber", "S001"): [80, 90, 100],
+    }
+    pairs = list(sales.keys()) + [("lettuce", "S001")]
+
+    session = FakeSession(sales)
+    agent = DemandForecastAgent(session)
+    results = asyncio.run(agent.execute_batch(pairs))
+
+    assert session.queries == 1
+    assert len(results) == len(pairs)
+
+    for (sku, store), result in zip(pairs, results):
+        single = asyncio.run(
+            DemandForecastAgent(FakeSession(sales)).execute(
+                {"product_sku": sku, "store_id": store}
+            )
+        )
+        assert result.success == single.success
+        assert result.data == single.data
+        assert result.cost == single.cost
+
+    assert results[-1].error_message == "No historical data found"
+
+
+def test_execute_batch_chunks():
+    """batch_sizeごとにクエリを分割する"""
+    sales = {("tomato", f"S{i:03d}"): [100] * 7 for i in range(5)}
+    session = FakeSession(sales)
+    agent = DemandForecastAgent(session)
+
+    results = asyncio.run(agent.execute_batch(list(sales.keys()), batch_size=2))
+
+    assert session.queries == 3
+    assert all(r.success and r.data["predicted_demand"] == 100 for r in results)
+
+
+def test_moving_average_kernel():
+    """予測カーネルは系列ごとの移動平均・信頼区間・行数を一括計算する"""
+    quantities = np.array([10, 20, 30] + [100] * 10)
+    codes = np.array([0, 0, 0] + [2] * 10)
+
+    matrix = build_sales_matrix(quantities, codes, n_series=3)
+    assert matrix.shape == (3, 10)
+    assert np.isnan(matrix[0, :7]).all()
+    assert list(matrix[0, 7:]) == [10, 20, 30]
+
+    forecast = moving_average_forecast(matrix)
+    assert list(forecast.predicted) == [20, 0, 100]
+    assert list(forecast.lower) == [18, 0, 91]
+    assert list(forecast.upper) == [21, 0, 109]
+    assert list(forecast.counts) == [3, 0, 10]
+
+
+def test_rolling_stats_windows():
+    """ローリング統計は日の前進で期間から外れた日を差し引き、窓は直近7データ日"""
+    store = RollingStatsStore()
+    start = date(2026, 1, 1)
+    for i in range(40):
+        store.add_sale("tomato", "S001", start + timedelta(days=i), i)
+    # 同じ日の2行目・期間外の古い行
+    store.add_sale("tomato", "S001", start + timedelta(days=39), 1)
+    assert not store.add_sale("tomato", "S001", start, 100)
+
+    stats = store.get("tomato", "S001")
+    last7 = list(range(33, 40))
+    last31 = list(range(9, 40))
+    last7[-1] += 1
+    last31[-1] += 1
+    assert stats.latest == start + timedelta(days=39)
+    assert (stats.window_sum, stats.window_days) == (sum(last7), 7)
+    assert (stats.history_sum, stats.history_days) == (sum(last31), 31)
+    assert stats.window_sum_sq == sum(q * q for q in last7)
+    assert stats.history_sum_sq == sum(q * q for q in last31)
+
+    # 基準日を進めると古い日が外れ、窓は残った直近7データ日になる
+    stats = store.get("tomato", "S001", as_of=start + timedelta(days=42))
+    assert (stats.window_sum, stats.window_days) == (sum(last7), 7)
+    assert stats.history_days == 28
+
+    # 日次集計の値で置き換えると加算済みの値は残らない
+    store.replace_store("S001", [("tomato", start + timedelta(days=39), 5)])
+    stats = store.get("tomato", "S001")
+    assert (stats.window_sum, stats.history_days) == (5, 1)
+    store.replace_store("S001", [])
+    assert store.get("tomato", "S001") is None
+
+
+def test_rolling_stats_match_kernel_with_gaps():
+    """販売の無い日があってもローリング統計と行列カーネルは同じ窓（直近7データ日）で予測する"""
+    today = date.today()
+    # 販売のあった日（今日からの日数）と数量。期間外（31日前）の行を含む
+    sales = {0: 40, 2: 10, 3: 30, 9: 20, 10: 50, 17: 70, 18: 60, 25: 90, 31: 1000}
+    in_range = sorted((d for d in sales if d <= 30), reverse=True)
+
+    store = RollingStatsStore()
+    for days_ago, qty in sales.items():
+        store.add_sale("tomato", "S001", today - timedelta(days=days_ago), qty)
+    stats = store.get("tomato", "S001", as_of=today)
+    rolling = forecast_from_window_sums(
+        [stats.window_sum], [stats.window_days], [stats.history_days]
+    )
+
+    quantities = np.array([sales[d] for d in in_range], dtype=np.float64)
+    matrix = moving_average_forecast(
+        build_sales_matrix(quantities, np.zeros(len(quantities), dtype=np.int64), 1)
+    )
+
+    assert list(rolling.predicted) == list(matrix.predicted) == [40]
+    assert list(rolling.counts) == list(matrix.counts) == [8]
+
+
+def test_execute_from_rolling_stats():
+    """ローリング統計がある系列はDBを読まずにDBと同じ予測を返す"""
+    quantities = [300 + (i * 37) % 50 for i in range(30)]
+    session = FakeSession({("tomato", "S001"): quantities})
+
+    rolling = RollingStatsStore()
+    for sku, store, d, qty, *_ in session._rows([("tomato", "S001")]):
+        rolling.add_sale(sku, store, d, qty)
+
+    from_db = asyncio.run(
+        DemandForecastAgent(session).execute({"product_sku": "tomato", "store_id": "S001"})
+    )
+    assert session.queries == 1
+
+    agent = DemandForecastAgent(session, rolling_stats=rolling)
+    from_state = asyncio.run(agent.execute({"product_sku": "tomato", "store_id": "S001"}))
+    batch = asyncio.run(agent.execute_batch([("tomato", "S001"), ("tomato", "S002")]))
+
+    assert from_state.data == from_db.data
+    assert batch[0].data == from_db.data
+    assert not batch[1].success
+    # バッチは統計にない S002 の分だけクエリする
+    assert session.queries == 2
+
+
+def test_execute_from_history_cache(tmp_path):
+    """締まった日はキャッシュから読み、当日分だけDBを読んでDBと同じ予測を返す"""
+    today = date.today()
+    sales = {
+        ("tomato", "S001"): [300 + (i * 37) % 50 for i in range(40)],
+        ("cucumber", "S001"): [80, 90, 100],
+        ("tomato", "S002"): [500] * 10,
+    }
+    session = FakeSession(sales, through=today)
+    pairs = list(sales.keys())
+
+    expected = [
+        asyncio.run(
+            DemandForecastAgent(FakeSession(sales, through=today)).execute(
+                {"product_sku": sku, "store_id": store}
+            )
+        )
+        for sku, store in pairs
+    ]
+
+    cache = PosHistoryCache(tmp_path)
+    agent = DemandForecastAgent(session, history_cache=cache)
+
+    first = asyncio.run(agent.execute({"product_sku": "tomato", "store_id": "S001"}))
+    assert first.data == expected[0].data
+    assert session.queries == 2  # 履歴の読み込み + 当日分
+    assert cache.month_path("S001", today.replace(day=1)).exists()
+
+    # 2回目以降は当日分だけ読む
+    batch = asyncio.run(agent.execute_batch(pairs))
+    assert [r.data for r in batch] == [r.data for r in expected]
+    assert session.queries == 4  # S002 の履歴 + 当日分
+
+    # 月内の範囲はファイルのバッファをそのまま参照する
+    yesterday = today - timedelta(days=1)
+    closed = cache.read("tomato", "S001", yesterday.replace(day=1), yesterday)
+    assert not closed.flags.owndata
+    assert list(closed) == sales[("tomato", "S001")][-1 - len(closed) : -1]
+
+
+def test_history_cache_invalidates_refreshed_closed_months(tmp_path):
+    """日次集計の更新後、締まった日を再集計した (店舗, 月) だけを破棄する"""
+    today = date(2026, 3, 10)
+    cache = PosHistoryCache(tmp_path, clock=lambda: today)
+    empty = {
+        name: np.empty(0, dtype=object)
+        for name in ("product_sku", "date", "sales_quantity", "price", "day_of_week", "is_holiday")
+    }
+    for store_id, month in (("S001", date(2026, 2, 1)), ("S001", date(2026, 3, 1)), ("S002", date(2026, 3, 1))):
+        cache.write_month(store_id, month, empty, date(2026, 3, 9))
+
+    invalidated = cache.invalidate_refreshed([
+        ("S001", date(2026, 2, 1), date(2026, 2, 27)),  # 締まった日の訂正
+        ("S002", date(2026, 3, 1), date(2026, 3, 10)),  # 当日分だけ
+    ])
+
+    assert invalidated == 1
+    assert not cache.month_path("S001", date(2026, 2, 1)).exists()
+    assert cache.month_path("S001", date(2026, 3, 1)).exists()
+    assert cache.month_path("S002", date(2026, 3, 1)).exists()
+
+
+def test_decode_binary_copy():
+    """COPY バイナリ形式を行ごとのオブジェクトを作らずに列配列へデコードする"""
+    rows = [
+        (0, date(2026, 1, 15), 300, 198.0, 4, False),
+        (2, date(2026, 1, 17), 512, 178.5, 6, True),
+    ]
+    pg_epoch = date(2000, 1, 1).toordinal()
+
+    buffer = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+    for series, d, qty, price, dow, holiday in rows:
+        buffer += struct.pack(">h", 6)
+        buffer += struct.pack(">iq", 8, series)
+        buffer += struct.pack(">ii", 4, d.toordinal() - pg_epoch)
+        buffer += struct.pack(">ii", 4, qty)
+        buffer += struct.pack(">id", 8, price)
+        buffer += struct.pack(">ii", 4, dow)
+        buffer += struct.pack(">i?", 1, holiday)
+    buffer += struct.pack(">h", -1)
+
+    arrays = decode_binary_copy(buffer, FORECAST_BATCH_COLUMNS)
+
+    assert arrays["series"].tolist() == [0, 2]
+    assert arrays["date"].tolist() == [date(2026, 1, 15), date(2026, 1, 17)]
+    assert arrays["sales_quantity"].tolist() == [300, 512]
+    assert arrays["price"].tolist() == [198.0, 178.5]
+    assert arrays["is_holiday"].tolist() == [False, True]
+    assert arrays["sales_quantity"].dtype == np.int32
+
+
+def test_forecast_cache_by_watermark():
+    """データが変わらない間は予測を再計算・再課金せず、新しいPOSが集計されたら再計算する"""
+    session = FakeSession({("tomato", "S001"): [300] * 30, ("tomato", "S002"): [500] * 30})
+    clock = FakeClock()
+    cache = ForecastCache(watermark_ttl_seconds=1.0, clock=clock)
+    agent = DemandForecastAgent(session, forecast_cache=cache)
+    request = {"product_sku": "tomato", "store_id": "S001"}
+
+    first = asyncio.run(agent.execute(request))
+    assert first.cost > 0
+    assert session.queries == 2  # ウォーターマーク + POSデータ
+
+    # ウォーターマークのTTL内はDBを読まず、課金もしない
+    repeat = asyncio.run(agent.execute(request))
+    assert repeat.data == first.data and repeat.cost == 0
+    assert session.queries == 2
+
+    # バッチでもヒットしたペアは読まない
+    batch = asyncio.run(agent.execute_batch([("tomato", "S001"), ("tomato", "S002")]))
+    assert batch[0].cost == 0 and batch[1].cost > 0
+    assert session.queries == 3
+
+    # 新しいPOSが集計されるとキーが変わる
+    session.sales[("tomato", "S001")] = [300] * 23 + [400] * 7
+    session.watermark = 2
+    clock.now = 2.0
+    updated = asyncio.run(agent.execute(request))
+    assert updated.data["predicted_demand"] == 400 and updated.cost > 0
+
+
+def test_forecast_cache_lru_eviction():
+    """上限を超えると最も古く使われたエントリから破棄する"""
+    backend = LRUForecastBackend(max_entries=2)
+    cache = ForecastCache(backend)
+    day = date.today()
+    keys = [(f"sku{i}", "S001", 1, day) for i in range(3)]
+
+    asyncio.run(cache.set_many({keys[0]: {"v": 0}, keys[1]: {"v": 1}}))
+    asyncio.run(cache.get_many([keys[0]]))  # keys[0] を最近使ったことにする
+    asyncio.run(cache.set_many({keys[2]: {"v": 2}}))
+
+    assert asyncio.run(cache.get_many(keys)) == [{"v": 0}, None, {"v": 2}]
+    assert len(backend) == 2
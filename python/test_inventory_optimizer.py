@@ -0,0 +1,155 @@
+"""
+在庫最適化エージェント テスト
+
+DB接続なしで最適化ロジックとサプライヤーキャッシュを検証
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+from scipy.stats import norm
+
+from agents.inventory_optimizer import InventoryOptimizerAgent
+from agents.inventory_snapshot import InventorySnapshot
+from agents.newsvendor_kernel import solve_newsvendor
+from agents.supplier_cache import SupplierCache
+from fakes import FakeClock, FakeSession, demand_forecast_result
+
+
+def test_execute_uses_best_supplier():
+    """品質スコア最上位のサプライヤーで最適化する"""
+    agent = InventoryOptimizerAgent(FakeSession(), supplier_cache=SupplierCache())
+
+    result = asyncio.run(agent.execute({"demand_forecast": demand_forecast_result()}))
+
+    assert result.success
+    assert result.data["supplier"]["id"] == "SUP001"
+    assert result.data["order_quantity"] >= 0
+    assert result.cost == 15
+
+
+def test_supplier_cache_shared_across_agents():
+    """キャッシュはエージェント間で共有され、TTL切れ・無効化で再取得する"""
+    clock = FakeClock()
+    cache = SupplierCache(ttl_seconds=60, clock=clock)
+    session = FakeSession()
+
+    agents = [InventoryOptimizerAgent(session, supplier_cache=cache) for _ in range(3)]
+    for agent in agents:
+        asyncio.run(agent.execute({"demand_forecast": demand_forecast_result()}))
+    assert session.queries == 1
+
+    clock.now = 61
+    asyncio.run(agents[0].execute({"demand_forecast": demand_forecast_result()}))
+    assert session.queries == 2
+
+    cache.invalidate()
+    asyncio.run(agents[1].execute({"demand_forecast": demand_forecast_result()}))
+    assert session.queries == 3
+
+
+def test_newsvendor_kernel_matches_scalar_formula():
+    """ニュースベンダーカーネルはスカラー計算（norm.ppf）と同じ結果を返す"""
+    means = np.array([300.0, 50.0, 1000.0, 10.0])
+    stds = np.array([13.8, 2.0, 45.0, 0.5])
+    inventory = np.array([80, 0, 1200, 10])
+
+    solution = solve_newsvendor(means, stds, 120.0, 198.0, 120.0, inventory)
+
+    for i in range(len(means)):
+        cr = (198.0 - 120.0) / (198.0 - 120.0 + 120.0)
+        optimal = norm.ppf(cr, loc=means[i], scale=stds[i])
+        assert solution.order_quantity[i] == max(0, int(optimal - inventory[i]))
+        assert solution.optimal_order_level[i] == int(optimal)
+        assert solution.safety_stock[i] == int(means[i] * 0.15)
+        assert solution.expected_waste[i] == max(0, int(optimal - means[i]))
+        assert solution.expected_shortage[i] == max(0, int(means[i] - optimal))
+    assert solution.valid.all()
+
+    # 価格 < 原価では解が求まらない
+    assert not solve_newsvendor(300.0, 10.0, 250.0, 198.0, 120.0, 0).valid[0]
+
+
+def test_execute_batch_matches_single():
+    """バッチ最適化は単一最適化と同じ結果を返す"""
+    cache = SupplierCache()
+    session = FakeSession()
+    agent = InventoryOptimizerAgent(session, supplier_cache=cache)
+    items = [
+        {"demand_forecast": demand_forecast_result(300, 273, 327)},
+        {"demand_forecast": demand_forecast_result(50, 45, 54)},
+        {"demand_forecast": {"data": {}}},
+    ]
+
+    results = asyncio.run(agent.execute_batch(items))
+
+    assert len(results) == 3
+    for item, result in zip(items[:2], results[:2]):
+        single = asyncio.run(agent.execute(item))
+        assert result.success and result.data == single.data
+    assert not results[2].success
+    assert session.queries == 1
+
+
+def test_current_inventory_from_snapshot():
+    """在庫はスナップショットから読み、バッチでは1クエリでまとめて読み込む"""
+    inventory = {("tomato", "S001"): 80, ("tomato", "S002"): 500}
+    session = FakeSession(inventory=inventory)
+    agent = InventoryOptimizerAgent(session, supplier_cache=SupplierCache())
+    items = [
+        {"demand_forecast": demand_forecast_result(), "product_sku": "tomato", "store_id": store}
+        for store in ("S001", "S002", "S003", "S001")
+    ]
+
+    results = asyncio.run(agent.execute_batch(items))
+
+    assert session.inventory_queries == 1
+    assert [r.data["current_inventory"] for r in results] == [80, 500, 0, 80]
+    assert results[1].data["order_quantity"] == 0
+
+    # ロード済みの商品は再クエリしない
+    single = asyncio.run(agent.execute(items[0]))
+    assert single.data["current_inventory"] == 80
+    assert session.inventory_queries == 1
+
+
+def test_inventory_snapshot_expires_and_invalidates():
+    """期限切れ・破棄したキーは読み直し、在庫0とみなした商品も後から行が入れば反映される"""
+    session = FakeSession(inventory={("tomato", "S001"): 80})
+    clock = FakeClock()
+    snapshot = InventorySnapshot(ttl_seconds=60, clock=clock)
+    agent = InventoryOptimizerAgent(
+        session, supplier_cache=SupplierCache(), inventory_snapshot=snapshot
+    )
+    items = [
+        {"demand_forecast": demand_forecast_result(), "product_sku": "tomato", "store_id": store}
+        for store in ("S001", "S002")
+    ]
+
+    results = asyncio.run(agent.execute_batch(items))
+    assert [r.data["current_inventory"] for r in results] == [80, 0]
+
+    # 期限内は読み直さない
+    session.inventory[("tomato", "S001")] = 30
+    session.inventory[("tomato", "S002")] = 200
+    clock.now = 59.0
+    asyncio.run(agent.execute_batch(items))
+    assert session.inventory_queries == 1
+
+    # 期限が切れると行の無かった商品も含めて読み直す
+    clock.now = 60.0
+    results = asyncio.run(agent.execute_batch(items))
+    assert session.inventory_queries == 2
+    assert [r.data["current_inventory"] for r in results] == [30, 200]
+
+    # 入荷などで破棄したキーだけ期限前でも読み直す
+    session.inventory[("tomato", "S002")] = 150
+    snapshot.invalidate([("tomato", "S002")])
+    assert snapshot.missing([("tomato", "S001"), ("tomato", "S002")]) == [("tomato", "S002")]
+    single = asyncio.run(agent.execute(items[1]))
+    assert single.data["current_inventory"] == 150
+    assert session.inventory_queries == 3
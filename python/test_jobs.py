@@ -0,0 +1,129 @@
+"""
+最適化ジョブ管理 テスト
+
+ジョブごとの状態の分離・同時実行数の上限・待機数の上限・/api/jobs を検証
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fastapi.testclient import TestClient
+
+from api.jobs import COMPLETED, FAILED, QUEUED, RUNNING, JobLimitError, JobManager
+
+
+def test_jobs_keep_separate_logs_and_status():
+    """ジョブごとにログ・ステータス・トランザクションを持つ"""
+
+    async def runner(job):
+        store = job.params["store_id"]
+        job.add_log("info", f"start {store}")
+        job.update_agent_status("demand_forecast", "completed", 100)
+        job.add_transaction("需要予測エージェント", 3, "0xabc", f"0x{store}")
+
+    async def run():
+        manager = JobManager()
+        a = manager.submit({"store_id": "S001"}, runner)
+        b = manager.submit({"store_id": "S002"}, runner)
+        await asyncio.sleep(0.01)
+        return a, b
+
+    a, b = asyncio.run(run())
+
+    assert a.job_id != b.job_id
+    assert a.state == b.state == COMPLETED
+    assert [log["message"] for log in a.logs] == ["start S001"]
+    assert [log["message"] for log in b.logs] == ["start S002"]
+    assert a.transactions[0]["tx_hash"] == "0xS001"
+    assert a.agents is not b.agents
+
+
+def test_concurrency_cap_and_queue_limit():
+    """同時実行数を超えたジョブは待機し、待機数の上限を超えると受け付けない"""
+    running = 0
+    max_running = 0
+
+    async def runner(job):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+
+    async def run():
+        manager = JobManager(max_concurrent_jobs=2, max_queued_jobs=3)
+        jobs = [manager.submit({}, runner) for _ in range(3)]
+        await asyncio.sleep(0)
+        states = [job.state for job in jobs]
+
+        # 1つは待機中。待機数の上限（3）まで受け付ける
+        jobs += [manager.submit({}, runner) for _ in range(2)]
+        try:
+            manager.submit({}, runner)
+        except JobLimitError:
+            rejected = True
+        else:
+            rejected = False
+
+        await asyncio.gather(*[job.task for job in jobs if job.task])
+        return states, rejected, jobs
+
+    states, rejected, jobs = asyncio.run(run())
+
+    assert states == [RUNNING, RUNNING, QUEUED]
+    assert rejected
+    assert max_running == 2
+    assert all(job.state == COMPLETED for job in jobs)
+
+
+def test_failed_job_and_retention():
+    """例外・fail() はジョブの失敗として記録され、完了済みジョブは上限まで保持される"""
+
+    async def crash(job):
+        raise RuntimeError("boom")
+
+    async def payment_error(job):
+        job.fail("Payment failed")
+
+    async def run():
+        manager = JobManager(max_retained_jobs=1)
+        first = manager.submit({}, crash)
+        await asyncio.sleep(0.01)
+        second = manager.submit({}, payment_error)
+        await asyncio.sleep(0.01)
+        third = manager.submit({}, payment_error)
+        await asyncio.sleep(0.01)
+        return manager, first, second, third
+
+    manager, first, second, third = asyncio.run(run())
+
+    assert (first.state, first.error_message) == (FAILED, "boom")
+    assert (second.state, second.error_message) == (FAILED, "Payment failed")
+    # first は破棄され、second（完了済み1件）と third が残る
+    assert manager.get(first.job_id) is None
+    assert [job.job_id for job in manager.list()] == [third.job_id, second.job_id]
+
+
+def test_jobs_api():
+    """/api/optimize はジョブIDを返し、/api/jobs/{id} でジョブごとの状態を取得できる"""
+    from api import main
+
+    with TestClient(main.app) as client:
+        body = {"product_sku": "tomato", "store_id": "S001"}
+        first = client.post("/api/optimize", json=body).json()
+        second = client.post("/api/optimize", json={**body, "store_id": "S002"}).json()
+
+        assert first["job_id"] != second["job_id"]
+
+        job = client.get(f"/api/jobs/{first['job_id']}").json()
+        assert job["params"]["store_id"] == "S001"
+        assert "商品: tomato" in job["logs"][1]["message"]
+        assert set(job["agents"]) == {"demand_forecast", "inventory_optimizer", "report_generator"}
+
+        listed = [j["job_id"] for j in client.get("/api/jobs").json()["jobs"]]
+        assert listed[:2] == [second["job_id"], first["job_id"]]
+        assert client.get("/api/status").json()["job_id"] == second["job_id"]
+        assert client.get("/api/jobs/unknown").status_code == 404
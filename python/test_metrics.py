@@ -0,0 +1,109 @@
+"""
+メトリクス テスト
+
+スクレイプ時に値を読むゲージ・エージェントの記録と /metrics エンドポイントを検証
+"""
+import sys
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fastapi.testclient import TestClient
+from prometheus_client import CollectorRegistry, Gauge
+from prometheus_client.parser import text_string_to_metric_families
+
+import metrics
+from agents.base import AgentResult
+from metrics import GaugeCollector
+
+
+def test_gauge_collector_reads_at_scrape_time():
+    """GaugeCollector はスクレイプのたびに値を読み、ラベル付きで出力する"""
+    registry = CollectorRegistry()
+    calls = []
+
+    def read():
+        calls.append(1)
+        return [(("sync", "checked_out"), len(calls))]
+
+    registry.register(GaugeCollector("pool_connections", "Pool", ["engine", "state"], read))
+
+    assert 'pool_connections{engine="sync",state="checked_out"} 1.0' in metrics.render(registry).decode()
+    assert registry.get_sample_value(
+        "pool_connections", {"engine": "sync", "state": "checked_out"}
+    ) == 2
+
+
+def test_gauge_collector_failures_are_isolated():
+    """収集に失敗しても他のメトリクスは出力され、bind 前のゲージは何も出さない"""
+    registry = CollectorRegistry()
+    subscribers = Gauge("subscribers", "Subscribers", registry=registry)
+    subscribers.inc()
+
+    def broken():
+        raise RuntimeError("database unavailable")
+
+    registry.register(GaugeCollector("pool_connections", "Pool", ["state"], broken))
+    unbound = GaugeCollector("jobs", "Jobs", ["state"])
+    registry.register(unbound)
+
+    body = metrics.render(registry).decode()
+    assert "subscribers 1.0" in body.splitlines()
+    assert "pool_connections{" not in body and "jobs{" not in body
+
+    unbound.bind(lambda: [(("queued",), 3)])
+    assert registry.get_sample_value("jobs", {"state": "queued"}) == 3
+
+
+def test_observe_agent_result():
+    """エージェントの実行時間・成否・コストを記録"""
+    def sample(name, **labels):
+        return metrics.REGISTRY.get_sample_value(name, {"agent": "test_agent", **labels}) or 0
+
+    before = sample("a2a_agent_cost_jpyc_total")
+
+    metrics.observe_agent_result(
+        "test_agent",
+        AgentResult(success=True, data={}, confidence=0.9, execution_time=0.02, cost=15),
+    )
+    metrics.observe_agent_result(
+        "test_agent",
+        AgentResult(success=False, data={}, confidence=0.0, execution_time=0.01, cost=0),
+    )
+
+    assert sample("a2a_agent_cost_jpyc_total") == before + 15
+    assert sample("a2a_agent_executions_total", status="failure") >= 1
+    assert sample("a2a_agent_execution_seconds_count") >= 2
+
+
+def test_metrics_endpoint_records_route_latency():
+    """/metrics はリクエストのレイテンシをルートのテンプレートごとに出力する"""
+    from api.main import app
+
+    client = TestClient(app)
+    assert client.get("/").status_code == 200
+    assert client.get("/api/logs?limit=5").status_code == 200
+    assert client.get("/no-such-path").status_code == 404
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == metrics.CONTENT_TYPE
+    samples = {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(response.text)
+        for sample in family.samples
+    }
+
+    def sample(name, **labels):
+        return samples.get((name, tuple(sorted(labels.items()))))
+
+    assert sample(
+        "a2a_http_request_duration_seconds_count", method="GET", endpoint="/api/logs", status="200"
+    ) >= 1
+    assert sample(
+        "a2a_http_request_duration_seconds_count", method="GET", endpoint="unmatched", status="404"
+    ) >= 1
+    assert sample("a2a_db_pool_connections", engine="sync", state="size") == 10
+    assert sample("a2a_jobs", state="queued") == 0
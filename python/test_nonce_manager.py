@@ -0,0 +1,197 @@
+"""
+Nonce 管理・ガス価格オラクル テスト
+
+並行送金での nonce の払い出し・エラー時の取り直し・送金あたりの RPC 呼び出しを検証
+（ネットワーク不要、RPC は偽のプロバイダで応答）
+"""
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from eth_account import Account
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+from protocols.blockchain_service import BlockchainService
+from protocols.nonce_manager import GasPriceOracle, NonceManager, is_nonce_error
+
+# テスト用の鍵（Anvil のデフォルトアカウント）
+PRIVATE_KEY = "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+RECIPIENT = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+PRIVATE_KEY_ADDRESS = "0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266"
+
+
+class FakeProvider(BaseProvider):
+    """RPC の呼び出しを記録し、送信時のエラーを注入できるプロバイダ"""
+
+    def __init__(self, pending_nonce: int = 7, send_errors=()):
+        self.pending_nonce = pending_nonce
+        self.send_errors = list(send_errors)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def make_request(self, method, params):
+        with self._lock:
+            self.calls.append(method)
+            if method == "eth_chainId":
+                return {"jsonrpc": "2.0", "id": 1, "result": hex(80002)}
+            if method == "eth_gasPrice":
+                return {"jsonrpc": "2.0", "id": 1, "result": hex(30 * 10**9)}
+            if method == "eth_getTransactionCount":
+                return {"jsonrpc": "2.0", "id": 1, "result": hex(self.pending_nonce)}
+            if method == "eth_sendRawTransaction":
+                if self.send_errors:
+                    message = self.send_errors.pop(0)
+                    return {"jsonrpc": "2.0", "id": 1, "error": {"code": -32000, "message": message}}
+                return {"jsonrpc": "2.0", "id": 1, "result": "0x" + "ab" * 32}
+        raise AssertionError(f"unexpected RPC call: {method}")
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return True
+
+
+def make_service(provider: FakeProvider) -> BlockchainService:
+    """RPC に接続せずに BlockchainService を組み立てる"""
+    service = BlockchainService.__new__(BlockchainService)
+    service.w3 = Web3(provider)
+    service.private_key = PRIVATE_KEY
+    service.address = Account.from_key(PRIVATE_KEY).address
+    service.jpyc_contract = service.w3.eth.contract(
+        address=Web3.to_checksum_address("0xafac6B9175D5c51C5F73ab1aAb6d2c35bDC3A302"),
+        abi=BlockchainService.ERC20_TRANSFER_ABI,
+    )
+    service.chain_id = 80002
+    service.nonces = NonceManager(
+        lambda: service.w3.eth.get_transaction_count(service.address, "pending")
+    )
+    service.gas_price = GasPriceOracle(lambda: service.w3.eth.gas_price, ttl_seconds=60)
+    service.nonce_retries = 2
+    return service
+
+
+def test_concurrent_allocations_are_unique():
+    """複数スレッドから払い出しても nonce は重複せず連番になる"""
+    fetches = []
+    manager = NonceManager(lambda: fetches.append(1) or 10)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        nonces = list(pool.map(lambda _: manager.allocate(), range(200)))
+
+    assert sorted(nonces) == list(range(10, 210))
+    assert len(fetches) == 1
+
+
+def test_release_and_resync():
+    """最後の nonce は再利用し、途中の nonce を返却したら RPC から取り直す"""
+    pending = [5]
+    manager = NonceManager(lambda: pending[0])
+
+    assert [manager.allocate(), manager.allocate()] == [5, 6]
+    manager.release(6)
+    assert manager.allocate() == 6
+
+    manager.allocate()  # 7
+    manager.release(6)  # 7 より前なので取り直し
+    pending[0] = 6
+    assert manager.allocate() == 6
+
+
+def test_gas_price_is_cached_until_ttl():
+    """ガス価格は TTL の間キャッシュされ、invalidate で取り直す"""
+    now = [0.0]
+    prices = iter([100, 200, 300])
+    oracle = GasPriceOracle(lambda: next(prices), ttl_seconds=5, clock=lambda: now[0])
+
+    assert oracle.get() == 100
+    now[0] = 4.9
+    assert oracle.get() == 100
+    now[0] = 5.0
+    assert oracle.get() == 200
+    oracle.invalidate()
+    assert oracle.get() == 300
+
+
+def test_is_nonce_error():
+    assert is_nonce_error(ValueError({"message": "nonce too low: next nonce 8, tx nonce 7"}))
+    assert is_nonce_error(ValueError("replacement transaction underpriced"))
+    assert not is_nonce_error(ValueError("insufficient funds for gas * price + value"))
+
+
+def test_transfers_use_local_nonces_without_redundant_rpc():
+    """連続送金では nonce・ガス価格・チェーンIDを送金ごとに取得しない"""
+    provider = FakeProvider(pending_nonce=7)
+    service = make_service(provider)
+
+    for _ in range(5):
+        service.transfer_jpyc(RECIPIENT, 3)
+
+    assert provider.calls.count("eth_getTransactionCount") == 1
+    assert provider.calls.count("eth_gasPrice") == 1
+    assert provider.calls.count("eth_chainId") == 0
+    assert provider.calls.count("eth_sendRawTransaction") == 5
+    assert service.nonces.allocate() == 12
+
+
+def test_transfer_resyncs_on_nonce_too_low():
+    """nonce too low で弾かれたら pending から取り直して再送する"""
+    provider = FakeProvider(pending_nonce=7, send_errors=["nonce too low"])
+    service = make_service(provider)
+
+    tx_hash = service.transfer_jpyc(RECIPIENT, 3)
+
+    assert tx_hash == "0x" + "ab" * 32
+    assert provider.calls.count("eth_getTransactionCount") == 2
+    assert provider.calls.count("eth_sendRawTransaction") == 2
+
+
+def test_failed_send_returns_nonce():
+    """nonce 以外のエラーで送れなかった nonce は次の送金で再利用する"""
+    provider = FakeProvider(pending_nonce=7, send_errors=["insufficient funds"])
+    service = make_service(provider)
+
+    try:
+        service.transfer_jpyc(RECIPIENT, 3)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Expected ValueError")
+
+    assert service.nonces.allocate() == 7
+    assert provider.calls.count("eth_getTransactionCount") == 1
+
+
+def test_batch_transfer_is_one_transaction():
+    """一括送金は送金先の数によらず1回の送信で、nonce も1つだけ使う"""
+    provider = FakeProvider(pending_nonce=7)
+    service = make_service(provider)
+
+    service.transfer_jpyc_batch([(RECIPIENT, 3), (RECIPIENT, 15), (PRIVATE_KEY_ADDRESS, 5)])
+
+    assert provider.calls.count("eth_sendRawTransaction") == 1
+    assert service.nonces.allocate() == 8
+
+
+def test_open_payment_channel_sends_approve_and_open_back_to_back():
+    """チャネル開設の approve と open は確認を待たずに連番の nonce で送る"""
+    provider = FakeProvider(pending_nonce=7)
+    service = make_service(provider)
+    service.payment_channel_address = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+    service.payment_channel_contract = service.w3.eth.contract(
+        address=service.payment_channel_address,
+        abi=BlockchainService.PAYMENT_CHANNEL_ABI,
+    )
+
+    before = int(time.time())
+    opened = service.open_payment_channel(RECIPIENT, 100, salt=b"\x01" * 32)
+
+    assert opened["channel_id"].startswith("0x") and len(opened["channel_id"]) == 66
+    # 期限は送信前の時刻 + 有効期間（オンチェーンの expiresAt 以前）
+    assert before + 86400 <= opened["expires_at"] <= int(time.time()) + 86400
+    assert provider.calls.count("eth_sendRawTransaction") == 2
+    assert provider.calls.count("eth_getTransactionCount") == 1
+    assert service.nonces.allocate() == 9
@@ -0,0 +1,98 @@
+"""
+AgentCoordinator テスト
+
+並行実行（execute_many）の同時実行数・タイムアウト・セッション管理を検証
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from orchestrator import AgentCoordinator, OptimizationResult
+
+
+class CountingSession:
+    """close() の呼び出しを記録するセッション"""
+
+    opened = 0
+    closed = 0
+
+    def __init__(self):
+        CountingSession.opened += 1
+
+    def close(self):
+        CountingSession.closed += 1
+
+
+class SlowCoordinator(AgentCoordinator):
+    """エージェントを呼ばずに一定時間待つだけのコーディネータ"""
+
+    running = 0
+    max_running = 0
+
+    async def execute_optimization_task(self, product_sku, store_id):
+        SlowCoordinator.running += 1
+        SlowCoordinator.max_running = max(SlowCoordinator.max_running, SlowCoordinator.running)
+        try:
+            await asyncio.sleep(1.0 if store_id == "SLOW" else 0.01)
+        finally:
+            SlowCoordinator.running -= 1
+
+        return OptimizationResult(
+            success=True,
+            product_sku=product_sku,
+            store_id=store_id,
+            demand_forecast=None,
+            inventory_optimization=None,
+            total_cost=18,
+            total_execution_time=0.01,
+            summary={},
+        )
+
+
+async def _collect(coordinator, tasks, **kwargs):
+    return [result async for result in coordinator.execute_many(tasks, **kwargs)]
+
+
+def test_execute_many_bounded_concurrency():
+    """同時実行数がmax_concurrencyを超えず、タスクごとにセッションを開閉する"""
+    CountingSession.opened = CountingSession.closed = 0
+    SlowCoordinator.max_running = 0
+
+    coordinator = SlowCoordinator(None, session_factory=CountingSession)
+    tasks = [("tomato", f"S{i:03d}") for i in range(20)]
+
+    results = asyncio.run(_collect(coordinator, tasks, max_concurrency=4))
+
+    assert len(results) == 20
+    assert all(r.success for r in results)
+    assert {r.store_id for r in results} == {store for _, store in tasks}
+    assert SlowCoordinator.max_running == 4
+    assert CountingSession.opened == CountingSession.closed == 20
+
+
+def test_execute_many_timeout():
+    """タイムアウトしたタスクは失敗結果として返る"""
+    CountingSession.opened = CountingSession.closed = 0
+
+    coordinator = SlowCoordinator(None, session_factory=CountingSession)
+    tasks = [("tomato", "S001"), ("tomato", "SLOW")]
+
+    results = asyncio.run(_collect(coordinator, tasks, timeout=0.2))
+
+    by_store = {r.store_id: r for r in results}
+    assert by_store["S001"].success
+    assert not by_store["SLOW"].success
+    assert "Timed out" in by_store["SLOW"].error_message
+    assert CountingSession.closed == 2
+
+
+def test_demand_forecast_uses_shared_rolling_stats():
+    """需要予測エージェントはプロセス内で共有するローリング統計を使う"""
+    from agents.rolling_stats import get_rolling_stats_store
+
+    coordinator = AgentCoordinator(db_session=None)
+
+    assert coordinator.demand_forecast_agent.rolling_stats is get_rolling_stats_store()
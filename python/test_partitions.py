@@ -0,0 +1,97 @@
+"""
+月次パーティション テスト
+
+月の計算と、パーティションの作成・切り離しの呼び出しを検証（DB不要）
+"""
+import sys
+from datetime import date
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from database import ensure_partitions, maintain_partitions
+from fakes import FakeResult
+from partitions import PARTITIONED_TABLES, add_months
+
+
+class FakeSession:
+    """パーティション関数の呼び出しを記録するだけのセッション"""
+
+    def __init__(self, detached=None):
+        # detached: {table: [切り離すパーティション名, ...]}
+        self.detached = detached or {}
+        self.calls = []
+        self.commits = 0
+
+    def execute(self, query, params=None):
+        sql = str(query)
+        if "ensure_monthly_partitions" in sql:
+            self.calls.append(("ensure", params["table"], params["start"], params["end"]))
+            months = (params["end"].year - params["start"].year) * 12
+            return FakeResult([(months + params["end"].month - params["start"].month + 1,)])
+        self.calls.append(("detach", params["table"], params["cutoff"]))
+        return FakeResult([(name,) for name in self.detached.get(params["table"], [])])
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_add_months_rolls_over_years():
+    """月初に揃え、年をまたいで前後にずらす"""
+    assert add_months(date(2026, 1, 31), 0) == date(2026, 1, 1)
+    assert add_months(date(2026, 11, 15), 1) == date(2026, 12, 1)
+    assert add_months(date(2026, 11, 15), 2) == date(2027, 1, 1)
+    assert add_months(date(2026, 12, 31), 13) == date(2028, 1, 1)
+    assert add_months(date(2026, 1, 15), -1) == date(2025, 12, 1)
+    assert add_months(date(2026, 3, 1), -24) == date(2024, 3, 1)
+
+
+def test_ensure_partitions_creates_each_table():
+    """対象の全テーブルに同じ範囲のパーティションを作成してコミットする"""
+    session = FakeSession()
+
+    months = ensure_partitions(session, date(2026, 11, 20), date(2027, 2, 3))
+
+    assert months == 4
+    assert session.calls == [
+        ("ensure", table, date(2026, 11, 20), date(2027, 2, 3)) for table in PARTITIONED_TABLES
+    ]
+    assert session.commits == 1
+
+    session = FakeSession()
+    ensure_partitions(session, date(2026, 1, 1), date(2026, 1, 31), tables=("pos_sales",))
+    assert [call[1] for call in session.calls] == ["pos_sales"]
+
+
+def test_maintain_partitions_creates_ahead_and_detaches_old():
+    """months_ahead 先の月初まで作成し、retain_months 前の月初より古い月を切り離す"""
+    session = FakeSession(
+        detached={"pos_sales": ["pos_sales_202410"], "pos_sales_daily": ["pos_sales_daily_202410"]}
+    )
+
+    detached = maintain_partitions(
+        session, months_ahead=3, retain_months=24, today=date(2026, 11, 17)
+    )
+
+    assert detached == ["pos_sales_202410", "pos_sales_daily_202410"]
+    assert session.calls == [
+        ("ensure", "pos_sales", date(2026, 11, 17), date(2027, 2, 1)),
+        ("ensure", "pos_sales_daily", date(2026, 11, 17), date(2027, 2, 1)),
+        ("detach", "pos_sales", date(2024, 11, 1)),
+        ("detach", "pos_sales_daily", date(2024, 11, 1)),
+    ]
+    assert session.commits == 2
+
+
+def test_maintain_partitions_defaults_to_settings():
+    """引数を省略した場合は設定値を使う"""
+    from config import settings
+
+    session = FakeSession()
+    maintain_partitions(session, today=date(2026, 1, 10))
+
+    ensure_end = session.calls[0][3]
+    cutoff = session.calls[-1][2]
+    assert ensure_end == add_months(date(2026, 1, 10), settings.POS_PARTITION_MONTHS_AHEAD)
+    assert cutoff == add_months(date(2026, 1, 10), -settings.POS_PARTITION_RETAIN_MONTHS)
@@ -0,0 +1,211 @@
+"""
+ペイメントチャネル テスト
+
+バウチャーの発行・ローカル検証と、X402Client のチャネル経由の決済を検証（ネットワーク不要）
+"""
+import sys
+import time
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from eth_abi import encode
+from eth_account import Account
+from eth_utils import keccak
+
+from protocols.x402 import (
+    ChannelError,
+    PaymentChannelPayer,
+    PaymentChannelReceiver,
+    PaymentScheme,
+    PaymentStatus,
+    Voucher,
+    X402Client,
+    X402Response,
+)
+from protocols.x402.channel import _voucher_message
+from protocols.x402.models import jpyc_to_wei
+
+# テスト用の鍵（Anvil のデフォルトアカウント）
+CLIENT_KEY = "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+SERVICE_ADDRESS = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+CHANNEL_CONTRACT = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+CHAIN_ID = 80002
+
+
+def make_channel(deposit_jpyc=100.0, expires_at=None, clock=time.time):
+    expires_at = expires_at or int(time.time()) + 86400
+    payer = PaymentChannelPayer(
+        private_key=CLIENT_KEY,
+        recipient=SERVICE_ADDRESS,
+        deposit=jpyc_to_wei(deposit_jpyc),
+        chain_id=CHAIN_ID,
+        contract_address=CHANNEL_CONTRACT,
+        expires_at=expires_at,
+        salt=b"\x01" * 32,
+        clock=clock,
+    )
+    receiver = PaymentChannelReceiver(
+        sender=payer.sender,
+        channel_id=payer.channel_id,
+        deposit=payer.deposit,
+        chain_id=CHAIN_ID,
+        contract_address=CHANNEL_CONTRACT,
+        expires_at=expires_at,
+        clock=clock,
+    )
+    return payer, receiver
+
+
+def test_voucher_digest_matches_contract():
+    """バウチャーの署名対象は JPYCPaymentChannel.voucherDigest と同じ EIP-712 ダイジェスト"""
+    payer, _ = make_channel()
+
+    domain_separator = keccak(encode(
+        ["bytes32", "bytes32", "bytes32", "uint256", "address"],
+        [
+            keccak(text="EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)"),
+            keccak(text="JPYCPaymentChannel"),
+            keccak(text="1"),
+            CHAIN_ID,
+            CHANNEL_CONTRACT,
+        ],
+    ))
+    struct_hash = keccak(encode(
+        ["bytes32", "bytes32", "uint256"],
+        [keccak(text="Voucher(bytes32 channelId,uint256 amount)"), bytes.fromhex(payer.channel_id[2:]), 5],
+    ))
+    expected = keccak(b"\x19\x01" + domain_separator + struct_hash)
+
+    message = _voucher_message(payer.channel_id, 5, CHAIN_ID, CHANNEL_CONTRACT)
+    assert keccak(b"\x19" + message.version + message.header + message.body) == expected
+
+    # channelId = keccak256(abi.encode(sender, recipient, salt))
+    assert payer.channel_id == "0x" + keccak(encode(
+        ["address", "address", "bytes32"], [payer.sender, SERVICE_ADDRESS, b"\x01" * 32]
+    )).hex()
+
+
+def test_receiver_accepts_cumulative_vouchers():
+    """累積額のバウチャーを順に受理し、最新の1枚で閉じられる"""
+    payer, receiver = make_channel()
+
+    for price in (3, 15, 5):
+        voucher = payer.pay(jpyc_to_wei(price))
+        assert receiver.accept(voucher, price=jpyc_to_wei(price)) == jpyc_to_wei(price)
+
+    assert receiver.received == jpyc_to_wei(23)
+    assert receiver.close_args()[1] == jpyc_to_wei(23)
+    assert payer.remaining == jpyc_to_wei(77)
+
+
+def test_receiver_rejects_invalid_vouchers():
+    """再送・額不足・署名の偽造・デポジット超過は受理しない"""
+    payer, receiver = make_channel(deposit_jpyc=10.0)
+    first = payer.pay(jpyc_to_wei(3))
+    receiver.accept(first, price=jpyc_to_wei(3))
+
+    forged = Account.from_key("0x" + "11" * 32).sign_message(
+        _voucher_message(payer.channel_id, jpyc_to_wei(9), CHAIN_ID, CHANNEL_CONTRACT)
+    )
+    cases = [
+        first,  # 再送
+        payer.pay(jpyc_to_wei(1)),  # 請求額（3 JPYC）に足りない
+        Voucher(payer.channel_id, jpyc_to_wei(9), "0x" + forged.signature.hex().removeprefix("0x")),
+        Voucher(payer.channel_id, jpyc_to_wei(20), first.signature),  # デポジット超過
+    ]
+    for voucher in cases:
+        try:
+            receiver.accept(voucher, price=jpyc_to_wei(3))
+        except ChannelError:
+            pass
+        else:
+            raise AssertionError(f"Expected ChannelError for {voucher}")
+
+    assert receiver.received == jpyc_to_wei(3)
+
+    try:
+        payer.pay(jpyc_to_wei(7))
+    except ChannelError:
+        pass
+    else:
+        raise AssertionError("Expected ChannelError")
+
+
+def test_channel_stops_before_expiry():
+    """期限の expiry_margin_seconds 前からはバウチャーを発行・受理しない"""
+    now = [1_000_000.0]
+    payer, receiver = make_channel(expires_at=1_000_000 + 3600, clock=lambda: now[0])
+    early = payer.pay(jpyc_to_wei(1))
+    receiver.accept(early, price=jpyc_to_wei(1))
+
+    # 期限の10分前（受け取り側が close を確定させる時間）
+    now[0] += 3600 - 600
+    for action in (
+        lambda: payer.pay(jpyc_to_wei(1)),
+        lambda: receiver.accept(early, price=0),
+    ):
+        try:
+            action()
+        except ChannelError:
+            pass
+        else:
+            raise AssertionError("Expected ChannelError")
+
+    assert payer.paid == jpyc_to_wei(1)
+    assert receiver.close_args()[1] == jpyc_to_wei(1)
+
+
+class OnChainRecorder:
+    """オンチェーン送金の呼び出しを記録"""
+
+    def __init__(self):
+        self.transfers = []
+
+    def transfer_jpyc(self, to_address, amount, gas_limit=100000):
+        self.transfers.append((to_address, amount))
+        return f"0xonchain{len(self.transfers)}"
+
+
+def test_x402_client_pays_through_channel():
+    """チャネルがある支払先への決済はバウチャーだけで完了し、尽きたらオンチェーンに戻る"""
+    payer, receiver = make_channel(deposit_jpyc=30.0)
+    service = OnChainRecorder()
+    client = X402Client(blockchain_service=service, client_agent_id=0)
+    client.add_channel(payer)
+
+    def call(amount_jpyc):
+        request = client.create_request(
+            service_agent_id=1,
+            service_description="需要予測サービス",
+            payment_scheme=PaymentScheme.EXACT,
+            base_amount_jpyc=amount_jpyc,
+        )
+        response = X402Response(
+            request_id=request.request_id,
+            response_id=f"res-{request.request_id[4:]}",
+            status="success",
+            actual_amount=request.base_amount,
+            payment_address=SERVICE_ADDRESS,
+        )
+        return client.process_response(request, response)
+
+    start = time.perf_counter()
+    transactions = [call(0.1) for _ in range(100)]
+    elapsed = time.perf_counter() - start
+
+    # サービス側はバウチャーを検証するだけ
+    for tx in transactions:
+        receiver.accept(Voucher.from_dict(tx.voucher), price=tx.amount)
+
+    assert service.transfers == []
+    assert all(tx.status == PaymentStatus.COMPLETED and tx.tx_hash is None for tx in transactions)
+    assert transactions[-1].channel_id == payer.channel_id
+    assert receiver.received == jpyc_to_wei(0.1) * 100
+    assert elapsed < 5  # 100回の署名（オンチェーンなら数分）
+
+    # デポジット（30 JPYC）の残りは 20 JPYC なので 25 JPYC はオンチェーンで送金
+    fallback = call(25.0)
+    assert fallback.tx_hash == "0xonchain1"
+    assert fallback.voucher is None
@@ -0,0 +1,128 @@
+"""
+最適化パイプライン テスト
+
+ステージの重なり・失敗の伝播・ステージ間の受け渡しを検証
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from agents.base import AgentResult
+from pipeline import (
+    DemandForecastStage,
+    InventoryOptimizationStage,
+    Pipeline,
+    PipelineStage,
+)
+
+
+class RecordingStage(PipelineStage):
+    """処理の開始・終了を記録して一定時間待つステージ"""
+
+    def __init__(self, name, events, delay=0.02, fail_store=None):
+        self.name = name
+        self.events = events
+        self.delay = delay
+        self.fail_store = fail_store
+
+    async def process(self, batch):
+        key = batch[0].store_id
+        self.events.append((self.name, key, "start"))
+        await asyncio.sleep(self.delay)
+        if key == self.fail_store:
+            raise RuntimeError("stage failed")
+        self.events.append((self.name, key, "end"))
+
+
+def _result(data, cost=3):
+    return AgentResult(success=True, data=data, confidence=0.85, execution_time=0.0, cost=cost)
+
+
+class FakeDemandAgent:
+    async def execute_batch(self, pairs):
+        return [_result({"predicted_demand": 300}) for _ in pairs]
+
+
+class FakeInventoryAgent:
+    def __init__(self):
+        self.inputs = []
+
+    async def execute_batch(self, items):
+        self.inputs.extend(items)
+        return [_result({"order_quantity": 220}, cost=15) for _ in items]
+
+
+async def _collect(pipeline, tasks, **kwargs):
+    return [item async for item in pipeline.run(tasks, **kwargs)]
+
+
+def test_downstream_starts_before_upstream_finishes():
+    """下流ステージは上流の全バッチを待たずに処理を始める"""
+    events = []
+    pipeline = Pipeline([RecordingStage("a", events), RecordingStage("b", events)])
+    tasks = [("tomato", f"S{i}") for i in range(3)]
+
+    items = asyncio.run(_collect(pipeline, tasks, batch_size=1))
+
+    assert [item.store_id for item in items] == ["S0", "S1", "S2"]
+    assert events.index(("b", "S0", "start")) < events.index(("a", "S2", "end"))
+
+
+def test_failed_batch_skips_downstream():
+    """ステージの例外はそのバッチのアイテムのエラーになり、他のバッチは続行する"""
+    events = []
+    pipeline = Pipeline(
+        [RecordingStage("a", events, fail_store="S1"), RecordingStage("b", events)]
+    )
+    tasks = [("tomato", "S0"), ("tomato", "S1"), ("tomato", "S2")]
+
+    items = asyncio.run(_collect(pipeline, tasks, batch_size=1))
+
+    assert [item.failed for item in items] == [False, True, False]
+    assert items[1].error_message == "stage failed"
+    # 失敗したアイテムも下流に渡る（エージェントのステージは失敗済みのアイテムを飛ばす）
+    assert ("b", "S1", "start") in events
+
+
+def test_task_errors_reach_the_caller():
+    """タスクの列が例外を出したり形式が不正でも、止まらずに呼び出し元へ例外を伝える"""
+    events = []
+    pipeline = Pipeline([RecordingStage("a", events)])
+
+    def broken_tasks():
+        yield ("tomato", "S0")
+        raise RuntimeError("task source failed")
+
+    async def collect_with_timeout(tasks):
+        return await asyncio.wait_for(_collect(pipeline, tasks, batch_size=1), timeout=2.0)
+
+    for tasks, expected in (
+        (broken_tasks(), RuntimeError),
+        ([("tomato", "S0"), ("tomato",)], ValueError),
+    ):
+        try:
+            asyncio.run(collect_with_timeout(tasks))
+        except expected:
+            pass
+        else:
+            raise AssertionError(f"Expected {expected.__name__}")
+
+
+def test_agent_stages_hand_off_results_by_reference():
+    """需要予測の AgentResult はコピーされずに在庫最適化へ渡る"""
+    inventory_agent = FakeInventoryAgent()
+    pipeline = Pipeline(
+        [DemandForecastStage(FakeDemandAgent()), InventoryOptimizationStage(inventory_agent)]
+    )
+    tasks = [("tomato", f"S{i}") for i in range(5)]
+
+    items = asyncio.run(_collect(pipeline, tasks, batch_size=2))
+
+    assert len(items) == 5
+    for item, agent_input in zip(items, inventory_agent.inputs):
+        assert agent_input["demand_forecast"] is item.demand
+        assert item.inventory.data["order_quantity"] == 220
+    assert not hasattr(items[0].demand, "__dict__")
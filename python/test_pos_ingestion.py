@@ -0,0 +1,147 @@
+"""
+POSデータ取り込み テスト
+
+エクスポートの読み込み（CSV / Parquet のチャンク分割）と列の正規化を検証（DB不要）
+"""
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+import pandas as pd
+
+from agents.rolling_stats import RollingStatsStore
+from pos_ingestion import (
+    POS_COLUMNS,
+    PosIngestor,
+    count_rejected,
+    iter_export_chunks,
+    normalize_chunk,
+)
+
+
+def make_export(**overrides):
+    data = {
+        "date": ["2026-01-16", "2026-01-17", "2026-01-17", "2026-01-18"],
+        "store_id": ["S001", "S001", "S001", "S002"],
+        "product_sku": ["tomato", "tomato", "tomato", "cucumber"],
+        "sales_quantity": [3, 5, 7, 2],
+        "price": [198.0, 198.0, 178.0, 98.0],
+        "transaction_id": ["T1", "T2", "T2", "T3"],
+    }
+    data.update(overrides)
+    return pd.DataFrame(data)
+
+
+def test_normalize_chunk_fills_calendar_columns():
+    """day_of_week（0=日曜）・is_holiday が無い場合は日付から補完し、pos_sales の列順に揃える"""
+    rows = normalize_chunk(make_export())
+
+    assert list(rows.columns) == POS_COLUMNS
+    assert rows["date"].iloc[0] == date(2026, 1, 16)
+    # 2026-01-16 は金曜、01-17 は土曜、01-18 は日曜
+    assert list(rows["day_of_week"]) == [5, 6, 0]
+    assert list(rows["is_holiday"]) == [False, True, True]
+
+
+def test_normalize_chunk_keeps_last_row_per_transaction():
+    """同じ (日付, 店舗, 取引ID) の重複行は最後の行を残す"""
+    rows = normalize_chunk(make_export())
+
+    assert list(rows["transaction_id"]) == ["T1", "T2", "T3"]
+    t2 = rows[rows["transaction_id"] == "T2"].iloc[0]
+    assert (t2["sales_quantity"], t2["price"]) == (7, 178.0)
+
+
+def test_normalize_chunk_rejects_rows_without_transaction_id():
+    """取引IDが空の行は再取り込みで重複するため取り込まない"""
+    export = make_export(transaction_id=["T1", None, "", "T3"])
+
+    rows = normalize_chunk(export)
+
+    assert list(rows["transaction_id"]) == ["T1", "T3"]
+    assert count_rejected(export) == 2
+
+    try:
+        normalize_chunk(export.drop(columns=["transaction_id"]))
+    except ValueError as e:
+        assert "transaction_id" in str(e)
+    else:
+        raise AssertionError("Expected ValueError")
+
+
+def test_iter_export_chunks_csv(tmp_path):
+    """CSV はチャンクごとに読み、店舗ID・SKU・取引IDは文字列のまま読む"""
+    path = tmp_path / "pos.csv"
+    make_export(store_id=["001", "001", "001", "002"]).to_csv(path, index=False)
+
+    chunks = list(iter_export_chunks(path, chunk_size=3))
+
+    assert [len(chunk) for chunk in chunks] == [3, 1]
+    assert chunks[0]["store_id"].iloc[0] == "001"
+    assert list(normalize_chunk(chunks[1])["transaction_id"]) == ["T3"]
+
+
+def test_iter_export_chunks_parquet(tmp_path):
+    """Parquet はレコードバッチ単位で読む"""
+    path = tmp_path / "pos.parquet"
+    make_export().to_parquet(path, index=False)
+
+    chunks = list(iter_export_chunks(path, chunk_size=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2]
+    assert list(pd.concat(chunks)["transaction_id"]) == ["T1", "T2", "T2", "T3"]
+
+
+def test_iter_export_chunks_rejects_unknown_format(tmp_path):
+    """CSV / Parquet 以外は読まない"""
+    try:
+        list(iter_export_chunks(tmp_path / "pos.xlsx"))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Expected ValueError")
+
+
+class FakeCursor:
+    """日次集計を返すだけのpsycopg2カーソル"""
+
+    def __init__(self, daily):
+        # daily: [(store_id, product_sku, date, sales_quantity), ...]
+        self.daily = daily
+        self.params = []
+        self._rows = []
+
+    def execute(self, query, params=None):
+        self.params.append(params)
+        store_ids, since = params
+        self._rows = [row for row in self.daily if row[0] in store_ids and row[2] >= since]
+
+    def fetchall(self):
+        return self._rows
+
+
+def test_reload_rolling_stats_replaces_refreshed_stores():
+    """日次集計の更新後は、直近の月を再集計した店舗のローリング統計を日次集計で置き換える"""
+    today = date.today()
+    rolling = RollingStatsStore()
+    # 取り込み前の状態（同じ取引の更新で数量が変わる・別商品に付け替わる）
+    rolling.add_sale("tomato", "S001", today, 5)
+    rolling.add_sale("cucumber", "S001", today, 2)
+    rolling.add_sale("tomato", "S002", today, 9)
+
+    cursor = FakeCursor([("S001", "tomato", today, 7), ("S002", "tomato", today, 1)])
+    refreshed = [
+        ("S001", today.replace(day=1), today, 2),
+        # 過去の月だけを再集計した店舗は読み直さない
+        ("S002", date(2020, 1, 1), date(2020, 1, 5), 1),
+    ]
+    ingestor = PosIngestor(engine=object(), rolling_stats=rolling)
+
+    assert ingestor._reload_rolling_stats(cursor, refreshed) == 1
+    assert cursor.params == [(["S001"], today - timedelta(days=30))]
+    assert rolling.get("tomato", "S001").window_sum == 7
+    assert rolling.get("cucumber", "S001") is None
+    assert rolling.get("tomato", "S002").window_sum == 9
@@ -0,0 +1,147 @@
+"""
+SSE ブロードキャストハブ テスト
+
+プッシュ配信・Last-Event-ID での再開・ハートビート・遅いクライアントの切断を検証
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from api.sse_hub import HEARTBEAT_FRAME, SSEHub, parse_last_event_id
+
+
+def _event_ids(frames):
+    return [int(f.split("\n")[0][len("id: "):]) for f in frames if f.startswith("id: ")]
+
+
+def _payloads(frames):
+    return [json.loads(f.split("data: ", 1)[1]) for f in frames if "data: " in f]
+
+
+def test_replays_history_then_snapshot_then_pushes():
+    """接続時に履歴と現在値を送り、以降は配信されたイベントだけを送る"""
+    hub = SSEHub(heartbeat_seconds=10)
+    hub.publish({"message": "before"})
+
+    async def run():
+        stream = hub.stream_events(snapshot=lambda: {"type": "status"})
+        frames = [await stream.__anext__(), await stream.__anext__()]
+        hub.publish({"message": "after"})
+        frames.append(await stream.__anext__())
+        await stream.aclose()
+        return frames
+
+    frames = asyncio.run(run())
+
+    assert _payloads(frames) == [{"message": "before"}, {"type": "status"}, {"message": "after"}]
+    assert _event_ids(frames) == [1, 2]
+    assert hub.subscriber_count == 0
+
+
+def test_resume_from_last_event_id():
+    """Last-Event-ID より後のイベントだけを再送し、ステータスは履歴に残さない"""
+    hub = SSEHub()
+    for i in range(3):
+        hub.publish({"message": f"log {i}"})
+    hub.publish({"type": "status"}, retain=False)
+    hub.publish({"message": "log 3"})
+
+    async def run():
+        stream = hub.stream_events(last_event_id=2)
+        frames = [await stream.__anext__(), await stream.__anext__()]
+        await stream.aclose()
+        return frames
+
+    frames = asyncio.run(run())
+
+    assert _payloads(frames) == [{"message": "log 2"}, {"message": "log 3"}]
+    assert _event_ids(frames) == [3, 5]
+
+
+def test_idle_stream_sends_heartbeats_only():
+    """イベントがない間はハートビートのコメント行だけを送る"""
+    hub = SSEHub(heartbeat_seconds=0.01)
+
+    async def run():
+        stream = hub.stream_events()
+        frames = [await stream.__anext__() for _ in range(3)]
+        await stream.aclose()
+        return frames
+
+    assert asyncio.run(run()) == [HEARTBEAT_FRAME] * 3
+
+
+def test_slow_subscriber_is_dropped():
+    """キューがあふれた購読者は切断され、他の購読者には配信が続く"""
+    hub = SSEHub(queue_size=2, heartbeat_seconds=10)
+
+    async def run():
+        slow = hub.stream_events()
+        fast = hub.stream_events()
+        # 2つとも登録させる（履歴が空なので最初のイベント待ちまで進める）
+        slow_next = asyncio.ensure_future(slow.__anext__())
+        fast_frames = []
+        fast_next = asyncio.ensure_future(fast.__anext__())
+        await asyncio.sleep(0)
+
+        for i in range(4):
+            hub.publish({"message": f"log {i}"})
+            fast_frames.append(await fast_next)
+            fast_next = asyncio.ensure_future(fast.__anext__())
+        # slow は最初の1件だけ受け取り、以降は読まない
+        slow_frames = [await slow_next]
+        rest = [frame async for frame in slow]
+
+        fast_next.cancel()
+        try:
+            await fast_next
+        except asyncio.CancelledError:
+            pass
+        await fast.aclose()
+        return slow_frames, rest, fast_frames
+
+    slow_frames, rest, fast_frames = asyncio.run(run())
+
+    assert _event_ids(fast_frames) == [1, 2, 3, 4]
+    assert _event_ids(slow_frames) == [1]
+    # 溜まっていたフレームは捨てられ、ストリームが終わる（クライアントは Last-Event-ID で再接続）
+    assert rest == []
+    assert hub.subscriber_count == 0
+
+
+def test_publish_from_another_thread():
+    """イベントループ外のスレッドからの配信はループのスレッドで届く"""
+    hub = SSEHub(heartbeat_seconds=10)
+
+    async def run():
+        stream = hub.stream_events()
+        next_frame = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        await asyncio.get_running_loop().run_in_executor(None, hub.publish, {"message": "x"})
+        frame = await next_frame
+        await stream.aclose()
+        return frame
+
+    assert _payloads([asyncio.run(run())]) == [{"message": "x"}]
+
+
+def test_parse_last_event_id():
+    assert parse_last_event_id("42") == 42
+    assert parse_last_event_id("abc") is None
+    assert parse_last_event_id(None) is None
+
+
+def test_agent_status_published_only_on_change():
+    """ステータスは値が変わったときだけ配信される"""
+    from api.jobs import Job
+
+    job = Job({})
+    job.update_agent_status("demand_forecast", "running", 10)
+    job.update_agent_status("demand_forecast", "running", 10)
+    job.update_agent_status("demand_forecast", "running", 20)
+
+    assert job.hub.last_event_id == 2
@@ -0,0 +1,139 @@
+"""
+処理時間計測 テスト
+
+スパンの記録・ステージ別の集計・プロファイル取得・JSON/OTLP 出力を検証
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from agents.inventory_optimizer import InventoryOptimizerAgent
+from agents.supplier_cache import SupplierCache
+from agents.tracing import Tracer, span
+from fakes import FakeSession, demand_forecast_result
+from pipeline import Pipeline, PipelineStage
+
+
+class FetchStage(PipelineStage):
+    name = "fetch"
+
+    async def process(self, batch):
+        with span("db_fetch", rows=len(batch)):
+            await asyncio.sleep(0)
+
+
+def test_spans_nest_and_break_down_by_name():
+    """スパンは親子関係を持ち、名前ごとに合計される（トレース外では記録しない）"""
+    with span("db_fetch") as outside:
+        assert outside is None
+
+    tracer = Tracer()
+    with tracer.trace("task", product_sku="tomato") as trace:
+        with span("db_fetch", query="a"):
+            with span("compute"):
+                pass
+        with span("db_fetch", query="b"):
+            pass
+
+    root, fetch_a, compute, fetch_b = trace.spans
+    assert root.name == "task" and root.parent_id is None
+    assert compute.parent_id == fetch_a.span_id
+    assert fetch_b.parent_id == root.span_id
+    assert set(trace.breakdown()) == {"db_fetch", "compute"}
+    assert trace.breakdown()["db_fetch"] == fetch_a.duration_ms + fetch_b.duration_ms
+    assert list(tracer.traces) == [trace]
+
+
+def test_agent_records_supplier_lookup_fetch_and_compute():
+    """在庫最適化はサプライヤー取得・DB取得・計算のスパンを残す"""
+    agent = InventoryOptimizerAgent(
+        FakeSession(inventory={("tomato", "S001"): 50}), supplier_cache=SupplierCache(ttl_seconds=600)
+    )
+    tracer = Tracer()
+
+    with tracer.trace("task") as trace:
+        result = asyncio.run(
+            agent.execute(
+                {"demand_forecast": demand_forecast_result(), "product_sku": "tomato", "store_id": "S001"}
+            )
+        )
+
+    assert result.success
+    names = [(s.name, s.attributes.get("query")) for s in trace.spans[1:]]
+    assert names == [
+        ("supplier_lookup", None),
+        ("db_fetch", "suppliers"),
+        ("db_fetch", "inventory_snapshot"),
+        ("compute", None),
+    ]
+    supplier_span = trace.spans[1]
+    assert trace.spans[2].parent_id == supplier_span.span_id
+
+
+def test_pipeline_stage_workers_share_the_trace():
+    """パイプラインのステージワーカー内のスパンも同じトレースに入る"""
+    tracer = Tracer()
+    pipeline = Pipeline([FetchStage()])
+
+    async def run():
+        with tracer.trace("pipeline") as trace:
+            items = [item async for item in pipeline.run([("tomato", f"S{i}") for i in range(3)], batch_size=2)]
+        return trace, items
+
+    trace, items = asyncio.run(run())
+
+    assert len(items) == 3
+    stage_spans = [s for s in trace.spans if s.name == "fetch"]
+    assert [s.attributes["batch_size"] for s in stage_spans] == [2, 1]
+    fetch_parents = [s.parent_id for s in trace.spans if s.name == "db_fetch"]
+    assert fetch_parents == [s.span_id for s in stage_spans]
+
+
+def test_profile_and_memory_capture_exported_as_otlp(tmp_path):
+    """cProfile・tracemalloc の結果をトレースに付け、OTLP/JSON で1行1トレース書き出す"""
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(profile=True, trace_memory=True, export_path=path, export_format="otlp", top_n=5)
+
+    with tracer.trace("task", store_id="S001") as trace:
+        with span("compute"):
+            data = [bytes(1000) for _ in range(200)]
+        # 並行して始めたタスクはプロファイルを取らない
+        with tracer.trace("concurrent") as other:
+            pass
+    del data
+
+    assert len(trace.profile) == 5
+    assert trace.memory["peak_bytes"] >= 200 * 1000
+    assert other.profile is None and other.memory is None
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2
+    exported = json.loads(lines[1])
+    spans = exported["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    root, compute = spans
+    assert root["traceId"] == trace.trace_id and len(root["traceId"]) == 32
+    assert compute["parentSpanId"] == root["spanId"]
+    assert int(compute["endTimeUnixNano"]) >= int(compute["startTimeUnixNano"])
+    assert {"key": "store_id", "value": {"stringValue": "S001"}} in root["attributes"]
+    event_names = {event["name"] for event in root["events"]}
+    assert event_names == {"cprofile.function", "tracemalloc.allocation"}
+
+
+def test_json_export(tmp_path):
+    """JSON形式はスパン一覧と名前別の内訳を持つ"""
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(export_path=path)
+
+    with tracer.trace("task"):
+        with span("summary"):
+            pass
+
+    record = json.loads(path.read_text())
+    assert record["name"] == "task"
+    assert [s["name"] for s in record["spans"]] == ["task", "summary"]
+    assert set(record["breakdown_ms"]) == {"summary"}
+    assert record["profile"] is None
@@ -4,6 +4,7 @@ X402 v2 プロトコルテスト
 Agent-to-Agent決済フローの検証
 """
 import sys
+from datetime import timedelta
 from pathlib import Path
 
 # プロジェクトルートをPythonパスに追加
@@ -15,6 +16,7 @@ from protocols.x402 import (
     X402Request,
     X402Response,
     PaymentStatus,
+    SettlementLedger,
 )
 from protocols.x402.models import jpyc_to_wei, wei_to_jpyc
 
@@ -292,6 +294,310 @@ def test_x402_transaction_summary():
     print("\n✅ Transaction Summary Test PASSED")
 
 
+class RecordingBlockchainService:
+    """一括送金の呼び出しを記録する（失敗を注入できる）"""
+
+    def __init__(self, fail_times: int = 0, reverted=(), pending=()):
+        self.batches = []
+        self.transfers = []
+        self.waits = []
+        self.fail_times = fail_times
+        self.reverted = set(reverted)  # レシートの status が 0 になるトランザクション
+        self.pending = set(pending)  # まだマイニングされていないトランザクション
+
+    def transfer_jpyc(self, to_address, amount, gas_limit=100000):
+        self.transfers.append((to_address, amount))
+        return f"0xsingle{len(self.transfers)}"
+
+    def transfer_jpyc_batch(self, transfers, gas_limit=None):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise ConnectionError("RPC unavailable")
+        self.batches.append(list(transfers))
+        return f"0xbatch{len(self.batches)}"
+
+    def get_transaction_receipt(self, tx_hash):
+        if tx_hash in self.pending:
+            raise LookupError(f"Transaction {tx_hash} not found")
+        return {"transaction_hash": tx_hash, "status": 0 if tx_hash in self.reverted else 1}
+
+    def wait_for_transaction(self, tx_hash, timeout=120):
+        self.waits.append(tx_hash)
+        self.pending.discard(tx_hash)
+        return self.get_transaction_receipt(tx_hash)
+
+
+def _queue(client, address, amount_jpyc):
+    request = client.create_request(
+        service_agent_id=1,
+        service_description="需要予測サービス",
+        payment_scheme=PaymentScheme.EXACT,
+        base_amount_jpyc=amount_jpyc,
+    )
+    response = X402Response(
+        request_id=request.request_id,
+        response_id=f"res-{request.request_id[4:]}",
+        status="success",
+        actual_amount=request.base_amount,
+        payment_address=address,
+    )
+    return client.queue_payment(request, response)
+
+
+AGENT_1 = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+AGENT_2 = "0x3C44CdDdB6a900fa2b585dd299e03d12FA4293BC"
+AGENT_3 = "0x90F79bf6EB2c4f870365E785982E1f101E93b906"
+
+
+def test_x402_batch_settlement():
+    """精算待ちの決済を支払先ごとに合算し、1トランザクションで送金"""
+    service = RecordingBlockchainService()
+    client = X402Client(blockchain_service=service, client_agent_id=0)
+
+    queued = [
+        _queue(client, AGENT_1, 3.0),
+        _queue(client, AGENT_2, 15.0),
+        _queue(client, AGENT_1.lower(), 5.0),
+    ]
+
+    assert all(tx.status == PaymentStatus.AUTHORIZED for tx in queued)
+    assert client.get_total_spent() == 0
+
+    settled = client.settle_pending()
+
+    assert service.batches == [[(AGENT_1, jpyc_to_wei(8.0)), (AGENT_2, jpyc_to_wei(15.0))]]
+    assert settled == queued
+    assert {tx.tx_hash for tx in queued} == {"0xbatch1"}
+    assert all(tx.status == PaymentStatus.COMPLETED for tx in queued)
+    assert client.get_total_spent() == 23.0
+    assert client.pending_settlement_count == 0
+    assert client.settle_pending() == []
+
+
+def test_x402_batch_settlement_splits_and_retries():
+    """支払先が上限を超えたら分割し、送金に失敗した分は精算待ちに残る"""
+    service = RecordingBlockchainService(fail_times=1)
+    client = X402Client(blockchain_service=service, client_agent_id=0, max_batch_size=2)
+    for address in (AGENT_1, AGENT_2, AGENT_1, AGENT_3):
+        _queue(client, address, 1.0)
+
+    try:
+        client.settle_pending()
+    except ConnectionError:
+        pass
+    else:
+        raise AssertionError("Expected ConnectionError")
+    assert client.pending_settlement_count == 4
+
+    settled = client.settle_pending()
+
+    assert [len(batch) for batch in service.batches] == [2, 1]
+    assert service.batches[0][0] == (AGENT_1, jpyc_to_wei(2.0))
+    assert [tx.tx_hash for tx in settled] == ["0xbatch1", "0xbatch1", "0xbatch1", "0xbatch2"]
+
+
+def test_x402_batch_settlement_requeues_reverted_batch():
+    """リバートした一括送金は COMPLETED にせず、精算待ちに戻して再送"""
+    service = RecordingBlockchainService(reverted={"0xbatch1"})
+    client = X402Client(blockchain_service=service, client_agent_id=0)
+    queued = [_queue(client, AGENT_1, 3.0), _queue(client, AGENT_2, 15.0)]
+
+    assert client.settle_pending() == []
+    assert all((tx.status, tx.tx_hash) == (PaymentStatus.AUTHORIZED, None) for tx in queued)
+    assert client.pending_settlement_count == 2
+    assert client.get_total_spent() == 0
+
+    settled = client.settle_pending()
+
+    assert settled == queued
+    assert len(service.batches) == 2
+    assert {tx.tx_hash for tx in queued} == {"0xbatch2"}
+    assert all(tx.status == PaymentStatus.COMPLETED for tx in queued)
+
+
+def _charge(client, scheme, amount_jpyc, address=AGENT_1):
+    request = client.create_request(
+        service_agent_id=3,
+        service_description="レポート生成サービス",
+        payment_scheme=scheme,
+        base_amount_jpyc=amount_jpyc,
+        max_amount_jpyc=amount_jpyc if scheme == PaymentScheme.UPTO else None,
+    )
+    response = X402Response(
+        request_id=request.request_id,
+        response_id=f"res-{request.request_id[4:]}",
+        status="success",
+        actual_amount=request.base_amount,
+        payment_address=address,
+    )
+    return client.process_response(request, response)
+
+
+def test_x402_ledger_nets_deferred_charges():
+    """DEFERRED・UPTO は台帳に積み、しきい値に達した支払先の分だけまとめて送金"""
+    service = RecordingBlockchainService()
+    ledger = SettlementLedger(threshold_jpyc=1000, max_age_seconds=3600)
+    client = X402Client(blockchain_service=service, client_agent_id=0, ledger=ledger)
+
+    charges = [_charge(client, PaymentScheme.DEFERRED, 5.0) for _ in range(1000)]
+    charges += [_charge(client, PaymentScheme.UPTO, 3.0, AGENT_2) for _ in range(10)]
+
+    # 5 JPYC × 200回ごとに1回（AGENT_2 は 30 JPYC でしきい値未満）
+    assert len(service.batches) == 5
+    assert all(batch == [(AGENT_1.lower(), jpyc_to_wei(1000))] for batch in service.batches)
+    # 送信したバッチは次の精算で確認（課金の処理中はレシートを待たない）
+    assert service.waits == []
+    assert all(tx.status == PaymentStatus.COMPLETED for tx in charges[:800])
+    assert all(
+        (tx.status, tx.tx_hash) == (PaymentStatus.AUTHORIZED, "0xbatch5") for tx in charges[800:1000]
+    )
+    assert all(tx.status == PaymentStatus.AUTHORIZED for tx in charges[1000:])
+    assert [(b.payment_address, b.amount) for b in ledger.balances()] == [
+        (AGENT_2.lower(), jpyc_to_wei(30))
+    ]
+
+    # EXACT は従来どおり即時に送金
+    exact = _charge(client, PaymentScheme.EXACT, 15.0)
+    assert (exact.status, exact.tx_hash) == (PaymentStatus.COMPLETED, "0xsingle1")
+
+    batches = client.settle_ledger(force=True)
+
+    assert [b.tx_hash for b in batches] == ["0xbatch5", "0xbatch6"]
+    assert batches[1].transfers == [(AGENT_2.lower(), jpyc_to_wei(30))]
+    assert all(tx.status == PaymentStatus.COMPLETED for tx in charges)
+    assert ledger.balances() == []
+
+
+def test_x402_ledger_settles_old_charges_and_keeps_failed():
+    """古い未精算分は経過時間で精算し、送金に失敗した分は未精算に戻す"""
+    ledger = SettlementLedger(threshold_jpyc=1000, max_age_seconds=60)
+    client = X402Client(client_agent_id=0, ledger=ledger)
+    charge = _charge(client, PaymentScheme.DEFERRED, 5.0)
+
+    assert not ledger.is_due()
+    later = charge.created_at + timedelta(seconds=61)
+    assert [b.amount for b in ledger.due_payees(later)] == [jpyc_to_wei(5)]
+
+    def failing(transfers):
+        raise ConnectionError("RPC unavailable")
+
+    try:
+        ledger.settle(failing, now=later)
+    except ConnectionError:
+        pass
+    else:
+        raise AssertionError("Expected ConnectionError")
+    assert ledger.backend.get(charge.transaction_id).status == "accrued"
+
+    batches = ledger.settle(lambda transfers: "0xsettled", confirm=lambda tx_hash: True, now=later)
+
+    assert batches[0].transaction_ids == [charge.transaction_id]
+    entry = ledger.backend.get(charge.transaction_id)
+    assert (entry.status, entry.tx_hash) == ("settled", "0xsettled")
+
+
+def test_x402_ledger_waits_for_receipt():
+    """レシートを確認するまでは submitting のまま、リバートした分は未精算に戻して再送"""
+    service = RecordingBlockchainService(reverted={"0xbatch1"})
+    ledger = SettlementLedger(threshold_jpyc=1000, max_age_seconds=3600)
+    client = X402Client(blockchain_service=service, client_agent_id=0, ledger=ledger)
+    charge = _charge(client, PaymentScheme.DEFERRED, 5.0)
+
+    # 送信しただけ（レシート未確認）
+    ledger.settle(service.transfer_jpyc_batch, force=True)
+    entry = ledger.backend.get(charge.transaction_id)
+    assert (entry.status, entry.tx_hash) == ("submitting", "0xbatch1")
+    assert ledger.balances() == []
+
+    # リバート → 未精算に戻り、同じ settle_ledger の中で再送される
+    batches = client.settle_ledger(force=True)
+
+    assert [(b.tx_hash, b.status) for b in batches] == [("0xbatch1", "accrued"), ("0xbatch2", "settled")]
+    assert len(service.batches) == 2
+    entry = ledger.backend.get(charge.transaction_id)
+    assert (entry.status, entry.tx_hash) == ("settled", "0xbatch2")
+    assert (charge.status, charge.tx_hash) == (PaymentStatus.COMPLETED, "0xbatch2")
+
+
+def test_x402_ledger_settlement_failure_keeps_charge():
+    """課金時の精算が失敗しても決済は AUTHORIZED で返り、課金は台帳に1回だけ残る"""
+    service = RecordingBlockchainService(fail_times=1)
+    ledger = SettlementLedger(threshold_jpyc=10, max_age_seconds=3600)
+    client = X402Client(blockchain_service=service, client_agent_id=0, ledger=ledger)
+
+    # 支払先ごとの判定だけで、全支払先の集計は精算するときだけ
+    aggregated = []
+    balances = ledger.backend.balances
+
+    def counting_balances():
+        aggregated.append(True)
+        return balances()
+
+    ledger.backend.balances = counting_balances
+
+    _charge(client, PaymentScheme.DEFERRED, 5.0, AGENT_2)
+    first = _charge(client, PaymentScheme.DEFERRED, 5.0)
+    assert aggregated == []
+
+    second = _charge(client, PaymentScheme.DEFERRED, 5.0)
+
+    assert second.status == PaymentStatus.AUTHORIZED
+    assert len(aggregated) == 1
+    assert ledger.backend.balance(AGENT_1.lower()).amount == jpyc_to_wei(10)
+
+    third = _charge(client, PaymentScheme.DEFERRED, 5.0)
+
+    assert service.batches == [[(AGENT_1.lower(), jpyc_to_wei(15))]]
+    assert all(tx.tx_hash == "0xbatch1" for tx in (first, second, third))
+
+    client.settle_ledger()
+    assert all(tx.status == PaymentStatus.COMPLETED for tx in (first, second, third))
+
+
+def test_x402_ledger_charge_does_not_wait_for_receipt():
+    """課金時の精算は送信だけで、マイニング前のバッチは次回の精算で確認する"""
+    service = RecordingBlockchainService(pending={"0xbatch1"})
+    ledger = SettlementLedger(threshold_jpyc=10, max_age_seconds=3600)
+    client = X402Client(blockchain_service=service, client_agent_id=0, ledger=ledger)
+
+    charges = [_charge(client, PaymentScheme.DEFERRED, 5.0) for _ in range(2)]
+    # 送信済みのバッチはまだマイニングされていないので、次の課金でも submitting のまま
+    charges.append(_charge(client, PaymentScheme.DEFERRED, 5.0))
+
+    assert service.waits == []
+    assert ledger.backend.get(charges[0].transaction_id).status == "submitting"
+    assert all(tx.status == PaymentStatus.AUTHORIZED for tx in charges)
+
+    # マイニングされたら次の課金で確認する（待たずにレシートを取得）
+    service.pending.clear()
+    charges += [_charge(client, PaymentScheme.DEFERRED, 5.0) for _ in range(2)]
+
+    assert service.waits == []
+    assert all(tx.status == PaymentStatus.COMPLETED for tx in charges[:2])
+    assert [tx.status for tx in charges[2:]] == [PaymentStatus.AUTHORIZED] * 3
+
+    # 定期精算ではレシートを待って確認し、しきい値未満の支払先も経過時間で精算する
+    client.settle_ledger(force=True)
+
+    assert service.waits == ["0xbatch2", "0xbatch3"]
+    assert all(tx.status == PaymentStatus.COMPLETED for tx in charges)
+    assert ledger.balances() == []
+
+
+def test_llm_orchestrator_settles_through_ledger():
+    """LLMオーケストレータの決済クライアントは精算台帳を使う"""
+    from orchestrator_llm import SupplyChainOrchestrator
+
+    ledger = SettlementLedger(threshold_jpyc=1000, max_age_seconds=3600)
+    orchestrator = SupplyChainOrchestrator(ledger=ledger, settlement_interval_seconds=0)
+
+    charge = _charge(orchestrator.x402_client, PaymentScheme.DEFERRED, 5.0)
+
+    assert orchestrator.x402_client.ledger is ledger
+    assert charge.status == PaymentStatus.AUTHORIZED
+    assert [b.amount for b in ledger.balances()] == [jpyc_to_wei(5)]
+
+
 def main():
     """全テストを実行"""
     print("\n" + "=" * 60)
@@ -304,6 +610,15 @@ def main():
         test_x402_upto_exceeds_max()
         test_x402_deferred_payment()
         test_x402_transaction_summary()
+        test_x402_batch_settlement()
+        test_x402_batch_settlement_splits_and_retries()
+        test_x402_batch_settlement_requeues_reverted_batch()
+        test_x402_ledger_nets_deferred_charges()
+        test_x402_ledger_settles_old_charges_and_keeps_failed()
+        test_x402_ledger_waits_for_receipt()
+        test_x402_ledger_settlement_failure_keeps_charge()
+        test_x402_ledger_charge_does_not_wait_for_receipt()
+        test_llm_orchestrator_settles_through_ledger()
 
         print("\n" + "=" * 60)
         print("✅ ALL X402 TESTS PASSED!")
@@ -314,6 +629,8 @@ def main():
         print("  ✓ UPTO max amount validation")
         print("  ✓ DEFERRED payment scheme (post-payment)")
         print("  ✓ Transaction tracking and summary")
+        print("  ✓ Batch settlement (batchTransfer)")
+        print("  ✓ Settlement ledger for DEFERRED / UPTO")
         print("\n🎯 X402 v2 protocol is ready for agent integration!")
 
     except AssertionError as e: